@@ -6,6 +6,7 @@ namespace torch_ipex {
 namespace cpu {
 
 IPEX_DEFINE_DISPATCH(masked_multihead_self_attention_kernel_stub);
+IPEX_DEFINE_DISPATCH(streaming_masked_multihead_self_attention_kernel_stub);
 
 /*
  *Caculate the masked multihead attention for decoder layer in decoder only
@@ -54,6 +55,47 @@ masked_multihead_self_attention_forward_cpu(
       add_casual_mask);
 }
 
+/*
+ *Caculate the masked multihead attention with the streaming kv cache, which
+ *keeps the first attention_sink_size tokens and the last sliding_window_size
+ *tokens of the sequence in a ring buffer of attention_sink_size +
+ *sliding_window_size tokens.
+ *@param seq_info The number of the past tokens (including the evicted ones).
+ *@param sink_query The query used for the attention sinks, which could be the
+ *query rotated back by the number of the evicted tokens so the distance
+ *between the query and the sinks is the one within the cache.
+ *@return {attn_outs, None, key_cache, value_cache, beam_idx}
+ */
+std::tuple<at::Tensor, at::Tensor, at::Tensor, at::Tensor, at::Tensor>
+streaming_masked_multihead_self_attention_forward_cpu(
+    at::Tensor& query,
+    at::Tensor& key,
+    at::Tensor& value,
+    at::Tensor& key_cache,
+    at::Tensor& value_cache,
+    at::Tensor& beam_idx,
+    at::Tensor seq_info,
+    const double scale_attn,
+    int64_t attention_sink_size,
+    int64_t sliding_window_size,
+    const c10::optional<at::Tensor>& sink_query /* optional */,
+    const c10::optional<at::Tensor>& attention_mask /* optional */) {
+  return streaming_masked_multihead_self_attention_kernel_stub(
+      kCPU,
+      query,
+      key,
+      value,
+      key_cache,
+      value_cache,
+      beam_idx,
+      seq_info,
+      scale_attn,
+      attention_sink_size,
+      sliding_window_size,
+      sink_query,
+      attention_mask);
+}
+
 } // namespace cpu
 } // namespace torch_ipex
 
@@ -68,5 +110,13 @@ TORCH_LIBRARY_FRAGMENT(torch_ipex, m) {
       "masked_multihead_self_attention",
       c10::DispatchKey::CPU,
       torch_ipex::cpu::masked_multihead_self_attention_forward_cpu);
+  m.def(
+      "streaming_masked_multihead_self_attention(Tensor query, Tensor key, Tensor value, Tensor key_cache, \
+       Tensor value_cache, Tensor beam_idx, Tensor seq_info, float scale_attn, int attention_sink_size, \
+       int sliding_window_size, Tensor? sink_query, Tensor? attention_mask)-> (Tensor, Tensor, Tensor, Tensor, Tensor)");
+  m.impl(
+      "streaming_masked_multihead_self_attention",
+      c10::DispatchKey::CPU,
+      torch_ipex::cpu::streaming_masked_multihead_self_attention_forward_cpu);
 }
 } // namespace
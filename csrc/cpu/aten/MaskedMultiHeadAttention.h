@@ -22,6 +22,21 @@ masked_multihead_self_attention(
     const c10::optional<at::Tensor>& head_mask /* optional */,
     const c10::optional<at::Tensor>& attention_mask /* optional */,
     c10::optional<bool> add_casual_mask /* optional */);
+
+std::tuple<at::Tensor, at::Tensor, at::Tensor, at::Tensor, at::Tensor>
+streaming_masked_multihead_self_attention(
+    at::Tensor& query,
+    at::Tensor& key,
+    at::Tensor& value,
+    at::Tensor& key_cache,
+    at::Tensor& value_cache,
+    at::Tensor& beam_idx,
+    at::Tensor seq_info,
+    const double scale_attn,
+    int64_t attention_sink_size,
+    int64_t sliding_window_size,
+    const c10::optional<at::Tensor>& sink_query /* optional */,
+    const c10::optional<at::Tensor>& attention_mask /* optional */);
 }
 
 using masked_multihead_self_attention_kernel_fn =
@@ -39,9 +54,27 @@ using masked_multihead_self_attention_kernel_fn =
         const c10::optional<at::Tensor>& attention_mask /* optional */,
         c10::optional<bool> add_casual_mask /* optional */);
 
+using streaming_masked_multihead_self_attention_kernel_fn =
+    std::tuple<at::Tensor, at::Tensor, at::Tensor, at::Tensor, at::Tensor> (*)(
+        at::Tensor& query,
+        at::Tensor& key,
+        at::Tensor& value,
+        at::Tensor& key_cache,
+        at::Tensor& value_cache,
+        at::Tensor& beam_idx,
+        at::Tensor seq_info,
+        const double scale_attn,
+        int64_t attention_sink_size,
+        int64_t sliding_window_size,
+        const c10::optional<at::Tensor>& sink_query /* optional */,
+        const c10::optional<at::Tensor>& attention_mask /* optional */);
+
 IPEX_DECLARE_DISPATCH(
     masked_multihead_self_attention_kernel_fn,
     masked_multihead_self_attention_kernel_stub);
+IPEX_DECLARE_DISPATCH(
+    streaming_masked_multihead_self_attention_kernel_fn,
+    streaming_masked_multihead_self_attention_kernel_stub);
 
 } // namespace cpu
 } // namespace torch_ipex
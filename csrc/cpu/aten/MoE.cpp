@@ -8,6 +8,7 @@ namespace cpu {
 IPEX_DEFINE_DISPATCH(mixtral_moe_tpp_kernel_stub);
 IPEX_DEFINE_DISPATCH(mixtral_moe_woq_kernel_stub);
 IPEX_DEFINE_DISPATCH(mixtral_moe_kernel_stub);
+IPEX_DEFINE_DISPATCH(mixtral_moe_grouped_kernel_stub);
 
 at::Tensor mixtral_moe_tpp(
     const at::Tensor& hidden_states,
@@ -98,6 +99,58 @@ at::Tensor mixtral_moe_woq(
       output,
       is_distributed);
 }
+
+/*
+ *Computes the sparse MoE block of Mixtral for all the experts at once: the
+ *tokens are sorted by expert once, every expert with at least one routed token
+ *runs its gate/up/down projections on its contiguous slice of the sorted
+ *tokens, and the weighted expert outputs are combined by one index_add.
+ *@param selected_experts The top-k experts of every token, [num_tokens, top_k].
+ *@param routing_weights The normalized weights of the selected experts, same
+ *shape as selected_experts.
+ *@param gate_wei/up_wei/down_wei The weights of every expert (the woq op
+ *contexts for MOE_LINEAR_WOQ).
+ *@param gate_op_ctx/up_op_ctx/down_op_ctx The op contexts of every expert for
+ *MOE_LINEAR_DNNL and MOE_LINEAR_MKL, empty otherwise.
+ *@param linear_type MoELinearType of the expert weights.
+ *@return The output of the MoE block, [num_tokens, hidden_size].
+ */
+at::Tensor mixtral_moe_grouped(
+    const at::Tensor& hidden_states,
+    const at::Tensor& selected_experts,
+    const at::Tensor& routing_weights,
+    const std::vector<at::Tensor>& gate_wei,
+    const std::vector<at::Tensor>& up_wei,
+    const std::vector<at::Tensor>& down_wei,
+    const std::vector<at::Tensor>& gate_op_ctx,
+    const std::vector<at::Tensor>& up_op_ctx,
+    const std::vector<at::Tensor>& down_op_ctx,
+    int64_t linear_type,
+    bool tpp_fallback,
+    bool is_distributed) {
+  RECORD_FUNCTION("ipex::mixtral_moe_grouped", c10::ArrayRef<c10::IValue>({}));
+
+  TORCH_CHECK(
+      gate_wei.size() == up_wei.size() && gate_wei.size() == down_wei.size(),
+      "mixtral_moe_grouped: the number of gate/up/down weights should be the same");
+  TORCH_CHECK(
+      selected_experts.sizes() == routing_weights.sizes(),
+      "mixtral_moe_grouped: selected_experts and routing_weights should have the same shape");
+  return mixtral_moe_grouped_kernel_stub(
+      kCPU,
+      hidden_states,
+      selected_experts,
+      routing_weights,
+      gate_wei,
+      up_wei,
+      down_wei,
+      gate_op_ctx,
+      up_op_ctx,
+      down_op_ctx,
+      linear_type,
+      tpp_fallback,
+      is_distributed);
+}
 } // namespace cpu
 } // namespace torch_ipex
 
@@ -124,5 +177,13 @@ TORCH_LIBRARY_FRAGMENT(torch_ipex, m) {
       "mixtral_moe_woq",
       c10::DispatchKey::CPU,
       torch_ipex::cpu::mixtral_moe_woq);
+  m.def(
+      "mixtral_moe_grouped(Tensor hidden_states, Tensor selected_experts, Tensor routing_weights, \
+      Tensor[] gate_wei, Tensor[] up_wei, Tensor[] down_wei, Tensor[] gate_op_ctx, Tensor[] up_op_ctx, \
+      Tensor[] down_op_ctx, int linear_type, bool tpp_fallback, bool is_distributed) -> Tensor");
+  m.impl(
+      "mixtral_moe_grouped",
+      c10::DispatchKey::CPU,
+      torch_ipex::cpu::mixtral_moe_grouped);
 }
 } // namespace
\ No newline at end of file
@@ -40,6 +40,26 @@ at::Tensor mixtral_moe(
     const at::Tensor&,
     at::Tensor&,
     bool);
+// The linear implementation of the experts used by mixtral_moe_grouped
+enum MoELinearType {
+  MOE_LINEAR_TPP = 0,
+  MOE_LINEAR_DNNL = 1,
+  MOE_LINEAR_MKL = 2,
+  MOE_LINEAR_WOQ = 3,
+};
+at::Tensor mixtral_moe_grouped(
+    const at::Tensor&,
+    const at::Tensor&,
+    const at::Tensor&,
+    const std::vector<at::Tensor>&,
+    const std::vector<at::Tensor>&,
+    const std::vector<at::Tensor>&,
+    const std::vector<at::Tensor>&,
+    const std::vector<at::Tensor>&,
+    const std::vector<at::Tensor>&,
+    int64_t,
+    bool,
+    bool);
 using mixtral_moe_tpp_kernel_fn = at::Tensor (*)(
     const at::Tensor& hidden_states,
     const at::Tensor& top_x,
@@ -75,8 +95,24 @@ using mixtral_moe_kernel_fn = at::Tensor (*)(
     const at::Tensor& routing_weights,
     at::Tensor& output,
     bool is_distributed);
+using mixtral_moe_grouped_kernel_fn = at::Tensor (*)(
+    const at::Tensor& hidden_states,
+    const at::Tensor& selected_experts,
+    const at::Tensor& routing_weights,
+    const std::vector<at::Tensor>& gate_wei,
+    const std::vector<at::Tensor>& up_wei,
+    const std::vector<at::Tensor>& down_wei,
+    const std::vector<at::Tensor>& gate_op_ctx,
+    const std::vector<at::Tensor>& up_op_ctx,
+    const std::vector<at::Tensor>& down_op_ctx,
+    int64_t linear_type,
+    bool tpp_fallback,
+    bool is_distributed);
 IPEX_DECLARE_DISPATCH(mixtral_moe_tpp_kernel_fn, mixtral_moe_tpp_kernel_stub);
 IPEX_DECLARE_DISPATCH(mixtral_moe_woq_kernel_fn, mixtral_moe_woq_kernel_stub);
 IPEX_DECLARE_DISPATCH(mixtral_moe_kernel_fn, mixtral_moe_kernel_stub);
+IPEX_DECLARE_DISPATCH(
+    mixtral_moe_grouped_kernel_fn,
+    mixtral_moe_grouped_kernel_stub);
 } // namespace cpu
 } // namespace torch_ipex
@@ -22,7 +22,9 @@ void single_query_cached_kv_attention_forward_cpu(
     at::Tensor& context_lens, // [num_seqs]
     int64_t block_size,
     int64_t max_context_len,
-    const c10::optional<at::Tensor>& alibi_slopes) {
+    const c10::optional<at::Tensor>& alibi_slopes,
+    const c10::optional<at::Tensor>& k_scale, // [num_blocks, block_size, num_heads]
+    const c10::optional<at::Tensor>& v_scale) {
   return single_query_cached_kv_attention_kernel_stub(
       kCPU,
       out,
@@ -35,7 +37,9 @@ void single_query_cached_kv_attention_forward_cpu(
       context_lens,
       block_size,
       max_context_len,
-      alibi_slopes);
+      alibi_slopes,
+      k_scale,
+      v_scale);
 }
 
 void reshape_and_cache_cpu(
@@ -43,9 +47,18 @@ void reshape_and_cache_cpu(
     at::Tensor& value,
     at::Tensor& key_cache,
     at::Tensor& value_cache,
-    at::Tensor& slot_mapping) {
+    at::Tensor& slot_mapping,
+    const c10::optional<at::Tensor>& k_scale, // [num_blocks, block_size, num_heads]
+    const c10::optional<at::Tensor>& v_scale) {
   return reshape_and_cache_kernel_stub(
-      kCPU, key, value, key_cache, value_cache, slot_mapping);
+      kCPU,
+      key,
+      value,
+      key_cache,
+      value_cache,
+      slot_mapping,
+      k_scale,
+      v_scale);
 }
 
 } // namespace cpu
@@ -57,13 +70,14 @@ TORCH_LIBRARY_FRAGMENT(torch_ipex, m) {
   m.def(
       "single_query_cached_kv_attention(Tensor (a!)out, Tensor (a!)query, Tensor (a!)key_cache, Tensor (a!)value_cache,\
        Tensor(a!) head_mapping, float scale, Tensor(a!) block_tables, Tensor(a!) context_lens, int block_size, int max_context_len,\
-       Tensor? alibi_slopes)-> ()");
+       Tensor? alibi_slopes, Tensor? k_scale=None, Tensor? v_scale=None)-> ()");
   m.impl(
       "single_query_cached_kv_attention",
       c10::DispatchKey::CPU,
       torch_ipex::cpu::single_query_cached_kv_attention_forward_cpu);
   m.def(
-      "reshape_and_cache(Tensor (a!)key, Tensor (a!)value, Tensor (a!)key_cache, Tensor (a!)value_cache, Tensor(a!) slot_mapping)-> ()");
+      "reshape_and_cache(Tensor (a!)key, Tensor (a!)value, Tensor (a!)key_cache, Tensor (a!)value_cache, Tensor(a!) slot_mapping,\
+       Tensor(b!)? k_scale=None, Tensor(c!)? v_scale=None)-> ()");
   m.impl(
       "reshape_and_cache",
       c10::DispatchKey::CPU,
@@ -19,7 +19,9 @@ void single_query_cached_kv_attention(
     at::Tensor& context_lens, // [num_seqs]
     int64_t block_size,
     int64_t max_context_len,
-    const c10::optional<at::Tensor>& alibi_slopes);
+    const c10::optional<at::Tensor>& alibi_slopes,
+    const c10::optional<at::Tensor>& k_scale, // [num_blocks, block_size, num_heads]
+    const c10::optional<at::Tensor>& v_scale);
 }
 
 void reshape_and_cache(
@@ -27,7 +29,9 @@ void reshape_and_cache(
     at::Tensor& value,
     at::Tensor& key_cache,
     at::Tensor& value_cache,
-    at::Tensor& slot_mapping);
+    at::Tensor& slot_mapping,
+    const c10::optional<at::Tensor>& k_scale, // [num_blocks, block_size, num_heads]
+    const c10::optional<at::Tensor>& v_scale);
 
 using single_query_cached_kv_attention_fn = void (*)(
     at::Tensor& out, // [num_seqs, num_heads, head_size]
@@ -40,14 +44,18 @@ using single_query_cached_kv_attention_fn = void (*)(
     at::Tensor& context_lens, // [num_seqs]
     int64_t block_size,
     int64_t max_context_len,
-    const c10::optional<at::Tensor>& alibi_slopes);
+    const c10::optional<at::Tensor>& alibi_slopes,
+    const c10::optional<at::Tensor>& k_scale, // [num_blocks, block_size, num_heads]
+    const c10::optional<at::Tensor>& v_scale);
 
 using reshape_and_cache_fn = void (*)(
     at::Tensor& key,
     at::Tensor& value,
     at::Tensor& key_cache,
     at::Tensor& value_cache,
-    at::Tensor& slot_mapping);
+    at::Tensor& slot_mapping,
+    const c10::optional<at::Tensor>& k_scale, // [num_blocks, block_size, num_heads]
+    const c10::optional<at::Tensor>& v_scale);
 
 IPEX_DECLARE_DISPATCH(
     single_query_cached_kv_attention_fn,
@@ -1,6 +1,7 @@
 #include <ATen/Tensor.h>
 #include <aten/FlashAttention.h>
 #include <aten/MaskedMultiHeadAttention.h>
+#include <aten/utils/kv_cache_quant.h>
 #include <torch/all.h>
 #include <torch/csrc/autograd/function.h>
 #include <limits>
@@ -489,6 +490,47 @@ void copy_key_value(
   }
 }
 
+template <typename CT, typename T>
+void copy_key_value_quantized(
+    at::Tensor key_cache,
+    const at::Tensor key,
+    at::Tensor value_cache,
+    const at::Tensor value,
+    int beam_batch) {
+  RECORD_FUNCTION(
+      "ipex::copy_key_value_quantized", c10::ArrayRef<c10::IValue>({}));
+  auto bs = key.size(0);
+  auto seq_len = key.size(1);
+  auto head_num = key.size(2);
+  auto head_size = key.size(3);
+  auto packed_head_size = key_cache.size(3);
+  auto key_cache_ptr = key_cache.data_ptr<CT>();
+  auto key_ptr = key.data_ptr<T>();
+  auto value_cache_ptr = value_cache.data_ptr<CT>();
+  auto value_ptr = value.data_ptr<T>();
+  auto token_stride = beam_batch * head_num * packed_head_size;
+  auto beam_size = beam_batch / bs;
+#pragma omp parallel for collapse(3)
+  for (auto si = 0; si < seq_len; si++) {
+    for (auto bi = 0; bi < bs; bi++) {
+      for (auto hi = 0; hi < head_num; hi++) {
+        auto cache_stride = si * token_stride +
+            (bi * beam_size * head_num + hi) * packed_head_size;
+        auto state_stride = ((bi * seq_len + si) * head_num + hi) * head_size;
+        auto key_cache_start = key_cache_ptr + cache_stride;
+        auto k_scale = kv_cache_quant::quantize_head(
+            key_ptr + state_stride, key_cache_start, head_size);
+        kv_cache_quant::store_packed_scale(key_cache_start, head_size, k_scale);
+        auto value_cache_start = value_cache_ptr + cache_stride;
+        auto v_scale = kv_cache_quant::quantize_head(
+            value_ptr + state_stride, value_cache_start, head_size);
+        kv_cache_quant::store_packed_scale(
+            value_cache_start, head_size, v_scale);
+      }
+    }
+  }
+}
+
 /*
  *The scale-dot product for indirect access kv chache and fuse
  *matmul+div+add+softmax to improve data reuse
@@ -527,7 +569,10 @@ scale_dot_product_for_indirect_access_kv_cache(
       c10::ArrayRef<c10::IValue>({}));
   int beam_batch = beam_idx.size(1);
   auto bs = query.size(0);
-  auto cur_len = query.size(1); // only process cur_len==1
+  auto cur_len = query.size(1);
+  // the query/key/value of the prompt (or of a prompt chunk) are not expanded
+  // by beams, their cache is stored to the first beam of every batch
+  auto beam_size = beam_batch / bs;
   auto head_num = query.size(2);
   auto kv_head = key.size(2);
   auto group_size = head_num / kv_head;
@@ -568,10 +613,11 @@ scale_dot_product_for_indirect_access_kv_cache(
     // according to the last decoded token to get the target beam for the past
     // token
     for (int i = 0; i < bs; i++) {
-      new_beam_idx[i][offset - 1] = b_ptr[(offset - 1) * bs + i];
+      new_beam_idx[i][offset - 1] =
+          b_ptr[(offset - 1) * beam_batch + i * beam_size];
       for (int j = offset - 2; j >= 0;
            j--) { // for the token of input, the target beam is alwarys 0
-        new_beam_idx[i][j] = b_ptr[j * bs + new_beam_idx[i][j + 1]];
+        new_beam_idx[i][j] = b_ptr[j * beam_batch + new_beam_idx[i][j + 1]];
       }
     }
   }
@@ -604,14 +650,8 @@ scale_dot_product_for_indirect_access_kv_cache(
               } else if (ti == query_ti + offset) { // caculate the innerproduct
                                                     // for the current token and
                                                     // store the key
-                if (cur_len > 1) { // this may occur for processing the promt
-                  auto beam_size = beam_batch / bs;
-                  // need to store key accross beam
-                  kc_t_beam_start =
-                      kc_t_beam_start + bi * beam_size * kv_head * head_size;
-                } else {
-                  kc_t_beam_start = kc_t_beam_start + bi * kv_head * head_size;
-                }
+                kc_t_beam_start =
+                    kc_t_beam_start + bi * beam_size * kv_head * head_size;
                 auto kc_head_start =
                     k_cache_ptr + kc_t_beam_start + kv_hi * head_size;
                 auto k_ptr_start = k_ptr +
@@ -639,11 +679,6 @@ scale_dot_product_for_indirect_access_kv_cache(
                 } else {
                   kc_t_beam_start = kc_t_beam_start +
                       new_beam_idx[bi][ti] * kv_head * head_size;
-                  if (cur_len > 1) {
-                    auto beam_size = beam_batch / bs;
-                    kc_t_beam_start =
-                        kc_t_beam_start + bi * beam_size * kv_head * head_size;
-                  }
                   auto kc_head_start =
                       k_cache_ptr + kc_t_beam_start + kv_hi * head_size;
                   reduce_head<QT>(
@@ -757,16 +792,8 @@ scale_dot_product_for_indirect_access_kv_cache(
               auto vc_token_start = vi * kc_token_stride;
               if (vi == query_ti + offset) { // caculate the attention values
                                              // for the current token
-                auto vc_t_beam_start = vc_token_start;
-                if (cur_len > 1) { // this may occur for processing the promt
-                  auto beam_size = beam_batch / bs;
-                  // removed the redundant computation, need to store key
-                  // accross beam
-                  vc_t_beam_start =
-                      vc_t_beam_start + bi * beam_size * kv_head * head_size;
-                } else {
-                  vc_t_beam_start = vc_t_beam_start + bi * kv_head * head_size;
-                }
+                auto vc_t_beam_start =
+                    vc_token_start + bi * beam_size * kv_head * head_size;
                 auto v_cache_head_start =
                     v_cache_ptr + vc_t_beam_start + kv_hi * head_size;
                 auto v_ptr_start = v_ptr +
@@ -798,11 +825,6 @@ scale_dot_product_for_indirect_access_kv_cache(
                 } else {
                   auto vc_t_beam_start = vc_token_start +
                       new_beam_idx[bi][vi] * kv_head * head_size;
-                  if (cur_len > 1) {
-                    auto beam_size = beam_batch / bs;
-                    vc_t_beam_start =
-                        vc_t_beam_start + bi * beam_size * kv_head * head_size;
-                  }
                   auto v_cache_head_start =
                       v_cache_ptr + vc_t_beam_start + kv_hi * head_size;
                   mul_attenion_weights_and_value_of_head<VT, float>(
@@ -863,6 +885,163 @@ scale_dot_product_for_indirect_access_kv_cache(
       attn_outs, at::Tensor(), key_cache, value_cache, beam_idx);
 }
 
+/*
+ *The scale-dot product for the indirect access kv cache stored in int8 or
+ *fp8. The key/value of the current tokens are quantized into the cache first,
+ *then every query token reads its whole context from the cache, so the
+ *dequantization is fused into the matmul of (query, key) and (attn_w, value).
+ *The last dim of the int8 cache packs the per token per head scale after the
+ *head values, see kv_cache_quant.h.
+ *@return attn_outs, None, key_cache, value_cache, beam_idx
+ */
+template <typename T, typename CT>
+std::tuple<at::Tensor, at::Tensor, at::Tensor, at::Tensor, at::Tensor>
+scale_dot_product_for_indirect_access_quantized_kv_cache(
+    at::Tensor query,
+    at::Tensor key,
+    at::Tensor value,
+    at::Tensor& key_cache,
+    at::Tensor& value_cache,
+    at::Tensor& beam_idx,
+    const int64_t offset,
+    const double scale_factor,
+    at::Tensor& attention_mask) {
+  RECORD_FUNCTION(
+      "ipex::scale_dot_product_for_indirect_access_quantized_kv_cache",
+      c10::ArrayRef<c10::IValue>({}));
+  int beam_batch = beam_idx.size(1);
+  auto bs = query.size(0);
+  auto cur_len = query.size(1);
+  auto beam_size = beam_batch / bs;
+  auto head_num = query.size(2);
+  auto kv_head = key.size(2);
+  auto group_size = head_num / kv_head;
+  auto head_size = query.size(3);
+  auto packed_head_size = key_cache.size(3);
+  auto seq_len = offset + cur_len;
+  auto kc_token_stride = beam_batch * kv_head * packed_head_size;
+  query = query.contiguous();
+  key = key.contiguous();
+  value = value.contiguous();
+  auto q_ptr = query.data_ptr<T>();
+  auto k_ptr = key.data_ptr<T>();
+  auto v_ptr = value.data_ptr<T>();
+  auto k_cache_ptr = key_cache.data_ptr<CT>();
+  auto v_cache_ptr = value_cache.data_ptr<CT>();
+  auto mask_ptr = attention_mask.data_ptr<T>();
+  auto mask_head_num = attention_mask.size(1);
+  auto mask_dim2 = attention_mask.size(2);
+  auto mask_bs_stride = mask_head_num * mask_dim2 * seq_len;
+  auto attn_weights = at::empty({bs, head_num, cur_len, seq_len}, at::kFloat);
+  auto attn_w_ptr = attn_weights.data_ptr<float>();
+  auto attn_outs_fp32 =
+      at::empty({bs, head_num, cur_len, head_size}, at::kFloat);
+  auto attn_out_fp32_ptr = attn_outs_fp32.data_ptr<float>();
+  auto b_ptr = beam_idx.data_ptr<long>();
+  // the beam of every past token, which is traced back from the last decoded
+  // token, the current tokens are stored to the first beam of every batch
+  std::vector<long> new_beam_idx(bs * seq_len);
+  for (auto bi = 0; bi < bs; bi++) {
+    for (auto ti = offset; ti < seq_len; ti++) {
+      new_beam_idx[bi * seq_len + ti] = bi * beam_size;
+    }
+    if (offset > 0) {
+      new_beam_idx[bi * seq_len + offset - 1] =
+          b_ptr[(offset - 1) * beam_batch + bi * beam_size];
+      for (auto ti = offset - 2; ti >= 0; ti--) {
+        new_beam_idx[bi * seq_len + ti] =
+            b_ptr[ti * beam_batch + new_beam_idx[bi * seq_len + ti + 1]];
+      }
+    }
+  }
+  {
+    RECORD_FUNCTION(
+        "ipex::iakv_sdp::quantize_key_value", c10::ArrayRef<c10::IValue>({}));
+#pragma omp parallel for collapse(3)
+    for (auto ti = 0; ti < cur_len; ti++) {
+      for (auto bi = 0; bi < bs; bi++) {
+        for (auto kv_hi = 0; kv_hi < kv_head; kv_hi++) {
+          auto cache_start = (offset + ti) * kc_token_stride +
+              (bi * beam_size * kv_head + kv_hi) * packed_head_size;
+          auto state_start = ((bi * cur_len + ti) * kv_head + kv_hi) * head_size;
+          auto k_scale = kv_cache_quant::quantize_head(
+              k_ptr + state_start, k_cache_ptr + cache_start, head_size);
+          kv_cache_quant::store_packed_scale(
+              k_cache_ptr + cache_start, head_size, k_scale);
+          auto v_scale = kv_cache_quant::quantize_head(
+              v_ptr + state_start, v_cache_ptr + cache_start, head_size);
+          kv_cache_quant::store_packed_scale(
+              v_cache_ptr + cache_start, head_size, v_scale);
+        }
+      }
+    }
+  }
+  {
+    RECORD_FUNCTION(
+        "ipex::iakv_sdp::quantized_attention", c10::ArrayRef<c10::IValue>({}));
+#pragma omp parallel for collapse(3)
+    for (auto bi = 0; bi < bs; bi++) {
+      for (auto hi = 0; hi < head_num; hi++) {
+        for (auto query_ti = 0; query_ti < cur_len; query_ti++) {
+          auto kv_hi = hi / group_size;
+          auto q_ptr_start = q_ptr +
+              ((bi * cur_len + query_ti) * head_num + hi) * head_size;
+          auto attn_w_start =
+              attn_w_ptr + ((bi * head_num + hi) * cur_len + query_ti) * seq_len;
+          auto mask_ptr_start = mask_ptr + bi * mask_bs_stride +
+              (hi % mask_head_num) * mask_dim2 * seq_len +
+              (query_ti % mask_dim2) * seq_len;
+          // the current token of the query and its past tokens
+          auto context_len = offset + query_ti + 1;
+          // matmul(query, key) + div + add + max
+          auto max_val = -100000.0f;
+          for (auto ti = 0; ti < context_len; ti++) {
+            auto kc_head_start = k_cache_ptr + ti * kc_token_stride +
+                (new_beam_idx[bi * seq_len + ti] * kv_head + kv_hi) *
+                    packed_head_size;
+            auto k_scale =
+                kv_cache_quant::load_packed_scale(kc_head_start, head_size);
+            attn_w_start[ti] = kv_cache_quant::dot_quantized_head(
+                                   q_ptr_start,
+                                   kc_head_start,
+                                   k_scale,
+                                   head_size) /
+                    scale_factor +
+                static_cast<float>(mask_ptr_start[ti]);
+            max_val = std::max(max_val, attn_w_start[ti]);
+          }
+          // softmax
+          float sum = 0.0f;
+          for (auto ti = 0; ti < context_len; ti++) {
+            attn_w_start[ti] = std::exp(attn_w_start[ti] - max_val);
+            sum += attn_w_start[ti];
+          }
+          // matmul(attn_w, value)
+          auto attn_out_start = attn_out_fp32_ptr +
+              ((bi * head_num + hi) * cur_len + query_ti) * head_size;
+          for (auto vi = 0; vi < context_len; vi++) {
+            auto vc_head_start = v_cache_ptr + vi * kc_token_stride +
+                (new_beam_idx[bi * seq_len + vi] * kv_head + kv_hi) *
+                    packed_head_size;
+            auto v_scale =
+                kv_cache_quant::load_packed_scale(vc_head_start, head_size);
+            kv_cache_quant::axpy_quantized_head(
+                attn_w_start[vi] / sum,
+                vc_head_start,
+                v_scale,
+                attn_out_start,
+                head_size,
+                vi > 0);
+          }
+        }
+      }
+    }
+  }
+  auto attn_outs = attn_outs_fp32.to(value.scalar_type());
+  return std::make_tuple(
+      attn_outs, at::Tensor(), key_cache, value_cache, beam_idx);
+}
+
 #if defined(CPU_CAPABILITY_AVX512_FP16)
 std::tuple<at::Tensor, at::Tensor, at::Tensor, at::Tensor, at::Tensor>
 scale_dot_product_for_indirect_access_kv_cache_half(
@@ -880,7 +1059,10 @@ scale_dot_product_for_indirect_access_kv_cache_half(
       c10::ArrayRef<c10::IValue>({}));
   int beam_batch = beam_idx.size(1);
   auto bs = query.size(0);
-  auto cur_len = query.size(1); // only process cur_len==1
+  auto cur_len = query.size(1);
+  // the query/key/value of the prompt (or of a prompt chunk) are not expanded
+  // by beams, their cache is stored to the first beam of every batch
+  auto beam_size = beam_batch / bs;
   auto head_num = query.size(2);
   auto kv_head = key.size(2);
   auto group_size = head_num / kv_head;
@@ -913,10 +1095,11 @@ scale_dot_product_for_indirect_access_kv_cache_half(
     // according to the last decoded token to get the target beam for the past
     // token
     for (int i = 0; i < bs; i++) {
-      new_beam_idx[i][offset - 1] = b_ptr[(offset - 1) * bs + i];
+      new_beam_idx[i][offset - 1] =
+          b_ptr[(offset - 1) * beam_batch + i * beam_size];
       for (int j = offset - 2; j >= 0;
            j--) { // for the token of input, the target beam is alwarys 0
-        new_beam_idx[i][j] = b_ptr[j * bs + new_beam_idx[i][j + 1]];
+        new_beam_idx[i][j] = b_ptr[j * beam_batch + new_beam_idx[i][j + 1]];
       }
     }
   }
@@ -945,14 +1128,8 @@ scale_dot_product_for_indirect_access_kv_cache_half(
             } else if (ti == query_ti + offset) { // caculate the innerproduct
                                                   // for the current token and
                                                   // store the key
-              if (cur_len > 1) { // this may occur for processing the promt
-                auto beam_size = beam_batch / bs;
-                // need to store key accross beam
-                kc_t_beam_start =
-                    kc_t_beam_start + bi * beam_size * kv_head * head_size;
-              } else {
-                kc_t_beam_start = kc_t_beam_start + bi * kv_head * head_size;
-              }
+              kc_t_beam_start =
+                  kc_t_beam_start + bi * beam_size * kv_head * head_size;
               auto kc_head_start =
                   k_cache_ptr + kc_t_beam_start + kv_hi * head_size;
               auto k_ptr_start = k_ptr +
@@ -980,11 +1157,6 @@ scale_dot_product_for_indirect_access_kv_cache_half(
               } else {
                 kc_t_beam_start = kc_t_beam_start +
                     new_beam_idx[bi][ti] * kv_head * head_size;
-                if (cur_len > 1) {
-                  auto beam_size = beam_batch / bs;
-                  kc_t_beam_start =
-                      kc_t_beam_start + bi * beam_size * kv_head * head_size;
-                }
                 auto kc_head_start =
                     k_cache_ptr + kc_t_beam_start + kv_hi * head_size;
                 reduce_head_half(
@@ -1068,15 +1240,8 @@ scale_dot_product_for_indirect_access_kv_cache_half(
             if (vi == query_ti + offset) { // caculate the attention values
                                            // for the current token
               auto vc_t_beam_start = vc_token_start;
-              if (cur_len > 1) { // this may occur for processing the promt
-                auto beam_size = beam_batch / bs;
-                // removed the redundant computation, need to store key accross
-                // beam
-                vc_t_beam_start =
-                    vc_t_beam_start + bi * beam_size * kv_head * head_size;
-              } else {
-                vc_t_beam_start = vc_t_beam_start + bi * kv_head * head_size;
-              }
+              vc_t_beam_start =
+                  vc_t_beam_start + bi * beam_size * kv_head * head_size;
               auto v_cache_head_start =
                   v_cache_ptr + vc_t_beam_start + kv_hi * head_size;
               auto v_ptr_start = v_ptr +
@@ -1108,11 +1273,6 @@ scale_dot_product_for_indirect_access_kv_cache_half(
               } else {
                 auto vc_t_beam_start =
                     vc_token_start + new_beam_idx[bi][vi] * kv_head * head_size;
-                if (cur_len > 1) {
-                  auto beam_size = beam_batch / bs;
-                  vc_t_beam_start =
-                      vc_t_beam_start + bi * beam_size * kv_head * head_size;
-                }
                 auto v_cache_head_start =
                     v_cache_ptr + vc_t_beam_start + kv_hi * head_size;
                 mul_attenion_weights_and_value_of_head_half(
@@ -1176,6 +1336,58 @@ zero_copy_kv_cache_masked_multihead_self_attention_kernel_impl(
   assert(
       key.scalar_type() == at::kBFloat16 || key.scalar_type() == at::kFloat ||
       key.scalar_type() == at::kHalf);
+  if (kv_cache_quant::is_quantized_kv_cache(key_cache)) {
+    TORCH_CHECK(
+        query.scalar_type() == value.scalar_type(),
+        "query and value must have the same data type to use the quantized kv cache");
+    auto cache_type = key_cache.scalar_type();
+    return AT_DISPATCH_FLOATING_TYPES_AND2(
+        at::kBFloat16,
+        at::kHalf,
+        query.scalar_type(),
+        "scale_dot_product_for_indirect_access_quantized_kv_cache",
+        [&] {
+          if (cache_type == at::kChar) {
+            return scale_dot_product_for_indirect_access_quantized_kv_cache<
+                scalar_t,
+                int8_t>(
+                query,
+                key,
+                value,
+                key_cache,
+                value_cache,
+                beam_idx,
+                offset,
+                scale_attn,
+                attention_mask);
+          } else if (cache_type == at::kFloat8_e4m3fn) {
+            return scale_dot_product_for_indirect_access_quantized_kv_cache<
+                scalar_t,
+                c10::Float8_e4m3fn>(
+                query,
+                key,
+                value,
+                key_cache,
+                value_cache,
+                beam_idx,
+                offset,
+                scale_attn,
+                attention_mask);
+          }
+          return scale_dot_product_for_indirect_access_quantized_kv_cache<
+              scalar_t,
+              c10::Float8_e5m2>(
+              query,
+              key,
+              value,
+              key_cache,
+              value_cache,
+              beam_idx,
+              offset,
+              scale_attn,
+              attention_mask);
+        });
+  }
   if (query.scalar_type() == at::kFloat && value.scalar_type() == at::kFloat) {
     return scale_dot_product_for_indirect_access_kv_cache<float, float>(
         query,
@@ -1294,12 +1506,15 @@ first_token_masked_mha(
   auto key_lenght = key.size(1);
   auto kv_head_num = key.size(2);
   auto head_size = key.size(3);
+  auto quantized_cache = kv_cache_quant::is_quantized_kv_cache(key_cache);
   if (origin_type == at::kHalf) {
     key = key.to(at::kFloat);
     query = query.to(at::kFloat);
     value = value.to(at::kFloat);
-    key_cache = key_cache.to(at::kFloat);
-    value_cache = value_cache.to(at::kFloat);
+    if (!quantized_cache) {
+      key_cache = key_cache.to(at::kFloat);
+      value_cache = value_cache.to(at::kFloat);
+    }
   }
   if (add_casual_mask) {
     auto casual_mask =
@@ -1313,7 +1528,22 @@ first_token_masked_mha(
         false,
         "key and value must be float or bfloat16 to use ipex::masked_multihead_self_attention_kernel_impl");
   }
-  if (key.scalar_type() == at::kFloat) {
+  if (quantized_cache) {
+    auto cache_type = key_cache.scalar_type();
+    AT_DISPATCH_FLOATING_TYPES_AND(
+        at::kBFloat16, key.scalar_type(), "copy_key_value_quantized", [&] {
+          if (cache_type == at::kChar) {
+            copy_key_value_quantized<int8_t, scalar_t>(
+                key_cache, key, value_cache, value, beam_batch);
+          } else if (cache_type == at::kFloat8_e4m3fn) {
+            copy_key_value_quantized<c10::Float8_e4m3fn, scalar_t>(
+                key_cache, key, value_cache, value, beam_batch);
+          } else {
+            copy_key_value_quantized<c10::Float8_e5m2, scalar_t>(
+                key_cache, key, value_cache, value, beam_batch);
+          }
+        });
+  } else if (key.scalar_type() == at::kFloat) {
     copy_key_value<float>(key_cache, key, value_cache, value, beam_batch);
   } else {
     copy_key_value<at::BFloat16>(
@@ -1359,8 +1589,10 @@ first_token_masked_mha(
   }
   if (origin_type == at::kHalf) {
     attn_outputs = attn_outputs.to(origin_type);
-    key_cache = key_cache.to(origin_type);
-    value_cache = value_cache.to(origin_type);
+    if (!quantized_cache) {
+      key_cache = key_cache.to(origin_type);
+      value_cache = value_cache.to(origin_type);
+    }
   }
   return std::make_tuple(
       attn_outputs, attn_weights, key_cache, value_cache, beam_idx);
@@ -1404,13 +1636,32 @@ masked_multihead_self_attention_kernel_impl(
   auto cache_size = key_cache.size(0);
   auto cur_len = query.size(1);
   if (offset == 0) {
+    // A negative max_positions takes the cache size from the first dim of the
+    // fake beam_idx of the first token, which the generation loops size as
+    // (prompt length + max_new_tokens, bs). Otherwise max_positions is used.
+    if (max_positions < 0) {
+      max_positions = beam_idx.size(0);
+    }
     max_positions =
         max_positions > cur_len ? max_positions : max_positions + cur_len;
-    key_cache = at::empty(
-        {max_positions, beam_batch, key.size(2), key.size(3)}, key.options());
-    value_cache = at::empty(
-        {max_positions, beam_batch, value.size(2), value.size(3)},
-        value.options());
+    if (kv_cache_quant::is_quantized_kv_cache(key_cache)) {
+      // the data type of the placeholder cache selects the quantized storage
+      auto cache_type = key_cache.scalar_type();
+      auto packed_head_size =
+          kv_cache_quant::packed_head_size(cache_type, key.size(3));
+      key_cache = at::empty(
+          {max_positions, beam_batch, key.size(2), packed_head_size},
+          key.options().dtype(cache_type));
+      value_cache = at::empty(
+          {max_positions, beam_batch, value.size(2), packed_head_size},
+          value.options().dtype(cache_type));
+    } else {
+      key_cache = at::empty(
+          {max_positions, beam_batch, key.size(2), key.size(3)}, key.options());
+      value_cache = at::empty(
+          {max_positions, beam_batch, value.size(2), value.size(3)},
+          value.options());
+    }
     beam_idx = at::empty({max_positions, beam_batch}, beam_idx.options());
     auto beam_idx_access = beam_idx.accessor<long, 2>();
     for (auto i = 0; i < max_positions; i++) {
@@ -1425,11 +1676,16 @@ masked_multihead_self_attention_kernel_impl(
     }
   } else if (offset > 0 && offset + cur_len > cache_size) {
     auto new_cache_size = cache_size * 2;
+    // a prompt chunk may need more than one doubling
+    while (new_cache_size < offset + cur_len) {
+      new_cache_size *= 2;
+    }
     auto new_key_cache = at::empty(
-        {new_cache_size, beam_batch, key.size(2), key.size(3)}, key.options());
+        {new_cache_size, beam_batch, key_cache.size(2), key_cache.size(3)},
+        key_cache.options());
     auto new_value_cache = at::empty(
-        {new_cache_size, beam_batch, value.size(2), value.size(3)},
-        value.options());
+        {new_cache_size, beam_batch, value_cache.size(2), value_cache.size(3)},
+        value_cache.options());
     auto new_beam_idx =
         at::empty({new_cache_size, beam_batch}, beam_idx.options());
     new_key_cache.slice(0, 0, cache_size).copy_(key_cache);
@@ -1471,11 +1727,321 @@ masked_multihead_self_attention_kernel_impl(
         add_casual_mask.value_or(true));
   }
 }
+
+/*
+ *The scale-dot product for the streaming kv cache. The cache is a ring buffer
+ *of sink_size + window_size tokens: the token t is stored to the slot t if it
+ *is an attention sink (t < sink_size), otherwise to the slot sink_size + (t -
+ *sink_size) % window_size. The query at the position q attends to the sinks
+ *and to the tokens in (q - window_size, q]. The past tokens are read from the
+ *cache and the current tokens from key/value, which are stored to the cache
+ *after all the queries are done, so a current token never overwrites a slot
+ *still used by the queries of the same step.
+ *@param sink_query The query used for the dot product with the sinks, same
+ *as query if not defined.
+ *@return attn_outs, None, key_cache, value_cache, beam_idx
+ */
+template <typename T, typename CT>
+std::tuple<at::Tensor, at::Tensor, at::Tensor, at::Tensor, at::Tensor>
+scale_dot_product_for_streaming_kv_cache(
+    at::Tensor query,
+    at::Tensor key,
+    at::Tensor value,
+    at::Tensor sink_query,
+    at::Tensor& key_cache,
+    at::Tensor& value_cache,
+    at::Tensor& beam_idx,
+    const int64_t offset,
+    const int64_t sink_size,
+    const int64_t window_size,
+    const double scale_factor,
+    at::Tensor& attention_mask) {
+  RECORD_FUNCTION(
+      "ipex::scale_dot_product_for_streaming_kv_cache",
+      c10::ArrayRef<c10::IValue>({}));
+  auto bs = query.size(0);
+  auto cur_len = query.size(1);
+  auto head_num = query.size(2);
+  auto kv_head = key.size(2);
+  auto group_size = head_num / kv_head;
+  auto head_size = query.size(3);
+  auto packed_head_size = key_cache.size(3);
+  auto seq_len = offset + cur_len;
+  auto capacity = sink_size + window_size;
+  auto kc_token_stride = bs * kv_head * packed_head_size;
+  query = query.contiguous();
+  key = key.contiguous();
+  value = value.contiguous();
+  sink_query = sink_query.defined() ? sink_query.contiguous() : query;
+  auto q_ptr = query.data_ptr<T>();
+  auto sq_ptr = sink_query.data_ptr<T>();
+  auto k_ptr = key.data_ptr<T>();
+  auto v_ptr = value.data_ptr<T>();
+  auto k_cache_ptr = key_cache.data_ptr<CT>();
+  auto v_cache_ptr = value_cache.data_ptr<CT>();
+  auto mask_ptr = attention_mask.data_ptr<T>();
+  auto mask_head_num = attention_mask.size(1);
+  auto mask_dim2 = attention_mask.size(2);
+  auto mask_bs_stride = mask_head_num * mask_dim2 * seq_len;
+  auto attn_weights =
+      at::empty({bs, head_num, cur_len, capacity + 1}, at::kFloat);
+  auto attn_w_ptr = attn_weights.data_ptr<float>();
+  auto attn_outs_fp32 =
+      at::empty({bs, head_num, cur_len, head_size}, at::kFloat);
+  auto attn_out_fp32_ptr = attn_outs_fp32.data_ptr<float>();
+  auto slot_of = [&](int64_t t) {
+    return t < sink_size ? t : sink_size + (t - sink_size) % window_size;
+  };
+  {
+    RECORD_FUNCTION(
+        "ipex::streaming_sdp::attention", c10::ArrayRef<c10::IValue>({}));
+#pragma omp parallel for collapse(3)
+    for (auto bi = 0; bi < bs; bi++) {
+      for (auto hi = 0; hi < head_num; hi++) {
+        for (auto query_ti = 0; query_ti < cur_len; query_ti++) {
+          auto kv_hi = hi / group_size;
+          auto q_pos = offset + query_ti;
+          auto sink_end = std::min(sink_size, q_pos + 1);
+          auto window_start = std::max(sink_size, q_pos - window_size + 1);
+          auto q_offset =
+              ((bi * cur_len + query_ti) * head_num + hi) * head_size;
+          auto attn_w_start = attn_w_ptr +
+              ((bi * head_num + hi) * cur_len + query_ti) * (capacity + 1);
+          auto mask_ptr_start = mask_ptr + bi * mask_bs_stride +
+              (hi % mask_head_num) * mask_dim2 * seq_len +
+              (query_ti % mask_dim2) * seq_len;
+          // the context of the query: the sinks, then the window
+          auto context_len =
+              sink_end + std::max<int64_t>(q_pos + 1 - window_start, 0);
+          auto token_of = [&](int64_t ci) {
+            return ci < sink_end ? ci : window_start + ci - sink_end;
+          };
+          // matmul(query, key) + div + add + max
+          auto max_val = -100000.0f;
+          for (auto ci = 0; ci < context_len; ci++) {
+            auto ti = token_of(ci);
+            auto qs_ptr = (ti < sink_size ? sq_ptr : q_ptr) + q_offset;
+            float qk = 0.0f;
+            if (ti >= offset) {
+              qk = kv_cache_quant::dot_quantized_head(
+                  qs_ptr,
+                  k_ptr +
+                      ((bi * cur_len + ti - offset) * kv_head + kv_hi) *
+                          head_size,
+                  1.0f,
+                  head_size);
+            } else {
+              auto kc_head_start = k_cache_ptr + slot_of(ti) * kc_token_stride +
+                  (bi * kv_head + kv_hi) * packed_head_size;
+              qk = kv_cache_quant::dot_quantized_head(
+                  qs_ptr,
+                  kc_head_start,
+                  kv_cache_quant::load_packed_scale(kc_head_start, head_size),
+                  head_size);
+            }
+            attn_w_start[ci] =
+                qk / scale_factor + static_cast<float>(mask_ptr_start[ti]);
+            max_val = std::max(max_val, attn_w_start[ci]);
+          }
+          // softmax
+          float sum = 0.0f;
+          for (auto ci = 0; ci < context_len; ci++) {
+            attn_w_start[ci] = std::exp(attn_w_start[ci] - max_val);
+            sum += attn_w_start[ci];
+          }
+          // matmul(attn_w, value)
+          auto attn_out_start = attn_out_fp32_ptr +
+              ((bi * head_num + hi) * cur_len + query_ti) * head_size;
+          for (auto ci = 0; ci < context_len; ci++) {
+            auto ti = token_of(ci);
+            if (ti >= offset) {
+              kv_cache_quant::axpy_quantized_head(
+                  attn_w_start[ci] / sum,
+                  v_ptr +
+                      ((bi * cur_len + ti - offset) * kv_head + kv_hi) *
+                          head_size,
+                  1.0f,
+                  attn_out_start,
+                  head_size,
+                  ci > 0);
+            } else {
+              auto vc_head_start = v_cache_ptr + slot_of(ti) * kc_token_stride +
+                  (bi * kv_head + kv_hi) * packed_head_size;
+              kv_cache_quant::axpy_quantized_head(
+                  attn_w_start[ci] / sum,
+                  vc_head_start,
+                  kv_cache_quant::load_packed_scale(vc_head_start, head_size),
+                  attn_out_start,
+                  head_size,
+                  ci > 0);
+            }
+          }
+        }
+      }
+    }
+  }
+  {
+    RECORD_FUNCTION(
+        "ipex::streaming_sdp::store_key_value", c10::ArrayRef<c10::IValue>({}));
+    // only the sinks and the last window_size tokens are kept
+    auto store_start = std::max(offset, seq_len - window_size);
+#pragma omp parallel for collapse(3)
+    for (auto ti = offset; ti < seq_len; ti++) {
+      for (auto bi = 0; bi < bs; bi++) {
+        for (auto kv_hi = 0; kv_hi < kv_head; kv_hi++) {
+          if (ti >= sink_size && ti < store_start) {
+            continue;
+          }
+          auto cache_start = slot_of(ti) * kc_token_stride +
+              (bi * kv_head + kv_hi) * packed_head_size;
+          auto state_start = ((bi * cur_len + ti - offset) * kv_head + kv_hi) *
+              head_size;
+          kv_cache_quant::store_head(
+              k_ptr + state_start, k_cache_ptr + cache_start, head_size);
+          kv_cache_quant::store_head(
+              v_ptr + state_start, v_cache_ptr + cache_start, head_size);
+        }
+      }
+    }
+  }
+  auto attn_outs = attn_outs_fp32.to(value.scalar_type());
+  return std::make_tuple(
+      attn_outs, at::Tensor(), key_cache, value_cache, beam_idx);
+}
+
+std::tuple<at::Tensor, at::Tensor, at::Tensor, at::Tensor, at::Tensor>
+streaming_masked_multihead_self_attention_kernel_impl(
+    at::Tensor& query,
+    at::Tensor& key,
+    at::Tensor& value,
+    at::Tensor& key_cache,
+    at::Tensor& value_cache,
+    at::Tensor& beam_idx,
+    at::Tensor seq_info,
+    const double scale_attn,
+    int64_t attention_sink_size,
+    int64_t sliding_window_size,
+    const c10::optional<at::Tensor>& sink_query /* optional */,
+    const c10::optional<at::Tensor>& attention_mask /* optional */) {
+  TORCH_CHECK(
+      attention_mask.has_value() && attention_mask.value().dim() == 4,
+      "4D attention mask is necessary for ipex::streaming_masked_multihead_self_attention");
+  TORCH_CHECK(
+      sliding_window_size > 0 && attention_sink_size >= 0,
+      "sliding_window_size should be positive to use ipex::streaming_masked_multihead_self_attention");
+  TORCH_CHECK(
+      query.scalar_type() == key.scalar_type() &&
+          query.scalar_type() == value.scalar_type(),
+      "query, key and value must have the same data type to use ipex::streaming_masked_multihead_self_attention");
+  auto beam_batch = beam_idx.size(1);
+  TORCH_CHECK(
+      beam_batch == query.size(0),
+      "Beam search is not supported by ipex::streaming_masked_multihead_self_attention");
+  auto attention_mask_v =
+      attention_mask.value().contiguous().to(query.scalar_type());
+  auto offset = seq_info.data_ptr<long>()[0];
+  auto capacity = attention_sink_size + sliding_window_size;
+  if (offset == 0) {
+    // the data type of the placeholder cache selects the quantized storage
+    auto cache_type = kv_cache_quant::is_quantized_kv_cache(key_cache)
+        ? key_cache.scalar_type()
+        : key.scalar_type();
+    auto packed_head_size =
+        kv_cache_quant::packed_head_size(cache_type, key.size(3));
+    key_cache = at::zeros(
+        {capacity, beam_batch, key.size(2), packed_head_size},
+        key.options().dtype(cache_type));
+    value_cache = at::zeros(
+        {capacity, beam_batch, value.size(2), packed_head_size},
+        value.options().dtype(cache_type));
+    beam_idx = at::arange(beam_batch, beam_idx.options())
+                   .unsqueeze(0)
+                   .repeat({capacity, 1});
+  }
+  TORCH_CHECK(
+      key_cache.size(0) == capacity,
+      "The kv cache is not allocated by ipex::streaming_masked_multihead_self_attention");
+  auto sink_query_v = sink_query.has_value() ? sink_query.value() : at::Tensor();
+  auto cache_type = key_cache.scalar_type();
+  return AT_DISPATCH_FLOATING_TYPES_AND2(
+      at::kBFloat16,
+      at::kHalf,
+      query.scalar_type(),
+      "scale_dot_product_for_streaming_kv_cache",
+      [&] {
+        if (cache_type == at::kChar) {
+          return scale_dot_product_for_streaming_kv_cache<scalar_t, int8_t>(
+              query,
+              key,
+              value,
+              sink_query_v,
+              key_cache,
+              value_cache,
+              beam_idx,
+              offset,
+              attention_sink_size,
+              sliding_window_size,
+              scale_attn,
+              attention_mask_v);
+        } else if (cache_type == at::kFloat8_e4m3fn) {
+          return scale_dot_product_for_streaming_kv_cache<
+              scalar_t,
+              c10::Float8_e4m3fn>(
+              query,
+              key,
+              value,
+              sink_query_v,
+              key_cache,
+              value_cache,
+              beam_idx,
+              offset,
+              attention_sink_size,
+              sliding_window_size,
+              scale_attn,
+              attention_mask_v);
+        } else if (cache_type == at::kFloat8_e5m2) {
+          return scale_dot_product_for_streaming_kv_cache<
+              scalar_t,
+              c10::Float8_e5m2>(
+              query,
+              key,
+              value,
+              sink_query_v,
+              key_cache,
+              value_cache,
+              beam_idx,
+              offset,
+              attention_sink_size,
+              sliding_window_size,
+              scale_attn,
+              attention_mask_v);
+        }
+        TORCH_CHECK(
+            cache_type == query.scalar_type(),
+            "The kv cache should be int8, fp8 or the same data type as the query");
+        return scale_dot_product_for_streaming_kv_cache<scalar_t, scalar_t>(
+            query,
+            key,
+            value,
+            sink_query_v,
+            key_cache,
+            value_cache,
+            beam_idx,
+            offset,
+            attention_sink_size,
+            sliding_window_size,
+            scale_attn,
+            attention_mask_v);
+      });
+}
 } // anonymous namespace
 
 IPEX_REGISTER_DISPATCH(
     masked_multihead_self_attention_kernel_stub,
     &masked_multihead_self_attention_kernel_impl);
+IPEX_REGISTER_DISPATCH(
+    streaming_masked_multihead_self_attention_kernel_stub,
+    &streaming_masked_multihead_self_attention_kernel_impl);
 
 } // namespace cpu
 } // namespace torch_ipex
@@ -143,6 +143,148 @@ at::Tensor mixtral_moe_woq_kernl_impl(
 
   return output;
 }
+
+// gate/up/down projections of the expert e on curr_state [1, n, hidden_size]
+at::Tensor mixtral_moe_expert_forward(
+    const at::Tensor& curr_state,
+    int64_t e,
+    const std::vector<at::Tensor>& gate_wei,
+    const std::vector<at::Tensor>& up_wei,
+    const std::vector<at::Tensor>& down_wei,
+    const std::vector<at::Tensor>& gate_op_ctx,
+    const std::vector<at::Tensor>& up_op_ctx,
+    const std::vector<at::Tensor>& down_op_ctx,
+    int64_t linear_type,
+    bool tpp_fallback) {
+  switch (linear_type) {
+    case MOE_LINEAR_WOQ:
+      return woq_linear_forward(
+          at::silu(woq_linear_forward(curr_state, gate_wei[e])) *
+              woq_linear_forward(curr_state, up_wei[e]),
+          down_wei[e]);
+    case MOE_LINEAR_DNNL:
+      return ipex_linear(
+          at::silu(ipex_linear(
+              curr_state,
+              gate_wei[e],
+              c10::nullopt,
+              gate_op_ctx[e],
+              c10::nullopt)) *
+              ipex_linear(
+                  curr_state,
+                  up_wei[e],
+                  c10::nullopt,
+                  up_op_ctx[e],
+                  c10::nullopt),
+          down_wei[e],
+          c10::nullopt,
+          down_op_ctx[e],
+          c10::nullopt);
+    case MOE_LINEAR_MKL:
+      return mkl_sgemm_forward(
+          at::silu(mkl_sgemm_forward(
+              curr_state,
+              gate_wei[e],
+              c10::nullopt,
+              gate_op_ctx[e],
+              c10::nullopt)) *
+              mkl_sgemm_forward(
+                  curr_state,
+                  up_wei[e],
+                  c10::nullopt,
+                  up_op_ctx[e],
+                  c10::nullopt),
+          down_wei[e],
+          c10::nullopt,
+          down_op_ctx[e],
+          c10::nullopt);
+    default:
+      if (tpp_fallback) {
+        return at::linear(
+            at::silu(at::linear(curr_state, gate_wei[e])) *
+                at::linear(curr_state, up_wei[e]),
+            down_wei[e]);
+      }
+      return tpp_linear_nobias_forward_cpu(
+          tpp_fused_gate_up_proj_forward_cpu(
+              curr_state,
+              gate_wei[e],
+              at::empty(0, curr_state.options()),
+              up_wei[e],
+              at::empty(0, curr_state.options()),
+              c10::nullopt),
+          down_wei[e],
+          c10::nullopt);
+  }
+}
+
+at::Tensor mixtral_moe_grouped_kernl_impl(
+    const at::Tensor& hidden_states,
+    const at::Tensor& selected_experts,
+    const at::Tensor& routing_weights,
+    const std::vector<at::Tensor>& gate_wei,
+    const std::vector<at::Tensor>& up_wei,
+    const std::vector<at::Tensor>& down_wei,
+    const std::vector<at::Tensor>& gate_op_ctx,
+    const std::vector<at::Tensor>& up_op_ctx,
+    const std::vector<at::Tensor>& down_op_ctx,
+    int64_t linear_type,
+    bool tpp_fallback,
+    bool is_distributed) {
+  auto num_experts = static_cast<int64_t>(gate_wei.size());
+  auto top_k = selected_experts.size(1);
+  // route: sort the (token, k) pairs by expert, so the tokens of every expert
+  // are contiguous in sorted_states
+  auto flat_experts = selected_experts.reshape({-1}).to(at::kLong);
+  auto order = std::get<1>(flat_experts.sort(/*stable=*/true));
+  auto token_idx = order.div(top_k, "floor");
+  auto sorted_weights =
+      routing_weights.reshape({-1}).index_select(0, order).unsqueeze(-1);
+  auto sorted_states = hidden_states.index_select(0, token_idx).unsqueeze(0);
+  auto counts = at::bincount(flat_experts, {}, num_experts);
+  auto counts_ptr = counts.data_ptr<int64_t>();
+  std::vector<at::Tensor> expert_outs;
+  expert_outs.reserve(num_experts);
+  int64_t start = 0;
+  for (int64_t e = 0; e < num_experts; e++) {
+    auto count = counts_ptr[e];
+    // the experts without any routed token are skipped
+    if (count == 0) {
+      continue;
+    }
+    expert_outs.push_back(mixtral_moe_expert_forward(
+        sorted_states.narrow(1, start, count),
+        e,
+        gate_wei,
+        up_wei,
+        down_wei,
+        gate_op_ctx,
+        up_op_ctx,
+        down_op_ctx,
+        linear_type,
+        tpp_fallback));
+    start += count;
+  }
+  auto output = at::zeros_like(hidden_states);
+  if (expert_outs.empty()) {
+    return output;
+  }
+  // combine: weight the expert outputs and add them to their tokens at once
+  auto curr_state = at::cat(expert_outs, 1).squeeze(0) * sorted_weights;
+  output.index_add_(0, token_idx, curr_state.to(hidden_states.dtype()));
+  // the experts are row-parallel, so one allreduce of the combined output is
+  // the same as one allreduce per expert
+  if (is_distributed) {
+    py::gil_scoped_acquire acquire;
+    py::function allreduce = py::module_::import("torch")
+                                 .attr("ops")
+                                 .attr("deepspeed_comm")
+                                 .attr("all_reduce");
+    allreduce(output);
+    py::gil_scoped_release release;
+  }
+  return output;
+}
 } // anonymous namespace
 
 IPEX_REGISTER_DISPATCH(
@@ -152,6 +294,9 @@ IPEX_REGISTER_DISPATCH(
     mixtral_moe_woq_kernel_stub,
     &mixtral_moe_woq_kernl_impl);
 IPEX_REGISTER_DISPATCH(mixtral_moe_kernel_stub, &mixtral_moe_kernl_impl);
+IPEX_REGISTER_DISPATCH(
+    mixtral_moe_grouped_kernel_stub,
+    &mixtral_moe_grouped_kernl_impl);
 
 } // namespace cpu
 } // namespace torch_ipex
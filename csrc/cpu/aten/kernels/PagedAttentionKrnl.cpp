@@ -1,5 +1,6 @@
 #include <ATen/Tensor.h>
 #include <aten/PagedAttention.h>
+#include <aten/utils/kv_cache_quant.h>
 #include <torch/all.h>
 #include <torch/csrc/autograd/function.h>
 #include <limits>
@@ -85,7 +86,7 @@ inline void mul_attenion_weights_and_value_of_head(
  * @param alibi_slopes  Optional tensor of alibi slopes with the shape of
  * (num_heads).
  */
-template <typename scalar_t>
+template <typename scalar_t, typename cache_t = scalar_t>
 void single_query_cached_kv_attention_kernel(
     at::Tensor& out,
     at::Tensor& query,
@@ -97,11 +98,20 @@ void single_query_cached_kv_attention_kernel(
     at::Tensor& context_lens,
     int64_t block_size,
     int64_t max_context_len,
-    const c10::optional<at::Tensor>& alibi_slopes) {
+    const c10::optional<at::Tensor>& alibi_slopes,
+    const c10::optional<at::Tensor>& k_scale = c10::nullopt,
+    const c10::optional<at::Tensor>& v_scale = c10::nullopt) {
+  constexpr bool quantized_cache = !std::is_same<scalar_t, cache_t>::value;
   auto out_ptr = out.data_ptr<scalar_t>();
   auto query_ptr = query.data_ptr<scalar_t>();
-  auto key_cache_ptr = key_cache.data_ptr<scalar_t>();
-  auto value_cache_ptr = value_cache.data_ptr<scalar_t>();
+  auto key_cache_ptr = key_cache.data_ptr<cache_t>();
+  auto value_cache_ptr = value_cache.data_ptr<cache_t>();
+  // per token per kv head scales of the int8 cache:
+  // [num_blocks, block_size, num_kv_heads]
+  auto k_scale_ptr =
+      k_scale.has_value() ? k_scale.value().data_ptr<float>() : nullptr;
+  auto v_scale_ptr =
+      v_scale.has_value() ? v_scale.value().data_ptr<float>() : nullptr;
   auto head_mapping_ptr = head_mapping.data_ptr<int>();
   auto block_tables_ptr = block_tables.data_ptr<int>();
   auto context_lens_ptr = context_lens.data_ptr<int>();
@@ -144,8 +154,18 @@ void single_query_cached_kv_attention_kernel(
         auto k_cache_start = key_cache_ptr + block_id * kv_block_stride +
             block_offset * num_kv_heads * head_size +
             head_mapping_ptr[head_id] * head_size;
-        reduce_head<scalar_t, scalar_t>(
-            q_ptr_start, k_cache_start, attn_w_pos, head_size);
+        if constexpr (quantized_cache) {
+          auto k_scale_val = k_scale_ptr == nullptr
+              ? 1.0f
+              : k_scale_ptr
+                    [(block_id * block_size + block_offset) * num_kv_heads +
+                     head_mapping_ptr[head_id]];
+          attn_w_pos[0] = kv_cache_quant::dot_quantized_head(
+              q_ptr_start, k_cache_start, k_scale_val, head_size);
+        } else {
+          reduce_head<scalar_t, scalar_t>(
+              q_ptr_start, k_cache_start, attn_w_pos, head_size);
+        }
       }
     }
   }
@@ -243,12 +263,27 @@ void single_query_cached_kv_attention_kernel(
         auto attn_out_start = private_attn_out_ptr +
             thread_id * private_attn_out_stride + seq_id * q_stride +
             head_id * head_size;
-        mul_attenion_weights_and_value_of_head<float, scalar_t>(
-            attn_w,
-            v_cache_start,
-            attn_out_start,
-            head_size,
-            flag_access[thread_id][seq_id][head_id]);
+        if constexpr (quantized_cache) {
+          auto v_scale_val = v_scale_ptr == nullptr
+              ? 1.0f
+              : v_scale_ptr
+                    [(block_id * block_size + block_offset) * num_kv_heads +
+                     head_mapping_ptr[head_id]];
+          kv_cache_quant::axpy_quantized_head(
+              attn_w,
+              v_cache_start,
+              v_scale_val,
+              attn_out_start,
+              head_size,
+              flag_access[thread_id][seq_id][head_id]);
+        } else {
+          mul_attenion_weights_and_value_of_head<float, scalar_t>(
+              attn_w,
+              v_cache_start,
+              attn_out_start,
+              head_size,
+              flag_access[thread_id][seq_id][head_id]);
+        }
         if (flag_access[thread_id][seq_id][head_id] == 0) {
           flag_access[thread_id][seq_id][head_id] = 1;
         }
@@ -349,6 +384,141 @@ void reshape_and_cache_kernel(
   }
 }
 
+/**
+ * Quantizes the key and value tensors into the int8 or fp8 caches based on the
+ * provided slot mapping. For the int8 cache, the per token per head scales are
+ * stored into k_scale/v_scale with the shape of [num_blocks, block_size,
+ * num_heads].
+ *
+ * @tparam CACHE_T The data type of the quantized caches.
+ * @tparam SRC_T The data type of the input tensors.
+ */
+template <typename CACHE_T, typename SRC_T>
+void reshape_and_cache_quantized_kernel(
+    at::Tensor& key,
+    at::Tensor& value,
+    at::Tensor& key_cache,
+    at::Tensor& value_cache,
+    at::Tensor& slot_mapping,
+    const c10::optional<at::Tensor>& k_scale,
+    const c10::optional<at::Tensor>& v_scale) {
+  auto num_tokens = key.size(0);
+  auto head_num = key.size(1);
+  auto head_size = key.size(2);
+  auto block_size = key_cache.size(1);
+  auto key_cache_ptr = key_cache.data_ptr<CACHE_T>();
+  auto key_ptr = key.data_ptr<SRC_T>();
+  auto value_cache_ptr = value_cache.data_ptr<CACHE_T>();
+  auto value_ptr = value.data_ptr<SRC_T>();
+  auto slot_mapping_ptr = slot_mapping.data_ptr<int>();
+  auto k_scale_ptr =
+      k_scale.has_value() ? k_scale.value().data_ptr<float>() : nullptr;
+  auto v_scale_ptr =
+      v_scale.has_value() ? v_scale.value().data_ptr<float>() : nullptr;
+  auto cache_stride = key_cache.stride(0);
+  auto state_stride = key.stride(0);
+#pragma omp parallel for collapse(2)
+  for (auto ti = 0; ti < num_tokens; ti++) {
+    for (auto hi = 0; hi < head_num; hi++) {
+      auto block_id = slot_mapping_ptr[ti] / block_size;
+      auto block_offset = slot_mapping_ptr[ti] % block_size;
+      auto cache_offset = block_id * cache_stride +
+          block_offset * key_cache.stride(1) + hi * head_size;
+      auto state_offset = ti * state_stride + hi * head_size;
+      auto k_scale_val = kv_cache_quant::quantize_head(
+          key_ptr + state_offset, key_cache_ptr + cache_offset, head_size);
+      auto v_scale_val = kv_cache_quant::quantize_head(
+          value_ptr + state_offset, value_cache_ptr + cache_offset, head_size);
+      auto scale_offset = slot_mapping_ptr[ti] * head_num + hi;
+      if (k_scale_ptr != nullptr) {
+        k_scale_ptr[scale_offset] = k_scale_val;
+      }
+      if (v_scale_ptr != nullptr) {
+        v_scale_ptr[scale_offset] = v_scale_val;
+      }
+    }
+  }
+}
+
+template <typename scalar_t>
+void single_query_cached_kv_attention_dispatch_cache(
+    at::Tensor& out,
+    at::Tensor& query,
+    at::Tensor& key_cache,
+    at::Tensor& value_cache,
+    at::Tensor& head_mapping,
+    const double scale,
+    at::Tensor& block_tables,
+    at::Tensor& context_lens,
+    int64_t block_size,
+    int64_t max_context_len,
+    const c10::optional<at::Tensor>& alibi_slopes,
+    const c10::optional<at::Tensor>& k_scale,
+    const c10::optional<at::Tensor>& v_scale) {
+  auto cache_type = key_cache.scalar_type();
+  if (cache_type == at::kChar) {
+    TORCH_CHECK(
+        k_scale.has_value() && v_scale.has_value(),
+        "k_scale and v_scale are required by the int8 kv cache");
+    single_query_cached_kv_attention_kernel<scalar_t, int8_t>(
+        out,
+        query,
+        key_cache,
+        value_cache,
+        head_mapping,
+        scale,
+        block_tables,
+        context_lens,
+        block_size,
+        max_context_len,
+        alibi_slopes,
+        k_scale,
+        v_scale);
+  } else if (cache_type == at::kFloat8_e4m3fn) {
+    single_query_cached_kv_attention_kernel<scalar_t, c10::Float8_e4m3fn>(
+        out,
+        query,
+        key_cache,
+        value_cache,
+        head_mapping,
+        scale,
+        block_tables,
+        context_lens,
+        block_size,
+        max_context_len,
+        alibi_slopes);
+  } else if (cache_type == at::kFloat8_e5m2) {
+    single_query_cached_kv_attention_kernel<scalar_t, c10::Float8_e5m2>(
+        out,
+        query,
+        key_cache,
+        value_cache,
+        head_mapping,
+        scale,
+        block_tables,
+        context_lens,
+        block_size,
+        max_context_len,
+        alibi_slopes);
+  } else {
+    TORCH_CHECK(
+        cache_type == out.scalar_type(),
+        "The kv cache should be int8, fp8 or the same data type as the output");
+    single_query_cached_kv_attention_kernel<scalar_t>(
+        out,
+        query,
+        key_cache,
+        value_cache,
+        head_mapping,
+        scale,
+        block_tables,
+        context_lens,
+        block_size,
+        max_context_len,
+        alibi_slopes);
+  }
+}
+
 void single_query_cached_kv_attention_kernel_impl(
     at::Tensor& out, // [num_seqs, num_heads, head_size]
     at::Tensor& query, // [num_seqs, num_heads, head_size]
@@ -360,13 +530,15 @@ void single_query_cached_kv_attention_kernel_impl(
     at::Tensor& context_lens, // [num_seqs]
     int64_t block_size,
     int64_t max_context_len,
-    const c10::optional<at::Tensor>& alibi_slopes) {
+    const c10::optional<at::Tensor>& alibi_slopes,
+    const c10::optional<at::Tensor>& k_scale,
+    const c10::optional<at::Tensor>& v_scale) {
   RECORD_FUNCTION(
       "ipex::single_query_cached_kv_attention_kernel_impl",
       c10::ArrayRef<c10::IValue>({}));
   // dispatch kernel according to the data type of input tensor
   if (out.scalar_type() == at::ScalarType::Float) {
-    single_query_cached_kv_attention_kernel<float>(
+    single_query_cached_kv_attention_dispatch_cache<float>(
         out,
         query,
         key_cache,
@@ -377,9 +549,11 @@ void single_query_cached_kv_attention_kernel_impl(
         context_lens,
         block_size,
         max_context_len,
-        alibi_slopes);
+        alibi_slopes,
+        k_scale,
+        v_scale);
   } else if (out.scalar_type() == at::ScalarType::BFloat16) {
-    single_query_cached_kv_attention_kernel<at::BFloat16>(
+    single_query_cached_kv_attention_dispatch_cache<at::BFloat16>(
         out,
         query,
         key_cache,
@@ -390,7 +564,9 @@ void single_query_cached_kv_attention_kernel_impl(
         context_lens,
         block_size,
         max_context_len,
-        alibi_slopes);
+        alibi_slopes,
+        k_scale,
+        v_scale);
   } else {
     TORCH_CHECK(
         false, "Unsupported data type for single_query_cached_kv_attention");
@@ -403,7 +579,9 @@ void reshape_and_cache_cpu_kernel_impl(
     at::Tensor& value,
     at::Tensor& key_cache,
     at::Tensor& value_cache,
-    at::Tensor& slot_mapping) {
+    at::Tensor& slot_mapping,
+    const c10::optional<at::Tensor>& k_scale,
+    const c10::optional<at::Tensor>& v_scale) {
   TORCH_CHECK(
       key.scalar_type() == value.scalar_type(),
       "key and value should have the same data type");
@@ -417,7 +595,48 @@ void reshape_and_cache_cpu_kernel_impl(
   RECORD_FUNCTION(
       "ipex::reshape_and_cache_cpu_kernel_impl",
       c10::ArrayRef<c10::IValue>({}));
-  if (key.scalar_type() == at::ScalarType::Float) {
+  if (kv_cache_quant::is_quantized_kv_cache(key_cache)) {
+    auto cache_type = key_cache.scalar_type();
+    TORCH_CHECK(
+        !kv_cache_quant::need_scale(cache_type) ||
+            (k_scale.has_value() && v_scale.has_value()),
+        "k_scale and v_scale are required by the int8 kv cache");
+    TORCH_CHECK(
+        key.scalar_type() == at::ScalarType::Float ||
+            key.scalar_type() == at::ScalarType::BFloat16,
+        "Unsupported data type for ipex::reshape_and_cache");
+    AT_DISPATCH_FLOATING_TYPES_AND(
+        at::ScalarType::BFloat16, key.scalar_type(), "reshape_and_cache", [&] {
+          if (cache_type == at::kChar) {
+            reshape_and_cache_quantized_kernel<int8_t, scalar_t>(
+                key,
+                value,
+                key_cache,
+                value_cache,
+                slot_mapping,
+                k_scale,
+                v_scale);
+          } else if (cache_type == at::kFloat8_e4m3fn) {
+            reshape_and_cache_quantized_kernel<c10::Float8_e4m3fn, scalar_t>(
+                key,
+                value,
+                key_cache,
+                value_cache,
+                slot_mapping,
+                k_scale,
+                v_scale);
+          } else {
+            reshape_and_cache_quantized_kernel<c10::Float8_e5m2, scalar_t>(
+                key,
+                value,
+                key_cache,
+                value_cache,
+                slot_mapping,
+                k_scale,
+                v_scale);
+          }
+        });
+  } else if (key.scalar_type() == at::ScalarType::Float) {
     reshape_and_cache_kernel<float, float>(
         key, value, key_cache, value_cache, slot_mapping);
   } else if (key.scalar_type() == at::ScalarType::BFloat16) {
@@ -0,0 +1,146 @@
+#pragma once
+
+#include <ATen/Tensor.h>
+#include <c10/util/Float8_e4m3fn.h>
+#include <c10/util/Float8_e5m2.h>
+#include <algorithm>
+#include <cmath>
+#include <cstring>
+#include <type_traits>
+
+// Helpers to store the key/value cache in low precision.
+// - int8: symmetric quantization with one float scale per token per kv head,
+//   scale = absmax / 127.
+// - fp8 (e4m3fn/e5m2): the values are saturated to the max finite value of
+//   the format and stored without scale.
+// The dequantization is fused into the attention kernels, which convert every
+// element of the cache to float and apply the scale on the dot product.
+// The paged attention keeps the int8 scales in separate tensors of
+// [num_blocks, block_size, num_kv_heads], while the indirect access KV cache,
+// which is allocated by the kernel, packs the scale of every head right after
+// its values: the last dim of its int8 cache is head_size + sizeof(float).
+
+namespace torch_ipex {
+namespace cpu {
+namespace kv_cache_quant {
+
+inline bool is_quantized_kv_cache(const at::Tensor& cache) {
+  auto dtype = cache.scalar_type();
+  return dtype == at::kChar || dtype == at::kFloat8_e4m3fn ||
+      dtype == at::kFloat8_e5m2;
+}
+
+inline bool need_scale(at::ScalarType dtype) {
+  return dtype == at::kChar;
+}
+
+template <typename CT>
+inline float max_value() {
+  return 127.0f;
+}
+
+template <>
+inline float max_value<c10::Float8_e4m3fn>() {
+  return 448.0f;
+}
+
+template <>
+inline float max_value<c10::Float8_e5m2>() {
+  return 57344.0f;
+}
+
+inline int64_t packed_head_size(at::ScalarType dtype, int64_t head_size) {
+  return need_scale(dtype) ? head_size + sizeof(float) : head_size;
+}
+
+template <typename CT>
+inline float load_packed_scale(const CT* head_ptr, int64_t head_size) {
+  float scale = 1.0f;
+  if constexpr (std::is_same<CT, int8_t>::value) {
+    std::memcpy(&scale, head_ptr + head_size, sizeof(float));
+  }
+  return scale;
+}
+
+template <typename CT>
+inline void store_packed_scale(CT* head_ptr, int64_t head_size, float scale) {
+  if constexpr (std::is_same<CT, int8_t>::value) {
+    std::memcpy(head_ptr + head_size, &scale, sizeof(float));
+  }
+}
+
+// Quantizes head_size elements of src into dst and returns the scale.
+template <typename CT, typename T>
+inline float quantize_head(const T* src, CT* dst, int64_t head_size) {
+  if constexpr (std::is_same<CT, int8_t>::value) {
+    float absmax = 0.0f;
+    for (auto i = 0; i < head_size; i++) {
+      absmax = std::max(absmax, std::abs(static_cast<float>(src[i])));
+    }
+    float scale = absmax > 0.0f ? absmax / 127.0f : 1.0f;
+    float inv_scale = 1.0f / scale;
+    for (auto i = 0; i < head_size; i++) {
+      auto q = std::nearbyint(static_cast<float>(src[i]) * inv_scale);
+      dst[i] = static_cast<int8_t>(std::min(std::max(q, -127.0f), 127.0f));
+    }
+    return scale;
+  } else {
+    auto max_val = max_value<CT>();
+    for (auto i = 0; i < head_size; i++) {
+      auto v = static_cast<float>(src[i]);
+      dst[i] = static_cast<CT>(std::min(std::max(v, -max_val), max_val));
+    }
+    return 1.0f;
+  }
+}
+
+// Stores head_size elements of src into the cache, the low precision caches
+// are quantized and the int8 scale is packed after the head values.
+template <typename CT, typename T>
+inline void store_head(const T* src, CT* dst, int64_t head_size) {
+  if constexpr (std::is_same<CT, T>::value) {
+    std::memcpy(dst, src, head_size * sizeof(T));
+  } else {
+    auto scale = quantize_head(src, dst, head_size);
+    store_packed_scale(dst, head_size, scale);
+  }
+}
+
+// sum(q[i] * k[i]) of a float/bf16/half query and a quantized key
+template <typename QT, typename CT>
+inline float dot_quantized_head(
+    const QT* q_ptr,
+    const CT* k_ptr,
+    float k_scale,
+    int64_t head_size) {
+  float sum = 0.0f;
+  for (auto i = 0; i < head_size; i++) {
+    sum += static_cast<float>(q_ptr[i]) * static_cast<float>(k_ptr[i]);
+  }
+  return sum * k_scale;
+}
+
+// out[i] (+)= attn_w * v[i] of a quantized value
+template <typename CT>
+inline void axpy_quantized_head(
+    float attn_w,
+    const CT* v_ptr,
+    float v_scale,
+    float* out_ptr,
+    int64_t head_size,
+    bool accumulate) {
+  auto w = attn_w * v_scale;
+  if (accumulate) {
+    for (auto i = 0; i < head_size; i++) {
+      out_ptr[i] += w * static_cast<float>(v_ptr[i]);
+    }
+  } else {
+    for (auto i = 0; i < head_size; i++) {
+      out_ptr[i] = w * static_cast<float>(v_ptr[i]);
+    }
+  }
+}
+
+} // namespace kv_cache_quant
+} // namespace cpu
+} // namespace torch_ipex
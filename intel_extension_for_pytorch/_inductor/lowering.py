@@ -64,6 +64,7 @@ make_fallback(torch.ops.torch_ipex.tpp_linear_silu)
 make_fallback(torch.ops.torch_ipex.tpp_linear_add)
 make_fallback(torch.ops.torch_ipex.tpp_linear_mul)
 make_fallback(torch.ops.torch_ipex.masked_multihead_self_attention)
+make_fallback(torch.ops.torch_ipex.streaming_masked_multihead_self_attention)
 make_fallback(torch.ops.torch_ipex.rotary_position_embedding)
 
 make_fallback(torch.ops.torch_ipex.add_softmax_)
@@ -626,6 +626,36 @@ def meta_masked_multihead_self_attention(
     return (attn_output, attn_weights, key_cache_out, value_cache_out, beam_idx_out)
 
 
+@register_meta("streaming_masked_multihead_self_attention")
+def meta_streaming_masked_multihead_self_attention(
+    query,
+    key,
+    value,
+    key_cache,
+    value_cache,
+    beam_idx,
+    seq_info,
+    scale_attn,
+    attention_sink_size,
+    sliding_window_size,
+    sink_query,
+    attention_mask,
+):
+    attn_output = query.new_empty(
+        (query.shape[0], query.shape[2], query.shape[1], query.shape[3])
+    )
+    attn_weights = None
+    capacity = attention_sink_size + sliding_window_size
+    key_cache_out = key_cache.new_empty(
+        (capacity, query.shape[0], key.shape[2], key_cache.shape[3])
+    )
+    value_cache_out = value_cache.new_empty(
+        (capacity, query.shape[0], value.shape[2], value_cache.shape[3])
+    )
+    beam_idx_out = beam_idx.new_empty((capacity, query.shape[0]))
+    return (attn_output, attn_weights, key_cache_out, value_cache_out, beam_idx_out)
+
+
 @register_meta("rotary_position_embedding")
 def meta_rotary_position_embedding(
     t_in,
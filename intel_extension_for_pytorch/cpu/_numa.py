@@ -0,0 +1,165 @@
+import ctypes
+import functools
+import os
+import platform
+
+import torch
+from ..utils._logger import logger, WarningType
+
+# The output channels of a GEMM are partitioned among the OpenMP threads in order, and
+# ipexrun pins the threads to the cores in order, so the first slice of the output channels
+# is computed by the cores of the first NUMA node, etc. Binding the same slices of the
+# prepacked weights, whose output channels are the outermost dimension, to the NUMA nodes
+# keeps the weight traffic of the memory bound GEMMs, e.g., the decoding of LLMs, local.
+_SYS_MBIND = {"x86_64": 237, "aarch64": 235}
+_SYS_MOVE_PAGES = {"x86_64": 279, "aarch64": 239}
+_MPOL_BIND = 2
+_MPOL_MF_MOVE = 1 << 1
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+@functools.lru_cache(None)
+def _syscall(name):
+    nr = {"mbind": _SYS_MBIND, "move_pages": _SYS_MOVE_PAGES}[name].get(
+        platform.machine()
+    )
+    if nr is None or platform.system() != "Linux":
+        return None
+    libc = ctypes.CDLL(None, use_errno=True)
+    return lambda *args: libc.syscall(ctypes.c_long(nr), *args)
+
+
+def get_numa_nodes():
+    r"""
+    Returns the NUMA nodes of the cores available to the process, in the order of the cores.
+    """
+    from .launch import CPUPoolList
+
+    available_cores = os.sched_getaffinity(0)
+    nodes = []
+    for core in CPUPoolList().pool_all:
+        if core.cpu in available_cores and core.node not in nodes:
+            nodes.append(core.node)
+    return nodes
+
+
+def _bind_pages(address, nbytes, node):
+    mbind = _syscall("mbind")
+    if mbind is None:
+        return False
+    nodemask = (ctypes.c_ulong * (node // 64 + 1))()
+    nodemask[node // 64] = 1 << (node % 64)
+    ret = mbind(
+        ctypes.c_void_p(address),
+        ctypes.c_ulong(nbytes),
+        ctypes.c_int(_MPOL_BIND),
+        nodemask,
+        ctypes.c_ulong(len(nodemask) * 64),
+        ctypes.c_uint(_MPOL_MF_MOVE),
+    )
+    return ret == 0
+
+
+def _get_page_nodes(address, nbytes):
+    move_pages = _syscall("move_pages")
+    if move_pages is None:
+        return []
+    count = nbytes // _PAGE_SIZE
+    pages = (ctypes.c_void_p * count)(*[address + i * _PAGE_SIZE for i in range(count)])
+    status = (ctypes.c_int * count)()
+    # Without the target nodes, move_pages returns the nodes of the pages in status
+    ret = move_pages(
+        ctypes.c_int(0), ctypes.c_ulong(count), pages, None, status, ctypes.c_int(0)
+    )
+    return list(status) if ret == 0 else []
+
+
+def _partition(tensor, num_parts):
+    # The boundaries of the slices are aligned to the pages
+    address = tensor.untyped_storage().data_ptr()
+    nbytes = tensor.untyped_storage().nbytes()
+    begin = address // _PAGE_SIZE * _PAGE_SIZE
+    end = (address + nbytes + _PAGE_SIZE - 1) // _PAGE_SIZE * _PAGE_SIZE
+    boundaries = [begin]
+    for i in range(1, num_parts):
+        boundaries.append(
+            max(
+                (address + nbytes * i // num_parts) // _PAGE_SIZE * _PAGE_SIZE,
+                boundaries[-1],
+            )
+        )
+    boundaries.append(end)
+    return [
+        (boundaries[i], boundaries[i + 1] - boundaries[i]) for i in range(num_parts)
+    ]
+
+
+def get_numa_nodes_of_tensor(tensor, num_parts):
+    r"""
+    Returns the NUMA nodes of the pages of every slice out of ``num_parts`` of the tensor.
+    """
+    return [
+        _get_page_nodes(address, nbytes)
+        for address, nbytes in _partition(tensor, num_parts)
+    ]
+
+
+def _get_weights(model):
+    weights = {}
+    for module in model.modules():
+        weight = getattr(module, "weight", None)
+        if (
+            isinstance(weight, torch.Tensor)
+            and weight.device.type == "cpu"
+            and weight.dim() >= 2
+        ):
+            weights[weight.untyped_storage().data_ptr()] = weight
+    return list(weights.values())
+
+
+def partition_weights_by_numa_node(model, nodes=None, min_bytes=1 << 20):
+    r"""
+    Binds the slices of the output channels of the (prepacked) weights of the model to the
+    NUMA nodes of the cores of the process, i.e., the cores of every node own the slice of
+    the weights they compute with. The placement is verified with the NUMA nodes of the
+    cores given by ``CPUPoolList`` and the pages of the weights.
+
+    Args:
+        model (torch.nn.Module): The (optimized) model.
+        nodes (list): The NUMA nodes in the order of the OpenMP threads. Default value is
+            ``None``, i.e., the nodes of the cores available to the process.
+        min_bytes (int): The minimal size of the weights to partition.
+
+    Returns:
+        The number of the partitioned weights.
+    """
+    if nodes is None:
+        nodes = get_numa_nodes()
+    if len(nodes) <= 1:
+        return 0
+    partitioned = 0
+    for weight in _get_weights(model):
+        if weight.untyped_storage().nbytes() < max(min_bytes, len(nodes) * _PAGE_SIZE):
+            continue
+        parts = _partition(weight, len(nodes))
+        if not all(
+            _bind_pages(address, nbytes, node)
+            for (address, nbytes), node in zip(parts, nodes)
+        ):
+            logger.warning(
+                f"fail to bind the weights to the NUMA nodes {nodes} due to: {os.strerror(ctypes.get_errno())}",
+                _type=WarningType.NotSupported,
+            )
+            return partitioned
+        partitioned += 1
+        placement = get_numa_nodes_of_tensor(weight, len(nodes))
+        misplaced = sum(
+            sum(1 for n in page_nodes if n >= 0 and n != node)
+            for page_nodes, node in zip(placement, nodes)
+        )
+        if misplaced > 0:
+            logger.warning(
+                f"{misplaced} pages of a weight of shape {list(weight.shape)} are not on their NUMA nodes {nodes}",
+                _type=WarningType.NotSupported,
+            )
+    return partitioned
@@ -3,8 +3,16 @@ import subprocess
 import os
 import intel_extension_for_pytorch.cpu.auto_ipex as auto_ipex
 from .launcher_base import Launcher
+from .cpu_info import CPUPool
+from .supervisor import InstanceSupervisor, METRICS_PREFIX
 from ...utils._logger import WarningType
 
+# Environment variables passed to the program by --weight-sharing, which are read by
+# ipex.cpu.runtime.WeightSharingInstances. The instances are in format of
+# "instance_idx:cores;instance_idx:cores;...", e.g., "0:0-3;1:4-7".
+WEIGHT_SHARING_INSTANCES_ENV = "IPEX_WEIGHT_SHARING_INSTANCES"
+WEIGHT_SHARING_LOG_PREFIX_ENV = "IPEX_WEIGHT_SHARING_LOG_PREFIX"
+
 
 class MultiInstancesLauncher(Launcher):
     """
@@ -69,6 +77,38 @@ class MultiInstancesLauncher(Launcher):
             default=False,
             help="Run one instance per node with all physical cores.",
         )
+        group.add_argument(
+            "--weight-sharing",
+            "--weight_sharing",
+            action="store_true",
+            default=False,
+            help="Run the instances as weight-sharing streams of one process instead of one process per \
+                instance. The program loads the model once and runs it on the instances with \
+                ipex.cpu.runtime.WeightSharingInstances, which takes the cores of the instances from ipexrun.",
+        )
+        group.add_argument(
+            "--supervise",
+            action="store_true",
+            default=False,
+            help=f'Supervise the instance processes. They are launched without shell, the failed ones are \
+                restarted on the same cores up to --max-restarts times, and the metrics lines printed by the \
+                instances, in format of "{METRICS_PREFIX} throughput=<value> latency=<value> ...", are \
+                summarized when all the instances end.',
+        )
+        group.add_argument(
+            "--max-restarts",
+            "--max_restarts",
+            default=0,
+            type=int,
+            help="Max times to restart a failed instance in supervisor mode.",
+        )
+        group.add_argument(
+            "--summary-file",
+            "--summary_file",
+            default="",
+            type=str,
+            help="Write the summary of supervisor mode to this file as JSON.",
+        )
         group.add_argument(
             "--cores-list",
             "--cores_list",
@@ -165,20 +205,63 @@ class MultiInstancesLauncher(Launcher):
             cmd.append("-m")
         cmd.append(args.program)
         log_name = f'{args.log_file_prefix}_instance_{index}_cores_{cores_list_local.replace(",", "_")}.log'
+        if args.weight_sharing:
+            log_name = f'{args.log_file_prefix}_weight_sharing_cores_{cores_list_local.replace(",", "_")}.log'
         log_name = os.path.join(args.log_dir, log_name)
         cmd.extend(args.program_args)
         cmd_s = " ".join(cmd)
-        if args.log_dir:
+        if args.log_dir and not args.supervise:
             cmd_s = f"{cmd_s} 2>&1 | tee {log_name}"
         self.verbose("info", f"cmd: {cmd_s}")
-        if len(set([c.node for c in pool])) > 1:
+        # The cores of the weight-sharing process are the union of the instances
+        if len(set([c.node for c in pool])) > 1 and not args.weight_sharing:
             self.verbose(
                 "warning",
                 f"Cross NUMA nodes execution detected: cores [{cores_list_local}] are on different NUMA nodes [{nodes_list_local}]",
             )
+        if args.supervise:
+            # The process is launched by the supervisor, which also writes the log file
+            return {
+                "process": None,
+                "cmd": cmd_s,
+                "index": index,
+                "cores": cores_list_local,
+                "argv": cmd,
+                "environ": dict(environ_local),
+                "log_name": log_name if args.log_dir else "",
+            }
         process = subprocess.Popen(cmd_s, env=environ_local, shell=True)
         return {"process": process, "cmd": cmd_s}
 
+    def weight_sharing_command_builder(
+        self, args, omp_runtime, task_mgr, environ, cpu_pools, instance_idx
+    ):
+        # One process is launched on the cores of all the instances, and the instances are
+        # passed to ipex.cpu.runtime.WeightSharingInstances in the process by the environment.
+        pool = CPUPool()
+        instances_txt = []
+        for i in instance_idx:
+            pool.extend(cpu_pools[i])
+            instances_txt.append(f'{i}:{cpu_pools[i].get_pool_txt()["cores"]}')
+        environ_local = dict(environ)
+        environ_local[WEIGHT_SHARING_INSTANCES_ENV] = ";".join(instances_txt)
+        self.verbose(
+            "info",
+            f"env: {WEIGHT_SHARING_INSTANCES_ENV}={environ_local[WEIGHT_SHARING_INSTANCES_ENV]}",
+        )
+        if args.log_dir:
+            environ_local[WEIGHT_SHARING_LOG_PREFIX_ENV] = os.path.join(
+                args.log_dir, args.log_file_prefix
+            )
+        return self.execution_command_builder(
+            args=args,
+            omp_runtime=omp_runtime,
+            task_mgr=task_mgr,
+            environ=environ_local,
+            cpu_pools=[pool],
+            index=0,
+        )
+
     def launch(self, args):
         if args.latency_mode and args.throughput_mode:
             raise RuntimeError(
@@ -301,24 +384,46 @@ class MultiInstancesLauncher(Launcher):
             set(instances_available)
         ), "Designated nodes list contains invalid nodes."
         processes = []
-        for i in instance_idx:
-            process = self.execution_command_builder(
+        if args.weight_sharing:
+            process = self.weight_sharing_command_builder(
                 args=args,
                 omp_runtime=omp_runtime,
                 task_mgr=task_mgr,
                 environ=environ_local,
                 cpu_pools=self.cpuinfo.pools_ondemand,
-                index=i,
+                instance_idx=instance_idx,
             )
             processes.append(process)
+        else:
+            for i in instance_idx:
+                process = self.execution_command_builder(
+                    args=args,
+                    omp_runtime=omp_runtime,
+                    task_mgr=task_mgr,
+                    environ=environ_local,
+                    cpu_pools=self.cpuinfo.pools_ondemand,
+                    index=i,
+                )
+                processes.append(process)
         try:
-            for process in processes:
-                p = process["process"]
-                p.wait()
-                if p.returncode != 0:
-                    raise subprocess.CalledProcessError(
-                        returncode=p.returncode, cmd=process["cmd"]
-                    )
+            if args.supervise:
+                supervisor = InstanceSupervisor(
+                    processes, self.verbose, args.max_restarts
+                )
+                supervisor.report(supervisor.run(), args.summary_file)
+                for process in processes:
+                    if process["returncode"] != 0:
+                        raise subprocess.CalledProcessError(
+                            returncode=process["returncode"], cmd=process["cmd"]
+                        )
+            else:
+                for process in processes:
+                    p = process["process"]
+                    p.wait()
+                    if p.returncode != 0:
+                        raise subprocess.CalledProcessError(
+                            returncode=p.returncode, cmd=process["cmd"]
+                        )
         finally:
             if args.auto_ipex:
                 # Clean the temp file
@@ -0,0 +1,196 @@
+import json
+import subprocess
+import sys
+import threading
+import time
+
+# The instances report their metrics by printing lines in format of
+# "IPEX_METRICS key=value key=value ...", e.g., "IPEX_METRICS throughput=120.5 latency=8.3".
+# The values of the last metrics line of each instance are summarized.
+METRICS_PREFIX = "IPEX_METRICS"
+
+
+def parse_metrics_line(line):
+    """
+    Parse a metrics line into a dict of float values, or return None if it is not a metrics line
+    """
+    line = line.strip()
+    if not line.startswith(METRICS_PREFIX):
+        return None
+    metrics = {}
+    for item in line[len(METRICS_PREFIX) :].split():
+        key, sep, value = item.partition("=")
+        if not sep:
+            continue
+        try:
+            metrics[key] = float(value)
+        except ValueError:
+            pass
+    return metrics
+
+
+class InstanceSupervisor:
+    """
+    Supervisor of the instance processes. The processes are launched without shell, and their
+    outputs are forwarded to stdout and the log files of the instances. A failed instance is
+    restarted on the same cores up to max_restarts times. After all the instances end, the
+    metrics lines of the instances are summarized.
+    """
+
+    def __init__(self, instances, verbose, max_restarts=0):
+        # Each instance is a dict with the keys of "index", "cores", "argv" (the command as a list),
+        # "environ" and "log_name" (empty to disable logging to file).
+        self.instances = instances
+        self.max_restarts = max_restarts
+        self.verbose = verbose
+        self.processes = {}
+        self.stdout_lock = threading.Lock()
+        # Set on interrupt, no instance is started or restarted after it. The processes are
+        # started under the lock, so they are either seen by the termination or not started.
+        self.stop_event = threading.Event()
+        self.processes_lock = threading.Lock()
+        for instance in self.instances:
+            instance["returncode"] = None
+            instance["restarts"] = 0
+            instance["elapsed"] = 0.0
+            instance["metrics"] = {}
+
+    def _forward_output(self, instance, process, log_file):
+        for line in process.stdout:
+            with self.stdout_lock:
+                sys.stdout.write(line)
+                sys.stdout.flush()
+            if log_file:
+                log_file.write(line)
+                log_file.flush()
+            metrics = parse_metrics_line(line)
+            if metrics:
+                instance["metrics"].update(metrics)
+
+    def _run_instance(self, instance):
+        log_file = open(instance["log_name"], "w") if instance["log_name"] else None
+        try:
+            while True:
+                start_time = time.time()
+                # The metrics of the last run are reported
+                instance["metrics"] = {}
+                with self.processes_lock:
+                    if self.stop_event.is_set():
+                        break
+                    process = subprocess.Popen(
+                        instance["argv"],
+                        env=instance["environ"],
+                        stdout=subprocess.PIPE,
+                        stderr=subprocess.STDOUT,
+                        universal_newlines=True,
+                        errors="replace",
+                    )
+                    self.processes[instance["index"]] = process
+                self._forward_output(instance, process, log_file)
+                instance["returncode"] = process.wait()
+                instance["elapsed"] = time.time() - start_time
+                # The instances interrupted by Ctrl-C exit with nonzero codes, they are not
+                # restarted.
+                if (
+                    instance["returncode"] == 0
+                    or instance["restarts"] >= self.max_restarts
+                    or self.stop_event.is_set()
+                ):
+                    break
+                instance["restarts"] += 1
+                self.verbose(
+                    "warning",
+                    f'Instance {instance["index"]} on cores [{instance["cores"]}] exited with code '
+                    + f'{instance["returncode"]}. Restarting it on the same cores '
+                    + f'({instance["restarts"]}/{self.max_restarts}).',
+                )
+        finally:
+            if log_file:
+                log_file.close()
+
+    def run(self):
+        threads = [
+            threading.Thread(target=self._run_instance, args=(instance,), daemon=True)
+            for instance in self.instances
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                thread.join()
+        except KeyboardInterrupt:
+            self.stop()
+            raise
+        return self.summary()
+
+    def stop(self, timeout=10):
+        """
+        Stop restarting the instances and terminate the running processes. The processes which
+        do not exit within timeout seconds after the termination are killed.
+        """
+        with self.processes_lock:
+            self.stop_event.set()
+            processes = list(self.processes.values())
+        for process in processes:
+            if process.poll() is None:
+                process.terminate()
+        deadline = time.time() + timeout
+        for process in processes:
+            try:
+                process.wait(timeout=max(deadline - time.time(), 0))
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+
+    def summary(self):
+        instances = [
+            {
+                key: instance[key]
+                for key in [
+                    "index",
+                    "cores",
+                    "returncode",
+                    "restarts",
+                    "elapsed",
+                    "metrics",
+                ]
+            }
+            for instance in self.instances
+        ]
+        # Aggregate each metric over the instances which report it, e.g., the sum of throughput
+        # is the throughput of all the instances.
+        aggregated = {}
+        for instance in instances:
+            for key, value in instance["metrics"].items():
+                aggregated.setdefault(key, []).append(value)
+        for key, values in aggregated.items():
+            aggregated[key] = {
+                "sum": sum(values),
+                "mean": sum(values) / len(values),
+                "min": min(values),
+                "max": max(values),
+                "ninstances": len(values),
+            }
+        return {"instances": instances, "aggregated": aggregated}
+
+    def report(self, summary, summary_file=""):
+        self.verbose("info", "==========")
+        for instance in summary["instances"]:
+            metrics_txt = " ".join(
+                [f"{key}={value}" for key, value in instance["metrics"].items()]
+            )
+            self.verbose(
+                "info",
+                f'instance {instance["index"]} cores [{instance["cores"]}]: returncode={instance["returncode"]} '
+                + f'restarts={instance["restarts"]} elapsed={instance["elapsed"]:.2f}s {metrics_txt}',
+            )
+        for key, value in summary["aggregated"].items():
+            self.verbose(
+                "info",
+                f"{key}: sum={value['sum']} mean={value['mean']} min={value['min']} max={value['max']} "
+                + f"over {value['ninstances']} instances",
+            )
+        if summary_file:
+            with open(summary_file, "w") as f:
+                json.dump(summary, f, indent=2)
+            self.verbose("info", f"Summary is written to {summary_file}")
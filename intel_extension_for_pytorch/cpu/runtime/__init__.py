@@ -6,4 +6,6 @@ from .multi_stream import (
     MultiStreamModuleHint,
     _MultiStreamBenchmarkModule,
 )
+from .dynamic_batcher import DynamicBatcher
+from .weight_sharing import WeightSharingInstances
 from .runtime_utils import get_core_list_of_node_id
@@ -0,0 +1,297 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Union
+
+import torch
+from .cpupool import CPUPool
+from .task import Task
+from .multi_stream import (
+    MultiStreamModuleHint,
+    get_default_num_streams,
+    default_multi_stream_module_split_hint,
+    default_multi_stream_module_concat_hint,
+)
+from ...utils._logger import logger, WarningType
+
+
+def _split_cores(core_ids, num_streams):
+    # The cores of every stream are taken from one NUMA node if the streams can be evenly
+    # distributed to the nodes of the cores, otherwise the cores are split in order.
+    from ..launch import CPUPoolList
+
+    node_of_core = {core.cpu: core.node for core in CPUPoolList().pool_all}
+    nodes = {}
+    for core_id in core_ids:
+        nodes.setdefault(node_of_core.get(core_id, 0), []).append(core_id)
+    groups = list(nodes.values())
+    if num_streams % len(groups) != 0 or any(
+        len(group) < num_streams // len(groups) for group in groups
+    ):
+        groups = [list(core_ids)]
+    num_streams_per_group = num_streams // len(groups)
+    streams_core_ids = []
+    for group in groups:
+        cores_per_stream, num_extra_cores = divmod(len(group), num_streams_per_group)
+        start = 0
+        for j in range(num_streams_per_group):
+            end = start + cores_per_stream + (1 if j < num_extra_cores else 0)
+            streams_core_ids.append(group[start:end])
+            start = end
+    return streams_core_ids
+
+
+def _get_batch_size(hint, obj):
+    if isinstance(hint, (list, tuple)):
+        sizes = [_get_batch_size(h, o) for h, o in zip(hint, obj)]
+    elif isinstance(hint, dict):
+        sizes = [_get_batch_size(h, obj[key]) for key, h in hint.items()]
+    else:
+        return None if hint is None else obj.size(hint)
+    return next((size for size in sizes if size is not None), None)
+
+
+def _batch_inputs(hint, objs):
+    if isinstance(hint, (list, tuple)):
+        return type(hint)(
+            _batch_inputs(h, [obj[i] for obj in objs]) for i, h in enumerate(hint)
+        )
+    elif isinstance(hint, dict):
+        return {
+            key: _batch_inputs(h, [obj[key] for obj in objs]) for key, h in hint.items()
+        }
+    elif hint is None:
+        # the inputs not to batch are taken from the first request
+        return objs[0]
+    return torch.cat(objs, dim=hint)
+
+
+def _split_outputs(hint, obj, sizes):
+    if isinstance(hint, (list, tuple)):
+        outputs = [_split_outputs(h, obj[i], sizes) for i, h in enumerate(hint)]
+        return [type(hint)(output[j] for output in outputs) for j in range(len(sizes))]
+    elif isinstance(hint, dict):
+        outputs = {key: _split_outputs(h, obj[key], sizes) for key, h in hint.items()}
+        return [
+            {key: output[j] for key, output in outputs.items()}
+            for j in range(len(sizes))
+        ]
+    elif hint is None:
+        return [obj] * len(sizes)
+    return list(obj.split(sizes, dim=hint))
+
+
+class _Request(object):
+    def __init__(self, args, kwargs, batch_size):
+        self.args = args
+        self.kwargs = kwargs
+        self.batch_size = batch_size
+        self.future = Future()
+        self.arrival_time = time.monotonic()
+
+
+class DynamicBatcher(object):
+    r"""
+    DynamicBatcher serves the single requests of online inference. The requests submitted from
+    any threads are collected into a queue and batched until the batch reaches ``max_batch_size``
+    or the first request of the batch has waited for ``max_latency_ms``, after which only the
+    requests already in the queue are added to the batch. The batches are
+    dispatched to the free ones of ``num_streams`` Task workers, which share the weights of the
+    model and run on their own cores of ``cpu_pool``, and the outputs are split back to the
+    requests. The cores of every worker are taken from one NUMA node if the workers can be evenly
+    distributed to the NUMA nodes of ``cpu_pool``.
+
+    Args:
+        model (torch.jit.ScriptModule or torch.nn.Module): The input model.
+        num_streams (Union[int, str]): Number of Task workers (int) or "AUTO" (str). "AUTO" means
+            one worker per core, the same as MultiStreamModule.
+        cpu_pool (intel_extension_for_pytorch.cpu.runtime.CPUPool): An
+            intel_extension_for_pytorch.cpu.runtime.CPUPool object, contains
+            all CPU cores used by the workers.
+        max_batch_size (int): The max batch size of the batches dispatched to the workers.
+        max_latency_ms (float): The max time in milliseconds the first request of a batch waits
+            for the following requests. The requests queued by then are still batched together.
+        input_split_hint (MultiStreamModuleHint): Hint to DynamicBatcher about
+            how to batch the inputs of the requests, e.g., along which dim.
+        output_concat_hint (MultiStreamModuleHint): Hint to DynamicBatcher about
+            how to split the outputs back to the requests.
+
+    Returns:
+        intel_extension_for_pytorch.cpu.runtime.DynamicBatcher: Generated
+        intel_extension_for_pytorch.cpu.runtime.DynamicBatcher object.
+
+    Examples:
+        >>> cpu_pool = ipex.cpu.runtime.CPUPool(node_id=0)
+        >>> batcher = ipex.cpu.runtime.DynamicBatcher(
+        ...     traced_model, num_streams=4, cpu_pool=cpu_pool, max_batch_size=16, max_latency_ms=2
+        ... )
+        >>> # in the request handler threads
+        >>> y = batcher.submit(x).result()
+        >>> batcher.close()
+
+    :meta public:
+    """
+
+    def __init__(
+        self,
+        model,
+        num_streams: Union[int, str] = "AUTO",
+        cpu_pool: CPUPool = None,
+        max_batch_size: int = 32,
+        max_latency_ms: float = 5.0,
+        input_split_hint: MultiStreamModuleHint = default_multi_stream_module_split_hint,
+        output_concat_hint: MultiStreamModuleHint = default_multi_stream_module_concat_hint,
+    ):
+        if cpu_pool is None:
+            cpu_pool = CPUPool()
+        assert (
+            type(cpu_pool) is CPUPool
+        ), "Input of cpu_pool must be provided with type of ipex.cpu.runtime.CPUPool"
+        assert max_batch_size >= 1, "max_batch_size should be a positive integer"
+        assert max_latency_ms >= 0, "max_latency_ms should be non-negative"
+        if not isinstance(model, torch.jit.ScriptModule):
+            logger.warning(
+                "Creating DynamicBatcher on an nn.Module. This can be slow due "
+                + "to Python Global Interpreter Lock (GIL). Suggest to use JIT ScriptModule for better performance.",
+                _type=WarningType.WrongArgument,
+            )
+        if isinstance(num_streams, str):
+            assert (
+                num_streams.upper() == "AUTO"
+            ), 'Input of num_streams must be Number of instances or string "AUTO"'
+            num_streams = get_default_num_streams(cpu_pool)
+        if num_streams > len(cpu_pool.core_ids):
+            num_streams = len(cpu_pool.core_ids)
+            logger.warning(
+                "The number of streams is larger than number of cores. "
+                + f"The number of streams changes to {num_streams}.",
+                _type=WarningType.WrongArgument,
+            )
+        self.num_streams = num_streams
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency_ms / 1000.0
+        self.input_split_hint = input_split_hint
+        self.output_concat_hint = output_concat_hint
+        self.tasks = [
+            Task(model, CPUPool(core_ids))
+            for core_ids in _split_cores(cpu_pool.core_ids, num_streams)
+        ]
+        self._queue = queue.Queue()
+        # the request which does not fit in the last batch, it goes first in the next batch
+        self._pending = None
+        self._batch_lock = threading.Lock()
+        self._closed = False
+        self._workers = [
+            threading.Thread(target=self._run_worker, args=(task,), daemon=True)
+            for task in self.tasks
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, *args, **kwargs) -> Future:
+        r"""
+        Submits one request, which is batched along the dims of ``input_split_hint``.
+
+        Returns:
+            concurrent.futures.Future: The future of the output of the request.
+        """
+        if self._closed:
+            raise RuntimeError("Cannot submit requests to a closed DynamicBatcher")
+        batch_size = _get_batch_size(self.input_split_hint.args, args)
+        if batch_size is None:
+            batch_size = _get_batch_size(self.input_split_hint.kwargs, kwargs)
+        assert batch_size is not None, "No input of the request is batched"
+        request = _Request(args, kwargs, batch_size)
+        self._queue.put(request)
+        return request.future
+
+    def __call__(self, *args, **kwargs):
+        return self.submit(*args, **kwargs).result()
+
+    def _get_request(self, block=True, timeout=None):
+        if self._pending is not None:
+            request, self._pending = self._pending, None
+            return request
+        return self._queue.get(block=block, timeout=timeout)
+
+    def _next_batch(self):
+        # One worker forms a batch at a time, the others wait for the lock
+        with self._batch_lock:
+            request = self._get_request()
+            if request is None:
+                # pass the stop signal to the other workers
+                self._queue.put(None)
+                return None
+            batch = [request]
+            batch_size = request.batch_size
+            deadline = request.arrival_time + self.max_latency
+            while batch_size < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                try:
+                    if timeout > 0:
+                        request = self._get_request(timeout=timeout)
+                    else:
+                        # The deadline has passed, only take the requests which are already queued,
+                        # so that the batches still fill up when the workers fall behind the queue
+                        request = self._get_request(block=False)
+                except queue.Empty:
+                    break
+                if request is None:
+                    self._queue.put(None)
+                    break
+                if batch_size + request.batch_size > self.max_batch_size:
+                    self._pending = request
+                    break
+                batch.append(request)
+                batch_size += request.batch_size
+            return batch
+
+    def _run_batch(self, task, batch):
+        hint = self.input_split_hint
+        args = _batch_inputs(tuple(hint.args), [request.args for request in batch])
+        kwargs = _batch_inputs(hint.kwargs, [request.kwargs for request in batch])
+        output = task(*args, **kwargs).get()
+        sizes = [request.batch_size for request in batch]
+        hint = self.output_concat_hint
+        if hint.args and hint.kwargs:
+            return list(
+                zip(
+                    _split_outputs(hint.args[0], output[0], sizes),
+                    _split_outputs(hint.kwargs, output[1], sizes),
+                )
+            )
+        elif hint.args:
+            return _split_outputs(hint.args[0], output, sizes)
+        return _split_outputs(hint.kwargs, output, sizes)
+
+    def _run_worker(self, task):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            try:
+                outputs = self._run_batch(task, batch)
+            except Exception as e:
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+            for request, output in zip(batch, outputs):
+                request.future.set_result(output)
+
+    def close(self):
+        r"""
+        Stops the workers after the submitted requests are served.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        for worker in self._workers:
+            worker.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -5,6 +5,9 @@ import intel_extension_for_pytorch._C as core
 from .cpupool import CPUPool
 from .task import Task
 import copy
+import queue
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from ...utils._logger import logger, WarningType
 
 
@@ -38,6 +41,15 @@ default_multi_stream_module_split_hint = MultiStreamModuleHint(0)
 default_multi_stream_module_concat_hint = MultiStreamModuleHint(0)
 
 
+def _copy_input_structure(obj):
+    # Copies the containers of the input structure but not the inputs
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(_copy_input_structure(item) for item in obj)
+    elif isinstance(obj, dict):
+        return {key: _copy_input_structure(value) for key, value in obj.items()}
+    return obj
+
+
 def get_default_num_streams(cpu_pool):
     # One core per stream usually brings better overall throughput than other configurations.
     # Therefore, we heuristically make one core per stream the default here.
@@ -64,6 +76,16 @@ class MultiStreamModule(nn.Module):
     as "AUTO", we suggest to set inputs' batchsize larger than and divisible by
     number of cores.
 
+    If ``micro_batch_size`` is set, the inputs are split into micro-batches of
+    at most ``micro_batch_size`` instead, and each stream takes the next
+    micro-batch once it finishes the previous one. For inputs whose cost varies
+    by sample, e.g., with ragged sequence lengths, the streams finish at about
+    the same time rather than waiting for the slowest one. The outputs of the
+    micro-batches are concatenated in order.
+
+    In asyncio, use ``await multi_stream_model.forward_async(x)`` to await the
+    results of the streams without blocking the event loop.
+
     Args:
         model (torch.jit.ScriptModule or torch.nn.Module): The input model.
         num_streams (Union[int, str]): Number of instances (int) or "AUTO" (str). "AUTO" means the stream number
@@ -81,6 +103,9 @@ class MultiStreamModule(nn.Module):
             how to split the inputs.
         output_concat_hint (MultiStreamModuleHint): Hint to MultiStreamModule about
             how to concat the outputs.
+        micro_batch_size (int): The max batch size of the micro-batches taken by
+            the idle streams. The default value is None, which splits the inputs
+            equally to each stream.
 
     Returns:
         intel_extension_for_pytorch.cpu.runtime.MultiStreamModule: Generated
@@ -97,11 +122,15 @@ class MultiStreamModule(nn.Module):
         concat_output: bool = True,
         input_split_hint: MultiStreamModuleHint = default_multi_stream_module_split_hint,
         output_concat_hint: MultiStreamModuleHint = default_multi_stream_module_concat_hint,
+        micro_batch_size: int = None,
     ):
         super(MultiStreamModule, self).__init__()
         assert (
             type(cpu_pool) is CPUPool
         ), "Input of cpu_pool must be provided with type of ipex.cpu.runtime.CPUPool"
+        assert (
+            micro_batch_size is None or micro_batch_size >= 1
+        ), "micro_batch_size should be a positive integer"
         if not isinstance(model, torch.jit.ScriptModule):
             logger.warning(
                 "Creating MultiStreamModule on an nn.Module. This can be slow due "
@@ -158,6 +187,10 @@ class MultiStreamModule(nn.Module):
                     )
                 )
                 start_core_list_idx = end_core_list_idx
+        self.micro_batch_size = micro_batch_size
+        if self.micro_batch_size is not None and self.num_streams > 1:
+            # One thread per stream to feed the micro-batches to the task of the stream.
+            self.micro_batch_executor = ThreadPoolExecutor(max_workers=self.num_streams)
         self.concat_output = concat_output
         self.input_split_hint = input_split_hint
         self.output_concat_hint = output_concat_hint
@@ -211,20 +244,31 @@ class MultiStreamModule(nn.Module):
     def init_forward_status(self, split_size, stream_id):
         # This function should be invoke only once at each forward
         self.split_size = split_size
+        # With micro_batch_size, the inputs are split to the micro-batches rather than the streams,
+        # and used_num_streams is the number of the micro-batches.
+        num_splits = self.num_streams
+        if self.micro_batch_size is not None:
+            num_splits = -(-self.split_size // self.micro_batch_size)
         # Ensure each instance has input offload
-        self.batch_per_instance = self.split_size // self.num_streams
+        self.batch_per_instance = self.split_size // num_splits
         if self.batch_per_instance >= 1:
-            # The input batchsize larger or equal to num_streams.
-            self.used_num_streams = self.num_streams
-            # If input batchsize larger than num_streams and not divisible,
+            # The input batchsize larger or equal to num_splits.
+            self.used_num_streams = num_splits
+            # If input batchsize larger than num_splits and not divisible,
             # the first remainder streams will have (mini_batch + 1) input size.
-            self.instance_need_extra_input = self.split_size % self.num_streams
+            self.instance_need_extra_input = self.split_size % num_splits
         else:
             # The input batchsize less than num_streams,
             # only the first batchsize stream will have mini_batch(1) input.
             self.batch_per_instance = 1
             self.used_num_streams = self.split_size
             self.instance_need_extra_input = 0
+        # Deep copy more input structures if there are more micro-batches than the streams
+        for _ in range(self.args_streams_input.__len__(), self.used_num_streams):
+            self.args_streams_input.append(copy.deepcopy(self.input_split_hint.args))
+            self.kwargs_streams_input.append(
+                copy.deepcopy(self.input_split_hint.kwargs)
+            )
         self.update_split_idx(stream_id)
 
     def _do_get_input_for_each_stream(
@@ -496,6 +540,9 @@ class MultiStreamModule(nn.Module):
         # Split the raw input to generate input for each stream
         self._get_input_for_each_stream(self.input_split_hint, *args, **kwargs)
 
+        if self.micro_batch_size is not None:
+            return self._forward_micro_batches()
+
         results_raw_future = []
         results_raw = []
         for stream_id in range(self.used_num_streams):
@@ -523,6 +570,91 @@ class MultiStreamModule(nn.Module):
             self._concat_output_for_each_stream() if self.concat_output else results_raw
         )
 
+    def _run_micro_batches(self, task, micro_batch_ids, results_raw):
+        # Each stream takes the next micro-batch until all of them are taken
+        while True:
+            try:
+                micro_batch_id = micro_batch_ids.get_nowait()
+            except queue.Empty:
+                return
+            results_raw[micro_batch_id] = task(
+                *(self.args_streams_input[micro_batch_id]),
+                **(self.kwargs_streams_input[micro_batch_id]),
+            ).get()
+
+    def _forward_micro_batches(self):
+        micro_batch_ids = queue.SimpleQueue()
+        for micro_batch_id in range(self.used_num_streams):
+            micro_batch_ids.put(micro_batch_id)
+        results_raw = [None] * self.used_num_streams
+        futures = [
+            self.micro_batch_executor.submit(
+                self._run_micro_batches, task, micro_batch_ids, results_raw
+            )
+            for task in self.tasks[: self.used_num_streams]
+        ]
+        for future in futures:
+            future.result()
+        return self._collect_outputs(results_raw)
+
+    def _collect_outputs(self, results_raw):
+        if not self.concat_output:
+            return results_raw
+        for stream_id in range(results_raw.__len__()):
+            self._generate_outputs([results_raw[stream_id]], stream_id)
+        return self._concat_output_for_each_stream()
+
+    async def forward_async(self, *args, **kwargs):
+        r"""
+        The same as forward, except that the results of the streams are awaited
+        in asyncio instead of blocking the calling thread. It must be invoked
+        in the thread of the running asyncio event loop.
+        """
+        self.reset_forward_status()
+        if self.num_streams == 1:
+            if not hasattr(self, "async_task"):
+                # The model runs in the calling thread in forward, which would block the event loop
+                self.async_task = Task(self.model, self.cpu_pool)
+            results_raw = await self.async_task.run_async(*args, **kwargs)
+            return results_raw if self.concat_output else [results_raw]
+
+        self._get_input_for_each_stream(self.input_split_hint, *args, **kwargs)
+        # The input structures of the streams are reused by the next call, which may
+        # start before the micro-batches of this call are all taken.
+        num_splits = self.used_num_streams
+        args_inputs = _copy_input_structure(self.args_streams_input[:num_splits])
+        kwargs_inputs = _copy_input_structure(self.kwargs_streams_input[:num_splits])
+        if self.micro_batch_size is None:
+            results_raw = await asyncio.gather(
+                *[
+                    self.tasks[stream_id].run_async(
+                        *(args_inputs[stream_id]), **(kwargs_inputs[stream_id])
+                    )
+                    for stream_id in range(num_splits)
+                ]
+            )
+            return self._collect_outputs(results_raw)
+
+        micro_batch_ids = queue.SimpleQueue()
+        for micro_batch_id in range(num_splits):
+            micro_batch_ids.put(micro_batch_id)
+        results_raw = [None] * num_splits
+
+        async def run_micro_batches(task):
+            while True:
+                try:
+                    micro_batch_id = micro_batch_ids.get_nowait()
+                except queue.Empty:
+                    return
+                results_raw[micro_batch_id] = await task.run_async(
+                    *(args_inputs[micro_batch_id]), **(kwargs_inputs[micro_batch_id])
+                )
+
+        await asyncio.gather(
+            *[run_micro_batches(task) for task in self.tasks[:num_splits]]
+        )
+        return self._collect_outputs(results_raw)
+
     def get_stream_number(self):
         return self.num_streams
 
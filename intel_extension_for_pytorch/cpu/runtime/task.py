@@ -1,3 +1,4 @@
+import asyncio
 import torch
 import intel_extension_for_pytorch as ipex
 from .cpupool import CPUPool
@@ -17,6 +18,13 @@ class Task(object):
     Returns:
         intel_extension_for_pytorch.cpu.runtime.Task: Generated
         intel_extension_for_pytorch.cpu.runtime.Task object.
+
+    Examples:
+        >>> task = ipex.cpu.runtime.Task(traced_model, cpu_pool)
+        >>> # blocking on the result
+        >>> y = task(x).get()
+        >>> # in a coroutine of asyncio, without blocking the event loop
+        >>> y = await task.run_async(x)
     """
 
     def __init__(self, module, cpu_pool: CPUPool):
@@ -34,3 +42,35 @@ class Task(object):
     def run_sync(self, *args, **kwargs):
         # sync execution
         return self._task.run_sync(*args, **kwargs)
+
+    def run_async(self, *args, **kwargs) -> asyncio.Future:
+        r"""
+        Schedules the task asynchronously and returns an awaitable, which must
+        be invoked in the thread of the running asyncio event loop. The result
+        is set to the awaitable by the event loop once the task is done, so no
+        thread is blocked on the pending tasks.
+
+        Returns:
+            asyncio.Future: The future of the output of the task.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        future_tensor = None
+
+        def set_result():
+            if future.cancelled():
+                return
+            try:
+                # the result is ready, get() does not block
+                future.set_result(future_tensor.get())
+            except Exception as e:
+                future.set_exception(e)
+
+        def done_callback():
+            # invoked in the thread of the task, wakes up the event loop
+            loop.call_soon_threadsafe(set_result)
+
+        future_tensor = self._task.run_async_with_callback(
+            done_callback, *args, **kwargs
+        )
+        return future
@@ -0,0 +1,149 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List
+
+from .cpupool import CPUPool
+from .task import Task
+from ...utils._logger import format_str
+
+
+def _parse_cores(cores_txt):
+    # Parses the cores in format of "core_id,core_id-core_id,..."
+    core_ids = []
+    for item in cores_txt.split(","):
+        if "-" in item:
+            start, end = item.split("-")
+            core_ids.extend(range(int(start), int(end) + 1))
+        else:
+            core_ids.append(int(item))
+    return core_ids
+
+
+class WeightSharingInstances(object):
+    r"""
+    WeightSharingInstances runs the instances of multi-instance inference as
+    weight-sharing streams of one process, which is launched by
+    ``ipexrun --weight-sharing``. The model is loaded and prepacked once, and
+    each instance runs it as a Task on the cores of the instance, the same
+    cores as the instance processes launched by ``ipexrun`` without
+    ``--weight-sharing``. Each instance has its own input queue, which is the
+    queue of its Task, and its own logger, which also writes to the log file of
+    the instance if ``--log-dir`` is set.
+
+    Args:
+        model (torch.jit.ScriptModule or torch.nn.Module): The input model.
+        cpu_pools (List[intel_extension_for_pytorch.cpu.runtime.CPUPool]): The
+            CPU pools of the instances. The default value is None, which takes
+            the instances from ``ipexrun --weight-sharing``.
+
+    Returns:
+        intel_extension_for_pytorch.cpu.runtime.WeightSharingInstances: Generated
+        intel_extension_for_pytorch.cpu.runtime.WeightSharingInstances object.
+
+    Examples:
+        >>> # ipexrun --throughput-mode --weight-sharing --log-dir ./logs script.py
+        >>> instances = ipex.cpu.runtime.WeightSharingInstances(traced_model)
+        >>> def run_instance(instance_idx):
+        ...     for x in dataloader:
+        ...         y = instances.submit(instance_idx, x).get()
+        ...     instances.loggers[instance_idx].info(f"Throughput: {throughput} fps")
+        >>> instances.run(run_instance)
+        >>> instances.close()
+
+    :meta public:
+    """
+
+    def __init__(self, model, cpu_pools: List[CPUPool] = None):
+        log_prefix = None
+        if cpu_pools is None:
+            from ..launch.launcher_multi_instances import (
+                WEIGHT_SHARING_INSTANCES_ENV,
+                WEIGHT_SHARING_LOG_PREFIX_ENV,
+            )
+
+            assert (
+                WEIGHT_SHARING_INSTANCES_ENV in os.environ
+            ), "cpu_pools should be provided if the program is not launched by ipexrun --weight-sharing"
+            # The instance index of ipexrun and the cores of each instance
+            instances = [
+                item.split(":")
+                for item in os.environ[WEIGHT_SHARING_INSTANCES_ENV].split(";")
+            ]
+            instances = [
+                (int(instance_id), cores_txt) for instance_id, cores_txt in instances
+            ]
+            cpu_pools = [CPUPool(_parse_cores(cores_txt)) for _, cores_txt in instances]
+            log_prefix = os.environ.get(WEIGHT_SHARING_LOG_PREFIX_ENV)
+        else:
+            for cpu_pool in cpu_pools:
+                assert (
+                    type(cpu_pool) is CPUPool
+                ), "Input of cpu_pools must be provided with type of ipex.cpu.runtime.CPUPool"
+            instances = [
+                (i, ",".join([str(core_id) for core_id in cpu_pool.core_ids]))
+                for i, cpu_pool in enumerate(cpu_pools)
+            ]
+        self.cpu_pools = cpu_pools
+        self.tasks = [Task(model, cpu_pool) for cpu_pool in cpu_pools]
+        self.loggers = []
+        # The file handlers added by this object, which are removed and closed by close()
+        self._file_handlers = []
+        for instance_id, cores_txt in instances:
+            instance_logger = logging.getLogger(f"IPEX-instance-{instance_id}")
+            instance_logger.setLevel(logging.INFO)
+            if log_prefix:
+                # The same log file as the instance process launched by ipexrun
+                log_name = os.path.abspath(
+                    f'{log_prefix}_instance_{instance_id}_cores_{cores_txt.replace(",", "_")}.log'
+                )
+                # The logger is shared by the objects of the process, which write the file once
+                if not any(
+                    isinstance(handler, logging.FileHandler)
+                    and handler.baseFilename == log_name
+                    for handler in instance_logger.handlers
+                ):
+                    file_handler = logging.FileHandler(log_name)
+                    file_handler.setFormatter(logging.Formatter(format_str))
+                    instance_logger.addHandler(file_handler)
+                    self._file_handlers.append((instance_logger, file_handler))
+            self.loggers.append(instance_logger)
+
+    def __len__(self):
+        return self.tasks.__len__()
+
+    def submit(self, instance_idx: int, *args, **kwargs):
+        r"""
+        Submits the inputs to the queue of the instance at ``instance_idx``.
+
+        Returns:
+            The future of the output, the same as ``Task.__call__``.
+        """
+        return self.tasks[instance_idx](*args, **kwargs)
+
+    def run(self, fn: Callable[[int], object]):
+        r"""
+        Runs ``fn(instance_idx)`` for each instance in its own thread, like the
+        program of each instance process, and waits for all of them.
+
+        Returns:
+            List: The return values of ``fn`` of the instances.
+        """
+        with ThreadPoolExecutor(max_workers=self.__len__()) as executor:
+            futures = [executor.submit(fn, i) for i in range(self.__len__())]
+            return [future.result() for future in futures]
+
+    def close(self):
+        r"""
+        Removes the file handlers of the log files from the loggers and closes them.
+        """
+        for instance_logger, file_handler in self._file_handlers:
+            instance_logger.removeHandler(file_handler)
+            file_handler.close()
+        self._file_handlers = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -223,6 +223,17 @@ void InitIpexModuleBindings(py::module m) {
             // Depending on this being ScriptModule of nn.Module we will release
             // the GIL or not further down in the stack
             return self.run_async(std::move(args), std::move(kwargs));
+          })
+      .def(
+          "run_async_with_callback",
+          [](torch_ipex::runtime::TaskModule& self,
+             const py::object& done_callback,
+             py::args& args,
+             py::kwargs& kwargs) {
+            // done_callback is invoked in the threadpool once the result is
+            // ready, then FutureTensor.get() returns without blocking
+            return self.run_async(
+                std::move(args), std::move(kwargs), done_callback);
           });
 
   m.def(
@@ -3,6 +3,37 @@
 namespace torch_ipex {
 namespace runtime {
 
+namespace {
+
+using DoneCallback = std::shared_ptr<py::object>;
+
+DoneCallback make_done_callback(const py::object& done_callback) {
+  // Must be invoked with GIL. The last reference of the callback may be
+  // dropped in the threadpool, so GIL is acquired to release it.
+  if (done_callback.is_none()) {
+    return nullptr;
+  }
+  return DoneCallback(new py::object(done_callback), [](py::object* callback) {
+    pybind11::gil_scoped_acquire gil_guard;
+    delete callback;
+  });
+}
+
+void invoke_done_callback(const DoneCallback& done_callback) {
+  if (!done_callback) {
+    return;
+  }
+  pybind11::gil_scoped_acquire gil_guard;
+  try {
+    (*done_callback)();
+  } catch (py::error_already_set& e) {
+    // There is no caller to raise to in the threadpool
+    e.discard_as_unraisable("TaskModule done_callback");
+  }
+}
+
+} // namespace
+
 py::object FutureTensor::get() {
   CHECK(this->script_module_initialized_ ^ this->module_initialized_);
   if (this->script_module_initialized_) {
@@ -45,8 +76,10 @@ TaskModule::~TaskModule() {
 
 std::unique_ptr<FutureTensor> TaskModule::run_async(
     py::args&& args,
-    py::kwargs&& kwargs) {
+    py::kwargs&& kwargs,
+    const py::object& done_callback) {
   CHECK(this->script_module_initialized_ ^ this->module_initialized_);
+  auto callback = make_done_callback(done_callback);
   // FutureTensor is going to return
   std::unique_ptr<FutureTensor> future_tensor_result =
       std::make_unique<FutureTensor>();
@@ -84,12 +117,13 @@ std::unique_ptr<FutureTensor> TaskModule::run_async(
         if (this->task_executor->is_stop())
           throw std::runtime_error(
               "submit TaskModule(py::object) on stopped ThreadPool");
-        this->task_executor->get_tasks().emplace([task, grad_mode]() {
+        this->task_executor->get_tasks().emplace([task, grad_mode, callback]() {
           // set the thread local status, such as the grad mode before
           // execuating the status
           at::GradMode::set_enabled(grad_mode);
           // execuate the task
           (*task)();
+          invoke_done_callback(callback);
         });
       }
       this->task_executor->get_condition().notify_one();
@@ -118,12 +152,13 @@ std::unique_ptr<FutureTensor> TaskModule::run_async(
       if (this->task_executor->is_stop())
         throw std::runtime_error(
             "submit TaskModule(py::object) on stopped ThreadPool");
-      this->task_executor->get_tasks().emplace([task, grad_mode]() {
+      this->task_executor->get_tasks().emplace([task, grad_mode, callback]() {
         // set the thread local status, such as the grad mode before execuating
         // the status
         at::GradMode::set_enabled(grad_mode);
         // execuate the task
         (*task)();
+        invoke_done_callback(callback);
       });
     }
     this->task_executor->get_condition().notify_one();
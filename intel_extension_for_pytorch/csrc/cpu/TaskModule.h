@@ -44,9 +44,12 @@ class TaskModule {
   TaskModule& operator=(TaskModule&& task_module) = delete;
   ~TaskModule();
   py::object run_sync(py::args&& args, py::kwargs&& kwargs); /*sync execution*/
+  /*async execution in threadpool, done_callback is invoked without arguments
+   * in the threadpool once the result is ready*/
   std::unique_ptr<FutureTensor> run_async(
       py::args&& args,
-      py::kwargs&& kwargs); /*async execution in threadpool*/
+      py::kwargs&& kwargs,
+      const py::object& done_callback = py::none());
  private:
   // Script module input
   torch::jit::Module script_module_;
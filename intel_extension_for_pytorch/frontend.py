@@ -33,6 +33,7 @@ from .cpu._auto_kernel_selection import (
     _disable_dnnl,
 )
 from .fx.concat_linear import _concat_linear
+from .cpu._numa import partition_weights_by_numa_node
 
 import intel_extension_for_pytorch._C as core
 from .utils._logger import logger, WarningType, warn_if_user_explicitly_set
@@ -183,6 +184,7 @@ def optimize(
     sample_input=None,
     graph_mode=None,
     concat_linear=None,
+    numa_partition=False,
 ):
     r"""
     Apply optimizations at Python frontend to the given model (nn.Module), as
@@ -274,6 +276,12 @@ def optimize(
         concat_linear (bool): Whether to perform ``concat_linear``. It only
             works for inference model. The default value is ``None``. Explicitly
             setting this knob overwrites the configuration set by ``level`` knob.
+        numa_partition (bool): Whether to bind the slices of the output channels of the
+            prepacked weights to the NUMA nodes of the cores of the process, so that the
+            cores of every node read the slice of the weights they compute with from the
+            local memory. It works for the inference model on CPU that spans the NUMA nodes,
+            with the OpenMP threads pinned to the cores in order, e.g., by ``ipexrun``.
+            The default value is ``False``.
 
     Returns:
         Model and optimizer (if given) modified according to the ``level`` knob
@@ -579,6 +587,15 @@ def optimize(
         torch._dynamo.allow_in_graph(_IPEXConvTranspose3d)
         torch._dynamo.allow_in_graph(_IPEXLinear)
 
+    if numa_partition:
+        if optimizer is None and device_type == "cpu":
+            partition_weights_by_numa_node(optimized_model)
+        else:
+            logger.warning(
+                "numa_partition only works for the inference model on CPU",
+                _type=WarningType.NotSupported,
+            )
+
     if opt_properties.graph_mode:
         _old_forward = optimized_model.forward
         wrapper = GraphCapture(
@@ -2,6 +2,8 @@ import warnings
 from .frontend import optimize
 from . import modules
 from . import functional
+from . import serving
+from . import metrics
 
 try:
     from . import generation
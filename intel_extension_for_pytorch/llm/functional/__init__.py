@@ -5,3 +5,4 @@ from .fusions import (
     indirect_access_kv_cache_attention,
     varlen_attention,
 )
+from .sampling import top_k_top_p_sampling
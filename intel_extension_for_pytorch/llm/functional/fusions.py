@@ -93,6 +93,11 @@ def indirect_access_kv_cache_attention(
     add_casual_mask: Optional[bool] = True,
     seq_info: Optional[torch.Tensor] = None,
     text_max_length: Optional[int] = 0,
+    prefill_chunk_size: Optional[int] = 0,
+    kv_cache_dtype: Optional[torch.dtype] = None,
+    attention_sink_size: Optional[int] = 0,
+    sliding_window_size: Optional[int] = 0,
+    rotary_embedding: Optional[RotaryEmbedding] = None,
 ):
     r"""
     kv_cache is used to reduce computation for **Decoder** layer but it also brings memory overheads,
@@ -121,6 +126,26 @@ def indirect_access_kv_cache_attention(
     - head_mask (torch.Tensor): Head mask tensor which is not supported by kernel yet.
     - attention_mask(torch.Tensor): Attention mask information.
     - text_max_length (int) : the max length of kv cache to be used for generation (allocate the pre-cache buffer).
+                              A negative value sizes the buffer by the first dim of beam-idx of the first token.
+    - prefill_chunk_size (int) : if larger than 0, the first token of a long prompt is computed in chunks of
+                                 prefill_chunk_size tokens, each chunk being appended to the kv cache, to bound
+                                 the memory of the attention weights. It is not applied during jit tracing.
+                                 Default is 0 (disabled).
+    - kv_cache_dtype (torch.dtype) : the data type to store the key/value buffers, which could be torch.int8
+                                     (symmetric quantization with a scale per token per head), torch.float8_e4m3fn
+                                     or torch.float8_e5m2. Default is None, i.e., the data type of key/value.
+    - attention_sink_size (int) : used with sliding_window_size, the number of tokens from the start of the
+                                  sequence (attention sinks) which are always kept in the kv cache. Default is 0.
+    - sliding_window_size (int) : if larger than 0, the kv cache only keeps the attention sinks and the last
+                                  sliding_window_size tokens, for streaming generation beyond the context length.
+                                  The key/value buffers are a ring of attention_sink_size + sliding_window_size
+                                  tokens whose window slots are reused in place, and every query only attends to
+                                  the sinks and the tokens of its window. Beam search is not supported.
+                                  Default is 0 (disabled).
+    - rotary_embedding (ipex.llm.modules.RotaryEmbedding) : the rotary embedding applied on the query/key, which
+                                  should be called before the attention. If given, the query is rotated back for
+                                  the attention sinks by the number of evicted tokens, so the sinks stay right
+                                  before the window in the rotary positions. Default is None.
 
     Return:
     - attn_output:  weighted value which is the output of scale dot product. shape (beam*batch, seq_len, head_num, head_size).
@@ -153,6 +178,11 @@ def indirect_access_kv_cache_attention(
         add_casual_mask,
         seq_info,
         text_max_length,
+        prefill_chunk_size,
+        kv_cache_dtype,
+        attention_sink_size,
+        sliding_window_size,
+        rotary_embedding,
     )
 
 
@@ -0,0 +1,101 @@
+from typing import Tuple, Union
+import torch
+
+# The initial number of the candidates of top-p without top-k, which is doubled until the
+# candidates cover top_p of the probability mass.
+_TOP_P_CANDIDATES = 1024
+
+
+def _top_k_top_p_candidates(
+    scores: torch.Tensor,
+    temperature: Union[float, torch.Tensor] = 1.0,
+    top_k: Union[int, torch.Tensor] = 0,
+    top_p: Union[float, torch.Tensor] = 1.0,
+    min_tokens_to_keep: int = 1,
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    r"""
+    Applies temperature, top-k and top-p on the scores of shape [batch, vocab_size] at once, which is
+    the same as the TemperatureLogitsWarper, TopKLogitsWarper and TopPLogitsWarper of HF in order.
+    Returns the (scores, token ids) of the candidate tokens, of shape [batch, num_candidates], where
+    the filtered ones are -inf. The candidates are selected with torch.topk instead of sorting the
+    whole vocabulary, and the probabilities of top-p are only computed on the candidates.
+    """
+    batch_size, vocab_size = scores.shape
+    scores = scores.float()
+    device = scores.device
+    temperature = torch.as_tensor(temperature, dtype=torch.float, device=device)
+    temperature = temperature.expand(batch_size)
+    top_k = torch.as_tensor(top_k, dtype=torch.long, device=device).expand(batch_size)
+    top_k = top_k.masked_fill((top_k <= 0) | (top_k > vocab_size), vocab_size)
+    top_p = torch.as_tensor(top_p, dtype=torch.float, device=device).expand(batch_size)
+    if bool((temperature != 1.0).any()):
+        scores = scores / temperature.unsqueeze(-1)
+    has_top_k = top_k < vocab_size
+    has_top_p = top_p < 1.0
+    if not bool((has_top_k | has_top_p).all()):
+        # some sequences sample from the whole vocabulary
+        num_candidates = vocab_size
+    else:
+        num_candidates = int(
+            torch.where(has_top_k, top_k, min(_TOP_P_CANDIDATES, vocab_size)).max()
+        )
+    if num_candidates == vocab_size and not bool(has_top_p.any()):
+        indices = torch.arange(vocab_size, device=device).expand(batch_size, -1)
+        return scores, indices
+    # top-p without top-k takes the probabilities over the whole vocabulary
+    lse = None
+    if bool((has_top_p & ~has_top_k).any()):
+        lse = torch.logsumexp(scores, dim=-1)
+    while True:
+        values, indices = scores.topk(num_candidates, dim=-1)
+        positions = torch.arange(num_candidates, device=device)
+        values = values.masked_fill(positions >= top_k.unsqueeze(-1), float("-inf"))
+        if not bool(has_top_p.any()):
+            return values, indices
+        candidates_lse = torch.logsumexp(values, dim=-1)
+        if lse is not None:
+            candidates_lse = torch.where(has_top_k, candidates_lse, lse)
+        probs = (values - candidates_lse.unsqueeze(-1)).exp()
+        cumulative_probs = probs.cumsum(dim=-1)
+        if num_candidates < vocab_size and bool(
+            (has_top_p & ~has_top_k & (cumulative_probs[:, -1] < top_p)).any()
+        ):
+            num_candidates = min(2 * num_candidates, vocab_size)
+            continue
+        # the tokens after the ones covering top_p of the probability mass are removed
+        remove = (cumulative_probs - probs >= top_p.unsqueeze(-1)) & (
+            positions >= min_tokens_to_keep
+        )
+        remove &= has_top_p.unsqueeze(-1)
+        return values.masked_fill(remove, float("-inf")), indices
+
+
+def top_k_top_p_sampling(
+    logits: torch.Tensor,
+    temperature: Union[float, torch.Tensor] = 1.0,
+    top_k: Union[int, torch.Tensor] = 0,
+    top_p: Union[float, torch.Tensor] = 1.0,
+    min_tokens_to_keep: int = 1,
+):
+    r"""
+    Samples the next tokens from the logits with temperature, top-k and top-p applied at once.
+    The candidate tokens are partially selected instead of sorting the whole vocabulary, and the
+    softmax and multinomial sampling are only computed on the candidates.
+    Args:
+    - logits (torch.Tensor) : the logits of the last position of shape [batch, vocab_size].
+    - temperature (float or torch.Tensor) : the temperature, or the ones of shape [batch] per sequence.
+    - top_k (int or torch.Tensor) : the number of the highest probability tokens to keep, 0 to keep all,
+                                    or the ones of shape [batch] per sequence.
+    - top_p (float or torch.Tensor) : keeps the smallest set of the most probable tokens whose probabilities
+                                      add up to top_p or higher, 1.0 to keep all, or the ones of shape [batch]
+                                      per sequence.
+    - min_tokens_to_keep (int) : the minimal number of tokens kept by top-p.
+    Return
+    - next_tokens (torch.Tensor): the sampled token ids of shape [batch].
+
+    """
+    values, indices = _top_k_top_p_candidates(
+        logits, temperature, top_k, top_p, min_tokens_to_keep
+    )
+    probs = torch.softmax(values, dim=-1)
+    return indices.gather(-1, torch.multinomial(probs, num_samples=1)).squeeze(-1)
@@ -1 +1,7 @@
-from .hf_function import hf_greedy_search, hf_beam_search, hf_beam_sample, hf_sample
+from .hf_function import (
+    hf_greedy_search,
+    hf_beam_search,
+    hf_beam_sample,
+    hf_sample,
+    hf_assisted_decoding,
+)
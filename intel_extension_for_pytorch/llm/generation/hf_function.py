@@ -8,8 +8,12 @@ from intel_extension_for_pytorch.transformers.generation.sample import (
 from intel_extension_for_pytorch.transformers.generation.beam_sample import (
     _beam_sample,
 )
+from intel_extension_for_pytorch.transformers.generation.assisted_decoding import (
+    _assisted_decoding,
+)
 
 hf_greedy_search = _greedy_search
 hf_beam_search = _beam_search
 hf_sample = _sample
 hf_beam_sample = _beam_sample
+hf_assisted_decoding = _assisted_decoding
@@ -0,0 +1,309 @@
+import json
+import threading
+import time
+from typing import Dict, List, Optional, Sequence
+
+import torch
+
+_DEFAULT_LATENCY_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.075,
+    0.1,
+    0.15,
+    0.2,
+    0.3,
+    0.5,
+    0.75,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+class _Histogram:
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, values: List[float]):
+        for v in values:
+            i = 0
+            while i < len(self.buckets) and v > self.buckets[i]:
+                i += 1
+            self.counts[i] += 1
+            self.sum += v
+        self.count += len(values)
+
+    def as_dict(self):
+        cumulative, buckets = 0, {}
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        buckets["+Inf"] = self.count
+        return {"buckets": buckets, "sum": self.sum, "count": self.count}
+
+
+def _kv_cache_nbytes(past_key_values) -> int:
+    # The indirect access kv cache of a layer is (seq_info, key_cache, value_cache, beam_idx),
+    # where seq_info only carries the sequence length in its shape.
+    if past_key_values is None:
+        return 0
+    nbytes = 0
+    for layer_past in past_key_values:
+        if isinstance(layer_past, torch.Tensor):
+            nbytes += layer_past.numel() * layer_past.element_size()
+            continue
+        if len(layer_past) >= 4 and layer_past[0].shape[-1] == 1:
+            tensors = [layer_past[1], layer_past[2]]
+            if len(layer_past) == 8:
+                # the cross attention kv cache of T5
+                tensors += [layer_past[5], layer_past[6]]
+        else:
+            tensors = [t for t in layer_past if isinstance(t, torch.Tensor)]
+        nbytes += sum(t.numel() * t.element_size() for t in tensors)
+    return nbytes
+
+
+class _GenerationRecorder:
+    r"""
+    Records one call of a generation loop. The step latencies are host timestamps and the
+    number of active sequences is accumulated by a tensor op, so recording never reads a
+    tensor value back while generating.
+    """
+
+    def __init__(self, metrics, batch_size: int, prompt_len: int):
+        self.metrics = metrics
+        self.batch_size = batch_size
+        self.prompt_len = prompt_len
+        self.start = time.time()
+        self.ttft = None
+        self.latencies: List[float] = []
+        # the sequences which generate tokens in a step are the ones unfinished
+        # after the previous step
+        self.active_sequences = torch.zeros((), dtype=torch.long)
+        self.generated_tokens = torch.zeros((), dtype=torch.long)
+        self.last_unfinished = None
+
+    def step(
+        self,
+        latency: float,
+        unfinished_sequences: Optional[torch.Tensor] = None,
+        num_tokens: int = 1,
+    ):
+        if self.ttft is None:
+            self.ttft = time.time() - self.start
+        self.latencies.append(latency)
+        active = (
+            self.batch_size if self.last_unfinished is None else self.last_unfinished
+        )
+        self.active_sequences.add_(active)
+        self.generated_tokens.add_(active * num_tokens)
+        if unfinished_sequences is not None:
+            self.last_unfinished = unfinished_sequences.sum()
+
+    def finish(self, past_key_values=None):
+        self.metrics._add_generation(
+            batch_size=self.batch_size,
+            prompt_len=self.prompt_len,
+            ttft=self.ttft if self.ttft is not None else 0.0,
+            latencies=self.latencies,
+            active_sequences=int(self.active_sequences),
+            generated_tokens=int(self.generated_tokens),
+            kv_cache_bytes=_kv_cache_nbytes(past_key_values),
+        )
+
+
+class GenerationMetrics:
+    r"""
+    Token-level latency and throughput metrics of the generation loops of ``ipex.llm``
+    optimized models (greedy search, sample, beam search, beam sample and assisted decoding).
+    Once enabled, every ``model.generate`` call is recorded, without wrapping the model:
+
+    - time to first token (TTFT), i.e., prefill latency of every ``generate`` call (histogram).
+    - next token latency of every decoding step (histogram).
+    - prefill and decoding time, prompt tokens and generated tokens (counters).
+    - decoding throughput in tokens/s, KV cache bytes and batch occupancy (the ratio of the
+      sequences still generating at every step, before they stop at EOS) of the last call (gauges).
+
+    The metrics of the process are collected in ``ipex.llm.metrics.generation_metrics``.
+
+    Args:
+    - latency_buckets (sequence of float): the upper bounds in seconds of the latency histograms.
+
+    Examples:
+        >>> ipex.llm.metrics.generation_metrics.enable()
+        >>> model.generate(input_ids, max_new_tokens=32)
+        >>> print(ipex.llm.metrics.generation_metrics.to_prometheus())
+        >>> ipex.llm.metrics.generation_metrics.to_json("metrics.json")
+    """
+
+    def __init__(self, latency_buckets: Sequence[float] = _DEFAULT_LATENCY_BUCKETS):
+        self.enabled = False
+        self.latency_buckets = latency_buckets
+        self._lock = threading.Lock()
+        self.reset()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self._lock:
+            self.requests = 0
+            self.prompt_tokens = 0
+            self.generated_tokens = 0
+            self.prefill_seconds = 0.0
+            self.decode_seconds = 0.0
+            self.ttft_seconds = _Histogram(self.latency_buckets)
+            self.next_token_latency_seconds = _Histogram(self.latency_buckets)
+            self.tokens_per_second = 0.0
+            self.kv_cache_bytes = 0
+            self.batch_occupancy = 0.0
+
+    def _start_generation(
+        self, input_ids: torch.Tensor
+    ) -> Optional[_GenerationRecorder]:
+        if not self.enabled:
+            return None
+        return _GenerationRecorder(self, input_ids.size(0), input_ids.size(-1))
+
+    def _add_generation(
+        self,
+        batch_size,
+        prompt_len,
+        ttft,
+        latencies,
+        active_sequences,
+        generated_tokens,
+        kv_cache_bytes,
+    ):
+        if len(latencies) == 0:
+            return
+        decode_latencies = latencies[1:]
+        decode_seconds = sum(decode_latencies)
+        # the first token of every sequence is generated by the prefill
+        decode_tokens = max(generated_tokens - batch_size, 0)
+        with self._lock:
+            self.requests += batch_size
+            self.prompt_tokens += batch_size * prompt_len
+            self.generated_tokens += generated_tokens
+            self.prefill_seconds += latencies[0]
+            self.decode_seconds += decode_seconds
+            self.ttft_seconds.observe([ttft])
+            self.next_token_latency_seconds.observe(decode_latencies)
+            self.tokens_per_second = (
+                decode_tokens / decode_seconds if decode_seconds > 0 else 0.0
+            )
+            self.kv_cache_bytes = kv_cache_bytes
+            self.batch_occupancy = active_sequences / (batch_size * len(latencies))
+
+    def as_dict(self) -> Dict:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "prompt_tokens": self.prompt_tokens,
+                "generated_tokens": self.generated_tokens,
+                "prefill_seconds": self.prefill_seconds,
+                "decode_seconds": self.decode_seconds,
+                "ttft_seconds": self.ttft_seconds.as_dict(),
+                "next_token_latency_seconds": self.next_token_latency_seconds.as_dict(),
+                "tokens_per_second": self.tokens_per_second,
+                "kv_cache_bytes": self.kv_cache_bytes,
+                "batch_occupancy": self.batch_occupancy,
+            }
+
+    def to_json(self, path: Optional[str] = None) -> str:
+        r"""
+        Returns the metrics as a JSON string, which is also written to ``path`` if given.
+        """
+        text = json.dumps(self.as_dict(), indent=2)
+        if path is not None:
+            with open(path, "w") as f:
+                f.write(text)
+        return text
+
+    def to_prometheus(self, prefix: str = "ipex_llm") -> str:
+        r"""
+        Returns the metrics in the Prometheus text exposition format.
+        """
+        metrics = self.as_dict()
+        lines = []
+
+        def add(name, kind, help_text, value):
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+            if kind != "histogram":
+                lines.append(f"{prefix}_{name} {value}")
+                return
+            for bound, count in value["buckets"].items():
+                lines.append(f'{prefix}_{name}_bucket{{le="{bound}"}} {count}')
+            lines.append(f"{prefix}_{name}_sum {value['sum']}")
+            lines.append(f"{prefix}_{name}_count {value['count']}")
+
+        add("requests_total", "counter", "Generated sequences.", metrics["requests"])
+        add(
+            "prompt_tokens_total",
+            "counter",
+            "Prompt tokens.",
+            metrics["prompt_tokens"],
+        )
+        add(
+            "generated_tokens_total",
+            "counter",
+            "Generated tokens.",
+            metrics["generated_tokens"],
+        )
+        add(
+            "prefill_seconds_total",
+            "counter",
+            "Time spent in the prefill.",
+            metrics["prefill_seconds"],
+        )
+        add(
+            "decode_seconds_total",
+            "counter",
+            "Time spent in the decoding steps.",
+            metrics["decode_seconds"],
+        )
+        add(
+            "time_to_first_token_seconds",
+            "histogram",
+            "Time to first token.",
+            metrics["ttft_seconds"],
+        )
+        add(
+            "next_token_latency_seconds",
+            "histogram",
+            "Latency of the decoding steps.",
+            metrics["next_token_latency_seconds"],
+        )
+        add(
+            "tokens_per_second",
+            "gauge",
+            "Decoding throughput of the last generation.",
+            metrics["tokens_per_second"],
+        )
+        add(
+            "kv_cache_bytes",
+            "gauge",
+            "KV cache bytes of the last generation.",
+            metrics["kv_cache_bytes"],
+        )
+        add(
+            "batch_occupancy",
+            "gauge",
+            "Ratio of the active sequences in the steps of the last generation.",
+            metrics["batch_occupancy"],
+        )
+        return "\n".join(lines) + "\n"
+
+
+generation_metrics = GenerationMetrics()
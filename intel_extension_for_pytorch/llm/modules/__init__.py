@@ -17,3 +17,4 @@ from .mha_fusion import (
     PagedAttention,
     VarlenAttention,
 )
+from .lora import LoRAAdapterCache, LoRALinear
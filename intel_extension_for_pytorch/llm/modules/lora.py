@@ -0,0 +1,276 @@
+import contextlib
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import torch
+import torch.nn as nn
+
+
+class LoRAAdapterCache:
+    r"""
+    An LRU cache of LoRA adapters shared by the ``LoRALinear`` modules of a model. The low-rank
+    weights of the cached adapters are stacked per layer into ``max_num_adapters`` slots, so the
+    sequences of one batch could use different adapters on top of the same base weights, which
+    stay prepacked or weight-only quantized. The adapters are added, replaced or removed at any time,
+    and the adapters not cached are loaded into the least recently used slot on demand.
+    Args:
+        max_num_adapters (int) : the number of the adapter slots.
+        max_rank (int) : the max rank of the adapters.
+        dtype (torch.dtype) : the data type of the adapter weights, which should be the same as the
+            activations of the model. Default is torch.float.
+        loader (callable, optional) : loads the adapter not added yet, which is called as
+            ``loader(adapter_id)`` and returns ``(state_dict, scaling)``.
+    Examples:
+        >>> adapter_cache = ipex.llm.modules.LoRAAdapterCache(16, 64, dtype=torch.bfloat16)
+        >>> model = adapter_cache.apply(model, ["q_proj", "k_proj", "v_proj", "o_proj"])
+        >>> adapter_cache.add_adapter("sql", peft_state_dict, scaling=lora_alpha / r)
+        >>> # the adapter of every sequence, None for the base model
+        >>> with adapter_cache.activate(["sql", None, "sql"]):
+        >>>     logits = model(input_ids)
+    """
+
+    def __init__(
+        self,
+        max_num_adapters: int,
+        max_rank: int,
+        dtype: torch.dtype = torch.float,
+        loader: Optional[Callable] = None,
+    ):
+        assert max_num_adapters > 0, "max_num_adapters should be a positive integer"
+        self.max_num_adapters = max_num_adapters
+        self.max_rank = max_rank
+        self.dtype = dtype
+        self.loader = loader
+        # layer name -> (lora_a [slots, max_rank, in_features], lora_b [slots, out_features, max_rank])
+        self.layers: Dict[str, Tuple[torch.Tensor, torch.Tensor]] = {}
+        self.adapters: Dict[str, Tuple[Dict[str, torch.Tensor], float]] = {}
+        # adapter id -> slot, in the order of the last use
+        self.slots: "OrderedDict[str, int]" = OrderedDict()
+        self.ranks = [0] * max_num_adapters
+        self.scalings = [0.0] * max_num_adapters
+        self.loaded_adapters = set()
+        # adapter id -> the number of times the adapter was replaced or removed
+        self.versions: Dict[str, int] = {}
+        self.token_slots: Optional[torch.Tensor] = None
+        self.num_loads = 0
+
+    def register_layer(self, name: str, in_features: int, out_features: int):
+        self.layers[name] = (
+            torch.zeros(
+                self.max_num_adapters, self.max_rank, in_features, dtype=self.dtype
+            ),
+            torch.zeros(
+                self.max_num_adapters, out_features, self.max_rank, dtype=self.dtype
+            ),
+        )
+
+    def apply(self, model: nn.Module, target_modules: Sequence[str]) -> nn.Module:
+        r"""
+        Wraps the linear modules of the model named one of ``target_modules``, e.g., "q_proj",
+        with ``LoRALinear``.
+        """
+        for name, module in list(model.named_modules()):
+            for child_name, child in list(module.named_children()):
+                full_name = f"{name}.{child_name}" if name else child_name
+                if child_name in target_modules and not isinstance(child, LoRALinear):
+                    setattr(module, child_name, LoRALinear(child, self, full_name))
+        return model
+
+    def _get_layer_weights(self, state_dict, name):
+        # the state_dict saved by PEFT, e.g., "base_model.model.model.layers.0.self_attn.q_proj.lora_A.weight"
+        weights = []
+        for suffix in [f"{name}.lora_A.weight", f"{name}.lora_B.weight"]:
+            weights.append(
+                next(
+                    (
+                        value
+                        for key, value in state_dict.items()
+                        if key == suffix or key.endswith(f".{suffix}")
+                    ),
+                    None,
+                )
+            )
+        return weights
+
+    def add_adapter(
+        self, adapter_id: str, state_dict: Dict[str, torch.Tensor], scaling: float = 1.0
+    ):
+        r"""
+        Adds or replaces an adapter. ``state_dict`` carries the ``<layer name>.lora_A.weight`` of
+        shape [rank, in_features] and ``<layer name>.lora_B.weight`` of shape [out_features, rank]
+        of the adapted layers, e.g., the state_dict saved by PEFT.
+        """
+        # the outputs computed with the old weights, e.g., the cached KV, are not valid any longer
+        if adapter_id in self.adapters:
+            self._bump_version(adapter_id)
+        self._add_adapter(adapter_id, state_dict, scaling)
+
+    def _add_adapter(self, adapter_id, state_dict, scaling):
+        layer_weights = {}
+        for name in self.layers:
+            lora_a, lora_b = self._get_layer_weights(state_dict, name)
+            if lora_a is None or lora_b is None:
+                continue
+            assert (
+                lora_a.size(0) <= self.max_rank
+            ), f"The rank {lora_a.size(0)} of {name} is larger than max_rank {self.max_rank}"
+            layer_weights[name] = (lora_a, lora_b)
+        assert (
+            len(layer_weights) > 0
+        ), f"No LoRA weights of adapter {adapter_id} are found"
+        self.adapters[adapter_id] = (layer_weights, scaling)
+        if adapter_id in self.slots:
+            self._load(adapter_id, self.slots[adapter_id])
+
+    def remove_adapter(self, adapter_id: str):
+        self._bump_version(adapter_id)
+        self.adapters.pop(adapter_id, None)
+        self.loaded_adapters.discard(adapter_id)
+        slot = self.slots.pop(adapter_id, None)
+        if slot is not None:
+            self.ranks[slot] = 0
+
+    def _bump_version(self, adapter_id):
+        self.versions[adapter_id] = self.versions.get(adapter_id, 0) + 1
+
+    def get_version(self, adapter_id: str) -> int:
+        r"""
+        Returns the version of the adapter, which changes whenever the adapter is replaced or
+        removed, so the outputs computed with an adapter could be cached along with its version.
+        """
+        return self.versions.get(adapter_id, 0)
+
+    def _load(self, adapter_id, slot):
+        layer_weights, scaling = self.adapters[adapter_id]
+        rank = 0
+        for name, (lora_a, lora_b) in self.layers.items():
+            lora_a[slot].zero_()
+            lora_b[slot].zero_()
+            if name in layer_weights:
+                a, b = layer_weights[name]
+                lora_a[slot, : a.size(0)].copy_(a)
+                lora_b[slot, :, : b.size(1)].copy_(b)
+                rank = max(rank, a.size(0))
+        self.ranks[slot] = rank
+        self.scalings[slot] = scaling
+        self.num_loads += 1
+
+    def get_slots(self, adapter_ids: List[Optional[str]]) -> torch.Tensor:
+        r"""
+        Returns the slots of the adapters, -1 for None, i.e., the base model. The adapters not
+        cached are loaded into the free slots or the least recently used ones.
+        """
+        in_use = list(dict.fromkeys(a for a in adapter_ids if a is not None))
+        assert (
+            len(in_use) <= self.max_num_adapters
+        ), f"{len(in_use)} adapters in one batch exceed max_num_adapters {self.max_num_adapters}"
+        for adapter_id in in_use:
+            if adapter_id in self.slots:
+                self.slots.move_to_end(adapter_id)
+                continue
+            if adapter_id not in self.adapters:
+                assert self.loader is not None, f"Adapter {adapter_id} is not added"
+                state_dict, scaling = self.loader(adapter_id)
+                self._add_adapter(adapter_id, state_dict, scaling)
+                self.loaded_adapters.add(adapter_id)
+            used_slots = set(self.slots.values())
+            free_slots = [
+                s for s in range(self.max_num_adapters) if s not in used_slots
+            ]
+            if len(free_slots) > 0:
+                slot = free_slots[0]
+            else:
+                evicted = next(a for a in self.slots if a not in in_use)
+                slot = self.slots.pop(evicted)
+                # the adapters from the loader are loaded again once used
+                if evicted in self.loaded_adapters:
+                    self.loaded_adapters.discard(evicted)
+                    self.adapters.pop(evicted)
+            self._load(adapter_id, slot)
+            self.slots[adapter_id] = slot
+        return torch.tensor(
+            [-1 if a is None else self.slots[a] for a in adapter_ids], dtype=torch.long
+        )
+
+    @contextlib.contextmanager
+    def activate(
+        self,
+        adapter_ids: List[Optional[str]],
+        num_tokens: Optional[List[int]] = None,
+    ):
+        r"""
+        Applies the adapters to the sequences of the batch inside the context.
+        Args:
+            adapter_ids (list) : the adapter of every sequence, None for the base model.
+            num_tokens (list, optional) : the number of tokens of every sequence if the tokens of the
+                sequences are packed into one dimension, otherwise every sequence has the same number
+                of tokens, i.e., the inputs are of shape [batch_size, seq_len, ...].
+        """
+        slots = self.get_slots(adapter_ids)
+        if num_tokens is not None:
+            slots = slots.repeat_interleave(torch.tensor(num_tokens, dtype=torch.long))
+        previous_slots = self.token_slots
+        self.token_slots = slots
+        try:
+            yield
+        finally:
+            self.token_slots = previous_slots
+
+
+class LoRALinear(nn.Module):
+    r"""
+    Applies the LoRA adapters of the sequences on top of a linear module:
+        result = linear(input) + scaling[i] * (input @ lora_a[i].T) @ lora_b[i].T
+    where i is the adapter slot of every token activated by ``LoRAAdapterCache.activate``.
+    The tokens of the batch are grouped by their adapters, so every adapter used by the batch
+    is applied with two GEMMs on the gathered tokens, and the base linear, e.g., ``_IPEXLinear``
+    prepacked by ``ipex.optimize`` or ``WeightOnlyQuantizedLinear``, is shared by all the adapters.
+    Args:
+        linear (torch.nn.Module) : the base linear module, which has ``in_features`` and ``out_features``.
+        adapter_cache (LoRAAdapterCache) : the adapter cache shared by the layers of the model.
+        name (str) : the name of the layer in the state_dict of the adapters.
+    Shape:
+        Input and output shapes are the same as torch.nn.Linear.
+    """
+
+    def __init__(self, linear: nn.Module, adapter_cache: LoRAAdapterCache, name: str):
+        super().__init__()
+        self.linear = linear
+        self.adapter_cache = adapter_cache
+        self.name = name
+        adapter_cache.register_layer(name, linear.in_features, linear.out_features)
+
+    def forward(self, x):
+        output = self.linear(x)
+        slots = self.adapter_cache.token_slots
+        if slots is None:
+            return output
+        lora_a, lora_b = self.adapter_cache.layers[self.name]
+        shape = output.shape
+        x = x.reshape(-1, x.size(-1))
+        output = output.reshape(-1, output.size(-1))
+        if slots.numel() != x.size(0):
+            # one adapter per sequence of the inputs of shape [batch_size, seq_len, ...]
+            slots = slots.repeat_interleave(x.size(0) // slots.numel())
+        for slot in slots.unique().tolist():
+            rank = self.adapter_cache.ranks[slot] if slot >= 0 else 0
+            if rank == 0:
+                continue
+            scaling = self.adapter_cache.scalings[slot]
+            if slots.numel() == 1 or bool((slots == slot).all()):
+                hidden = nn.functional.linear(x, lora_a[slot, :rank])
+                output = output + scaling * nn.functional.linear(
+                    hidden, lora_b[slot, :, :rank]
+                )
+            else:
+                index = (slots == slot).nonzero().squeeze(1)
+                hidden = nn.functional.linear(
+                    x.index_select(0, index), lora_a[slot, :rank]
+                )
+                output = output.index_add(
+                    0,
+                    index,
+                    nn.functional.linear(hidden, lora_b[slot, :, :rank]),
+                    alpha=scaling,
+                )
+        return output.view(shape)
@@ -404,7 +404,8 @@ class PagedAttention:
     The block tables are used to map the logical block of sequence into the physical block.
 
     [class method]: reshape_and_cache
-    ipex.llm.modules.PagedAttention.reshape_and_cache(key,  value,  key_cache, value_cache, slot_mapping)
+    ipex.llm.modules.PagedAttention.reshape_and_cache(key,  value,  key_cache, value_cache, slot_mapping,
+                                                      k_scale=None, v_scale=None)
     This operator is used to store the key/value token states into the pre-allcated kv_cache buffers of paged attention.
     Args:
     - key (torch.Tensor):  The keytensor. The shape should be [num_seqs, num_heads, head_size].
@@ -416,6 +417,16 @@ class PagedAttention:
     - slot_mapping (torch.Tensor):  It stores the position to store the key/value in the pre-allocated buffers.
                                     The shape should be the number of sequences. For sequence _i_, the slot_mapping[i]//block_number
                                     can get the block index, and the slot_mapping%block_size can get the offset of this block.
+    - k_scale (torch.Tensor, optional): The buffer to store the per token per head scales of the int8 key cache.
+                                        The shape should be [num_blocks, block_size, num_heads] and the data
+                                        type should be torch.float.
+    - v_scale (torch.Tensor, optional): The buffer to store the per token per head scales of the int8 value cache,
+                                        with the same shape as k_scale.
+
+    The key_cache/value_cache could be allocated in low precision to reduce the memory footprint of the kv cache:
+    with torch.int8, the key/value are symmetrically quantized per token per head and k_scale/v_scale are required;
+    with torch.float8_e4m3fn or torch.float8_e5m2, the key/value are saturated to the range of the format and no
+    scale is needed.
 
     [class method]: single_query_cached_kv_attention
     ipex.llm.modules.PagedAttention.single_query_cached_kv_attention(
@@ -429,7 +440,9 @@ class PagedAttention:
                                                         context_lens,
                                                         block_size,
                                                         max_context_len,
-                                                        alibi_slopes
+                                                        alibi_slopes,
+                                                        k_scale=None,
+                                                        v_scale=None,
                                                         )
 
     This operator is used to be calculated the scale-dot-product based on the paged attention.
@@ -451,6 +464,9 @@ class PagedAttention:
     - block_size (int): The block size which means the number of token in every block.
     - max_context_len (int): The max sequence length.
     - alibi_slopes (torch.Tensor, optinal): which is the alibi slope with the shape of (num_heads).
+    - k_scale (torch.Tensor, optional): The scales of the int8 key cache stored by reshape_and_cache.
+    - v_scale (torch.Tensor, optional): The scales of the int8 value cache stored by reshape_and_cache.
+                                        The dequantization of the int8/fp8 caches is fused into the kernel.
 
     """
 
@@ -464,10 +480,14 @@ class PagedAttention:
         key_cache: torch.Tensor,
         value_cache: torch.Tensor,
         slot_mapping: torch.Tensor,
+        k_scale: torch.Tensor = None,
+        v_scale: torch.Tensor = None,
     ):
         return cls.runtime_ops.get_module_from_device(
             key.device.type, IPEXCustomOpType.PAGED_ATTENTION, False
-        ).reshape_and_cache(key, value, key_cache, value_cache, slot_mapping)
+        ).reshape_and_cache(
+            key, value, key_cache, value_cache, slot_mapping, k_scale, v_scale
+        )
 
     @classmethod
     def single_query_cached_kv_attention(
@@ -483,6 +503,8 @@ class PagedAttention:
         block_size: int,
         max_context_len: int,
         alibi_slopes: torch.Tensor,
+        k_scale: torch.Tensor = None,
+        v_scale: torch.Tensor = None,
     ):
         return cls.runtime_ops.get_module_from_device(
             output.device.type, IPEXCustomOpType.PAGED_ATTENTION, False
@@ -498,6 +520,8 @@ class PagedAttention:
             block_size,
             max_context_len,
             alibi_slopes,
+            k_scale,
+            v_scale,
         )
 
 
@@ -520,6 +544,26 @@ class IndirectAccessKVCacheAttention(nn.Module):
     Args:
     module init
     - text_max_length (int) : the max length of kv cache to be used for generation (allocate the pre-cache buffer).
+                              A negative value sizes the buffer by the first dim of beam-idx of the first token.
+    - prefill_chunk_size (int) : if larger than 0, the first token of a long prompt is computed in chunks of
+                                 prefill_chunk_size tokens, each chunk being appended to the kv cache, to bound
+                                 the memory of the attention weights. Default is 0 (disabled).
+    - kv_cache_dtype (torch.dtype) : the data type to store the key/value buffers, which could be torch.int8
+                                     (symmetric quantization with a scale per token per head), torch.float8_e4m3fn
+                                     or torch.float8_e5m2. The dequantization is fused into the attention kernel.
+                                     Default is None, i.e., the data type of key/value.
+    - attention_sink_size (int) : used with sliding_window_size, the number of tokens from the start of the
+                                  sequence (attention sinks) which are always kept in the kv cache. Default is 0.
+    - sliding_window_size (int) : if larger than 0, the kv cache only keeps the attention sinks and the last
+                                  sliding_window_size tokens, for streaming generation beyond the context length.
+                                  The key/value buffers are a ring of attention_sink_size + sliding_window_size
+                                  tokens whose window slots are reused in place, and every query only attends to
+                                  the sinks and the tokens of its window. Beam search is not supported.
+                                  Default is 0 (disabled).
+    - rotary_embedding (ipex.llm.modules.RotaryEmbedding) : the rotary embedding applied on the query/key, which
+                                  should be called before the attention. If given, the query is rotated back for
+                                  the attention sinks by the number of evicted tokens, so the sinks stay right
+                                  before the window in the rotary positions. Default is None.
 
     forward
     - query (torch.Tensor): Query tensor; shape: (beam*batch, seq_len, head_num, head_dim).
@@ -540,6 +584,10 @@ class IndirectAccessKVCacheAttention(nn.Module):
     - new_layer_past: updated layer_past (seq_info, key_cache, value_cache, beam-idx).
 
     Notes:
+    - If text_max_length is negative, the first dim of beam-idx of the first token is used as max_seq to
+      pre-allocate the key/value buffers, so the buffers can be sized by the prompt length + max_new_tokens
+      of the generation. Otherwise, text_max_length is used. The buffers grow by doubling when the
+      generation goes beyond max_seq.
     - How to reorder KV cache when using the format of IndirectAccessKVCacheAttention (e.g., on llama model
       see https://github.com/huggingface/transformers/blob/main/src/transformers/models/llama/modeling_llama.py#L1318)
         def _reorder_cache(
@@ -561,9 +609,36 @@ class IndirectAccessKVCacheAttention(nn.Module):
 
     runtime_ops: IPEXRuntimeCustomOps = IPEXRuntimeCustomOps()
 
-    def __init__(self, text_max_length=2048):
+    def __init__(
+        self,
+        text_max_length=2048,
+        prefill_chunk_size=0,
+        kv_cache_dtype=None,
+        attention_sink_size=0,
+        sliding_window_size=0,
+        rotary_embedding=None,
+    ):
         super().__init__()
         self.text_max_length = text_max_length
+        self.prefill_chunk_size = prefill_chunk_size
+        self.kv_cache_dtype = kv_cache_dtype
+        self.attention_sink_size = attention_sink_size
+        self.sliding_window_size = sliding_window_size
+        self.rotary_embedding = rotary_embedding
+
+    @classmethod
+    def _get_rope_module(cls, device_type, rotary_embedding):
+        if rotary_embedding is None:
+            return None
+        return rotary_embedding.runtime_ops.get_module_from_device(
+            device_type,
+            IPEXCustomOpType.ROPE,
+            True,
+            rotary_embedding.max_position_embeddings,
+            rotary_embedding.pos_embd_dim,
+            rotary_embedding.base,
+            rotary_embedding.model_backbone,
+        )
 
     @classmethod
     def apply_function(
@@ -579,6 +654,11 @@ class IndirectAccessKVCacheAttention(nn.Module):
         add_casual_mask: Optional[bool] = True,
         seq_info: Optional[torch.Tensor] = None,
         text_max_length: Optional[int] = 0,
+        prefill_chunk_size: Optional[int] = 0,
+        kv_cache_dtype: Optional[torch.dtype] = None,
+        attention_sink_size: Optional[int] = 0,
+        sliding_window_size: Optional[int] = 0,
+        rotary_embedding: Optional[RotaryEmbedding] = None,
     ):
         return cls.runtime_ops.get_module_from_device(
             query.device.type, IPEXCustomOpType.INDIRECTACCESS_KVCACHE_ATTENTION, False
@@ -594,6 +674,11 @@ class IndirectAccessKVCacheAttention(nn.Module):
             add_casual_mask,
             seq_info,
             text_max_length,
+            prefill_chunk_size=prefill_chunk_size,
+            kv_cache_dtype=kv_cache_dtype,
+            attention_sink_size=attention_sink_size,
+            sliding_window_size=sliding_window_size,
+            rotary_embedding=cls._get_rope_module(query.device.type, rotary_embedding),
         )
 
     def forward(
@@ -630,6 +715,11 @@ class IndirectAccessKVCacheAttention(nn.Module):
             IPEXCustomOpType.INDIRECTACCESS_KVCACHE_ATTENTION,
             True,
             self.text_max_length,
+            self.prefill_chunk_size,
+            self.kv_cache_dtype,
+            self.attention_sink_size,
+            self.sliding_window_size,
+            self._get_rope_module(query.device.type, self.rotary_embedding),
         )
         return runtime_module(
             query,
@@ -0,0 +1,6 @@
+from .sequence import Sequence, SequenceStatus, SamplingParams, RequestOutput
+from .prefix_cache import PrefixCache
+from .block_manager import BlockAllocator, BlockSpaceManager
+from .scheduler import Scheduler, SchedulerConfig, SchedulerOutput
+from .attention import PagedAttentionMetadata, paged_attention
+from .engine import LLMEngine
@@ -0,0 +1,183 @@
+from typing import List, Optional
+
+import torch
+
+from ..modules import PagedAttention
+
+
+class PagedAttentionMetadata:
+    r"""
+    Describes how the tokens of one engine step are packed into a single forward pass.
+    The prefill tokens of all the admitted sequences come first (sequence by sequence),
+    followed by one token for every decoding sequence.
+
+    Attributes:
+    - num_prefills (int): the number of prefill sequences.
+    - num_prefill_tokens (int): the number of tokens of all the prefill sequences.
+    - prefill_start_loc (list(int)): [num_prefills + 1], the start offset of every prefill sequence
+                                     inside the packed tokens.
+    - slot_mapping (torch.Tensor): [num_tokens], the cache slot of every packed token.
+    - block_tables (torch.Tensor): [num_decodes, max_num_blocks_per_seq], block tables of the decoding sequences.
+    - context_lens (torch.Tensor): [num_decodes], context length (including the current token) of the
+                                   decoding sequences.
+    - max_context_len (int): the max value of context_lens.
+    - last_token_indices (torch.Tensor): [num_seqs], the index of the last token of every sequence inside
+                                         the packed tokens, which is used to select the logits to sample.
+    - prefill_num_cached_tokens (list(int), optional): [num_prefills], the number of leading tokens of every
+                                                       prefill sequence whose key/value are already in the
+                                                       cache (prefix caching hits). These tokens are not part
+                                                       of the packed tokens.
+    - prefill_block_tables (list(list(int)), optional): [num_prefills], block tables of the prefill sequences,
+                                                        needed when prefill_num_cached_tokens is not all zero.
+    """
+
+    def __init__(
+        self,
+        num_prefills: int,
+        num_prefill_tokens: int,
+        prefill_start_loc: List[int],
+        slot_mapping: torch.Tensor,
+        block_tables: torch.Tensor,
+        context_lens: torch.Tensor,
+        max_context_len: int,
+        last_token_indices: torch.Tensor,
+        prefill_num_cached_tokens: Optional[List[int]] = None,
+        prefill_block_tables: Optional[List[List[int]]] = None,
+    ):
+        self.num_prefills = num_prefills
+        self.num_prefill_tokens = num_prefill_tokens
+        self.prefill_start_loc = prefill_start_loc
+        self.slot_mapping = slot_mapping
+        self.block_tables = block_tables
+        self.context_lens = context_lens
+        self.max_context_len = max_context_len
+        self.last_token_indices = last_token_indices
+        self.prefill_num_cached_tokens = (
+            prefill_num_cached_tokens
+            if prefill_num_cached_tokens is not None
+            else [0] * num_prefills
+        )
+        self.prefill_block_tables = prefill_block_tables
+
+    @property
+    def num_decodes(self) -> int:
+        return self.context_lens.size(0)
+
+
+def _gather_cached_kv(cache: torch.Tensor, block_table: List[int], num_tokens: int):
+    # cache: [num_blocks, block_size, num_kv_heads, head_size] -> [num_tokens, num_kv_heads, head_size]
+    block_size = cache.size(1)
+    num_blocks = (num_tokens + block_size - 1) // block_size
+    blocks = torch.tensor(
+        block_table[:num_blocks], dtype=torch.long, device=cache.device
+    )
+    return cache.index_select(0, blocks).flatten(0, 1)[:num_tokens]
+
+
+def paged_attention(
+    query: torch.Tensor,
+    key: torch.Tensor,
+    value: torch.Tensor,
+    key_cache: torch.Tensor,
+    value_cache: torch.Tensor,
+    attn_metadata: PagedAttentionMetadata,
+    scale: float,
+    alibi_slopes: Optional[torch.Tensor] = None,
+):
+    r"""
+    Computes the attention of one packed engine step on the paged KV cache. The key/value of all
+    the tokens are firstly stored into the cache with ``PagedAttention.reshape_and_cache``, then
+    the prefill tokens use causal attention among their own sequence (including the cached prefix,
+    if any), and the decoding tokens use ``PagedAttention.single_query_cached_kv_attention`` on
+    their cached context.
+
+    Args:
+    - query (torch.Tensor): [num_tokens, num_heads, head_size].
+    - key (torch.Tensor): [num_tokens, num_kv_heads, head_size].
+    - value (torch.Tensor): [num_tokens, num_kv_heads, head_size].
+    - key_cache/value_cache (torch.Tensor): [num_blocks, block_size, num_kv_heads, head_size].
+    - attn_metadata (PagedAttentionMetadata): the packing information of the step.
+    - scale (float): the scale used by the scale-dot-product, usually 1 / sqrt(head_size).
+    - alibi_slopes (torch.Tensor, optional): [num_heads] alibi slopes.
+
+    Return:
+    - output (torch.Tensor): [num_tokens, num_heads, head_size].
+    """
+    query = query.contiguous()
+    key = key.contiguous()
+    value = value.contiguous()
+    num_heads = query.size(1)
+    num_kv_heads = key.size(1)
+    num_queries_per_kv = num_heads // num_kv_heads
+    PagedAttention.reshape_and_cache(
+        key, value, key_cache, value_cache, attn_metadata.slot_mapping
+    )
+    output = torch.empty_like(query)
+
+    start_loc = attn_metadata.prefill_start_loc
+    for i in range(attn_metadata.num_prefills):
+        start, end = start_loc[i], start_loc[i + 1]
+        num_cached_tokens = attn_metadata.prefill_num_cached_tokens[i]
+        if num_cached_tokens > 0:
+            block_table = attn_metadata.prefill_block_tables[i]
+            context_len = num_cached_tokens + end - start
+            # the cache could be stored in fp8
+            k = _gather_cached_kv(key_cache, block_table, context_len).to(query.dtype)
+            v = _gather_cached_kv(value_cache, block_table, context_len).to(query.dtype)
+        else:
+            k = key[start:end]
+            v = value[start:end]
+        # [1, num_heads, seq_len, head_size]
+        q = query[start:end].transpose(0, 1).unsqueeze(0)
+        k = k.transpose(0, 1).unsqueeze(0)
+        v = v.transpose(0, 1).unsqueeze(0)
+        if num_queries_per_kv > 1:
+            k = k.repeat_interleave(num_queries_per_kv, dim=1)
+            v = v.repeat_interleave(num_queries_per_kv, dim=1)
+        attn_mask = None
+        if alibi_slopes is not None or num_cached_tokens > 0:
+            q_positions = torch.arange(
+                num_cached_tokens, num_cached_tokens + end - start, device=query.device
+            )
+            k_positions = torch.arange(k.size(2), device=query.device)
+            relative_positions = (k_positions[None, :] - q_positions[:, None]).to(
+                torch.float
+            )
+            attn_mask = torch.zeros_like(relative_positions).masked_fill_(
+                relative_positions > 0, float("-inf")
+            )
+            if alibi_slopes is not None:
+                attn_mask = attn_mask + alibi_slopes.view(
+                    -1, 1, 1
+                ) * relative_positions.unsqueeze(0)
+            attn_mask = attn_mask.to(query.dtype)
+        out = torch.nn.functional.scaled_dot_product_attention(
+            q,
+            k,
+            v,
+            attn_mask=attn_mask,
+            is_causal=attn_mask is None,
+            scale=scale,
+        )
+        output[start:end].copy_(out.squeeze(0).transpose(0, 1))
+
+    if attn_metadata.num_decodes > 0:
+        num_prefill_tokens = attn_metadata.num_prefill_tokens
+        head_mapping = torch.repeat_interleave(
+            torch.arange(num_kv_heads, dtype=torch.int32, device=query.device),
+            num_queries_per_kv,
+        )
+        PagedAttention.single_query_cached_kv_attention(
+            output[num_prefill_tokens:],
+            query[num_prefill_tokens:],
+            key_cache,
+            value_cache,
+            head_mapping,
+            scale,
+            attn_metadata.block_tables,
+            attn_metadata.context_lens,
+            key_cache.size(1),
+            attn_metadata.max_context_len,
+            alibi_slopes,
+        )
+    return output
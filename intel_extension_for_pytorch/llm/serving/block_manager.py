@@ -0,0 +1,219 @@
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+from .prefix_cache import PrefixCache
+from .sequence import Sequence
+
+
+class BlockAllocator:
+    r"""
+    Manages the free list of the physical blocks of the pre-allocated paged KV cache buffers
+    ([num_blocks, block_size, num_heads, head_size]). Every allocated block carries a reference
+    count so that it can be shared by several sequences. With a prefix cache, the unreferenced
+    cached blocks are kept for reuse and only reclaimed when no free block is left.
+    """
+
+    def __init__(
+        self,
+        num_blocks: int,
+        block_size: int,
+        prefix_cache: Optional[PrefixCache] = None,
+    ):
+        self.num_blocks = num_blocks
+        self.block_size = block_size
+        self.prefix_cache = prefix_cache
+        self.free_blocks = deque(range(num_blocks))
+        self.ref_counts = [0] * num_blocks
+
+    def allocate(self) -> int:
+        if self.free_blocks:
+            block = self.free_blocks.popleft()
+        elif (
+            self.prefix_cache is not None
+            and self.prefix_cache.get_num_evictable_blocks() > 0
+        ):
+            block = self.prefix_cache.evict()
+        else:
+            raise ValueError("Out of memory! No free blocks are available.")
+        self.ref_counts[block] = 1
+        return block
+
+    def fork(self, block: int) -> int:
+        if self.ref_counts[block] == 0:
+            assert self.prefix_cache is not None and self.prefix_cache.is_cached(
+                block
+            ), f"Block {block} is not allocated."
+            self.prefix_cache.remove_evictable(block)
+        self.ref_counts[block] += 1
+        return block
+
+    def free(self, block: int):
+        assert (
+            self.ref_counts[block] > 0
+        ), f"Double free! Block {block} is already freed."
+        self.ref_counts[block] -= 1
+        if self.ref_counts[block] == 0:
+            if self.prefix_cache is not None and self.prefix_cache.is_cached(block):
+                self.free_blocks.extend(self.prefix_cache.add_evictable(block))
+            else:
+                self.free_blocks.append(block)
+
+    def get_ref_count(self, block: int) -> int:
+        return self.ref_counts[block]
+
+    def get_num_free_blocks(self) -> int:
+        num_free_blocks = len(self.free_blocks)
+        if self.prefix_cache is not None:
+            num_free_blocks += self.prefix_cache.get_num_evictable_blocks()
+        return num_free_blocks
+
+
+class BlockSpaceManager:
+    r"""
+    Maps the logical token positions of every running sequence to the physical blocks of the
+    paged KV cache. The block table of a sequence is the list of physical block numbers, the slot
+    of token ``i`` is ``block_table[i // block_size] * block_size + i % block_size``, which is the
+    ``slot_mapping`` layout expected by ``ipex.llm.modules.PagedAttention.reshape_and_cache``.
+
+    With ``enable_prefix_caching``, the full blocks of a prompt are looked up in a
+    :class:`PrefixCache` and shared (with reference counting) when they match the prompt of an
+    earlier request, so only the remaining suffix needs to be prefilled. Shared blocks are never
+    written in place: appending to a block referenced by several sequences copies it first
+    (copy-on-write).
+
+    Args:
+    - num_blocks (int): the number of blocks of the pre-allocated KV cache buffers.
+    - block_size (int): the number of tokens stored in one block.
+    - watermark (float): the ratio of blocks kept free when admitting new sequences, which avoids
+                         preempting the running sequences right after a prefill.
+    - enable_prefix_caching (bool): share the KV cache blocks of identical prompt prefixes.
+    - max_num_cached_blocks (int, optional): the memory budget of the unreferenced cached blocks.
+    - adapter_cache (ipex.llm.modules.LoRAAdapterCache, optional): the LoRA adapters of the sequences, whose
+                                                                   versions are part of the prefix hashes.
+    """
+
+    def __init__(
+        self,
+        num_blocks: int,
+        block_size: int,
+        watermark: float = 0.01,
+        enable_prefix_caching: bool = False,
+        max_num_cached_blocks: Optional[int] = None,
+        adapter_cache=None,
+    ):
+        self.block_size = block_size
+        self.adapter_cache = adapter_cache
+        self.prefix_cache = (
+            PrefixCache(max_num_cached_blocks) if enable_prefix_caching else None
+        )
+        self.allocator = BlockAllocator(num_blocks, block_size, self.prefix_cache)
+        self.watermark_blocks = int(watermark * num_blocks)
+        self.block_tables: Dict[int, List[int]] = {}
+        self.num_cached_tokens: Dict[int, int] = {}
+
+    def _num_required_blocks(self, num_tokens: int) -> int:
+        return (num_tokens + self.block_size - 1) // self.block_size
+
+    def can_allocate(self, seq: Sequence) -> bool:
+        num_required_blocks = self._num_required_blocks(seq.get_len())
+        return (
+            self.allocator.get_num_free_blocks() - num_required_blocks
+            >= self.watermark_blocks
+        )
+
+    def allocate(self, seq: Sequence):
+        assert seq.seq_id not in self.block_tables, f"{seq} is already allocated."
+        token_ids = seq.token_ids
+        block_table: List[int] = []
+        num_cached_tokens = 0
+        # The last token is always computed to get the logits of the next token.
+        num_reusable_blocks = (seq.get_len() - 1) // self.block_size
+        # the KV cache computed with a LoRA adapter is only shared by the requests of the adapter,
+        # and not reused once the adapter is replaced
+        parent_hash = None
+        if seq.adapter_id is not None:
+            version = (
+                0
+                if self.adapter_cache is None
+                else self.adapter_cache.get_version(seq.adapter_id)
+            )
+            parent_hash = hash((seq.adapter_id, version))
+        for i in range(self._num_required_blocks(seq.get_len())):
+            block_token_ids = token_ids[i * self.block_size : (i + 1) * self.block_size]
+            if self.prefix_cache is None or len(block_token_ids) < self.block_size:
+                block_table.append(self.allocator.allocate())
+                continue
+            parent_hash = self.prefix_cache.hash_block(parent_hash, block_token_ids)
+            block = None
+            if i < num_reusable_blocks and num_cached_tokens == i * self.block_size:
+                block = self.prefix_cache.lookup(parent_hash)
+            if block is not None:
+                block_table.append(self.allocator.fork(block))
+                num_cached_tokens += self.block_size
+            else:
+                block = self.allocator.allocate()
+                # The key/value of the block are written by this step's forward pass before
+                # any attention reads them, so it can be shared right away.
+                self.prefix_cache.insert(parent_hash, block)
+                block_table.append(block)
+        self.block_tables[seq.seq_id] = block_table
+        self.num_cached_tokens[seq.seq_id] = num_cached_tokens
+
+    def fork(self, parent_seq: Sequence, child_seq: Sequence):
+        assert (
+            child_seq.seq_id not in self.block_tables
+        ), f"{child_seq} is already allocated."
+        block_table = self.block_tables[parent_seq.seq_id]
+        self.block_tables[child_seq.seq_id] = [
+            self.allocator.fork(block) for block in block_table
+        ]
+        self.num_cached_tokens[child_seq.seq_id] = 0
+
+    def can_append_slot(self, seq: Sequence) -> bool:
+        block_table = self.block_tables[seq.seq_id]
+        if len(block_table) >= self._num_required_blocks(seq.get_len()) and (
+            self.allocator.get_ref_count(block_table[-1]) == 1
+        ):
+            return True
+        return self.allocator.get_num_free_blocks() > 0
+
+    def append_slot(self, seq: Sequence) -> Optional[Tuple[int, int]]:
+        r"""
+        Makes sure the last token of the sequence has a writable slot. Returns the
+        (src_block, dst_block) pair to be copied if the last block had to be copied on write.
+        """
+        block_table = self.block_tables[seq.seq_id]
+        if len(block_table) < self._num_required_blocks(seq.get_len()):
+            block_table.append(self.allocator.allocate())
+            return None
+        last_block = block_table[-1]
+        if self.allocator.get_ref_count(last_block) == 1:
+            return None
+        new_block = self.allocator.allocate()
+        self.allocator.free(last_block)
+        block_table[-1] = new_block
+        return last_block, new_block
+
+    def free(self, seq: Sequence):
+        self.num_cached_tokens.pop(seq.seq_id, None)
+        block_table = self.block_tables.pop(seq.seq_id, None)
+        if block_table is None:
+            return
+        for block in block_table:
+            self.allocator.free(block)
+
+    def get_block_table(self, seq: Sequence) -> List[int]:
+        return self.block_tables[seq.seq_id]
+
+    def get_num_cached_tokens(self, seq: Sequence) -> int:
+        return self.num_cached_tokens.get(seq.seq_id, 0)
+
+    def get_slot(self, seq: Sequence, position: int) -> int:
+        block_table = self.block_tables[seq.seq_id]
+        return (
+            block_table[position // self.block_size] * self.block_size
+            + position % self.block_size
+        )
+
+    def get_num_free_blocks(self) -> int:
+        return self.allocator.get_num_free_blocks()
@@ -0,0 +1,268 @@
+import itertools
+from typing import List, Optional, Tuple
+
+import torch
+
+from ..functional import top_k_top_p_sampling
+from .attention import PagedAttentionMetadata
+from .block_manager import BlockSpaceManager
+from .scheduler import Scheduler, SchedulerConfig, SchedulerOutput
+from .sequence import RequestOutput, SamplingParams, Sequence
+
+
+class LLMEngine:
+    r"""
+    A continuous-batching generation engine on top of ``ipex.llm.modules.PagedAttention``.
+    Requests are admitted and retired at every decoding step: the prefill tokens of the newly
+    admitted requests and one token of every running request are packed into one forward pass.
+
+    Args:
+    - model (callable): the model forward, which is called as
+                        ``model(input_ids, positions, kv_caches, attn_metadata)`` and returns the
+                        logits of shape [num_tokens, vocab_size] (or [num_seqs, vocab_size] if the model
+                        only computes the logits of ``attn_metadata.last_token_indices``), where
+                        input_ids/positions are the packed tokens of shape [num_tokens], and kv_caches is
+                        a list of (key_cache, value_cache) per layer. Use
+                        ``ipex.llm.serving.paged_attention`` inside the attention layers.
+    - num_layers (int): the number of decoder layers.
+    - num_kv_heads (int): the number of key/value heads.
+    - head_size (int): the head dimension.
+    - num_blocks (int): the number of blocks of the pre-allocated KV cache of every layer.
+    - block_size (int): the number of tokens stored in one block. Default is 16.
+    - dtype (torch.dtype): data type of the KV cache. Default is torch.float.
+    - scheduler_config (SchedulerConfig, optional): the batching limits of the scheduler.
+    - enable_prefix_caching (bool): share the KV cache blocks of identical prompt prefixes among
+                                    requests, so only the uncached suffix of a prompt is prefilled.
+                                    Default is False.
+    - max_num_cached_blocks (int, optional): the memory budget (in blocks) of the prefix cache blocks
+                                             not referenced by any running request.
+    - adapter_cache (ipex.llm.modules.LoRAAdapterCache, optional): the LoRA adapters applied to the model,
+                                                                   every request could use its own
+                                                                   adapter given by ``add_request``. The
+                                                                   cached prefixes of an adapter are not
+                                                                   reused once it is replaced.
+
+    Examples:
+        >>> engine = ipex.llm.serving.LLMEngine(model, 32, 8, 128, num_blocks=2048, dtype=torch.bfloat16)
+        >>> engine.add_request(prompt_token_ids, ipex.llm.serving.SamplingParams(max_new_tokens=128))
+        >>> while engine.has_unfinished_requests():
+        >>>     for output in engine.step():
+        >>>         if output.finished:
+        >>>             print(output.output_token_ids)
+    """
+
+    def __init__(
+        self,
+        model,
+        num_layers: int,
+        num_kv_heads: int,
+        head_size: int,
+        num_blocks: int,
+        block_size: int = 16,
+        dtype: torch.dtype = torch.float,
+        scheduler_config: Optional[SchedulerConfig] = None,
+        enable_prefix_caching: bool = False,
+        max_num_cached_blocks: Optional[int] = None,
+        adapter_cache=None,
+    ):
+        self.model = model
+        self.adapter_cache = adapter_cache
+        self.block_size = block_size
+        self.kv_caches: List[Tuple[torch.Tensor, torch.Tensor]] = [
+            (
+                torch.zeros(
+                    num_blocks, block_size, num_kv_heads, head_size, dtype=dtype
+                ),
+                torch.zeros(
+                    num_blocks, block_size, num_kv_heads, head_size, dtype=dtype
+                ),
+            )
+            for _ in range(num_layers)
+        ]
+        self.block_manager = BlockSpaceManager(
+            num_blocks,
+            block_size,
+            enable_prefix_caching=enable_prefix_caching,
+            max_num_cached_blocks=max_num_cached_blocks,
+            adapter_cache=adapter_cache,
+        )
+        self.scheduler = Scheduler(
+            scheduler_config if scheduler_config is not None else SchedulerConfig(),
+            self.block_manager,
+        )
+        self.seq_counter = itertools.count()
+
+    def add_request(
+        self,
+        prompt_token_ids: List[int],
+        sampling_params: Optional[SamplingParams] = None,
+        adapter_id: Optional[str] = None,
+    ) -> int:
+        assert len(prompt_token_ids) > 0, "The prompt should not be empty"
+        assert (
+            adapter_id is None or self.adapter_cache is not None
+        ), "adapter_cache is required to serve the requests with LoRA adapters"
+        seq = Sequence(
+            next(self.seq_counter),
+            prompt_token_ids,
+            sampling_params if sampling_params is not None else SamplingParams(),
+            adapter_id,
+        )
+        self.scheduler.add_sequence(seq)
+        return seq.seq_id
+
+    def fork_request(
+        self, request_id: int, sampling_params: Optional[SamplingParams] = None
+    ) -> int:
+        r"""
+        Forks a running request into a new one which shares all its KV cache blocks. The shared
+        blocks are copied on write once the two requests diverge.
+        """
+        parent = next(
+            (seq for seq in self.scheduler.running if seq.seq_id == request_id), None
+        )
+        assert parent is not None, f"Request {request_id} is not running."
+        child = Sequence(
+            next(self.seq_counter),
+            parent.prompt_token_ids,
+            sampling_params if sampling_params is not None else parent.sampling_params,
+            parent.adapter_id,
+        )
+        child.output_token_ids = list(parent.output_token_ids)
+        child.status = parent.status
+        self.block_manager.fork(parent, child)
+        self.scheduler.running.append(child)
+        return child.seq_id
+
+    def has_unfinished_requests(self) -> bool:
+        return self.scheduler.has_unfinished_seqs()
+
+    def _prepare_inputs(self, scheduler_output: SchedulerOutput):
+        input_ids: List[int] = []
+        positions: List[int] = []
+        slot_mapping: List[int] = []
+        prefill_start_loc = [0]
+        prefill_num_cached_tokens: List[int] = []
+        prefill_block_tables: List[List[int]] = []
+        last_token_indices: List[int] = []
+        for seq in scheduler_output.prefill_seqs:
+            seq_len = seq.get_len()
+            num_cached_tokens = self.block_manager.get_num_cached_tokens(seq)
+            input_ids.extend(seq.token_ids[num_cached_tokens:])
+            positions.extend(range(num_cached_tokens, seq_len))
+            slot_mapping.extend(
+                self.block_manager.get_slot(seq, pos)
+                for pos in range(num_cached_tokens, seq_len)
+            )
+            prefill_start_loc.append(
+                prefill_start_loc[-1] + seq_len - num_cached_tokens
+            )
+            prefill_num_cached_tokens.append(num_cached_tokens)
+            prefill_block_tables.append(self.block_manager.get_block_table(seq))
+            last_token_indices.append(len(input_ids) - 1)
+
+        block_tables: List[List[int]] = []
+        context_lens: List[int] = []
+        for seq in scheduler_output.decode_seqs:
+            position = seq.get_len() - 1
+            input_ids.append(seq.get_last_token_id())
+            positions.append(position)
+            slot_mapping.append(self.block_manager.get_slot(seq, position))
+            block_tables.append(self.block_manager.get_block_table(seq))
+            context_lens.append(position + 1)
+            last_token_indices.append(len(input_ids) - 1)
+        max_num_blocks = max([len(table) for table in block_tables], default=0)
+        block_tables = [
+            table + [0] * (max_num_blocks - len(table)) for table in block_tables
+        ]
+
+        attn_metadata = PagedAttentionMetadata(
+            num_prefills=len(scheduler_output.prefill_seqs),
+            num_prefill_tokens=prefill_start_loc[-1],
+            prefill_start_loc=prefill_start_loc,
+            slot_mapping=torch.tensor(slot_mapping, dtype=torch.int),
+            block_tables=torch.tensor(block_tables, dtype=torch.int).view(
+                len(block_tables), max_num_blocks
+            ),
+            context_lens=torch.tensor(context_lens, dtype=torch.int),
+            max_context_len=max(context_lens, default=0),
+            last_token_indices=torch.tensor(last_token_indices, dtype=torch.long),
+            prefill_num_cached_tokens=prefill_num_cached_tokens,
+            prefill_block_tables=prefill_block_tables,
+        )
+        return (
+            torch.tensor(input_ids, dtype=torch.long),
+            torch.tensor(positions, dtype=torch.long),
+            attn_metadata,
+        )
+
+    def _sample(self, logits: torch.Tensor, seqs: List[Sequence]) -> List[int]:
+        logits = logits.float()
+        next_tokens = torch.argmax(logits, dim=-1)
+        temperatures = [seq.sampling_params.temperature for seq in seqs]
+        if any(t > 0 for t in temperatures):
+            sample_idx = [i for i, t in enumerate(temperatures) if t > 0]
+            params = [seqs[i].sampling_params for i in sample_idx]
+            next_tokens[sample_idx] = top_k_top_p_sampling(
+                logits[sample_idx],
+                torch.tensor([p.temperature for p in params]),
+                torch.tensor([p.top_k for p in params]),
+                torch.tensor([p.top_p for p in params]),
+            )
+        return next_tokens.tolist()
+
+    @torch.no_grad()
+    def step(self) -> List[RequestOutput]:
+        r"""
+        Runs one iteration: schedules the requests, packs the prefill and decoding tokens into
+        one forward pass, samples one token for every scheduled request and retires the finished ones.
+
+        Return:
+        - outputs (list(RequestOutput)): the outputs of the requests scheduled in this step.
+        """
+        scheduler_output = self.scheduler.schedule()
+        outputs = [RequestOutput(seq) for seq in scheduler_output.ignored_seqs]
+        if scheduler_output.is_empty():
+            return outputs
+        for src, dst in scheduler_output.blocks_to_copy:
+            for key_cache, value_cache in self.kv_caches:
+                key_cache[dst].copy_(key_cache[src])
+                value_cache[dst].copy_(value_cache[src])
+        input_ids, positions, attn_metadata = self._prepare_inputs(scheduler_output)
+        seqs = scheduler_output.prefill_seqs + scheduler_output.decode_seqs
+        if self.adapter_cache is not None:
+            start_loc = attn_metadata.prefill_start_loc
+            num_tokens = [end - begin for begin, end in zip(start_loc, start_loc[1:])]
+            num_tokens += [1] * len(scheduler_output.decode_seqs)
+            with self.adapter_cache.activate(
+                [seq.adapter_id for seq in seqs], num_tokens
+            ):
+                logits = self.model(input_ids, positions, self.kv_caches, attn_metadata)
+        else:
+            logits = self.model(input_ids, positions, self.kv_caches, attn_metadata)
+        if logits.size(0) != attn_metadata.last_token_indices.size(0):
+            logits = logits.index_select(0, attn_metadata.last_token_indices)
+        for seq, token_id in zip(seqs, self._sample(logits, seqs)):
+            seq.append_token_id(token_id)
+            outputs.append(RequestOutput(seq))
+        self.scheduler.free_finished_seqs()
+        return outputs
+
+    def generate(
+        self,
+        prompts: List[List[int]],
+        sampling_params: Optional[SamplingParams] = None,
+    ) -> List[List[int]]:
+        r"""
+        Generates the output tokens of a list of prompts with continuous batching.
+
+        Return:
+        - output_token_ids (list(list(int))): the generated tokens of every prompt, in input order.
+        """
+        request_ids = [self.add_request(prompt, sampling_params) for prompt in prompts]
+        results = {}
+        while self.has_unfinished_requests():
+            for output in self.step():
+                if output.finished:
+                    results[output.request_id] = output.output_token_ids
+        return [results[request_id] for request_id in request_ids]
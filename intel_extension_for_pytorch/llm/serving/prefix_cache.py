@@ -0,0 +1,75 @@
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence
+
+
+class PrefixCache:
+    r"""
+    Maps the hash of a full token block (chained with the hash of all the previous blocks of the
+    sequence) to the physical KV cache block holding its key/value states, so that identical
+    prompt prefixes share the same physical blocks.
+
+    Blocks that are no longer referenced by any sequence are kept in an LRU list and can still
+    be hit by later requests. They are reclaimed (least recently used first) when the allocator
+    runs out of free blocks, or when their number exceeds ``max_num_cached_blocks``.
+
+    Args:
+    - max_num_cached_blocks (int, optional): the memory budget (in blocks) of the unreferenced
+                                             cached blocks. Default is None, which means the budget
+                                             is only limited by the KV cache size.
+    """
+
+    def __init__(self, max_num_cached_blocks: Optional[int] = None):
+        self.max_num_cached_blocks = max_num_cached_blocks
+        self.cached_blocks: Dict[int, int] = {}
+        self.block_hashes: Dict[int, int] = {}
+        self.evictor: "OrderedDict[int, None]" = OrderedDict()
+        self.num_hits = 0
+        self.num_queries = 0
+
+    @staticmethod
+    def hash_block(parent_hash: Optional[int], token_ids: Sequence[int]) -> int:
+        return hash((parent_hash, tuple(token_ids)))
+
+    def lookup(self, block_hash: int) -> Optional[int]:
+        self.num_queries += 1
+        block = self.cached_blocks.get(block_hash)
+        if block is not None:
+            self.num_hits += 1
+        return block
+
+    def insert(self, block_hash: int, block: int):
+        if block_hash in self.cached_blocks or block in self.block_hashes:
+            return
+        self.cached_blocks[block_hash] = block
+        self.block_hashes[block] = block_hash
+
+    def is_cached(self, block: int) -> bool:
+        return block in self.block_hashes
+
+    def add_evictable(self, block: int) -> List[int]:
+        r"""
+        Marks an unreferenced cached block as evictable. Returns the blocks which are evicted
+        to respect the memory budget and should go back to the free list.
+        """
+        self.evictor[block] = None
+        evicted = []
+        if self.max_num_cached_blocks is not None:
+            while len(self.evictor) > self.max_num_cached_blocks:
+                evicted.append(self.evict())
+        return evicted
+
+    def remove_evictable(self, block: int):
+        self.evictor.pop(block, None)
+
+    def evict(self) -> Optional[int]:
+        if not self.evictor:
+            return None
+        block, _ = self.evictor.popitem(last=False)
+        del self.cached_blocks[self.block_hashes.pop(block)]
+        return block
+
+    def get_num_evictable_blocks(self) -> int:
+        return len(self.evictor)
+
+    def get_hit_rate(self) -> float:
+        return self.num_hits / self.num_queries if self.num_queries > 0 else 0.0
@@ -0,0 +1,121 @@
+from collections import deque
+from typing import Deque, List, NamedTuple, Tuple
+
+from ...utils._logger import logger, WarningType
+from .block_manager import BlockSpaceManager
+from .sequence import Sequence, SequenceStatus
+
+
+class SchedulerConfig:
+    r"""
+    Args:
+    - max_num_seqs (int): the max number of sequences running in one step.
+    - max_num_batched_tokens (int): the max number of tokens (prefill tokens plus one token
+                                    per decoding sequence) packed into one forward pass.
+    """
+
+    def __init__(self, max_num_seqs: int = 256, max_num_batched_tokens: int = 4096):
+        assert max_num_seqs > 0 and max_num_batched_tokens > 0
+        self.max_num_seqs = max_num_seqs
+        self.max_num_batched_tokens = max_num_batched_tokens
+
+
+class SchedulerOutput(NamedTuple):
+    prefill_seqs: List[Sequence]
+    decode_seqs: List[Sequence]
+    ignored_seqs: List[Sequence]
+    blocks_to_copy: List[Tuple[int, int]]
+
+    def is_empty(self) -> bool:
+        return not self.prefill_seqs and not self.decode_seqs
+
+
+class Scheduler:
+    r"""
+    Iteration-level scheduler. At every step all the running sequences are scheduled for one
+    decoding token first, then the waiting sequences are admitted for prefill as long as the
+    KV cache blocks and the token budget allow. When the KV cache is exhausted, the most recently
+    admitted sequences are preempted: their blocks are released and they are put back to the
+    front of the waiting queue to be recomputed later.
+    """
+
+    def __init__(self, config: SchedulerConfig, block_manager: BlockSpaceManager):
+        self.config = config
+        self.block_manager = block_manager
+        self.waiting: Deque[Sequence] = deque()
+        self.running: List[Sequence] = []
+
+    def add_sequence(self, seq: Sequence):
+        self.waiting.append(seq)
+
+    def has_unfinished_seqs(self) -> bool:
+        return bool(self.waiting) or bool(self.running)
+
+    def get_num_unfinished_seqs(self) -> int:
+        return len(self.waiting) + len(self.running)
+
+    def _preempt(self, seq: Sequence):
+        self.block_manager.free(seq)
+        seq.status = SequenceStatus.WAITING
+        self.waiting.appendleft(seq)
+
+    def schedule(self) -> SchedulerOutput:
+        # Reserve one slot for every running sequence, preempt the youngest ones if needed.
+        running = deque(sorted(self.running, key=lambda seq: seq.arrival_time))
+        decode_seqs: List[Sequence] = []
+        blocks_to_copy: List[Tuple[int, int]] = []
+        while running:
+            seq = running.popleft()
+            while not self.block_manager.can_append_slot(seq):
+                if running:
+                    self._preempt(running.pop())
+                else:
+                    self._preempt(seq)
+                    seq = None
+                    break
+            if seq is not None:
+                copy_on_write = self.block_manager.append_slot(seq)
+                if copy_on_write is not None:
+                    blocks_to_copy.append(copy_on_write)
+                decode_seqs.append(seq)
+        self.running = list(decode_seqs)
+
+        # Admit the waiting sequences for prefill under the token budget.
+        num_batched_tokens = len(decode_seqs)
+        prefill_seqs: List[Sequence] = []
+        ignored_seqs: List[Sequence] = []
+        while self.waiting:
+            if len(self.running) + len(prefill_seqs) >= self.config.max_num_seqs:
+                break
+            seq = self.waiting[0]
+            num_tokens = seq.get_len()
+            if num_tokens > self.config.max_num_batched_tokens:
+                logger.warning(
+                    f"Sequence {seq.seq_id} has {num_tokens} tokens which exceeds "
+                    f"max_num_batched_tokens={self.config.max_num_batched_tokens}, "
+                    "and it will be ignored.",
+                    _type=WarningType.WrongArgument,
+                )
+                seq.status = SequenceStatus.FINISHED_IGNORED
+                ignored_seqs.append(self.waiting.popleft())
+                continue
+            if num_batched_tokens + num_tokens > self.config.max_num_batched_tokens:
+                break
+            if not self.block_manager.can_allocate(seq):
+                break
+            self.waiting.popleft()
+            self.block_manager.allocate(seq)
+            seq.status = SequenceStatus.RUNNING
+            prefill_seqs.append(seq)
+            num_batched_tokens += num_tokens - self.block_manager.get_num_cached_tokens(
+                seq
+            )
+        self.running.extend(prefill_seqs)
+        return SchedulerOutput(prefill_seqs, decode_seqs, ignored_seqs, blocks_to_copy)
+
+    def free_finished_seqs(self) -> List[Sequence]:
+        finished = [seq for seq in self.running if seq.is_finished()]
+        for seq in finished:
+            self.block_manager.free(seq)
+        self.running = [seq for seq in self.running if not seq.is_finished()]
+        return finished
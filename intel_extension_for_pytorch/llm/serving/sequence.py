@@ -0,0 +1,123 @@
+import time
+from enum import Enum
+from typing import List, Optional, Union
+
+
+class SequenceStatus(Enum):
+    WAITING = 0
+    RUNNING = 1
+    FINISHED_STOPPED = 2
+    FINISHED_LENGTH_CAPPED = 3
+    FINISHED_IGNORED = 4
+
+    @staticmethod
+    def is_finished(status: "SequenceStatus") -> bool:
+        return status in [
+            SequenceStatus.FINISHED_STOPPED,
+            SequenceStatus.FINISHED_LENGTH_CAPPED,
+            SequenceStatus.FINISHED_IGNORED,
+        ]
+
+
+class SamplingParams:
+    r"""
+    Per-request generation parameters used by :class:`LLMEngine`.
+
+    Args:
+    - max_new_tokens (int): the max number of tokens to generate for the request.
+    - eos_token_id (int or list(int), optional): token id(s) which stop the generation.
+    - temperature (float): 0.0 means greedy search, otherwise the logits are scaled by
+                           1 / temperature before multinomial sampling.
+    - top_k (int): samples from the top_k highest probability tokens, 0 means all the tokens.
+    - top_p (float): samples from the smallest set of the most probable tokens whose probabilities
+                     add up to top_p or higher, 1.0 means all the tokens.
+    """
+
+    def __init__(
+        self,
+        max_new_tokens: int = 32,
+        eos_token_id: Optional[Union[int, List[int]]] = None,
+        temperature: float = 0.0,
+        top_k: int = 0,
+        top_p: float = 1.0,
+    ):
+        assert max_new_tokens > 0, "max_new_tokens should be a positive integer"
+        assert temperature >= 0.0, "temperature should be non-negative"
+        assert top_k >= 0, "top_k should be non-negative"
+        assert 0.0 < top_p <= 1.0, "top_p should be in (0, 1]"
+        self.max_new_tokens = max_new_tokens
+        if isinstance(eos_token_id, int):
+            eos_token_id = [eos_token_id]
+        self.eos_token_id = eos_token_id if eos_token_id is not None else []
+        self.temperature = temperature
+        self.top_k = top_k
+        self.top_p = top_p
+
+
+class Sequence:
+    r"""
+    The state of one request inside the serving engine: the prompt, the generated tokens
+    and the scheduling status.
+    """
+
+    def __init__(
+        self,
+        seq_id: int,
+        prompt_token_ids: List[int],
+        sampling_params: SamplingParams,
+        adapter_id: Optional[str] = None,
+    ):
+        self.seq_id = seq_id
+        self.prompt_token_ids = list(prompt_token_ids)
+        self.output_token_ids: List[int] = []
+        self.sampling_params = sampling_params
+        self.adapter_id = adapter_id
+        self.status = SequenceStatus.WAITING
+        self.arrival_time = time.time()
+
+    @property
+    def token_ids(self) -> List[int]:
+        return self.prompt_token_ids + self.output_token_ids
+
+    def get_len(self) -> int:
+        return len(self.prompt_token_ids) + len(self.output_token_ids)
+
+    def get_last_token_id(self) -> int:
+        if self.output_token_ids:
+            return self.output_token_ids[-1]
+        return self.prompt_token_ids[-1]
+
+    def append_token_id(self, token_id: int):
+        self.output_token_ids.append(token_id)
+        if token_id in self.sampling_params.eos_token_id:
+            self.status = SequenceStatus.FINISHED_STOPPED
+        elif len(self.output_token_ids) >= self.sampling_params.max_new_tokens:
+            self.status = SequenceStatus.FINISHED_LENGTH_CAPPED
+
+    def is_finished(self) -> bool:
+        return SequenceStatus.is_finished(self.status)
+
+    def __repr__(self):
+        return (
+            f"Sequence(seq_id={self.seq_id}, status={self.status.name}, "
+            f"num_prompt_tokens={len(self.prompt_token_ids)}, "
+            f"num_output_tokens={len(self.output_token_ids)})"
+        )
+
+
+class RequestOutput:
+    r"""
+    The output of one request returned by :meth:`LLMEngine.step`.
+    """
+
+    def __init__(self, seq: Sequence):
+        self.request_id = seq.seq_id
+        self.prompt_token_ids = seq.prompt_token_ids
+        self.output_token_ids = list(seq.output_token_ids)
+        self.finished = seq.is_finished()
+
+    def __repr__(self):
+        return (
+            f"RequestOutput(request_id={self.request_id}, "
+            f"output_token_ids={self.output_token_ids}, finished={self.finished})"
+        )
@@ -92,6 +92,24 @@ class WeightOnlyQuantizedLinear(nn.Module):
         if qconfig is None or not isinstance(qconfig, QConfigWoq):
             return mod
 
+        dtype = qconfig.weight_dtype
+        group_size = qconfig.group_size
+        if group_size == -1:
+            qweight, scales, zero_points = quantize_per_channel(
+                mod.weight, dtype, scales, zero_points
+            )
+        else:
+            qweight, scales, zero_points = quantize_per_block(
+                mod.weight, dtype, group_size, scales, zero_points
+            )
+        return cls._from_float_and_qweight(mod, qweight, scales, zero_points)
+
+    @classmethod
+    def _from_float_and_qweight(cls, mod, qweight, scales, zero_points):
+        r"""Create a weight-only quantized module from a float module with qconfig
+        and its weight quantized by quantize_per_channel or quantize_per_block
+        """
+        qconfig = mod.qconfig
         lowp_mode = qconfig.lowp_mode
         if qconfig.lowp_mode == 3 and qconfig.weight_dtype == WoqWeightDtype.INT8:
             # lowp_mode=3 (INT8) is not supported for INT8 weight
@@ -107,14 +125,6 @@ class WeightOnlyQuantizedLinear(nn.Module):
         dtype = qconfig.weight_dtype
         group_size = qconfig.group_size
 
-        if group_size == -1:
-            qweight, scales, zero_points = quantize_per_channel(
-                mod.weight, dtype, scales, zero_points
-            )
-        else:
-            qweight, scales, zero_points = quantize_per_block(
-                mod.weight, dtype, group_size, scales, zero_points
-            )
         if not hasattr(mod, "in_features"):
             mod.in_features = mod.weight.size()[1]
         if not hasattr(mod, "out_features"):
@@ -1,5 +1,9 @@
 import copy
 import functools
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from ..utils._logger import logger, WarningType
 
 import torch
@@ -16,7 +20,13 @@ from intel_extension_for_pytorch.nn.utils._weight_prepack import (
     _all_reduce_and_bias_add,
     _pre_ipex_gemm,
 )
-from ._quantize_utils import auto_prepare, auto_convert, copy_prepared_model
+from ._quantize_utils import (
+    auto_prepare,
+    auto_convert,
+    copy_prepared_model,
+    quantize_weights_batched,
+)
+from ._qconfig import QConfigWoq
 from .. import nn
 from typing import Dict
 
@@ -380,6 +390,91 @@ def may_quantize_deepspeed_modules(
     return module_mappings, qconfig_spec
 
 
+# The max bytes of the float weights quantized in one batch
+_WOQ_BATCH_BYTES = 1 << 30
+
+
+def _get_num_woq_pack_workers():
+    # The prepack op of every weight runs an OpenMP team of the intra-op threads, so the pool
+    # only adds the workers for the cores left, e.g., with OMP_NUM_THREADS smaller than the cores.
+    try:
+        num_cores = len(os.sched_getaffinity(0))
+    except AttributeError:
+        num_cores = os.cpu_count() or 1
+    return max(1, num_cores // max(1, torch.get_num_threads()))
+
+
+def _convert_woq_linears(model, qconfig, module_mappings):
+    r"""
+    Convert the linear modules of the model to weight-only quantized modules in a pipeline.
+    The weights with the same input channel, dtype and quantization config are quantized
+    in batches by quantize_weights_batched, while the quantized weights of the previous
+    batches are packed into the op contexts by a thread pool sized to the available cores.
+    """
+    batches = defaultdict(list)
+    for parent in model.modules():
+        for name, mod in parent.named_children():
+            woq_cls = module_mappings.get(type(mod), None)
+            if woq_cls is None or not issubclass(
+                woq_cls, nn.modules.weight_only_quantization.WeightOnlyQuantizedLinear
+            ):
+                continue
+            mod_qconfig = getattr(mod, "qconfig", qconfig)
+            if not isinstance(mod_qconfig, QConfigWoq):
+                continue
+            mod.qconfig = mod_qconfig
+            key = (
+                mod.weight.size(1),
+                mod.weight.dtype,
+                mod_qconfig.weight_dtype,
+                mod_qconfig.group_size,
+            )
+            batches[key].append((parent, name, mod, woq_cls))
+
+    def pack(mod, woq_cls, qweight, scales, zero_points):
+        start = time.time()
+        qlinear = woq_cls._from_float_and_qweight(mod, qweight, scales, zero_points)
+        return qlinear, time.time() - start
+
+    start = time.time()
+    quantize_seconds = 0.0
+    futures = []
+    num_workers = _get_num_woq_pack_workers()
+    with torch.no_grad(), ThreadPoolExecutor(max_workers=num_workers) as pool:
+        for (_, _, weight_dtype, group_size), mods in batches.items():
+            i = 0
+            while i < len(mods):
+                # at least one weight in a batch
+                batch, nbytes = [], 0
+                while i < len(mods) and (len(batch) == 0 or nbytes < _WOQ_BATCH_BYTES):
+                    weight = mods[i][2].weight
+                    batch.append(mods[i])
+                    nbytes += weight.numel() * weight.element_size()
+                    i += 1
+                quantize_start = time.time()
+                results = quantize_weights_batched(
+                    [m.weight.detach() for _, _, m, _ in batch],
+                    weight_dtype,
+                    group_size,
+                )
+                quantize_seconds += time.time() - quantize_start
+                for (parent, name, mod, woq_cls), qparams in zip(batch, results):
+                    futures.append(
+                        (parent, name, pool.submit(pack, mod, woq_cls, *qparams))
+                    )
+        pack_seconds = 0.0
+        for parent, name, future in futures:
+            qlinear, seconds = future.result()
+            setattr(parent, name, qlinear)
+            pack_seconds += seconds
+    logger.info(
+        f"Weight only quantization converted {len(futures)} linear modules in "
+        + f"{time.time() - start:.2f}s: quantization {quantize_seconds:.2f}s, "
+        + f"packing {pack_seconds:.2f}s on {num_workers} threads (overlapped with quantization)"
+    )
+    return model
+
+
 def convert(model, inplace=False):
     r"""
     Convert an FP32 prepared model to a model which will automatically insert fake quant
@@ -433,12 +528,18 @@ def convert(model, inplace=False):
             module_mappings,
             qconfig_spec,
         )
+        # the linear modules are quantized by the batched pipeline, the others by quantize_dynamic
+        convert_model = _convert_woq_linears(
+            convert_model, convert_model.q_config, module_mappings
+        )
+        # convert_model is already a copy if not inplace, copying it again would
+        # unpack and repack the op contexts of the converted linear modules
         converted_model = torch.quantization.quantize_dynamic(
             convert_model,
             qconfig_spec=qconfig_spec,
             dtype=torch.qint8,
             mapping=module_mappings,
-            inplace=inplace,
+            inplace=True,
         )
         return converted_model
 
@@ -829,10 +829,10 @@ NF4_DEQUANT_TABLE = [
 def map_float_tensor_to_nf4(t, dtype=torch.uint8):
     # Map [-1, 1] to nf4
     # Assume t in [-1, 1]
-    out_uint8 = torch.empty(t.shape, dtype=dtype)
-    for i in range(len(NF4_QUANT_TABLE)):
-        out_uint8[t > NF4_QUANT_TABLE[i]] = i
-    return out_uint8
+    # The nf4 value is the index of the last entry of the table less than t,
+    # i.e., the number of entries less than t minus one.
+    boundaries = torch.tensor(NF4_QUANT_TABLE, dtype=t.dtype, device=t.device)
+    return torch.bucketize(t, boundaries).sub_(1).clamp_(min=0).to(dtype)
 
 
 def map_nf4_tensor_to_float(t, dtype=torch.float32):
@@ -1178,3 +1178,40 @@ def dequantize_per_block(
     if weight_shape is not None:
         t = t[: weight_shape[0], : weight_shape[1]].contiguous()
     return t
+
+
+def quantize_weights_batched(weights: List[torch.Tensor], dtype, group_size=-1):
+    r"""
+    Quantize the weight tensors of Linear modules with the same input channel together.
+    The weights are concatenated along the output channel, so that the min/max, scales,
+    rounding and INT4/NF4 packing of all of them are done by one pass of vectorized ops.
+    The results are the same as quantizing every weight by quantize_per_channel
+    (group_size = -1) or quantize_per_block.
+
+    Args:
+        weights: The tensors to be quantized, in shape [output channel, input channel]
+        dtype: data type of the quantized tensor, int8, int4 or nf4
+        group_size: Size of group along input channel, -1 means per channel
+
+    Returns:
+        A list of tuples of the quantized tensor, scales and zero points of the weights
+    """
+    assert all(
+        w.dim() == 2 and w.size(1) == weights[0].size(1) for w in weights
+    ), f"{__name__}: Expect 2-dim weights with the same input channel"
+    t = torch.cat(weights, dim=0) if len(weights) > 1 else weights[0]
+    if group_size == -1:
+        qt, scales, zps = quantize_per_channel(t, dtype)
+    else:
+        qt, scales, zps = quantize_per_block(t, dtype, group_size)
+    if len(weights) == 1:
+        return [(qt, scales, zps)]
+    sizes = [w.size(0) for w in weights]
+    qts = qt.split(sizes)
+    scales = scales.split(sizes)
+    zps = zps.split(sizes) if zps is not None else [None] * len(weights)
+    # clone the slices, so that the batch is released once all the weights are packed
+    return [
+        (q.clone(), s.clone(), z.clone() if z is not None else None)
+        for q, s, z in zip(qts, scales, zps)
+    ]
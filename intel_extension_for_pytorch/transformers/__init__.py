@@ -9,6 +9,8 @@ from .tensor_parallel import (
     update_heads_info,
     TensorParallelColumnLinear,
     TensorParallelRowLinear,
+    TensorParallelChunkedRowLinear,
+    chunk_row_linear_allreduce,
     TensorParallelLMhead,
     TensorParallelConv2d,
 )
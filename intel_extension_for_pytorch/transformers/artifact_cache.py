@@ -0,0 +1,210 @@
+import hashlib
+import json
+import os
+import re
+import tempfile
+
+import torch
+import intel_extension_for_pytorch as ipex
+from ..utils._logger import logger, WarningType
+from ..utils._checkpoint import _get_checkpoint_files
+from .tensor_parallel import get_allreduce_chunks
+
+# The frozen TorchScript graphs of ipex.llm.optimize carry the weights in their final
+# prepacked (blocked/VNNI or WOQ packed) layout as the attributes of the op contexts,
+# so the saved graphs are the optimized artifacts of a model:
+#   <cache_dir>/<key>/trace_graph.pt
+#   <cache_dir>/<key>/trace_graph_first.pt (Yuan only)
+#   <cache_dir>/<key>/metadata.json
+_TRACE_GRAPH = "trace_graph.pt"
+_TRACE_GRAPH_FIRST = "trace_graph_first.pt"
+_METADATA = "metadata.json"
+_CHECKPOINT_SUFFIXES = (".safetensors", ".bin", ".pt", ".pth", ".json")
+
+
+def _hash_tensors(h, state_dict):
+    for name, t in state_dict.items():
+        if not isinstance(t, torch.Tensor):
+            continue
+        h.update(name.encode())
+        h.update(f"{tuple(t.shape)}{t.dtype}".encode())
+        if t.device.type != "meta":
+            h.update(t.detach().contiguous().reshape(-1).view(torch.uint8).numpy())
+
+
+def _hash_files(h, files):
+    for f in files:
+        stat = os.stat(f)
+        h.update(f"{os.path.basename(f)}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+
+
+def _get_checkpoint_dir(model):
+    # The local directory of the checkpoint of the model. If the model is loaded by a hub id,
+    # it is the snapshot directory of the id in the HF cache, which is resolved without network.
+    name_or_path = getattr(model.config, "_name_or_path", "")
+    if not name_or_path or os.path.isdir(name_or_path):
+        return name_or_path
+    try:
+        from huggingface_hub import snapshot_download
+
+        return snapshot_download(
+            name_or_path,
+            revision=getattr(model.config, "_commit_hash", None),
+            local_files_only=True,
+        )
+    except Exception:
+        return ""
+
+
+def _checkpoint_fingerprint(model):
+    r"""
+    Returns the fingerprint of the checkpoint of the model. Hashing the names, sizes and
+    modification times of the checkpoint files in the local directory or the HF cache
+    snapshot of the model is enough to identify the checkpoint and does not read the weights.
+    Otherwise, e.g., the model is built from a config only or in memory, the parameters and
+    buffers of the model are hashed, which reads all the weights and is expensive for large
+    models.
+    """
+    h = hashlib.sha256()
+    checkpoint_dir = _get_checkpoint_dir(model)
+    files = []
+    if checkpoint_dir:
+        files = sorted(
+            f for f in os.listdir(checkpoint_dir) if f.endswith(_CHECKPOINT_SUFFIXES)
+        )
+    if any(not f.endswith(".json") for f in files):
+        _hash_files(h, [os.path.join(checkpoint_dir, f) for f in files])
+    else:
+        _hash_tensors(h, model.state_dict())
+    return h.hexdigest()
+
+
+def _get_cache_key(
+    model,
+    dtype,
+    kv_cache_dtype,
+    quantization_config,
+    qconfig_summary_file,
+    low_precision_checkpoint,
+    checkpoint=None,
+    tensor_parallel=None,
+):
+    r"""
+    Returns the cache key of the optimized artifacts, which covers the model checkpoint,
+    the model config, dtype, KV cache dtype, quantization recipe, the shard of the rank and
+    the allreduce chunks of tensor parallelism, the ISA of the machine and the versions of IPEX, PyTorch and transformers.
+    """
+    h = hashlib.sha256()
+    for state_dict in [low_precision_checkpoint, checkpoint]:
+        if isinstance(state_dict, tuple):
+            h.update(str(state_dict[1]).encode())
+            state_dict = state_dict[0]
+        if isinstance(state_dict, (str, os.PathLike)):
+            _hash_files(h, _get_checkpoint_files(os.fspath(state_dict)))
+        elif isinstance(state_dict, dict):
+            _hash_tensors(h, state_dict)
+    if qconfig_summary_file is not None:
+        with open(qconfig_summary_file, "rb") as f:
+            h.update(f.read())
+    try:
+        import transformers
+
+        transformers_version = transformers.__version__
+    except ImportError:
+        transformers_version = None
+    world_size, rank = 1, 0
+    if torch.distributed.is_available() and torch.distributed.is_initialized():
+        world_size = torch.distributed.get_world_size()
+        rank = torch.distributed.get_rank()
+    elif tensor_parallel != 1:
+        # the ranks sharded by ipex.llm.optimize
+        from ..cpu import comm as ipex_comm
+
+        world_size = ipex_comm.get_world_size()
+        rank = ipex_comm.get_rank()
+    items = {
+        "checkpoint": _checkpoint_fingerprint(model),
+        "checkpoint_files": h.hexdigest(),
+        "config": str(sorted(model.config.to_dict().items())),
+        "dtype": str(dtype),
+        "kv_cache_dtype": str(kv_cache_dtype),
+        # the reprs of the observers of the qconfig contain their object addresses
+        "quantization_config": re.sub(
+            r" at 0x[0-9a-fA-F]+", "", str(quantization_config)
+        ),
+        "isa": ipex._C._get_current_isa_level(),
+        "ipex": ipex.__version__,
+        "torch": torch.__version__,
+        "transformers": transformers_version,
+        "world_size": world_size,
+        "rank": rank,
+        "tensor_parallel": tensor_parallel,
+        # the row-parallel linears are chunked in the graph
+        "allreduce_chunks": get_allreduce_chunks() if world_size > 1 else 1,
+    }
+    key = hashlib.sha256(json.dumps(items, sort_keys=True).encode()).hexdigest()
+    return key, items
+
+
+def _load_cached_artifacts(cache_dir, key):
+    r"""
+    Returns the cached (trace_graph, trace_graph_first) of the key, or None on a cache miss.
+    """
+    path = os.path.join(cache_dir, key)
+    if not os.path.exists(os.path.join(path, _METADATA)):
+        return None
+    try:
+        trace_model = torch.jit.freeze(
+            torch.jit.load(os.path.join(path, _TRACE_GRAPH)).eval()
+        )
+        trace_model_first = None
+        if os.path.exists(os.path.join(path, _TRACE_GRAPH_FIRST)):
+            trace_model_first = torch.jit.freeze(
+                torch.jit.load(os.path.join(path, _TRACE_GRAPH_FIRST)).eval()
+            )
+    except Exception as e:
+        logger.warning(
+            f"fail to load the optimized model from {path} due to: {e}, optimizing the model again",
+            _type=WarningType.NotSupported,
+        )
+        return None
+    return trace_model, trace_model_first
+
+
+def _save_artifact(module, path):
+    # Write to a temporary file and rename it, so the concurrent instances of ipexrun
+    # sharing the cache never read a partially written file.
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    os.close(fd)
+    try:
+        torch.jit.save(module, tmp)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def _save_cached_artifacts(cache_dir, key, items, model):
+    if not hasattr(model, "trace_graph"):
+        return
+    path = os.path.join(cache_dir, key)
+    try:
+        os.makedirs(path, exist_ok=True)
+        _save_artifact(
+            model.trace_graph.optimized_model, os.path.join(path, _TRACE_GRAPH)
+        )
+        if hasattr(model, "trace_graph_first"):
+            _save_artifact(
+                model.trace_graph_first.optimized_model,
+                os.path.join(path, _TRACE_GRAPH_FIRST),
+            )
+        # the metadata is written last, it marks the artifacts as complete
+        fd, tmp = tempfile.mkstemp(dir=path, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(items, f, indent=2)
+        os.replace(tmp, os.path.join(path, _METADATA))
+    except Exception as e:
+        logger.warning(
+            f"fail to save the optimized model to {path} due to: {e}",
+            _type=WarningType.NotSupported,
+        )
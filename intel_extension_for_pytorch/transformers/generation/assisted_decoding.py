@@ -0,0 +1,350 @@
+import torch
+from typing import Optional, Union, List
+from transformers.generation.stopping_criteria import (
+    StoppingCriteriaList,
+    validate_stopping_criteria,
+)
+from transformers.generation.logits_process import LogitsProcessorList
+from transformers.generation.streamers import BaseStreamer
+from .greedy_search import GreedySearchDecoderOnlyOutput
+from .utils import _get_initial_beam_idx, _rollback_iakv_cache
+import time
+from ...llm.metrics import generation_metrics
+
+# decoder-only models whose past_key_values are the plain indirect access KV cache
+# (seq_info, key_cache, value_cache, beam_idx) of every layer
+_SPECULATIVE_MODEL_BACKBONES = [
+    "GPTJForCausalLM",
+    "LlamaForCausalLM",
+    "GPTNeoXForCausalLM",
+    "OPTForCausalLM",
+    "FalconForCausalLM",
+    "RWForCausalLM",
+    "BloomForCausalLM",
+    "CodeGenForCausalLM",
+    "BaichuanForCausalLM",
+    "GPTBigCodeForCausalLM",
+    "MistralForCausalLM",
+    "MixtralForCausalLM",
+    "MptForCausalLM",
+    "StableLmForCausalLM",
+    "QWenLMHeadModel",
+    "PhiForCausalLM",
+    "Phi3ForCausalLM",
+]
+
+
+def _supports_speculative_decoding(model):
+    return (
+        getattr(getattr(model, "assisted_decoding", None), "__func__", None)
+        is _assisted_decoding
+        and not model.config.is_encoder_decoder
+        and model.config.architectures[0] in _SPECULATIVE_MODEL_BACKBONES
+    )
+
+
+def _get_num_hidden_layers(config):
+    if hasattr(config, "n_layer"):
+        return config.n_layer
+    elif hasattr(config, "num_hidden_layers"):
+        return config.num_hidden_layers
+    elif hasattr(config, "num_layers"):
+        return config.num_layers
+    return config.n_layers
+
+
+def _speculative_forward(model, input_ids, past_key_values, cache_len, beam_idx):
+    r"""
+    Runs ``input_ids`` of shape [1, n] on top of the first ``cache_len`` cached tokens and returns the
+    logits of all the n tokens and the updated past_key_values. The first forward (``past_key_values``
+    is None) only returns the logits of the last token.
+    """
+    first_token = past_key_values is None
+    if first_token:
+        past_key_values = tuple(
+            [
+                (
+                    torch.zeros(1, 0, 0, 1, dtype=torch.long).contiguous(),
+                    torch.zeros([1, 1, 1, 1]).contiguous(),
+                    torch.zeros([1, 1, 1, 1]).contiguous(),
+                    beam_idx,
+                )
+                for i in range(_get_num_hidden_layers(model.config))
+            ]
+        )
+    num_tokens = input_ids.size(-1)
+    attention_mask = torch.ones(
+        (1, cache_len + num_tokens), dtype=torch.long, device=input_ids.device
+    )
+    model_inputs = model.prepare_inputs_for_generation(
+        input_ids,
+        past_key_values=None if first_token else past_key_values,
+        attention_mask=attention_mask,
+        use_cache=True,
+    )
+    # prepare_inputs_for_generation only keeps the last token once there is a cache,
+    # while the verification runs all the speculated tokens in one forward
+    model_inputs["input_ids"] = input_ids
+    model_inputs["past_key_values"] = past_key_values
+    if model_inputs.get("position_ids", None) is not None:
+        model_inputs["position_ids"] = torch.arange(
+            cache_len, cache_len + num_tokens, device=input_ids.device
+        ).unsqueeze(0)
+    if hasattr(model, "trace_graph"):
+        model_inputs.pop("use_cache", None)
+        model_inputs.pop("token_type_ids", None)
+        if "return_last_logit" in model_inputs:
+            model_inputs["return_last_logit"] = torch.tensor(first_token)
+        if first_token and hasattr(model, "trace_graph_first"):
+            outputs = model.trace_graph_first(**model_inputs)
+        else:
+            outputs = model.trace_graph(**model_inputs)
+    else:
+        if "return_last_logit" in model_inputs:
+            model_inputs["return_last_logit"] = first_token
+        outputs = model(**model_inputs, return_dict=True)
+    if isinstance(outputs, dict):
+        return outputs.logits, outputs.past_key_values
+    return outputs[0], outputs[1]
+
+
+def _assisted_decoding(
+    self,
+    input_ids: torch.LongTensor,
+    assistant_model: Optional[torch.nn.Module] = None,
+    candidate_generator=None,
+    do_sample: bool = False,
+    logits_processor: Optional[LogitsProcessorList] = None,
+    logits_warper: Optional[LogitsProcessorList] = None,
+    stopping_criteria: Optional[StoppingCriteriaList] = None,
+    pad_token_id: Optional[int] = None,
+    eos_token_id: Optional[Union[int, List[int]]] = None,
+    output_attentions: Optional[bool] = None,
+    output_hidden_states: Optional[bool] = None,
+    output_scores: Optional[bool] = None,
+    return_dict_in_generate: Optional[bool] = None,
+    synced_gpus: Optional[bool] = False,
+    streamer: Optional["BaseStreamer"] = None,
+    **model_kwargs,
+):
+    r"""
+    Speculative decoding with a small draft model, which is reached by
+    ``model.generate(input_ids, assistant_model=draft_model)``. Both the target and the draft model
+    should be optimized by ``ipex.llm.optimize``. At every step the draft model greedily proposes
+    ``draft_model.generation_config.num_assistant_tokens`` tokens, and the target model verifies them
+    in one forward pass on its indirect access KV cache. The longest prefix of the proposal matching
+    the tokens chosen by the target model is accepted, plus the next token of the target model, and
+    the KV cache and beam_idx history of the rejected tokens are rolled back on both models. The
+    generated tokens are the same as the ones of the greedy search (or sampling) on the target model.
+
+    Only batch size 1 of decoder-only models is supported, the other cases go to the default
+    implementation of transformers.
+    """
+    if assistant_model is None and candidate_generator is not None:
+        assistant_model = getattr(candidate_generator, "assistant_model", None)
+    if (
+        input_ids.size(0) != 1
+        or assistant_model is None
+        or synced_gpus
+        or output_attentions
+        or output_hidden_states
+        or not _supports_speculative_decoding(self)
+        or not _supports_speculative_decoding(assistant_model)
+    ):
+        fallback_kwargs = {}
+        if assistant_model is not None:
+            fallback_kwargs["assistant_model"] = assistant_model
+        if candidate_generator is not None:
+            fallback_kwargs["candidate_generator"] = candidate_generator
+        return type(self).assisted_decoding(
+            self,
+            input_ids,
+            do_sample=do_sample,
+            logits_processor=logits_processor,
+            logits_warper=logits_warper,
+            stopping_criteria=stopping_criteria,
+            pad_token_id=pad_token_id,
+            eos_token_id=eos_token_id,
+            output_attentions=output_attentions,
+            output_hidden_states=output_hidden_states,
+            output_scores=output_scores,
+            return_dict_in_generate=return_dict_in_generate,
+            synced_gpus=synced_gpus,
+            streamer=streamer,
+            **fallback_kwargs,
+            **model_kwargs,
+        )
+
+    token_latency = (
+        self.config.token_latency if hasattr(self.config, "token_latency") else False
+    )
+
+    latency_list = []
+    logits_processor = (
+        logits_processor if logits_processor is not None else LogitsProcessorList()
+    )
+    logits_warper = (
+        logits_warper if logits_warper is not None else LogitsProcessorList()
+    )
+    stopping_criteria = (
+        stopping_criteria if stopping_criteria is not None else StoppingCriteriaList()
+    )
+    eos_token_id = (
+        eos_token_id
+        if eos_token_id is not None
+        else self.generation_config.eos_token_id
+    )
+    if isinstance(eos_token_id, int):
+        eos_token_id = [eos_token_id]
+    output_scores = (
+        output_scores
+        if output_scores is not None
+        else self.generation_config.output_scores
+    )
+    return_dict_in_generate = (
+        return_dict_in_generate
+        if return_dict_in_generate is not None
+        else self.generation_config.return_dict_in_generate
+    )
+    scores = () if (return_dict_in_generate and output_scores) else None
+
+    num_assistant_tokens = getattr(
+        assistant_model.generation_config, "num_assistant_tokens", 5
+    )
+    heuristic_schedule = (
+        getattr(
+            assistant_model.generation_config,
+            "num_assistant_tokens_schedule",
+            "heuristic",
+        )
+        == "heuristic"
+    )
+    max_length = stopping_criteria.max_length
+    if max_length is None:
+        max_length = self.generation_config.max_length
+    stopping_criteria = validate_stopping_criteria(stopping_criteria, max_length)
+
+    # prefill the prompt on both models, the first token of the target model is always accepted
+    metrics_recorder = generation_metrics._start_generation(input_ids)
+    tic = time.time()
+    cur_len = input_ids.size(-1)
+    beam_idx = _get_initial_beam_idx(self, 1, cur_len, stopping_criteria)
+    logits, past_key_values = _speculative_forward(self, input_ids, None, 0, beam_idx)
+    assistant_beam_idx = _get_initial_beam_idx(
+        assistant_model, 1, cur_len, stopping_criteria
+    )
+    _, assistant_past_key_values = _speculative_forward(
+        assistant_model, input_ids, None, 0, assistant_beam_idx
+    )
+    cache_len = cur_len
+    assistant_cache_len = cur_len
+    candidate_ids = input_ids[:, :0]
+
+    first_step = True
+    while True:
+        # 1. verify the candidates with the target model, starting from the last token which is
+        # not in its cache yet; the logits of the first step come from the prefill
+        if not first_step:
+            logits, past_key_values = _speculative_forward(
+                self,
+                torch.cat([input_ids[:, -1:], candidate_ids], dim=-1),
+                past_key_values,
+                cache_len,
+                None,
+            )
+        num_candidates = candidate_ids.size(-1)
+        new_tokens = []
+        for i in range(num_candidates + 1):
+            ids = torch.cat([input_ids, candidate_ids[:, :i]], dim=-1)
+            next_token_scores = logits_processor(
+                ids, logits[:, i - num_candidates - 1, :]
+            )
+            if do_sample:
+                next_token_scores = logits_warper(ids, next_token_scores)
+                probs = torch.nn.functional.softmax(next_token_scores, dim=-1)
+                next_token = torch.multinomial(probs, num_samples=1).squeeze(1)
+            else:
+                next_token = torch.argmax(next_token_scores, dim=-1)
+            if scores is not None:
+                scores += (next_token_scores,)
+            new_tokens.append(next_token)
+            if (
+                (eos_token_id is not None and next_token.item() in eos_token_id)
+                or cur_len + len(new_tokens) >= max_length
+                or i == num_candidates
+                or next_token.item() != candidate_ids[0, i].item()
+            ):
+                break
+        num_accepted = len(new_tokens) - 1
+        new_tokens = torch.stack(new_tokens, dim=-1)
+        input_ids = torch.cat([input_ids, new_tokens], dim=-1)
+        cur_len = input_ids.size(-1)
+        if streamer is not None:
+            streamer.put(new_tokens.cpu())
+
+        # 2. roll back the tokens rejected by the target model, the last accepted token
+        # is fed to the models at the next step
+        if not first_step:
+            cache_len += num_accepted + 1
+            past_key_values = _rollback_iakv_cache(past_key_values, cache_len)
+        if assistant_cache_len > cache_len:
+            assistant_cache_len = cache_len
+            assistant_past_key_values = _rollback_iakv_cache(
+                assistant_past_key_values, assistant_cache_len
+            )
+
+        latency_list.append(time.time() - tic)
+        if metrics_recorder is not None:
+            metrics_recorder.step(latency_list[-1], num_tokens=new_tokens.size(-1))
+        tic = time.time()
+        if (
+            (eos_token_id is not None and new_tokens[0, -1].item() in eos_token_id)
+            or cur_len >= max_length
+            or stopping_criteria(input_ids, scores)
+        ):
+            break
+
+        if heuristic_schedule and num_candidates > 0:
+            if num_accepted == num_candidates:
+                num_assistant_tokens += 2
+            else:
+                num_assistant_tokens = max(1, num_assistant_tokens - 1)
+
+        # 3. the draft model proposes the candidates greedily, the cache of the target model is
+        # at most max_length - 1 long after verifying them
+        num_proposals = min(int(num_assistant_tokens), max_length - cur_len - 1)
+        candidates = []
+        draft_ids = input_ids[:, assistant_cache_len:]
+        for _ in range(num_proposals):
+            draft_logits, assistant_past_key_values = _speculative_forward(
+                assistant_model,
+                draft_ids,
+                assistant_past_key_values,
+                assistant_cache_len,
+                None,
+            )
+            assistant_cache_len += draft_ids.size(-1)
+            draft_ids = torch.argmax(draft_logits[:, -1, :], dim=-1, keepdim=True)
+            candidates.append(draft_ids)
+        candidate_ids = (
+            torch.cat(candidates, dim=-1) if candidates else input_ids[:, :0]
+        )
+        first_step = False
+
+    if metrics_recorder is not None:
+        metrics_recorder.finish(past_key_values)
+    if streamer is not None:
+        streamer.end()
+
+    if return_dict_in_generate:
+        output_result = GreedySearchDecoderOnlyOutput(
+            sequences=input_ids,
+            scores=scores,
+        )
+    else:
+        output_result = input_ids
+
+    if token_latency:
+        return (output_result, latency_list)
+    else:
+        return output_result
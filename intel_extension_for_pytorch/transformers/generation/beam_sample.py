@@ -10,7 +10,16 @@ from transformers.generation.stopping_criteria import (
 from transformers.generation.logits_process import LogitsProcessorList
 from transformers.generation.beam_search import BeamScorer
 from transformers.utils import ModelOutput
+from .utils import (
+    _get_initial_beam_idx,
+    _use_chunked_prefill,
+    _chunked_prefill,
+    _get_fused_sampling_params,
+)
+from .beam_scorer import _get_beam_scorer
 import time
+from ...llm.metrics import generation_metrics
+from ...llm.functional.sampling import _top_k_top_p_candidates
 
 
 class GenerateBeamDecoderOnlyOutput(ModelOutput):
@@ -119,11 +128,16 @@ def _beam_sample(
 
     # init attention / hidden states / scores tuples
     scores = () if (return_dict_in_generate and output_scores) else None
+    # the logits warpers are fused into the sampling unless their outputs are returned
+    fused_sampling_params = (
+        _get_fused_sampling_params(logits_warper) if scores is None else None
+    )
     beam_indices = (
         tuple(() for _ in range(batch_beam_size))
         if (return_dict_in_generate and output_scores)
         else None
     )
+    beam_scorer = _get_beam_scorer(beam_scorer, beam_indices)
     decoder_attentions = () if (return_dict_in_generate and output_attentions) else None
     cross_attentions = () if (return_dict_in_generate and output_attentions) else None
     decoder_hidden_states = (
@@ -151,6 +165,7 @@ def _beam_sample(
     this_peer_finished = False  # used by synced_gpus only
 
     decoder_prompt_len = input_ids.shape[-1]  # record the prompt length of decoder
+    metrics_recorder = generation_metrics._start_generation(input_ids)
     while True:
         tic = time.time()
         if synced_gpus:
@@ -197,9 +212,12 @@ def _beam_sample(
                 first_token = True
                 if self.model_backbone == "T5ForConditionalGeneration":
                     first_token = False
-                    beam_idx_tmp = torch.zeros(
-                        (2048, int(batch_size * num_beams)), dtype=torch.long
-                    ).contiguous()
+                    beam_idx_tmp = _get_initial_beam_idx(
+                        self,
+                        batch_size * num_beams,
+                        input_ids.size(-1),
+                        stopping_criteria,
+                    )
                     model_inputs["past_key_values"] = tuple(
                         [
                             (
@@ -247,9 +265,12 @@ def _beam_sample(
                     )
                 elif self.model_backbone == "GitForCausalLM":
                     first_token = False
-                    beam_idx_tmp = torch.zeros(
-                        (2048, int(batch_size * num_beams)), dtype=torch.long
-                    ).contiguous()
+                    beam_idx_tmp = _get_initial_beam_idx(
+                        self,
+                        batch_size * num_beams,
+                        input_ids.size(-1),
+                        stopping_criteria,
+                    )
                     num_head = self.git.encoder.layer[
                         0
                     ].attention.self.num_attention_heads
@@ -280,9 +301,9 @@ def _beam_sample(
                     num_hidden_layers = self.config.num_layers
                 elif hasattr(self.config, "n_layers"):
                     num_hidden_layers = self.config.n_layers
-                beam_idx_tmp = torch.zeros(
-                    (2048, int(batch_size * num_beams)), dtype=torch.long
-                ).contiguous()
+                beam_idx_tmp = _get_initial_beam_idx(
+                    self, batch_size * num_beams, input_ids.size(-1), stopping_criteria
+                )
                 model_inputs["past_key_values"] = tuple(
                     [
                         (
@@ -315,7 +336,9 @@ def _beam_sample(
             if first_token and self.model_backbone == "YuanForCausalLM":
                 model_inputs.pop("past_key_values", None)
             if hasattr(self, "trace_graph"):
-                if first_token and hasattr(self, "trace_graph_first"):
+                if first_token and _use_chunked_prefill(self, model_inputs):
+                    outputs = _chunked_prefill(self, model_inputs)
+                elif first_token and hasattr(self, "trace_graph_first"):
                     outputs = self.trace_graph_first(**model_inputs)
                 else:
                     outputs = self.trace_graph(**model_inputs)
@@ -346,9 +369,16 @@ def _beam_sample(
         )  # (batch_size * num_beams, vocab_size)
 
         next_token_scores_processed = logits_processor(input_ids, next_token_scores)
-        next_token_scores_processed = logits_warper(
-            input_ids, next_token_scores_processed
-        )
+        candidate_tokens = None
+        if fused_sampling_params is not None:
+            # sample among the candidates of every beam instead of the whole vocabulary
+            next_token_scores_processed, candidate_tokens = _top_k_top_p_candidates(
+                next_token_scores_processed, **fused_sampling_params
+            )
+        else:
+            next_token_scores_processed = logits_warper(
+                input_ids, next_token_scores_processed
+            )
         next_token_scores = next_token_scores_processed + beam_scores[
             :, None
         ].expand_as(next_token_scores_processed)
@@ -388,7 +418,12 @@ def _beam_sample(
         next_tokens = torch.gather(next_tokens, -1, _indices)
 
         next_indices = torch.div(next_tokens, vocab_size, rounding_mode="floor")
-        next_tokens = next_tokens % vocab_size
+        if candidate_tokens is not None:
+            next_tokens = torch.gather(
+                candidate_tokens.reshape(batch_size, -1), -1, next_tokens
+            )
+        else:
+            next_tokens = next_tokens % vocab_size
 
         # stateless
         beam_outputs = beam_scorer.process(
@@ -429,6 +464,8 @@ def _beam_sample(
         # increase cur_len
         cur_len = cur_len + 1
         latency_list.append(time.time() - tic)
+        if metrics_recorder is not None:
+            metrics_recorder.step(latency_list[-1])
 
         if beam_scorer.is_done or stopping_criteria(input_ids, scores):
             if not synced_gpus:
@@ -436,6 +473,8 @@ def _beam_sample(
             else:
                 this_peer_finished = True
 
+    if metrics_recorder is not None:
+        metrics_recorder.finish(model_kwargs["past_key_values"])
     sequence_outputs = beam_scorer.finalize(
         input_ids,
         beam_scores,
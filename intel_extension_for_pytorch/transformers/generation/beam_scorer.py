@@ -0,0 +1,236 @@
+import torch
+from collections import UserDict
+from typing import List, Optional, Union
+from transformers.generation.beam_search import BeamScorer, BeamSearchScorer
+
+
+class _BeamSearchScorer:
+    r"""
+    The same beam search bookkeeping as HF BeamSearchScorer, computed on the tensors of all the batches at
+    once rather than looping over the batches and candidates in Python. The finished hypotheses of every
+    batch are kept as the best ``num_beams`` ones of a [batch_size, num_beams] score tensor in descending
+    order, and their ids are only copied at the steps where some EOS candidates are added.
+    """
+
+    def __init__(
+        self,
+        batch_size: int,
+        num_beams: int,
+        device: torch.device,
+        length_penalty: float = 1.0,
+        do_early_stopping: Union[bool, str] = False,
+        num_beam_hyps_to_keep: int = 1,
+        max_length: Optional[int] = None,
+    ):
+        self.num_beams = num_beams
+        self.device = device
+        self.length_penalty = length_penalty
+        self.do_early_stopping = do_early_stopping
+        self.num_beam_hyps_to_keep = num_beam_hyps_to_keep
+        self.max_length = max_length
+        self._hyp_scores = torch.full(
+            (batch_size, num_beams), -float("inf"), dtype=torch.double, device=device
+        )
+        self._hyp_lens = torch.zeros(
+            (batch_size, num_beams), dtype=torch.long, device=device
+        )
+        self._hyp_ids = None
+        self._num_hyps = torch.zeros(batch_size, dtype=torch.long, device=device)
+        self._done = torch.zeros(batch_size, dtype=torch.bool, device=device)
+
+    @property
+    def is_done(self) -> bool:
+        return self._done.all()
+
+    def _add(self, scores, ids, mask):
+        # Adds the hypotheses of shape [batch_size, num_candidates, length] where mask is True,
+        # which is the same as adding them to HF BeamHypotheses one by one, except for the ties.
+        batch_size, num_candidates, length = ids.shape
+        capacity = 0 if self._hyp_ids is None else self._hyp_ids.size(-1)
+        # one more position for the EOS token appended by finalize
+        if capacity < length + 1:
+            capacity = max(length + 1, 2 * capacity, self.max_length or 0)
+            hyp_ids = ids.new_zeros((batch_size, self.num_beams, capacity))
+            if self._hyp_ids is not None:
+                hyp_ids[..., : self._hyp_ids.size(-1)] = self._hyp_ids
+            self._hyp_ids = hyp_ids
+        new_ids = ids.new_zeros((batch_size, num_candidates, capacity))
+        new_ids[..., :length] = ids
+        slots = torch.arange(self.num_beams, device=ids.device)
+        valid = torch.cat([slots < self._num_hyps.unsqueeze(-1), mask], dim=1)
+        all_scores = torch.cat(
+            [self._hyp_scores, scores.masked_fill(~mask, -float("inf"))], dim=1
+        )
+        # the valid hypotheses with the highest scores, the earlier ones first for the ties
+        order = torch.sort(all_scores, dim=1, descending=True, stable=True).indices
+        invalid = (~valid).gather(1, order).to(torch.uint8)
+        order = order.gather(1, torch.sort(invalid, dim=1, stable=True).indices)
+        order = order[:, : self.num_beams]
+        self._hyp_scores = all_scores.gather(1, order)
+        self._hyp_lens = torch.cat(
+            [self._hyp_lens, torch.full_like(mask, length, dtype=torch.long)], dim=1
+        ).gather(1, order)
+        self._hyp_ids = torch.cat([self._hyp_ids, new_ids], dim=1).gather(
+            1, order.unsqueeze(-1).expand(-1, -1, capacity)
+        )
+        self._num_hyps = torch.clamp(self._num_hyps + mask.sum(1), max=self.num_beams)
+
+    def _update_done(self, best_sum_logprobs, cur_len, decoder_prompt_len):
+        full = self._num_hyps >= self.num_beams
+        if self.do_early_stopping is True:
+            done = full
+        else:
+            length = cur_len - decoder_prompt_len
+            if self.do_early_stopping is not False and self.length_penalty > 0.0:
+                if self.max_length <= decoder_prompt_len:
+                    raise ValueError(
+                        "max_length is not larger than decoder prompt length"
+                    )
+                length = self.max_length - decoder_prompt_len
+            highest_attainable_score = best_sum_logprobs / length**self.length_penalty
+            done = full & (self._hyp_scores[:, -1] >= highest_attainable_score)
+        self._done |= done
+
+    def process(
+        self,
+        input_ids: torch.LongTensor,
+        next_scores: torch.FloatTensor,
+        next_tokens: torch.LongTensor,
+        next_indices: torch.LongTensor,
+        pad_token_id: Optional[int] = None,
+        eos_token_id: Optional[Union[int, List[int]]] = None,
+        beam_indices: Optional[torch.LongTensor] = None,
+        group_index: Optional[int] = 0,
+        decoder_prompt_len: Optional[int] = 0,
+    ):
+        cur_len = input_ids.shape[-1] + 1
+        batch_size, num_candidates = next_tokens.shape
+        device = next_tokens.device
+        if isinstance(eos_token_id, int):
+            eos_token_id = [eos_token_id]
+        if eos_token_id is not None:
+            is_eos = torch.isin(next_tokens, torch.tensor(eos_token_id, device=device))
+        else:
+            is_eos = torch.zeros_like(next_tokens, dtype=torch.bool)
+        batch_offsets = torch.arange(batch_size, device=device) * self.num_beams
+        batch_beam_idx = next_indices + batch_offsets.unsqueeze(-1)
+        # the next beams are the first num_beams candidates which are not EOS
+        beam_pos = torch.sort(is_eos.to(torch.uint8), dim=1, stable=True).indices
+        beam_pos = beam_pos[:, : self.num_beams]
+        done = self._done.unsqueeze(-1)
+        next_beam_scores = next_scores.gather(1, beam_pos).masked_fill(done, 0)
+        next_beam_tokens = next_tokens.gather(1, beam_pos)
+        if pad_token_id is not None:
+            next_beam_tokens = next_beam_tokens.masked_fill(done, pad_token_id)
+        next_beam_indices = batch_beam_idx.gather(1, beam_pos).masked_fill(done, 0)
+        # the EOS candidates among the top num_beams ones are the finished hypotheses
+        rank = torch.arange(num_candidates, device=device)
+        add = is_eos & (rank < self.num_beams) & ~done
+        too_many_eos, has_new_hyps, has_done = torch.stack(
+            [
+                (is_eos.gather(1, beam_pos).any(1) & ~self._done).any(),
+                add.any(),
+                self._done.any(),
+            ]
+        ).tolist()
+        if too_many_eos:
+            raise ValueError(
+                f"At most {self.num_beams} tokens in {next_tokens} can be equal to `eos_token_id:"
+                f" {eos_token_id}`. Make sure {next_tokens} are corrected."
+            )
+        if has_done and (eos_token_id is None or pad_token_id is None):
+            raise ValueError(
+                "Generated beams >= num_beams -> eos_token_id and pad_token have to be defined"
+            )
+        if has_new_hyps:
+            scores = next_scores.double() / (
+                (cur_len - decoder_prompt_len) ** self.length_penalty
+            )
+            self._add(scores, input_ids[batch_beam_idx], add)
+        self._update_done(
+            next_scores.max(dim=1).values.double(), cur_len, decoder_prompt_len
+        )
+        return UserDict(
+            {
+                "next_beam_scores": next_beam_scores.view(-1),
+                "next_beam_tokens": next_beam_tokens.view(-1),
+                "next_beam_indices": next_beam_indices.view(-1),
+            }
+        )
+
+    def finalize(
+        self,
+        input_ids: torch.LongTensor,
+        final_beam_scores: torch.FloatTensor,
+        final_beam_tokens: torch.LongTensor,
+        final_beam_indices: torch.LongTensor,
+        max_length: int,
+        pad_token_id: Optional[int] = None,
+        eos_token_id: Optional[Union[int, List[int]]] = None,
+        beam_indices: Optional[torch.LongTensor] = None,
+        decoder_prompt_len: Optional[int] = 0,
+    ):
+        batch_size = self._done.size(0)
+        if isinstance(eos_token_id, int):
+            eos_token_id = [eos_token_id]
+        # all the open beams of the batches not done are added to the hypotheses
+        length = input_ids.shape[-1]
+        scores = final_beam_scores.double().view(batch_size, self.num_beams) / (
+            (length - decoder_prompt_len) ** self.length_penalty
+        )
+        self._add(
+            scores,
+            input_ids.view(batch_size, self.num_beams, length),
+            ~self._done.unsqueeze(-1).expand(-1, self.num_beams),
+        )
+        num_hyps = self.num_beam_hyps_to_keep
+        best_scores = self._hyp_scores[:, :num_hyps].float().reshape(-1)
+        sent_lengths = self._hyp_lens[:, :num_hyps].reshape(-1)
+        min_length, max_sent_length = torch.aminmax(sent_lengths)
+        min_length, max_sent_length = int(min_length), int(max_sent_length)
+        sent_max_len = max_sent_length + 1
+        if max_length is not None:
+            sent_max_len = min(sent_max_len, max_length)
+        decoded = self._hyp_ids[:, :num_hyps, :sent_max_len].reshape(
+            batch_size * num_hyps, sent_max_len
+        )
+        positions = torch.arange(sent_max_len, device=decoded.device)
+        # shorter batches are padded if needed
+        if min_length != max_sent_length:
+            if pad_token_id is None:
+                raise ValueError("`pad_token_id` has to be defined")
+            decoded = decoded.masked_fill(
+                positions >= sent_lengths.unsqueeze(-1), pad_token_id
+            )
+        # fill with the first eos_token_id if it fits in
+        if eos_token_id is not None:
+            decoded = decoded.masked_fill(
+                positions == sent_lengths.unsqueeze(-1), eos_token_id[0]
+            )
+        return UserDict(
+            {
+                "sequences": decoded,
+                "sequence_scores": best_scores,
+                "beam_indices": None,
+            }
+        )
+
+
+def _get_beam_scorer(beam_scorer: BeamScorer, beam_indices=None):
+    # The HF BeamSearchScorer is replaced with the batched one unless the beam indices of the
+    # hypotheses are returned, which are tracked as Python tuples.
+    if (
+        type(beam_scorer) is not BeamSearchScorer
+        or beam_scorer.num_beam_groups != 1
+        or beam_indices is not None
+    ):
+        return beam_scorer
+    return _BeamSearchScorer(
+        len(beam_scorer._beam_hyps),
+        beam_scorer.num_beams,
+        beam_scorer.device,
+        beam_scorer.length_penalty,
+        beam_scorer.do_early_stopping,
+        beam_scorer.num_beam_hyps_to_keep,
+        beam_scorer._beam_hyps[0].max_length,
+    )
@@ -10,7 +10,10 @@ from transformers.generation.stopping_criteria import (
 from transformers.generation.logits_process import LogitsProcessorList
 from transformers.generation.beam_search import BeamScorer
 from transformers.utils import ModelOutput
+from .utils import _get_initial_beam_idx, _use_chunked_prefill, _chunked_prefill
+from .beam_scorer import _get_beam_scorer
 import time
+from ...llm.metrics import generation_metrics
 
 
 class BeamSearchEncoderDecoderOutput(ModelOutput):
@@ -126,6 +129,7 @@ def _beam_search(
         if (return_dict_in_generate and output_scores)
         else None
     )
+    beam_scorer = _get_beam_scorer(beam_scorer, beam_indices)
     decoder_attentions = () if (return_dict_in_generate and output_attentions) else None
     cross_attentions = () if (return_dict_in_generate and output_attentions) else None
     decoder_hidden_states = (
@@ -153,6 +157,7 @@ def _beam_search(
     beam_scores[:, 1:] = -1e9
     beam_scores = beam_scores.view((batch_size * num_beams,))
     this_peer_finished = False  # used by synced_gpus only
+    metrics_recorder = generation_metrics._start_generation(input_ids)
     while True:
         tic = time.time()
         if synced_gpus:
@@ -200,9 +205,12 @@ def _beam_search(
                 first_token = True
                 if self.model_backbone == "T5ForConditionalGeneration":
                     first_token = False
-                    beam_idx_tmp = torch.zeros(
-                        (2048, int(batch_size * num_beams)), dtype=torch.long
-                    ).contiguous()
+                    beam_idx_tmp = _get_initial_beam_idx(
+                        self,
+                        batch_size * num_beams,
+                        input_ids.size(-1),
+                        stopping_criteria,
+                    )
                     model_inputs["past_key_values"] = tuple(
                         [
                             (
@@ -250,9 +258,12 @@ def _beam_search(
                     )
                 elif self.model_backbone == "GitForCausalLM":
                     first_token = False
-                    beam_idx_tmp = torch.zeros(
-                        (2048, int(batch_size * num_beams)), dtype=torch.long
-                    ).contiguous()
+                    beam_idx_tmp = _get_initial_beam_idx(
+                        self,
+                        batch_size * num_beams,
+                        input_ids.size(-1),
+                        stopping_criteria,
+                    )
                     num_head = self.git.encoder.layer[
                         0
                     ].attention.self.num_attention_heads
@@ -283,9 +294,9 @@ def _beam_search(
                     num_hidden_layers = self.config.num_layers
                 elif hasattr(self.config, "n_layers"):
                     num_hidden_layers = self.config.n_layers
-                beam_idx_tmp = torch.zeros(
-                    (2048, int(batch_size * num_beams)), dtype=torch.long
-                ).contiguous()
+                beam_idx_tmp = _get_initial_beam_idx(
+                    self, batch_size * num_beams, input_ids.size(-1), stopping_criteria
+                )
                 model_inputs["past_key_values"] = tuple(
                     [
                         (
@@ -335,7 +346,9 @@ def _beam_search(
             if first_token and self.model_backbone == "YuanForCausalLM":
                 model_inputs.pop("past_key_values", None)
             if hasattr(self, "trace_graph"):
-                if first_token and hasattr(self, "trace_graph_first"):
+                if first_token and _use_chunked_prefill(self, model_inputs):
+                    outputs = _chunked_prefill(self, model_inputs)
+                elif first_token and hasattr(self, "trace_graph_first"):
                     outputs = self.trace_graph_first(**model_inputs)
                 else:
                     outputs = self.trace_graph(**model_inputs)
@@ -451,6 +464,8 @@ def _beam_search(
         # increase cur_len
         cur_len = cur_len + 1
         latency_list.append(time.time() - tic)
+        if metrics_recorder is not None:
+            metrics_recorder.step(latency_list[-1])
 
         if beam_scorer.is_done or stopping_criteria(input_ids, scores):
             if not synced_gpus:
@@ -458,6 +473,8 @@ def _beam_search(
             else:
                 this_peer_finished = True
 
+    if metrics_recorder is not None:
+        metrics_recorder.finish(model_kwargs["past_key_values"])
     sequence_outputs = beam_scorer.finalize(
         input_ids,
         beam_scores,
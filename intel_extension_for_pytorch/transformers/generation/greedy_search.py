@@ -9,7 +9,16 @@ from transformers.generation.stopping_criteria import (
 from transformers.generation.logits_process import LogitsProcessorList
 from transformers.generation.streamers import BaseStreamer
 from transformers.utils import ModelOutput
+from .utils import (
+    _get_initial_beam_idx,
+    _get_max_length,
+    _get_eos_check_interval,
+    _GeneratedIdsBuffer,
+    _use_chunked_prefill,
+    _chunked_prefill,
+)
 import time
+from ...llm.metrics import generation_metrics
 
 
 class GreedySearchDecoderOnlyOutput(ModelOutput):
@@ -131,8 +140,16 @@ def _greedy_search(
     unfinished_sequences = torch.ones(
         input_ids.shape[0], dtype=torch.long, device=input_ids.device
     )
+    # write the generated ids into a preallocated buffer, and check the length-only
+    # stopping criteria on host instead of evaluating them on the ids every step
+    generated_ids = _GeneratedIdsBuffer(input_ids, stopping_criteria.max_length)
+    max_length = _get_max_length(stopping_criteria)
+    eos_check_interval = _get_eos_check_interval(
+        max_length, streamer, return_dict_in_generate
+    )
 
     this_peer_finished = False  # used by synced_gpus only
+    metrics_recorder = generation_metrics._start_generation(input_ids)
     while True:
         tic = time.time()
         if synced_gpus:
@@ -181,9 +198,9 @@ def _greedy_search(
                 first_token = True
                 if self.model_backbone == "T5ForConditionalGeneration":
                     first_token = False
-                    beam_idx_tmp = torch.zeros(
-                        (2048, int(input_bs)), dtype=torch.long
-                    ).contiguous()
+                    beam_idx_tmp = _get_initial_beam_idx(
+                        self, input_bs, input_ids.size(-1), stopping_criteria
+                    )
                     model_inputs["past_key_values"] = tuple(
                         [
                             (
@@ -238,9 +255,9 @@ def _greedy_search(
                     num_hidden_layers = self.config.num_layers
                 elif hasattr(self.config, "n_layers"):
                     num_hidden_layers = self.config.n_layers
-                beam_idx_tmp = torch.zeros(
-                    (2048, int(input_bs)), dtype=torch.long
-                ).contiguous()
+                beam_idx_tmp = _get_initial_beam_idx(
+                    self, input_bs, input_ids.size(-1), stopping_criteria
+                )
                 if self.model_backbone == "GitForCausalLM":
                     num_head = self.git.encoder.layer[
                         0
@@ -296,7 +313,9 @@ def _greedy_search(
                     model_inputs["encoder_outputs"] = (
                         model_inputs["encoder_outputs"]["last_hidden_state"],
                     )
-                if first_token and hasattr(self, "trace_graph_first"):
+                if first_token and _use_chunked_prefill(self, model_inputs):
+                    outputs = _chunked_prefill(self, model_inputs)
+                elif first_token and hasattr(self, "trace_graph_first"):
                     outputs = self.trace_graph_first(**model_inputs)
                 else:
                     outputs = self.trace_graph(**model_inputs)
@@ -359,7 +378,10 @@ def _greedy_search(
             )
 
         # update generated ids, model inputs, and length for next step
-        input_ids = torch.cat([input_ids, next_tokens[:, None]], dim=-1)
+        input_ids = generated_ids.append(
+            next_tokens,
+            unfinished_sequences if eos_token_id_tensor is not None else None,
+        )
         if streamer is not None:
             streamer.put(next_tokens.cpu())
         model_kwargs = self._update_model_kwargs_for_generation(
@@ -368,22 +390,39 @@ def _greedy_search(
 
         # if eos_token was found in one sentence, set sentence to finished
         if eos_token_id_tensor is not None:
-            unfinished_sequences = unfinished_sequences.mul(
-                next_tokens.tile(eos_token_id_tensor.shape[0], 1)
-                .ne(eos_token_id_tensor.unsqueeze(1))
-                .prod(dim=0)
+            unfinished_sequences.mul_(
+                torch.isin(next_tokens, eos_token_id_tensor, invert=True)
             )
 
         # stop when each sentence is finished, or if we exceed the maximum length
         latency_list.append(time.time() - tic)
-        if unfinished_sequences.max() == 0 or stopping_criteria(input_ids, scores):
+        if metrics_recorder is not None:
+            metrics_recorder.step(latency_list[-1], unfinished_sequences)
+        if (
+            generated_ids.cur_len >= max_length
+            if max_length is not None
+            else stopping_criteria(input_ids, scores)
+        ) or (
+            eos_token_id_tensor is not None
+            and generated_ids.cur_len % eos_check_interval == 0
+            and not unfinished_sequences.any()
+        ):
             if not synced_gpus:
                 break
             else:
                 this_peer_finished = True
 
+    if eos_token_id_tensor is not None and eos_check_interval > 1:
+        num_dropped = generated_ids.trim_finished()
+        if num_dropped > 0:
+            del latency_list[-num_dropped:]
+            if metrics_recorder is not None:
+                del metrics_recorder.latencies[-num_dropped:]
+    if metrics_recorder is not None:
+        metrics_recorder.finish(model_kwargs.get("past_key_values"))
     if streamer is not None:
         streamer.end()
+    input_ids = generated_ids.finalize()
 
     if return_dict_in_generate:
         if self.config.is_encoder_decoder:
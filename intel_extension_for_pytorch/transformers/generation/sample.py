@@ -10,7 +10,18 @@ from transformers.generation.stopping_criteria import (
 from transformers.generation.logits_process import LogitsProcessorList
 from transformers.generation.streamers import BaseStreamer
 from transformers.utils import ModelOutput
+from .utils import (
+    _get_initial_beam_idx,
+    _get_max_length,
+    _get_eos_check_interval,
+    _GeneratedIdsBuffer,
+    _get_fused_sampling_params,
+    _use_chunked_prefill,
+    _chunked_prefill,
+)
 import time
+from ...llm.metrics import generation_metrics
+from ...llm.functional import top_k_top_p_sampling
 
 
 class SampleEncoderDecoderOutput(ModelOutput):
@@ -112,6 +123,10 @@ def _sample(
 
     # init attention / hidden states / scores tuples
     scores = () if (return_dict_in_generate and output_scores) else None
+    # the logits warpers are fused into the sampling unless their outputs are returned
+    fused_sampling_params = (
+        _get_fused_sampling_params(logits_warper) if scores is None else None
+    )
     decoder_attentions = () if (return_dict_in_generate and output_attentions) else None
     cross_attentions = () if (return_dict_in_generate and output_attentions) else None
     decoder_hidden_states = (
@@ -135,9 +150,17 @@ def _sample(
     unfinished_sequences = torch.ones(
         input_ids.shape[0], dtype=torch.long, device=input_ids.device
     )
+    # write the generated ids into a preallocated buffer, and check the length-only
+    # stopping criteria on host instead of evaluating them on the ids every step
+    generated_ids = _GeneratedIdsBuffer(input_ids, stopping_criteria.max_length)
+    max_length = _get_max_length(stopping_criteria)
+    eos_check_interval = _get_eos_check_interval(
+        max_length, streamer, return_dict_in_generate
+    )
 
     this_peer_finished = False  # used by synced_gpus only
     # auto-regressive generation
+    metrics_recorder = generation_metrics._start_generation(input_ids)
     while True:
         tic = time.time()
         if synced_gpus:
@@ -187,9 +210,9 @@ def _sample(
                 first_token = True
                 if self.model_backbone == "T5ForConditionalGeneration":
                     first_token = False
-                    beam_idx_tmp = torch.zeros(
-                        (2048, int(input_bs)), dtype=torch.long
-                    ).contiguous()
+                    beam_idx_tmp = _get_initial_beam_idx(
+                        self, input_bs, input_ids.size(-1), stopping_criteria
+                    )
                     model_inputs["past_key_values"] = tuple(
                         [
                             (
@@ -244,9 +267,9 @@ def _sample(
                     num_hidden_layers = self.config.num_layers
                 elif hasattr(self.config, "n_layers"):
                     num_hidden_layers = self.config.n_layers
-                beam_idx_tmp = torch.zeros(
-                    (2048, int(input_bs)), dtype=torch.long
-                ).contiguous()
+                beam_idx_tmp = _get_initial_beam_idx(
+                    self, input_bs, input_ids.size(-1), stopping_criteria
+                )
                 if self.model_backbone == "GitForCausalLM":
                     num_head = self.git.encoder.layer[
                         0
@@ -302,7 +325,9 @@ def _sample(
                     model_inputs["encoder_outputs"] = (
                         model_inputs["encoder_outputs"]["last_hidden_state"],
                     )
-                if first_token and hasattr(self, "trace_graph_first"):
+                if first_token and _use_chunked_prefill(self, model_inputs):
+                    outputs = _chunked_prefill(self, model_inputs)
+                elif first_token and hasattr(self, "trace_graph_first"):
                     outputs = self.trace_graph_first(**model_inputs)
                 else:
                     outputs = self.trace_graph(**model_inputs)
@@ -330,7 +355,8 @@ def _sample(
 
         # pre-process distribution
         next_token_scores = logits_processor(input_ids, next_token_logits)
-        next_token_scores = logits_warper(input_ids, next_token_scores)
+        if fused_sampling_params is None:
+            next_token_scores = logits_warper(input_ids, next_token_scores)
 
         # Store scores, attentions and hidden_states when required
         if return_dict_in_generate:
@@ -353,8 +379,13 @@ def _sample(
                 )
 
         # sample
-        probs = nn.functional.softmax(next_token_scores, dim=-1)
-        next_tokens = torch.multinomial(probs, num_samples=1).squeeze(1)
+        if fused_sampling_params is not None:
+            next_tokens = top_k_top_p_sampling(
+                next_token_scores, **fused_sampling_params
+            )
+        else:
+            probs = nn.functional.softmax(next_token_scores, dim=-1)
+            next_tokens = torch.multinomial(probs, num_samples=1).squeeze(1)
 
         # finished sentences should have their next token be a padding token
         if eos_token_id is not None:
@@ -367,7 +398,10 @@ def _sample(
             )
 
         # update generated ids, model inputs, and length for next step
-        input_ids = torch.cat([input_ids, next_tokens[:, None]], dim=-1)
+        input_ids = generated_ids.append(
+            next_tokens,
+            unfinished_sequences if eos_token_id_tensor is not None else None,
+        )
         if streamer is not None:
             streamer.put(next_tokens.cpu())
         model_kwargs = self._update_model_kwargs_for_generation(
@@ -376,25 +410,42 @@ def _sample(
 
         # if eos_token was found in one sentence, set sentence to finished
         if eos_token_id_tensor is not None:
-            unfinished_sequences = unfinished_sequences.mul(
-                next_tokens.tile(eos_token_id_tensor.shape[0], 1)
-                .ne(eos_token_id_tensor.unsqueeze(1))
-                .prod(dim=0)
+            unfinished_sequences.mul_(
+                torch.isin(next_tokens, eos_token_id_tensor, invert=True)
             )
 
-            # stop when each sentence is finished
-            if unfinished_sequences.max() == 0:
-                this_peer_finished = True
         latency_list.append(time.time() - tic)
+        if metrics_recorder is not None:
+            metrics_recorder.step(latency_list[-1], unfinished_sequences)
         # stop if we exceed the maximum length
-        if stopping_criteria(input_ids, scores):
+        if (
+            generated_ids.cur_len >= max_length
+            if max_length is not None
+            else stopping_criteria(input_ids, scores)
+        ):
+            this_peer_finished = True
+        # stop when each sentence is finished
+        elif (
+            eos_token_id_tensor is not None
+            and generated_ids.cur_len % eos_check_interval == 0
+            and not unfinished_sequences.any()
+        ):
             this_peer_finished = True
 
         if this_peer_finished and not synced_gpus:
             break
 
+    if eos_token_id_tensor is not None and eos_check_interval > 1:
+        num_dropped = generated_ids.trim_finished()
+        if num_dropped > 0:
+            del latency_list[-num_dropped:]
+            if metrics_recorder is not None:
+                del metrics_recorder.latencies[-num_dropped:]
+    if metrics_recorder is not None:
+        metrics_recorder.finish(model_kwargs.get("past_key_values"))
     if streamer is not None:
         streamer.end()
+    input_ids = generated_ids.finalize()
 
     if return_dict_in_generate:
         if self.config.is_encoder_decoder:
@@ -1,3 +1,14 @@
+import torch
+from typing import Optional
+from transformers.generation.stopping_criteria import (
+    MaxLengthCriteria,
+    MaxNewTokensCriteria,
+)
+from transformers.generation.logits_process import (
+    TemperatureLogitsWarper,
+    TopKLogitsWarper,
+    TopPLogitsWarper,
+)
 from transformers.utils import ModelOutput
 
 
@@ -22,3 +33,199 @@ def _extract_past_from_model_output(
             past_key_values, batch_size=batch_size
         )
     return past_key_values
+
+
+def _get_initial_beam_idx(self, batch_size, cur_len, stopping_criteria=None):
+    # The beam_idx of the first token is a placeholder which the indirect access KV cache kernel
+    # takes as (max_positions, batch_size). Unless config.text_max_length is set, the cache is
+    # pre-allocated with its first dim and grows by doubling when the generation goes further.
+    # Size it by the max length of the generation (prompt length + max_new_tokens) rather than
+    # a fixed number of positions.
+    max_length = None
+    if stopping_criteria is not None:
+        max_length = stopping_criteria.max_length
+    if max_length is None:
+        max_length = getattr(self.generation_config, "max_length", None) or 0
+    return torch.zeros(
+        (max(max_length, cur_len + 1), int(batch_size)), dtype=torch.long
+    ).contiguous()
+
+
+def _get_max_length(stopping_criteria):
+    # Returns the max length if every stopping criterion only depends on the length of the
+    # generated ids, which can then be checked on host without calling the criteria.
+    if stopping_criteria is None or len(stopping_criteria) == 0:
+        return None
+    if not all(
+        isinstance(criteria, (MaxLengthCriteria, MaxNewTokensCriteria))
+        for criteria in stopping_criteria
+    ):
+        return None
+    return stopping_criteria.max_length
+
+
+_FUSED_LOGITS_WARPERS = [TemperatureLogitsWarper, TopKLogitsWarper, TopPLogitsWarper]
+
+
+def _get_fused_sampling_params(logits_warper):
+    # Returns the parameters of the logits warpers if they are only the temperature, top-k and
+    # top-p warpers in the order of HF, which top_k_top_p_sampling applies at once.
+    params = {}
+    last = -1
+    for warper in logits_warper:
+        if type(warper) not in _FUSED_LOGITS_WARPERS:
+            return None
+        index = _FUSED_LOGITS_WARPERS.index(type(warper))
+        if index <= last:
+            return None
+        last = index
+        if isinstance(warper, TemperatureLogitsWarper):
+            params["temperature"] = warper.temperature
+        elif warper.filter_value != -float("inf"):
+            return None
+        elif isinstance(warper, TopKLogitsWarper):
+            params["top_k"] = warper.top_k
+        else:
+            params["top_p"] = warper.top_p
+            params["min_tokens_to_keep"] = warper.min_tokens_to_keep
+    return params
+
+
+class _GeneratedIdsBuffer:
+    r"""
+    Keeps the generated ids in a preallocated [batch, max_length] buffer, so appending one token per
+    step is an in-place write instead of a torch.cat of all the ids so far. ``ids`` is a view of the
+    valid part of the buffer. The buffer grows by doubling if the generation goes beyond max_length.
+    """
+
+    def __init__(self, input_ids: torch.Tensor, max_length: Optional[int] = None):
+        batch_size, self.cur_len = input_ids.shape
+        capacity = max(max_length or 0, self.cur_len + 1)
+        self.buffer = input_ids.new_empty((batch_size, capacity))
+        self.buffer[:, : self.cur_len].copy_(input_ids)
+        # the length up to the last step with an unfinished sequence, kept on device
+        self.active_len = self.cur_len
+
+    @property
+    def ids(self) -> torch.Tensor:
+        return self.buffer[:, : self.cur_len]
+
+    def append(
+        self,
+        next_tokens: torch.Tensor,
+        unfinished_sequences: Optional[torch.Tensor] = None,
+    ) -> torch.Tensor:
+        if self.cur_len == self.buffer.size(1):
+            buffer = self.buffer.new_empty((self.buffer.size(0), 2 * self.cur_len))
+            buffer[:, : self.cur_len].copy_(self.buffer)
+            self.buffer = buffer
+        self.buffer[:, self.cur_len].copy_(next_tokens)
+        self.cur_len += 1
+        if unfinished_sequences is not None:
+            # unfinished_sequences before the EOS update of this step
+            self.active_len = self.active_len + unfinished_sequences.max()
+        return self.ids
+
+    def trim_finished(self) -> int:
+        r"""
+        Drops the steps after all the sequences are finished, which only appended padding ids, and
+        returns the number of the dropped steps. It is only valid if ``unfinished_sequences`` is
+        passed to every ``append``.
+        """
+        active_len = int(self.active_len)
+        num_dropped = self.cur_len - active_len
+        self.cur_len = active_len
+        return num_dropped
+
+    def finalize(self) -> torch.Tensor:
+        return self.ids.contiguous()
+
+
+# Checking whether all the sequences are finished converts a tensor to a Python bool, i.e., a host
+# sync per step, so it only runs every _EOS_CHECK_INTERVAL steps. The tradeoff is that up to
+# _EOS_CHECK_INTERVAL - 1 steps run after all the sequences are finished; their padding ids are
+# trimmed from the output by _GeneratedIdsBuffer.trim_finished.
+_EOS_CHECK_INTERVAL = 4
+
+
+def _get_eos_check_interval(max_length, streamer=None, return_dict_in_generate=False):
+    # The stopping criteria evaluated on the ids (max_length is None), the streamer and the
+    # per-step outputs would see the extra steps, check every step for them.
+    if max_length is None or streamer is not None or return_dict_in_generate:
+        return 1
+    return _EOS_CHECK_INTERVAL
+
+
+def _rollback_iakv_cache(past_key_values, length: int):
+    r"""
+    Truncates the indirect access KV cache of every layer to its first ``length`` tokens, e.g. to drop
+    the tokens rejected by speculative decoding. The key/value buffers are kept as they are since the
+    kernel only reads the positions before the offset carried by the shape of ``layer_past[0]``; the
+    ``beam_idx`` history of the dropped positions is reset to the initial one.
+    """
+    new_past_key_values = []
+    for layer_past in past_key_values:
+        beam_idx = layer_past[3]
+        if beam_idx.size(0) > length:
+            beam_idx[length:] = beam_idx[0]
+        new_past_key_values.append(
+            (
+                torch.empty(1, length, length, 1, dtype=torch.long).contiguous(),
+                layer_past[1],
+                layer_past[2],
+                beam_idx,
+            )
+            + tuple(layer_past[4:])
+        )
+    return tuple(new_past_key_values)
+
+
+_CHUNKED_PREFILL_INPUTS = {
+    "input_ids",
+    "attention_mask",
+    "position_ids",
+    "past_key_values",
+    "return_last_logit",
+}
+
+
+def _use_chunked_prefill(self, model_inputs):
+    prefill_chunk_size = getattr(self.config, "prefill_chunk_size", 0)
+    return (
+        prefill_chunk_size > 0
+        and hasattr(self, "trace_graph")
+        and model_inputs["input_ids"].size(-1) > prefill_chunk_size
+        and set(model_inputs.keys()) <= _CHUNKED_PREFILL_INPUTS
+        and len(model_inputs["past_key_values"][0]) == 4
+    )
+
+
+def _chunked_prefill(self, model_inputs):
+    r"""
+    Runs the first token of the traced model in chunks of ``config.prefill_chunk_size`` tokens to
+    bound the peak activation memory of long prompts. The first chunk goes through trace_graph_first
+    and allocates the indirect access KV cache, the following chunks are appended to it through
+    trace_graph. Returns the outputs of the last chunk, whose last logits are the ones of the prompt.
+    """
+    chunk_size = self.config.prefill_chunk_size
+    input_ids = model_inputs["input_ids"]
+    attention_mask = model_inputs["attention_mask"]
+    position_ids = model_inputs.get("position_ids", None)
+    past_key_values = model_inputs["past_key_values"]
+    seq_len = input_ids.size(-1)
+    for start in range(0, seq_len, chunk_size):
+        end = min(start + chunk_size, seq_len)
+        chunk_inputs = dict(model_inputs)
+        chunk_inputs["input_ids"] = input_ids[:, start:end]
+        chunk_inputs["attention_mask"] = attention_mask[:, :end]
+        if position_ids is not None:
+            chunk_inputs["position_ids"] = position_ids[:, start:end]
+        chunk_inputs["past_key_values"] = past_key_values
+        if start == 0 and hasattr(self, "trace_graph_first"):
+            outputs = self.trace_graph_first(**chunk_inputs)
+        else:
+            outputs = self.trace_graph(**chunk_inputs)
+        past_key_values = (
+            outputs.past_key_values if isinstance(outputs, dict) else outputs[1]
+        )
+    return outputs
@@ -30,6 +30,9 @@ class _IPEXRopeCPU(nn.Module):
         num_concats: Optional[int] = None,
     ):
         position_ids = position_ids.contiguous()
+        # kept for shift_positions, which rotates the query of the streaming kv cache
+        self.rotary_offset = offset
+        self.rotary_ndims = rotary_ndims
         sin_cos, _, _ = self.embed_positions(seq_len)
         if num_concats is None:
             # query, key (in/out shape) : [bs, seqlen, num_head/num_kv_head, head_dim]
@@ -61,6 +64,34 @@ class _IPEXRopeCPU(nn.Module):
             )
             return query, key, value
 
+    def shift_positions(self, x: torch.Tensor, shift: torch.Tensor):
+        # x (in/out shape) : [bs, seqlen, num_head, head_dim], already rotated by forward
+        # shift: [seqlen], x[:, s] is rotated by -shift[s] positions with the
+        # offset/rotary_ndims of the last forward call.
+        rotary_ndims = self.rotary_ndims
+        freqs = shift.to(torch.float32).unsqueeze(-1) * self.embed_positions.inv_freq[
+            : rotary_ndims // 2
+        ].unsqueeze(0)
+        if self.embed_positions.model_backbone in [
+            "FalconForCausalLM",
+            "RWForCausalLM",
+        ]:
+            sin_cos = torch.cat(
+                ((-freqs).sin().repeat(1, 2), freqs.cos().repeat(1, 2)), dim=-1
+            )
+        else:
+            sin_cos = torch.cat(((-freqs).sin(), freqs.cos()), dim=-1)
+        x, _, _ = torch.ops.torch_ipex.rotary_position_embedding(
+            x,
+            sin_cos.contiguous(),
+            torch.zeros(1, dtype=torch.long),
+            x.size(2),
+            x.size(3),
+            self.rotary_offset,
+            rotary_ndims,
+        )
+        return x
+
     @classmethod
     def rotary_embedding(
         cls, query, key, sin, cos, rotary_dim, rotary_half, position_ids=None
@@ -138,9 +169,145 @@ class _IPEXRopeCPU(nn.Module):
 
 
 class _IPEXScaleDotProductCPU(nn.Module):
-    def __init__(self, text_max_length):
+    def __init__(
+        self,
+        text_max_length,
+        prefill_chunk_size=0,
+        kv_cache_dtype=None,
+        attention_sink_size=0,
+        sliding_window_size=0,
+        rotary_embedding=None,
+    ):
         super().__init__()
         self.text_max_length = text_max_length
+        self.prefill_chunk_size = prefill_chunk_size
+        self.kv_cache_dtype = kv_cache_dtype
+        self.attention_sink_size = attention_sink_size
+        self.sliding_window_size = sliding_window_size
+        self.rotary_embedding = rotary_embedding
+
+    @classmethod
+    def _streaming_attention(
+        cls,
+        query: torch.Tensor,
+        key: torch.Tensor,
+        value: torch.Tensor,
+        scale_attn: float,
+        layer_past: Tuple[torch.Tensor],
+        attention_mask: torch.Tensor,
+        seq_info: Optional[torch.Tensor],
+        kv_cache_dtype: Optional[torch.dtype],
+        attention_sink_size: int,
+        sliding_window_size: int,
+        rotary_embedding: Optional[nn.Module],
+    ):
+        # The kv cache keeps attention_sink_size tokens from the start of the sequence plus a
+        # rolling window of the last sliding_window_size tokens, and the window slots are reused
+        # in place. The keys are rotated at their absolute positions, so a window key is at the
+        # right distance from the query. The sinks are not: the query at the position q is rotated
+        # back by max(0, q + 1 - capacity) positions for them, so that the sinks look right before
+        # the window, as if the evicted tokens never existed.
+        key_cache = layer_past[1].contiguous()
+        value_cache = layer_past[2].contiguous()
+        if kv_cache_dtype is not None and key_cache.dtype != kv_cache_dtype:
+            key_cache = key_cache.to(kv_cache_dtype)
+            value_cache = value_cache.to(kv_cache_dtype)
+        beam_idx = layer_past[3].contiguous()
+        if seq_info is None:
+            seq_info = torch.tensor(
+                layer_past[0].size(-2), dtype=torch.long
+            ).contiguous()
+        sink_query = None
+        if rotary_embedding is not None and attention_sink_size > 0:
+            positions = seq_info + torch.arange(query.size(1), dtype=torch.long)
+            shift = torch.clamp(
+                positions + 1 - (attention_sink_size + sliding_window_size), min=0
+            )
+            sink_query = rotary_embedding.shift_positions(query.contiguous(), shift)
+        (
+            attn_output,
+            attn_weights,
+            key_cache,
+            value_cache,
+            beam_idx,
+        ) = torch.ops.torch_ipex.streaming_masked_multihead_self_attention(
+            query,
+            key,
+            value,
+            key_cache,
+            value_cache,
+            beam_idx,
+            seq_info,
+            scale_attn,
+            attention_sink_size,
+            sliding_window_size,
+            sink_query,
+            attention_mask,
+        )
+        # the sequence info still counts all the tokens, as the model needs the absolute
+        # position of the next tokens
+        present = (
+            torch.empty(
+                1,
+                (layer_past[0].size(-2) + query.shape[1]),
+                (layer_past[0].size(-2) + query.shape[1]),
+                1,
+                dtype=torch.long,
+            ).contiguous(),
+            key_cache,
+            value_cache,
+            beam_idx,
+        )
+        return attn_output, attn_weights, present
+
+    @classmethod
+    def _chunked_prefill(
+        cls,
+        query: torch.Tensor,
+        key: torch.Tensor,
+        value: torch.Tensor,
+        scale_attn: float,
+        layer_past: Optional[Tuple[torch.Tensor]],
+        head_mask: Optional[Tuple[torch.Tensor]],
+        attention_mask: torch.Tensor,
+        add_casual_mask: Optional[bool],
+        text_max_length: Optional[int],
+        prefill_chunk_size: int,
+        kv_cache_dtype: Optional[torch.dtype] = None,
+        attention_sink_size: int = 0,
+        sliding_window_size: int = 0,
+        rotary_embedding: Optional[nn.Module] = None,
+    ):
+        # Runs the first token in chunks of prefill_chunk_size tokens. The first chunk allocates the
+        # KV cache, the following ones are appended to it and attend to all the previous tokens, so
+        # the attention weights are [chunk, seq_len] instead of [seq_len, seq_len]. The kernel masks
+        # the future tokens of every chunk, the rows/columns of attention_mask are sliced accordingly.
+        seq_len = query.size(1)
+        attn_outputs = []
+        for start in range(0, seq_len, prefill_chunk_size):
+            end = min(start + prefill_chunk_size, seq_len)
+            chunk_mask = attention_mask[..., :end]
+            if chunk_mask.size(-2) > 1:
+                chunk_mask = chunk_mask[..., start:end, :]
+            attn_output, _, layer_past = cls.apply_function(
+                query[:, start:end],
+                key[:, start:end],
+                value[:, start:end],
+                scale_attn,
+                layer_past,
+                head_mask,
+                chunk_mask.contiguous(),
+                None,
+                add_casual_mask,
+                None,
+                text_max_length,
+                kv_cache_dtype=kv_cache_dtype,
+                attention_sink_size=attention_sink_size,
+                sliding_window_size=sliding_window_size,
+                rotary_embedding=rotary_embedding,
+            )
+            attn_outputs.append(attn_output)
+        return torch.cat(attn_outputs, dim=-2), None, layer_past
 
     @classmethod
     def apply_function(
@@ -158,6 +325,11 @@ class _IPEXScaleDotProductCPU(nn.Module):
         text_max_length: Optional[int] = 0,
         cutoff: Optional[torch.Tensor] = None,
         vision: Optional[torch.Tensor] = False,
+        prefill_chunk_size: Optional[int] = 0,
+        kv_cache_dtype: Optional[torch.dtype] = None,
+        attention_sink_size: Optional[int] = 0,
+        sliding_window_size: Optional[int] = 0,
+        rotary_embedding: Optional[nn.Module] = None,
     ):
         if cutoff is not None:
             if layer_past is None:
@@ -222,8 +394,52 @@ class _IPEXScaleDotProductCPU(nn.Module):
                 torch.zeros([1, 1, 1, 1]).contiguous(),
                 torch.zeros(1, int(query.size(0)), dtype=torch.long).contiguous(),
             )
+        # The traced model is chunked by the generation loop instead, a chunk loop traced with the
+        # dummy prompt would be baked into the graph with its slice bounds.
+        if (
+            prefill_chunk_size
+            and not torch.jit.is_tracing()
+            and query.size(1) > prefill_chunk_size
+            and seq_info is None
+            and layer_past[0].size(-2) == 0
+        ):
+            return cls._chunked_prefill(
+                query,
+                key,
+                value,
+                scale_attn,
+                layer_past,
+                head_mask,
+                attention_mask,
+                add_casual_mask,
+                text_max_length,
+                prefill_chunk_size,
+                kv_cache_dtype,
+                attention_sink_size,
+                sliding_window_size,
+                rotary_embedding,
+            )
+        if sliding_window_size > 0:
+            return cls._streaming_attention(
+                query,
+                key,
+                value,
+                scale_attn,
+                layer_past,
+                attention_mask,
+                seq_info,
+                kv_cache_dtype,
+                attention_sink_size,
+                sliding_window_size,
+                rotary_embedding,
+            )
         key_cache = layer_past[1].contiguous()
         value_cache = layer_past[2].contiguous()
+        if kv_cache_dtype is not None and key_cache.dtype != kv_cache_dtype:
+            # The kernel allocates the cache of the first token in the data type of
+            # the placeholder cache, int8 and fp8 caches are quantized by the kernel.
+            key_cache = key_cache.to(kv_cache_dtype)
+            value_cache = value_cache.to(kv_cache_dtype)
         beam_idx = layer_past[3].contiguous()
         if seq_info is None:
             seq_info = torch.tensor(
@@ -293,6 +509,11 @@ class _IPEXScaleDotProductCPU(nn.Module):
             self.text_max_length,
             cutoff,
             vision,
+            self.prefill_chunk_size,
+            self.kv_cache_dtype,
+            self.attention_sink_size,
+            self.sliding_window_size,
+            self.rotary_embedding,
         )
 
 
@@ -336,9 +557,18 @@ class _IPEXFastLayerNormCPU(nn.Module):
 
 class _IPEXPagedAttentionCPU:
     @classmethod
-    def reshape_and_cache(cls, key, value, key_cache, value_cache, slot_mapping):
+    def reshape_and_cache(
+        cls,
+        key,
+        value,
+        key_cache,
+        value_cache,
+        slot_mapping,
+        k_scale=None,
+        v_scale=None,
+    ):
         torch.ops.torch_ipex.reshape_and_cache(
-            key, value, key_cache, value_cache, slot_mapping
+            key, value, key_cache, value_cache, slot_mapping, k_scale, v_scale
         )
 
     @classmethod
@@ -355,6 +585,8 @@ class _IPEXPagedAttentionCPU:
         block_size,
         max_context_len,
         alibi_slopes,
+        k_scale=None,
+        v_scale=None,
     ):
         torch.ops.torch_ipex.single_query_cached_kv_attention(
             output,
@@ -368,6 +600,8 @@ class _IPEXPagedAttentionCPU:
             block_size,
             max_context_len,
             alibi_slopes,
+            k_scale,
+            v_scale,
         )
 
 
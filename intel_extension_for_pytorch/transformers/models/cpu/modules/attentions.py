@@ -1,3 +1,4 @@
+import torch
 from torch import nn
 from ...cpu.fusions.mha_fusion import (
     _IPEXRopeCPU,
@@ -8,6 +9,14 @@ from ...cpu.fusions.linear_fusion import (
 )
 
 
+def _get_kv_cache_dtype(config):
+    # config.kv_cache_dtype is the name of the dtype set by ipex.llm.optimize, e.g., "int8"
+    kv_cache_dtype = getattr(config, "kv_cache_dtype", None)
+    if isinstance(kv_cache_dtype, str):
+        kv_cache_dtype = getattr(torch, kv_cache_dtype)
+    return kv_cache_dtype
+
+
 class _IPEXAttentionCPU(nn.Module):
     def __init__(self, module, config, tpp=False, woq=False):
         super().__init__()
@@ -71,9 +80,15 @@ class _IPEXAttentionCPU(nn.Module):
 
         if self.model_backbone in ["CodeGenForCausalLM"]:
             self._IPEXROPE.embed_positions.sin_cos = self.embed_positions
+        # -1 sizes the KV cache by the beam_idx placeholder of the generation loops
         self.text_max_length = (
-            config.text_max_length if hasattr(config, "text_max_length") else 2048
+            config.text_max_length if hasattr(config, "text_max_length") else -1
         )
         self._IPEXScaleDotProduct = _IPEXScaleDotProductCPU(
-            text_max_length=self.text_max_length
+            text_max_length=self.text_max_length,
+            prefill_chunk_size=getattr(config, "prefill_chunk_size", 0),
+            kv_cache_dtype=_get_kv_cache_dtype(config),
+            attention_sink_size=getattr(config, "attention_sink_size", 0),
+            sliding_window_size=getattr(config, "sliding_window_size", 0),
+            rotary_embedding=getattr(self, "_IPEXROPE", None),
         )
@@ -921,7 +921,19 @@ class _IPEXRMSNormRef(nn.Module):
 
 class _IPEXPagedAttentionRef:
     @classmethod
-    def reshape_and_cache(cls, key, value, key_cache, value_cache, slot_mapping):
+    def reshape_and_cache(
+        cls,
+        key,
+        value,
+        key_cache,
+        value_cache,
+        slot_mapping,
+        k_scale=None,
+        v_scale=None,
+    ):
+        assert (
+            k_scale is None and v_scale is None
+        ), "The quantized kv cache is not supported by the reference paged attention"
         if key.dtype is torch.bfloat16:
             x = 16 // torch.tensor([], dtype=key.dtype).element_size()
         else:
@@ -952,7 +964,12 @@ class _IPEXPagedAttentionRef:
         block_size,
         max_context_len,
         alibi_slopes,
+        k_scale=None,
+        v_scale=None,
     ) -> None:
+        assert (
+            k_scale is None and v_scale is None
+        ), "The quantized kv cache is not supported by the reference paged attention"
         num_heads = value_cache.shape[1]
         head_size = value_cache.shape[2]
         block_size = value_cache.shape[3]
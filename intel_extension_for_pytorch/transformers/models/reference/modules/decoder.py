@@ -692,6 +692,52 @@ def MistralDecoderLayer_forward(
     return outputs
 
 
+# The linear implementations of torch.ops.torch_ipex.mixtral_moe_grouped
+_MOE_LINEAR_TPP = 0
+_MOE_LINEAR_DNNL = 1
+_MOE_LINEAR_WOQ = 3
+
+
+def _get_mixtral_moe_weights(self):
+    # Collects the expert weights in their current layout. model_convert_lowering
+    # keeps them in _moe_weights once the experts are prepacked or WOQ converted,
+    # before that they are collected at every forward, so they never refer to
+    # the weights of replaced experts.
+    experts = self.block_sparse_moe.experts
+    gate_op_ctx, up_op_ctx, down_op_ctx = [], [], []
+    tpp_fallback = True
+    if experts[0].w1.weight.dtype in [torch.qint8, torch.int8, torch.uint8]:
+        linear_type = _MOE_LINEAR_WOQ
+        gate_wei = [e.w1._op_context.get_data_handle() for e in experts]
+        up_wei = [e.w3._op_context.get_data_handle() for e in experts]
+        down_wei = [e.w2._op_context.get_data_handle() for e in experts]
+    elif hasattr(experts[0].w1, "use_dnnl") and experts[0].w1.use_dnnl:
+        linear_type = _MOE_LINEAR_DNNL
+        gate_wei = [e.w1._get_forward_weight() for e in experts]
+        up_wei = [e.w3._get_forward_weight() for e in experts]
+        down_wei = [e.w2._get_forward_weight() for e in experts]
+        gate_op_ctx = [e.w1.ctx.get_data_handle() for e in experts]
+        up_op_ctx = [e.w3.ctx.get_data_handle() for e in experts]
+        down_op_ctx = [e.w2.ctx.get_data_handle() for e in experts]
+    else:
+        linear_type = _MOE_LINEAR_TPP
+        gate_wei = [e.w1.weight for e in experts]
+        up_wei = [e.w3.weight for e in experts]
+        down_wei = [e.w2.weight for e in experts]
+        if hasattr(experts[0].w1, "tpp_fallback"):
+            tpp_fallback = experts[0].w1.tpp_fallback
+    return (
+        gate_wei,
+        up_wei,
+        down_wei,
+        gate_op_ctx,
+        up_op_ctx,
+        down_op_ctx,
+        linear_type,
+        tpp_fallback,
+    )
+
+
 def MixtralDecoderLayer_forward(
     self,
     hidden_states: torch.Tensor,
@@ -763,67 +809,36 @@ def MixtralDecoderLayer_forward(
     # we cast back to the input dtype
     routing_weights = routing_weights.to(hidden_states.dtype)
 
-    final_hidden_states = torch.zeros(
-        (batch_size * sequence_length, hidden_dim),
-        dtype=hidden_states.dtype,
-        device=hidden_states.device,
+    # Routes the tokens by expert once and runs all the experts which receive
+    # tokens in one op, instead of one op per expert
+    (
+        gate_wei,
+        up_wei,
+        down_wei,
+        gate_op_ctx,
+        up_op_ctx,
+        down_op_ctx,
+        linear_type,
+        tpp_fallback,
+    ) = (
+        self._moe_weights
+        if hasattr(self, "_moe_weights")
+        else _get_mixtral_moe_weights(self)
+    )
+    final_hidden_states = torch.ops.torch_ipex.mixtral_moe_grouped(
+        hidden_states,
+        selected_experts,
+        routing_weights,
+        gate_wei,
+        up_wei,
+        down_wei,
+        gate_op_ctx,
+        up_op_ctx,
+        down_op_ctx,
+        linear_type,
+        tpp_fallback,
+        self.distributed,
     )
-
-    # One hot encode the selected experts to create an expert mask
-    # this will be used to easily index which expert is going to be sollicitated
-    expert_mask = torch.nn.functional.one_hot(
-        selected_experts, num_classes=self.block_sparse_moe.num_experts
-    ).permute(2, 1, 0)
-
-    # Loop over all available experts in the model and perform the computation on each expert
-    for expert_idx in range(self.block_sparse_moe.num_experts):
-        expert_layer = self.block_sparse_moe.experts[expert_idx]
-        idx, top_x = torch.where(expert_mask[expert_idx])
-        if expert_layer.w1.weight.dtype in [torch.qint8, torch.int8, torch.uint8]:
-            final_hidden_states = torch.ops.torch_ipex.mixtral_moe_woq(
-                hidden_states,
-                top_x,
-                idx,
-                expert_layer.w1._op_context.get_data_handle(),
-                expert_layer.w3._op_context.get_data_handle(),
-                expert_layer.w2._op_context.get_data_handle(),
-                routing_weights,
-                final_hidden_states,
-                self.distributed,
-            )
-        elif hasattr(expert_layer.w1, "use_dnnl") and expert_layer.w1.use_dnnl:
-            final_hidden_states = torch.ops.torch_ipex.mixtral_moe(
-                hidden_states,
-                top_x,
-                idx,
-                expert_layer.w1._get_forward_weight(),
-                expert_layer.w1.ctx.get_data_handle(),
-                expert_layer.w3._get_forward_weight(),
-                expert_layer.w3.ctx.get_data_handle(),
-                expert_layer.w2._get_forward_weight(),
-                expert_layer.w2.ctx.get_data_handle(),
-                hasattr(expert_layer.w1, "use_dnnl") and expert_layer.w1.use_dnnl,
-                routing_weights,
-                final_hidden_states,
-                self.distributed,
-            )
-        else:
-            final_hidden_states = torch.ops.torch_ipex.mixtral_moe_tpp(
-                hidden_states,
-                top_x,
-                idx,
-                expert_layer.w1.weight,
-                expert_layer.w3.weight,
-                expert_layer.w2.weight,
-                (
-                    expert_layer.w1.tpp_fallback
-                    if hasattr(expert_layer.w1, "tpp_fallback")
-                    else True
-                ),
-                routing_weights,
-                final_hidden_states,
-                self.distributed,
-            )
     final_hidden_states = final_hidden_states.reshape(
         batch_size, sequence_length, hidden_dim
     )
@@ -1,3 +1,4 @@
+import os
 import torch
 import copy
 from ..utils._logger import logger, WarningType
@@ -11,9 +12,19 @@ import intel_extension_for_pytorch as ipex
 from ..utils.weight_only_quantization import (
     _is_woq_qconfig,
     _convert_woq_with_low_precision_checkpoint,
+    _deepcopy_without_quantized_weights,
 )
+from ..utils._checkpoint import _load_checkpoint, _load_meta_tensors
+from ..cpu._numa import partition_weights_by_numa_node
 
+from .artifact_cache import (
+    _get_cache_key,
+    _load_cached_artifacts,
+    _save_cached_artifacts,
+)
 from .tensor_parallel import (
+    chunk_row_linear_allreduce,
+    get_allreduce_chunks,
     shard_lm_head_weights,
     shard_mha_weights,
     shard_mlp_weights,
@@ -115,7 +126,7 @@ def check_transformers_for_llm_support():
         )
 
 
-def model_convert_reference(_model):
+def model_convert_reference(_model, tensor_parallel=None):
     import transformers
     from packaging import version
 
@@ -128,6 +139,7 @@ def model_convert_reference(_model):
         _greedy_search,
         _sample,
         _beam_sample,
+        _assisted_decoding,
     )
 
     # model wise optimization for MHA module
@@ -204,6 +216,7 @@ def model_convert_reference(_model):
     convert_function(_model, "greedy_search", _greedy_search)
     convert_function(_model, "sample", _sample)
     convert_function(_model, "beam_sample", _beam_sample)
+    convert_function(_model, "assisted_decoding", _assisted_decoding)
     convert_function(
         _model,
         "_extract_past_from_model_output",
@@ -343,7 +356,8 @@ def model_convert_reference(_model):
         # distributed uses default False
         pass
     need_ipex_tp = False
-    if _model.device.type == "cpu":
+    # tensor_parallel=1 keeps the whole model in every rank, e.g., for data parallelism
+    if _model.device.type == "cpu" and tensor_parallel != 1:
         from ..cpu import comm as ipex_comm
 
         world_size = ipex_comm.get_world_size()
@@ -351,6 +365,9 @@ def model_convert_reference(_model):
         if world_size > 1:
             global distributed
             if distributed:
+                assert (
+                    tensor_parallel is None
+                ), "The model has been sharded by DeepSpeed, please do not set tensor_parallel"
                 need_ipex_tp = False
             else:
                 need_ipex_tp = True
@@ -787,6 +804,10 @@ def model_convert_reference(_model):
             distributed=distributed,
         )
 
+    # overlap the allreduce of the row-parallel linears with their GEMMs
+    if distributed:
+        chunk_row_linear_allreduce(_model, get_allreduce_chunks())
+
     return _model
 
 
@@ -952,7 +973,8 @@ def get_dummy_input(_model, return_dict=False):
             ) + sample_inputs[2:]
     if _model.config.architectures[0] == "YuanForCausalLM":
         hidden_size = _model.config.hidden_size
-        if _model.device.type == "cpu":
+        # the hidden size in the config is the one of the shard
+        if _model.device.type == "cpu" and distributed:
             from ..cpu import comm as ipex_comm
 
             world_size = ipex_comm.get_world_size()
@@ -1025,7 +1047,10 @@ def model_convert_lowering(
     woq=False,
 ):
     from .models.reference.modules.attentions import _IPEXAttentionRef
-    from .models.reference.modules.decoder import _IPEXDecoderLayerRef
+    from .models.reference.modules.decoder import (
+        _IPEXDecoderLayerRef,
+        _get_mixtral_moe_weights,
+    )
 
     if device == "cpu":
         from .models.cpu.modules.attentions import _IPEXAttentionCPU
@@ -1127,6 +1152,13 @@ def model_convert_lowering(
                 woq=woq,
             )
 
+        # the expert weights of Mixtral are in their final layout after the lowering
+        for module in _model.modules():
+            if isinstance(module, _IPEXDecoderLayerCPU) and hasattr(
+                module, "block_sparse_moe"
+            ):
+                module._moe_weights = _get_mixtral_moe_weights(module)
+
         if deployment_mode:
             sample_inputs = (
                 get_dummy_input(_model, return_dict=True)
@@ -1210,6 +1242,11 @@ def optimize(
     low_precision_checkpoint=None,
     sample_inputs=None,
     deployment_mode=True,
+    kv_cache_dtype=None,
+    cache_dir=None,
+    checkpoint=None,
+    tensor_parallel=None,
+    numa_partition=False,
 ):
     r"""
     Apply optimizations at Python frontend to the given transformers model (nn.Module).
@@ -1237,10 +1274,13 @@ def optimize(
         qconfig_summary_file (str): Path to the IPEX static quantization config json file.
             Default value is ``None``. Work with quantization_config under static quantization use case.
             Need to do IPEX static quantization calibration and generate this file.
-        low_precision_checkpoint (dict or tuple of dict): For weight only quantization with INT4 weights.
+        low_precision_checkpoint (dict or str or tuple): For weight only quantization with INT4 weights.
             If it's a dict, it should be the state_dict of checkpoint (`.pt`) generated by GPTQ, etc.
+            If it's a str, it should be the path to the checkpoint file or the directory of the (sharded)
+            checkpoint files in `.safetensors` or `.pt` format, which are memory-mapped and loaded layer
+            by layer, so the peak memory stays close to the size of the quantized model.
             If a tuple is provided, it should be `(checkpoint, checkpoint config)`,
-            where `checkpoint` is the state_dict and `checkpoint config` is dict specifying
+            where `checkpoint` is the state_dict or the path and `checkpoint config` is dict specifying
             keys of weight/scale/zero point/bias in the state_dict.
             The default config is {'weight_key': 'packed_weight', 'scale_key': 'scale',
             'zero_point_key': 'packed_zp', bias_key: 'bias'}. Change the values of the dict to make a custom config.
@@ -1252,6 +1292,41 @@ def optimize(
             Default value is ``None``, and for well supported model, we provide this sample inputs automaticlly.
         deployment_mode (bool): Whether to apply the optimized model for deployment of model generation.
             It means there is no need to further apply optimization like torchscirpt. Default value is ``True``.
+        kv_cache_dtype (torch.dtype): The data type to store the indirect access KV cache. It could be
+            ``torch.int8`` (symmetric quantization with a scale per token per head), ``torch.float8_e4m3fn`` or
+            ``torch.float8_e5m2`` to reduce the memory footprint of the KV cache, the dequantization is fused
+            into the attention kernel. Default value is ``None``, i.e., the data type of the model.
+        cache_dir (str): The directory to cache the optimized model on disk, i.e., the TorchScript graphs with
+            the weights prepacked in their final layout. The cache key covers the model checkpoint, config, dtype,
+            quantization recipe, the ISA of the machine and the versions of IPEX and PyTorch. On a cache hit,
+            the conversion, prepacking, quantization and tracing of the model are skipped and the cached graphs
+            are loaded instead, thus the model could be constructed on the meta device with ``ipex.OnDevice``
+            to skip loading its weights. Only works on CPU with ``deployment_mode``, the cache could be shared
+            by the instances of ``ipexrun``. Not used with ``numa_partition``. Default value is ``None``,
+            i.e., no cache.
+        checkpoint (dict or str): The weights of a well supported model constructed on the meta device with
+            ``ipex.OnDevice``. It could be a state_dict, or the path to the checkpoint file or the directory of
+            the (sharded) checkpoint files in `.safetensors` or `.pt` format, which are memory-mapped. The
+            weights are assigned to the model without copy and only read when they are prepacked or quantized
+            into their final layout, so the float weights are never materialized in memory as a whole.
+            Construct the model in the data type of the checkpoint to avoid the conversion of the weights.
+            Default value is ``None``, i.e., the weights of the model are used. The meta tensors of the model
+            are also loaded from ``low_precision_checkpoint`` if given.
+        tensor_parallel (int): The number of ranks to shard the model across with the collectives of IPEX,
+            without DeepSpeed. The attention heads, the MLP and the LM head of Llama, GPT-J, Yuan and Phi are
+            sharded, and the outputs of the row-sharded linears are all-reduced. The ranks should be launched
+            by ``ipexrun --nprocs-per-node <tensor_parallel>`` on one host, which pins every rank to the cores
+            of a NUMA node, and every rank copies its shard out of the weights of the model, so the shard is
+            allocated on the NUMA node of the rank. ``1`` keeps the whole model in every rank.
+            Set the environment variable ``TP_ALLREDUCE_CHUNKS`` to split the row-parallel linears into
+            chunks, so the allreduce of a chunk overlaps with the GEMM of the next chunk.
+            Default value is ``None``, i.e., the model is sharded if more than one rank is launched.
+        numa_partition (bool): Whether to bind the slices of the output channels of the optimized weights
+            to the NUMA nodes of the cores of the process, so the memory bound GEMMs of the decoding read the
+            weights from the local memory of every node, when one process spans the NUMA nodes, e.g., launched
+            by ``ipexrun --ninstances 1``. Only works on CPU and not with the static quantization, and disables
+            ``cache_dir`` since the weights of the cached graphs are not bound to the NUMA nodes.
+            Default value is ``False``.
 
     Returns:
         Optimized model object for model.generate(), also workable with model.forward
@@ -1269,6 +1344,27 @@ def optimize(
         >>> optimized_model = ipex.llm.optimize(model, dtype=torch.bfloat16)
         >>> optimized_model.generate()
 
+        >>> # load the weights into their final layout without copying the model
+        >>> config = AutoConfig.from_pretrained(MODEL_PATH)
+        >>> with ipex.OnDevice(dtype=torch.bfloat16, device="meta"):
+        >>>     model = AutoModelForCausalLM.from_config(config)
+        >>> optimized_model = ipex.llm.optimize(
+        >>>     model.eval(), dtype=torch.bfloat16, checkpoint=MODEL_PATH
+        >>> )
+
+        >>> # shard the model across the 2 sockets, launched by `ipexrun --nprocs-per-node 2 run.py`
+        >>> optimized_model = ipex.llm.optimize(
+        >>>     model.eval(), dtype=torch.bfloat16, tensor_parallel=2
+        >>> )
+
+        >>> # reuse the optimized model of the previous runs
+        >>> config = AutoConfig.from_pretrained(MODEL_PATH)
+        >>> with ipex.OnDevice(dtype=torch.bfloat16, device="meta"):
+        >>>     model = AutoModelForCausalLM.from_config(config)
+        >>> optimized_model = ipex.llm.optimize(
+        >>>     model.eval(), dtype=torch.bfloat16, inplace=True, cache_dir=CACHE_DIR
+        >>> )
+
     """
     if isinstance(model, torch.jit.ScriptModule):
         return model
@@ -1343,19 +1439,6 @@ def optimize(
 
             return _model
 
-        if not inplace:
-            _model = copy.deepcopy(model)
-        else:
-            _model = model
-
-        # profiling mode is disabled in ChatGLM (https://huggingface.co/THUDM/chatglm3-6b/blob/main/modeling_chatglm.py#L33-L34)
-        # Enable profiling mode to apply jit optimizations
-        if model.config.architectures[0] == "ChatGLMModel":
-            torch._C._jit_set_profiling_mode(True)
-            torch._C._jit_set_profiling_executor(True)
-            torch._C._jit_override_can_fuse_on_cpu(False)
-            torch._C._jit_override_can_fuse_on_gpu(False)
-
         is_quantization = False
         is_woq = False
         if quantization_config is not None:
@@ -1363,27 +1446,161 @@ def optimize(
             if _is_woq_qconfig(quantization_config):
                 is_woq = True
 
+        if tensor_parallel is not None:
+            assert (
+                isinstance(tensor_parallel, int) and tensor_parallel >= 1
+            ), "Invalid tensor_parallel argument"
+        if tensor_parallel is not None and tensor_parallel > 1:
+            assert (
+                device == "cpu"
+            ), "ipex.llm.optimize only supports tensor_parallel on CPU"
+            assert model.config.architectures[0] in [
+                "GPTJForCausalLM",
+                "LlamaForCausalLM",
+                "YuanForCausalLM",
+                "PhiForCausalLM",
+            ], "ipex.llm.optimize supports tensor_parallel on Llama, GPT-J, Yuan and Phi"
+            from ..cpu import comm as ipex_comm
+
+            world_size = ipex_comm.get_world_size()
+            assert world_size == tensor_parallel, (
+                f"tensor_parallel={tensor_parallel} does not match the number of ranks {world_size}, "
+                + f"please launch the script by `ipexrun --nprocs-per-node {tensor_parallel}`"
+            )
+
+        if numa_partition and is_quantization and not is_woq:
+            # the int8 weights are packed into the frozen graph, out of the reach of the modules
+            logger.warning(
+                "ipex.llm.optimize does not support numa_partition with the static quantization, "
+                + "the weights are not bound to the NUMA nodes",
+                _type=WarningType.NotSupported,
+            )
+            numa_partition = False
+        # the static quantization is traced only with the calibration result
+        use_cache = (
+            cache_dir is not None
+            and device == "cpu"
+            and (
+                qconfig_summary_file is not None
+                if is_quantization and not is_woq
+                else deployment_mode
+            )
+        )
+        if use_cache and numa_partition:
+            # the weights of the cached graphs are loaded from disk without the NUMA binding
+            logger.warning(
+                "ipex.llm.optimize does not support cache_dir with numa_partition, "
+                + "the optimized model is neither loaded from nor saved to the cache",
+                _type=WarningType.NotSupported,
+            )
+            use_cache = False
+        cached_artifacts = None
+        if use_cache:
+            cache_key, cache_items = _get_cache_key(
+                model,
+                dtype,
+                kv_cache_dtype,
+                quantization_config,
+                qconfig_summary_file,
+                low_precision_checkpoint,
+                checkpoint,
+                tensor_parallel,
+            )
+            cached_artifacts = _load_cached_artifacts(cache_dir, cache_key)
+
         # Load low precision checkpoint (generated by GPTQ, etc.) for WOQ before any conversion
-        if device == "cpu" and is_woq and low_precision_checkpoint is not None:
-            state_dict, config = None, None
+        lowp_state_dict, lowp_config = None, None
+        if (
+            device == "cpu"
+            and is_woq
+            and low_precision_checkpoint is not None
+            and cached_artifacts is None
+        ):
             if isinstance(low_precision_checkpoint, tuple):
                 assert (
                     len(low_precision_checkpoint) == 2
-                    and isinstance(low_precision_checkpoint[0], dict)
+                    and isinstance(
+                        low_precision_checkpoint[0], (dict, str, os.PathLike)
+                    )
                     and isinstance(low_precision_checkpoint[1], dict)
                 ), "Invalid low_precision_checkpoint"
-                state_dict, config = low_precision_checkpoint
+                lowp_state_dict, lowp_config = low_precision_checkpoint
             else:
                 assert isinstance(
-                    low_precision_checkpoint, dict
+                    low_precision_checkpoint, (dict, str, os.PathLike)
                 ), "Invalid low_precision_checkpoint argument"
-                state_dict = low_precision_checkpoint
+                lowp_state_dict = low_precision_checkpoint
+            lowp_state_dict = _load_checkpoint(lowp_state_dict)
+
+        if not inplace:
+            # the float weights replaced by the low precision checkpoint are not copied
+            _model = (
+                _deepcopy_without_quantized_weights(model, lowp_state_dict, lowp_config)
+                if lowp_state_dict is not None
+                else copy.deepcopy(model)
+            )
+        else:
+            _model = model
+
+        if kv_cache_dtype is not None:
+            supported_kv_cache_dtypes = [
+                torch.int8,
+                getattr(torch, "float8_e4m3fn", None),
+                getattr(torch, "float8_e5m2", None),
+            ]
+            if device == "cpu" and kv_cache_dtype in supported_kv_cache_dtypes:
+                # stored as the name of the dtype to keep the config JSON serializable
+                _model.config.kv_cache_dtype = str(kv_cache_dtype).split(".")[-1]
+            else:
+                logger.warning(
+                    f"ipex.llm.optimize does not support kv_cache_dtype={kv_cache_dtype} on {device}, "
+                    + "the KV cache is stored in the data type of the model",
+                    _type=WarningType.NotSupported,
+                )
+
+        # profiling mode is disabled in ChatGLM (https://huggingface.co/THUDM/chatglm3-6b/blob/main/modeling_chatglm.py#L33-L34)
+        # Enable profiling mode to apply jit optimizations
+        if model.config.architectures[0] == "ChatGLMModel":
+            torch._C._jit_set_profiling_mode(True)
+            torch._C._jit_set_profiling_executor(True)
+            torch._C._jit_override_can_fuse_on_cpu(False)
+            torch._C._jit_override_can_fuse_on_gpu(False)
+
+        if cached_artifacts is not None:
+            # the eager model is still needed by the generation functions
+            _model = model_convert_reference(_model, tensor_parallel)
+            trace_model, trace_model_first = cached_artifacts
+            _model = _set_optimized_model_for_generation(
+                _model,
+                optimized_model=trace_model,
+                first_token_optimized_model=trace_model_first,
+            )
+            from .models.reference.models import output_hook
+
+            _model.register_forward_hook(output_hook, with_kwargs=True)
+            return _model
+
+        # load the weights of the model on the meta device before any conversion
+        if checkpoint is not None:
+            _model = _load_meta_tensors(_model, _load_checkpoint(checkpoint))
+        if lowp_state_dict is not None:
+            _model = _load_meta_tensors(_model, lowp_state_dict)
             _model = _convert_woq_with_low_precision_checkpoint(
-                _model, quantization_config, state_dict, config
+                _model, quantization_config, lowp_state_dict, lowp_config
             )
 
         # model reference conversion
-        _model = model_convert_reference(_model)
+        _model = model_convert_reference(_model, tensor_parallel)
+        # the non-persistent buffers, e.g., the causal masks and the inv_freq of rotary
+        # embeddings, are not in the checkpoints, and the optimized modules do not use them
+        meta_tensors = [
+            name
+            for name, t in _model.state_dict(keep_vars=True).items()
+            if t is not None and t.device.type == "meta"
+        ]
+        assert (
+            len(meta_tensors) == 0
+        ), f"The weights of {meta_tensors} are not found, please pass them by the checkpoint argument"
 
         # model quantization if needed
         if is_quantization:
@@ -1458,6 +1675,10 @@ def optimize(
                             _model = _set_optimized_model_for_generation(
                                 _model, optimized_model=trace_model
                             )
+                    if use_cache:
+                        _save_cached_artifacts(
+                            cache_dir, cache_key, cache_items, _model
+                        )
                     return _model
                 else:
                     print(
@@ -1487,6 +1708,10 @@ def optimize(
             is_quantization,
             is_woq,
         )
+        if numa_partition and device == "cpu":
+            partition_weights_by_numa_node(_model)
+        if use_cache:
+            _save_cached_artifacts(cache_dir, cache_key, cache_items, _model)
         # do not register output hook when doing calibration in static int8
         if not (is_quantization and not is_woq and qconfig_summary_file is None):
             from .models.reference.models import output_hook
@@ -1515,6 +1740,11 @@ def optimize_transformers(
     low_precision_checkpoint=None,
     sample_inputs=None,
     deployment_mode=True,
+    kv_cache_dtype=None,
+    cache_dir=None,
+    checkpoint=None,
+    tensor_parallel=None,
+    numa_partition=False,
 ):
     logger.warning(
         "ipex.optimize_transformers API is going to be deprecated, please use ipex.llm.optimize instead.",
@@ -1531,4 +1761,9 @@ def optimize_transformers(
         low_precision_checkpoint=low_precision_checkpoint,
         sample_inputs=sample_inputs,
         deployment_mode=deployment_mode,
+        kv_cache_dtype=kv_cache_dtype,
+        cache_dir=cache_dir,
+        checkpoint=checkpoint,
+        tensor_parallel=tensor_parallel,
+        numa_partition=numa_partition,
     )
@@ -1,9 +1,19 @@
+import functools
 import torch
 import torch.nn as nn
 from ..cpu import comm as ipex_comm
 import os
 
 
+def _local_shard(t):
+    # The shard sliced from the weight of the whole model is a view of it. Every rank is
+    # pinned to the cores of a NUMA node by ipexrun, so copying the shard in the rank
+    # allocates it on the node of the rank and releases the weight of the whole model.
+    if t is None or t.untyped_storage().nbytes() == t.numel() * t.element_size():
+        return t
+    return t.clone(memory_format=torch.contiguous_format)
+
+
 class TensorParallelConv2d(nn.Module):
     def __init__(self, conv, rank, world_size, shard_by_oc):
         super().__init__()
@@ -52,9 +62,9 @@ class TensorParallelConv2d(nn.Module):
             conv.bias is not None,
             conv.padding_mode,
         )
-        self.conv.weight = torch.nn.Parameter(weight_data)
+        self.conv.weight = torch.nn.Parameter(_local_shard(weight_data))
         if conv.bias is not None:
-            self.conv.bias = torch.nn.Parameter(bias_data)
+            self.conv.bias = torch.nn.Parameter(_local_shard(bias_data))
         del conv
 
     def forward(self, input: torch.Tensor) -> torch.Tensor:
@@ -380,9 +390,9 @@ class TensorParallellLinear(nn.Module):
             weight.shape[1], weight.shape[0], bias=linear.bias is not None
         )
 
-        self.linear.weight = weight
+        self.linear.weight = torch.nn.Parameter(_local_shard(weight.data))
         if linear.bias is not None:
-            self.linear.bias = bias
+            self.linear.bias = torch.nn.Parameter(_local_shard(bias.data))
         del linear
 
     def forward(self, input: torch.Tensor) -> torch.Tensor:
@@ -485,6 +495,108 @@ class TensorParallelLMhead(TensorParallellLinear):
         return out
 
 
+class TensorParallelChunkedRowLinear(nn.Module):
+    r"""
+    A row-parallel linear split into chunks along the output features. The allreduce of a
+    chunk is forked to the inter-op thread pool of TorchScript and overlaps with the GEMM
+    of the next chunk, while oneCCL progresses the communication on its worker cores.
+    Only one allreduce is in flight, so all ranks issue the allreduces in the same order.
+    Every chunk is a separate ``nn.Linear`` to be prepacked or quantized.
+    """
+
+    def __init__(self, weight, bias, original_bias, num_chunks, all_reduce):
+        super().__init__()
+        self.linears = nn.ModuleList()
+        biases = (
+            bias.data.tensor_split(num_chunks)
+            if bias is not None
+            else [None] * num_chunks
+        )
+        for weight_chunk, bias_chunk in zip(
+            weight.data.tensor_split(num_chunks), biases
+        ):
+            linear = nn.Linear(
+                weight_chunk.shape[1],
+                weight_chunk.shape[0],
+                bias=bias_chunk is not None,
+            )
+            linear.weight = torch.nn.Parameter(_local_shard(weight_chunk))
+            if bias_chunk is not None:
+                linear.bias = torch.nn.Parameter(_local_shard(bias_chunk))
+            self.linears.append(linear)
+        # the bias added after the allreduce, e.g., the one of LinearAllreduce of DeepSpeed
+        self.original_bias = original_bias
+        self.all_reduce = all_reduce
+
+    def forward(self, input: torch.Tensor) -> torch.Tensor:
+        outputs = []
+        future = None
+        for linear in self.linears:
+            output = linear(input)
+            if future is not None:
+                outputs.append(torch.jit.wait(future))
+            future = torch.jit.fork(self.all_reduce, output)
+        outputs.append(torch.jit.wait(future))
+        output = torch.cat(outputs, dim=-1)
+        if self.original_bias is not None:
+            output += self.original_bias
+        return output
+
+
+def get_allreduce_chunks():
+    r"""
+    Returns the number of chunks of the row-parallel linears set by the environment
+    variable ``TP_ALLREDUCE_CHUNKS``, which is 1 (no chunking) by default.
+    """
+    num_chunks = os.getenv("TP_ALLREDUCE_CHUNKS", "1").strip()
+    assert (
+        num_chunks.isdigit() and int(num_chunks) > 0
+    ), f"TP_ALLREDUCE_CHUNKS should be a positive integer, but got {num_chunks}"
+    return int(num_chunks)
+
+
+def chunk_row_linear_allreduce(model, num_chunks):
+    r"""
+    Replaces the row-parallel linears sharded by IPEX or DeepSpeed with
+    ``TensorParallelChunkedRowLinear`` of ``num_chunks`` chunks.
+    """
+    if num_chunks <= 1:
+        return
+    try:
+        from deepspeed.module_inject.layers import LinearAllreduce
+    except ImportError:
+        LinearAllreduce = None
+    from ..nn.utils._weight_prepack import _all_reduce_and_bias_add
+
+    for name, sub_m in model.named_children():
+        if type(sub_m) is TensorParallelRowLinear and sub_m.world_size > 1:
+            setattr(
+                model,
+                name,
+                TensorParallelChunkedRowLinear(
+                    sub_m.linear.weight,
+                    sub_m.linear.bias,
+                    None,
+                    num_chunks,
+                    ipex_comm.allreduce_add,
+                ),
+            )
+        elif LinearAllreduce is not None and type(sub_m) is LinearAllreduce:
+            setattr(
+                model,
+                name,
+                TensorParallelChunkedRowLinear(
+                    sub_m.weight,
+                    None,
+                    sub_m.bias,
+                    num_chunks,
+                    functools.partial(_all_reduce_and_bias_add, sub_m.mp_group, None),
+                ),
+            )
+        else:
+            chunk_row_linear_allreduce(sub_m, num_chunks)
+
+
 def shard_mha_weights(
     model,
     target_m,
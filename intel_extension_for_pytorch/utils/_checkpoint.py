@@ -0,0 +1,134 @@
+import glob
+import json
+import os
+from collections.abc import Mapping
+
+import torch
+
+
+def _get_checkpoint_files(path):
+    if os.path.isfile(path):
+        return [path]
+    assert os.path.isdir(path), f"checkpoint {path} does not exist"
+    # the shards listed by the index of a sharded checkpoint, or all the files of a format
+    for index in ["model.safetensors.index.json", "pytorch_model.bin.index.json"]:
+        if os.path.exists(os.path.join(path, index)):
+            with open(os.path.join(path, index)) as f:
+                shards = sorted(set(json.load(f)["weight_map"].values()))
+            return [os.path.join(path, shard) for shard in shards]
+    for suffixes in [[".safetensors"], [".pt", ".pth", ".bin"]]:
+        files = sorted(
+            f
+            for suffix in suffixes
+            for f in glob.glob(os.path.join(path, "*" + suffix))
+        )
+        if len(files) > 0:
+            return files
+    raise AssertionError(f"No checkpoint file found in {path}")
+
+
+class _MmapCheckpoint(Mapping):
+    r"""
+    A read-only state_dict of checkpoint files (``.safetensors`` or ``.pt``),
+    which are memory-mapped, so a tensor is only read from disk when it is accessed.
+    """
+
+    def __init__(self, path):
+        self._shards = {}
+        self._key_to_file = {}
+        for f in _get_checkpoint_files(path):
+            for k in self._open(f).keys():
+                self._key_to_file[k] = f
+
+    def _open(self, f):
+        if f not in self._shards:
+            if f.endswith(".safetensors"):
+                try:
+                    from safetensors import safe_open
+                except ImportError as e:
+                    raise RuntimeError(
+                        "loading a safetensors checkpoint requires the safetensors package"
+                    ) from e
+                self._shards[f] = safe_open(f, framework="pt", device="cpu")
+            else:
+                self._shards[f] = torch.load(
+                    f, map_location="cpu", mmap=True, weights_only=True
+                )
+        return self._shards[f]
+
+    def __getitem__(self, key):
+        shard = self._open(self._key_to_file[key])
+        if isinstance(shard, dict):
+            return shard[key]
+        return shard.get_tensor(key)
+
+    def __contains__(self, key):
+        return key in self._key_to_file
+
+    def __iter__(self):
+        return iter(self._key_to_file)
+
+    def __len__(self):
+        return len(self._key_to_file)
+
+
+def _load_checkpoint(checkpoint):
+    r"""
+    Returns the state_dict of the checkpoint, which is either a state_dict or the path
+    to the checkpoint file or the directory of the (sharded) checkpoint files.
+    """
+    if isinstance(checkpoint, (str, os.PathLike)):
+        return _MmapCheckpoint(os.fspath(checkpoint))
+    return checkpoint
+
+
+def _load_meta_tensors(model, state_dict):
+    r"""
+    Assigns the tensors of the state_dict to the parameters and buffers of the model on
+    the meta device. The memory-mapped tensors of the checkpoint files are assigned without
+    copy (unless their dtypes differ from the model), so the weights are only read from disk
+    when they are prepacked or quantized into their final layout.
+    """
+    prefix = getattr(model, "base_model_prefix", "")
+
+    def get_tensor(name):
+        keys = [name]
+        if prefix:
+            if name.startswith(prefix + "."):
+                keys.append(name[len(prefix) + 1 :])
+            else:
+                keys.append(prefix + "." + name)
+        for key in keys:
+            if key in state_dict:
+                return state_dict[key]
+        return None
+
+    # the tied parameters are assigned once and shared by their modules
+    assigned = {}
+    missing = []
+    for module_name, module in model.named_modules(remove_duplicate=False):
+        for tensors in [module._parameters, module._buffers]:
+            for name, t in tensors.items():
+                if t is None or t.device.type != "meta":
+                    continue
+                if id(t) in assigned:
+                    tensors[name] = assigned[id(t)]
+                    continue
+                full_name = module_name + "." + name if module_name else name
+                value = get_tensor(full_name)
+                if value is None:
+                    missing.append((tensors, name, t))
+                    continue
+                assert (
+                    value.shape == t.shape
+                ), f"The shape of {full_name} is {tuple(t.shape)} in the model but {tuple(value.shape)} in the checkpoint"
+                if value.dtype != t.dtype and value.is_floating_point():
+                    value = value.to(t.dtype)
+                if isinstance(t, torch.nn.Parameter):
+                    value = torch.nn.Parameter(value, requires_grad=t.requires_grad)
+                assigned[id(t)] = value
+                tensors[name] = value
+    for tensors, name, t in missing:
+        if id(t) in assigned:
+            tensors[name] = assigned[id(t)]
+    return model
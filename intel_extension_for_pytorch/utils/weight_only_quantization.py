@@ -1,6 +1,8 @@
 import copy
+from collections.abc import Mapping
 import torch
 from intel_extension_for_pytorch.nn.modules import WeightOnlyQuantizedLinear
+from ._checkpoint import _load_checkpoint
 from torch.ao.quantization import PlaceholderObserver, QConfigMapping
 
 # The config describes how to load low precision checkpoint for weight only quantization.
@@ -144,6 +146,28 @@ def _get_linear_parameters(attr_name, state_dict, checkpoint_config):
     return qweight, scales, qzeros, bias, group_size, g_idx
 
 
+def _deepcopy_without_quantized_weights(
+    model, low_precision_checkpoint, checkpoint_config=None
+):
+    r"""
+    Deep-copies the model except for the float weights of the linear layers to be replaced
+    by the low precision checkpoint, which are copied as meta tensors.
+    """
+    if checkpoint_config is None:
+        checkpoint_config = _default_lowp_checkpoint_config()
+    weight_key = _get_keys_from_config(checkpoint_config)[0]
+    memo = {}
+    for name, mod in model.named_modules():
+        if (
+            isinstance(mod, torch.nn.Linear)
+            and name + "." + weight_key in low_precision_checkpoint
+        ):
+            memo[id(mod.weight)] = torch.nn.Parameter(
+                mod.weight.to("meta"), requires_grad=mod.weight.requires_grad
+            )
+    return copy.deepcopy(model, memo)
+
+
 def _convert_woq_with_low_precision_checkpoint(
     model,
     qconfig_mapping,
@@ -156,7 +180,8 @@ def _convert_woq_with_low_precision_checkpoint(
     Args:
         model: original model
         qconfig_mapping: QConfigMapping object containing observer info, lowp mode, etc.
-        low_precision_checkpoint (dict): checkpoint generated by GPTQ, etc.
+        low_precision_checkpoint (dict or str): checkpoint generated by GPTQ, etc. It could be
+            a state_dict or the path to the checkpoint files (``.safetensors`` or ``.pt``).
         checkpoint_config (dict): custom config to load the checkpoint. Use default if None
         inplace: do conversion in-place or make a copy of original model
     Return:
@@ -168,11 +193,15 @@ def _convert_woq_with_low_precision_checkpoint(
     Default format:
     - Weights and zero points in UINT4 and compressed as INT32, scales in FP16.
     - Keys are 'packed_weight', 'scale', 'packed_zp'
+
+    The linear layers are converted one by one and the checkpoint files of a path are
+    memory-mapped, so the peak memory stays close to the size of the quantized model.
     """
 
+    low_precision_checkpoint = _load_checkpoint(low_precision_checkpoint)
     assert isinstance(
-        low_precision_checkpoint, dict
-    ), "low_precision_checkpoint should be a state_dict"
+        low_precision_checkpoint, Mapping
+    ), "low_precision_checkpoint should be a state_dict or the path to the checkpoint"
     assert checkpoint_config is None or isinstance(
         checkpoint_config, dict
     ), "checkpoint_config should be a dict"
@@ -183,7 +212,7 @@ def _convert_woq_with_low_precision_checkpoint(
     # Check that keys can be found in the state dict. Bias and g_idx are optional.
     weight_key, scales_key, zeros_key, _, _ = _get_keys_from_config(checkpoint_config)
     keys_found = [False] * 3
-    for k, _ in state_dict.items():
+    for k in state_dict.keys():
         if k.endswith("." + weight_key):
             keys_found[0] = True
         if k.endswith("." + scales_key):
@@ -215,7 +244,9 @@ def _convert_woq_with_low_precision_checkpoint(
         return mod_new
 
     if not inplace:
-        model_new = copy.deepcopy(model)
+        model_new = _deepcopy_without_quantized_weights(
+            model, state_dict, checkpoint_config
+        )
     else:
         model_new = model
     return _convert(model_new, "")
@@ -314,6 +314,52 @@ class TestLLMModules(TestCase):
             self.assertEqual(ipex_q, ref_q)
             self.assertEqual(ref_k, ipex_k)
 
+    def test_mixtral_moe_grouped(self):
+        F = torch.nn.functional
+        num_tokens, hidden_size, intermediate_size = 6, 64, 128
+        num_experts, top_k = 8, 2
+        gate_wei = [
+            torch.randn(intermediate_size, hidden_size) for _ in range(num_experts)
+        ]
+        up_wei = [
+            torch.randn(intermediate_size, hidden_size) for _ in range(num_experts)
+        ]
+        down_wei = [
+            torch.randn(hidden_size, intermediate_size) for _ in range(num_experts)
+        ]
+        hidden_states = torch.randn(num_tokens, hidden_size)
+        # the experts 2, 5 and 7 receive no token and are skipped
+        selected_experts = torch.tensor(
+            [[0, 1], [1, 3], [4, 0], [6, 1], [3, 4], [0, 6]]
+        )
+        routing_weights = torch.softmax(torch.randn(num_tokens, top_k), dim=-1)
+        ref_out = torch.zeros(num_tokens, hidden_size)
+        for e in range(num_experts):
+            top_x, idx = torch.where(selected_experts == e)
+            if top_x.numel() == 0:
+                continue
+            x = hidden_states[top_x]
+            y = F.linear(
+                F.silu(F.linear(x, gate_wei[e])) * F.linear(x, up_wei[e]),
+                down_wei[e],
+            )
+            ref_out.index_add_(0, top_x, y * routing_weights[top_x, idx].unsqueeze(-1))
+        out = torch.ops.torch_ipex.mixtral_moe_grouped(
+            hidden_states,
+            selected_experts,
+            routing_weights,
+            gate_wei,
+            up_wei,
+            down_wei,
+            [],
+            [],
+            [],
+            0,  # TPP
+            True,  # tpp_fallback
+            False,
+        )
+        self.assertEqual(out, ref_out, atol=1e-3, rtol=1e-4)
+
 
 if __name__ == "__main__":
     test = unittest.main()
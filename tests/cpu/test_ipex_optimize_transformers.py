@@ -1,4 +1,5 @@
 import unittest
+import unittest.mock
 import torch
 import intel_extension_for_pytorch as ipex
 import sys
@@ -394,11 +395,26 @@ class OptimizeTransformersTester(TestCase):
             )
             assert hasattr(ipex_m, "trace_graph")
 
+            # load the memory-mapped checkpoint file layer by layer
+            streaming_m = ipex.llm.optimize(
+                m,
+                dtype=torch.float,
+                quantization_config=qconfig,
+                low_precision_checkpoint=checkpoint_file_name,
+                deployment_mode=True,
+            )
+            assert hasattr(streaming_m, "trace_graph")
+            assert all(
+                p.device.type != "meta" for p in m.parameters()
+            ), "the original model should not be modified"
+
             # Ensure model can run without errors
             with torch.no_grad():
                 example_inputs = _get_gptj_example_inputs()
                 # the optimized model is ipex_m.trace_graph
-                ipex_m.trace_graph(*example_inputs)
+                res = ipex_m.trace_graph(*example_inputs)
+                streaming_res = streaming_m.trace_graph(*example_inputs)
+                self.assertEqual(res[0], streaming_res[0])
 
     def test_generate_functions(self):
         config = AutoConfig.from_pretrained(
@@ -445,6 +461,402 @@ class OptimizeTransformersTester(TestCase):
                 ref_res = ref_m.generate(input_ids, **generate_kwargs)
                 self.assertEqual(ipex_res, ref_res)
 
+    def test_fused_sampling(self):
+        from intel_extension_for_pytorch.llm.functional.sampling import (
+            _top_k_top_p_candidates,
+        )
+        from intel_extension_for_pytorch.transformers.generation.utils import (
+            _get_fused_sampling_params,
+        )
+
+        vocab_size = 4096
+        logits = torch.randn(4, vocab_size) * 4
+        for temperature, top_k, top_p in itertools.product(
+            [1.0, 0.7], [0, 50], [1.0, 0.9, 0.3]
+        ):
+            warpers = transformers.LogitsProcessorList()
+            if temperature != 1.0:
+                warpers.append(transformers.TemperatureLogitsWarper(temperature))
+            if top_k > 0:
+                warpers.append(transformers.TopKLogitsWarper(top_k))
+            if top_p < 1.0:
+                warpers.append(transformers.TopPLogitsWarper(top_p))
+            ref = warpers(None, logits.clone())
+            params = _get_fused_sampling_params(warpers)
+            values, indices = _top_k_top_p_candidates(logits, **params)
+            res = torch.full_like(logits, -float("inf")).scatter(-1, indices, values)
+            self.assertEqual(res, ref)
+        # the warpers not fused
+        self.assertIsNone(
+            _get_fused_sampling_params(
+                [
+                    transformers.TopKLogitsWarper(50),
+                    transformers.TemperatureLogitsWarper(0.7),
+                ]
+            )
+        )
+        # per sequence parameters
+        top_k = torch.tensor([1, 0, 0, 8])
+        top_p = torch.tensor([1.0, 0.5, 1e-6, 1.0])
+        values, indices = _top_k_top_p_candidates(logits, 1.0, top_k, top_p)
+        num_candidates = (values > -float("inf")).sum(-1)
+        self.assertEqual(num_candidates[0], 1)
+        self.assertEqual(num_candidates[2], 1)
+        self.assertEqual(num_candidates[3], 8)
+        greedy = logits.argmax(-1)
+        next_tokens = ipex.llm.functional.top_k_top_p_sampling(
+            logits, 0.5, top_k, top_p
+        )
+        self.assertEqual(next_tokens[[0, 2]], greedy[[0, 2]])
+
+    def test_beam_search_scorer(self):
+        from intel_extension_for_pytorch.transformers.generation.beam_scorer import (
+            _BeamSearchScorer,
+            _get_beam_scorer,
+        )
+
+        vocab_size, eos_token_id = 12, [1, 2]
+        for batch_size, num_beams, length_penalty, early_stopping, num_keep in [
+            (3, 4, 1.0, False, 1),
+            (2, 3, 0.5, True, 2),
+            (4, 2, 1.5, "never", 2),
+        ]:
+            torch.manual_seed(0)
+            scorers = [
+                transformers.BeamSearchScorer(
+                    batch_size,
+                    num_beams,
+                    "cpu",
+                    length_penalty,
+                    early_stopping,
+                    num_keep,
+                    max_length=20,
+                )
+                for _ in range(2)
+            ]
+            scorers[1] = _get_beam_scorer(scorers[1])
+            self.assertTrue(isinstance(scorers[1], _BeamSearchScorer))
+            input_ids = torch.randint(3, vocab_size, (batch_size * num_beams, 5))
+            beam_scores = torch.zeros(batch_size * num_beams)
+            for _ in range(10):
+                logprobs = torch.log_softmax(
+                    torch.randn(len(input_ids), vocab_size), -1
+                )
+                next_scores = (logprobs + beam_scores[:, None]).view(batch_size, -1)
+                next_scores, next_tokens = next_scores.topk(2 * num_beams, dim=1)
+                # at least num_beams candidates are not EOS
+                next_tokens[:, num_beams:] -= (
+                    next_tokens[:, num_beams:] % vocab_size - 3
+                )
+                outputs = [
+                    scorer.process(
+                        input_ids,
+                        next_scores,
+                        next_tokens % vocab_size,
+                        next_tokens // vocab_size,
+                        pad_token_id=0,
+                        eos_token_id=eos_token_id,
+                    )
+                    for scorer in scorers
+                ]
+                for key in outputs[0]:
+                    self.assertEqual(outputs[0][key], outputs[1][key])
+                self.assertEqual(bool(scorers[0].is_done), bool(scorers[1].is_done))
+                input_ids = torch.cat(
+                    [
+                        input_ids[outputs[0]["next_beam_indices"]],
+                        outputs[0]["next_beam_tokens"].unsqueeze(-1),
+                    ],
+                    dim=-1,
+                )
+                beam_scores = outputs[0]["next_beam_scores"]
+                if scorers[0].is_done:
+                    break
+            ref, res = [
+                scorer.finalize(
+                    input_ids,
+                    beam_scores,
+                    None,
+                    None,
+                    max_length=20,
+                    pad_token_id=0,
+                    eos_token_id=eos_token_id,
+                )
+                for scorer in scorers
+            ]
+            self.assertEqual(ref["sequences"], res["sequences"])
+            self.assertEqual(ref["sequence_scores"], res["sequence_scores"])
+
+    def test_generate_preallocated_ids(self):
+        config = AutoConfig.from_pretrained(
+            f"{curpath}/hf_configs/gptj", return_dict=False
+        )
+        m = transformers.models.gptj.modeling_gptj.GPTJForCausalLM(config).eval()
+        ref_m = copy.deepcopy(m)
+        ipex_m = ipex.llm.optimize(
+            m, dtype=torch.bfloat16, deployment_mode=True, inplace=True
+        )
+        input_ids = torch.randint(0, 100, (2, 8)).to(torch.long)
+        # length-only stopping criteria are checked on host, the others on the ids
+        for stopping_criteria in [
+            None,
+            transformers.StoppingCriteriaList(
+                [transformers.MaxTimeCriteria(max_time=3600)]
+            ),
+        ]:
+            for do_sample, max_new_tokens in [(False, 16), (True, 4)]:
+                generate_kwargs = dict(
+                    do_sample=do_sample,
+                    temperature=0.01,
+                    max_new_tokens=max_new_tokens,
+                    min_new_tokens=max_new_tokens,
+                    stopping_criteria=stopping_criteria,
+                )
+                with torch.inference_mode(), torch.no_grad(), torch.cpu.amp.autocast():
+                    torch.manual_seed(0)
+                    ipex_res = ipex_m.generate(input_ids, **generate_kwargs)
+                    torch.manual_seed(0)
+                    ref_res = ref_m.generate(input_ids, **generate_kwargs)
+                    self.assertEqual(ipex_res.shape, (2, 8 + max_new_tokens))
+                    self.assertTrue(ipex_res.is_contiguous())
+                    self.assertEqual(ipex_res, ref_res)
+
+    def test_generated_ids_trim_finished(self):
+        from intel_extension_for_pytorch.transformers.generation.utils import (
+            _GeneratedIdsBuffer,
+        )
+
+        input_ids = torch.randint(0, 100, (2, 3))
+        generated_ids = _GeneratedIdsBuffer(input_ids, 16)
+        unfinished_sequences = torch.ones(2, dtype=torch.long)
+        # the second sequence finishes at the 2nd step, the first one at the 3rd step,
+        # and the following 2 steps only append padding ids
+        for step, finished in enumerate([[], [1], [0], [], []]):
+            generated_ids.append(torch.full((2,), step), unfinished_sequences)
+            unfinished_sequences[finished] = 0
+        self.assertEqual(generated_ids.trim_finished(), 2)
+        self.assertEqual(generated_ids.finalize().shape, (2, 6))
+        self.assertEqual(generated_ids.finalize()[:, :3], input_ids)
+
+    def test_speculative_decoding(self):
+        config = AutoConfig.from_pretrained(
+            f"{curpath}/hf_configs/gptj", return_dict=False
+        )
+        m = transformers.models.gptj.modeling_gptj.GPTJForCausalLM(config).eval()
+        draft_config = copy.deepcopy(config)
+        draft_config.n_layer = 1
+        draft_m = transformers.models.gptj.modeling_gptj.GPTJForCausalLM(
+            draft_config
+        ).eval()
+        same_m = copy.deepcopy(m)
+        ipex_m = ipex.llm.optimize(
+            m, dtype=torch.float, deployment_mode=True, inplace=True
+        )
+        input_ids = torch.randint(0, 100, (1, 8)).to(torch.long)
+        generate_kwargs = dict(do_sample=False, max_new_tokens=16, min_new_tokens=16)
+        with torch.inference_mode(), torch.no_grad():
+            ref_res = ipex_m.generate(input_ids, **generate_kwargs)
+            # an identical draft model gets all the candidates accepted,
+            # a different one gets some of them rolled back
+            for draft in [same_m, draft_m]:
+                ipex_draft = ipex.llm.optimize(
+                    draft, dtype=torch.float, deployment_mode=True, inplace=True
+                )
+                res = ipex_m.generate(
+                    input_ids, assistant_model=ipex_draft, **generate_kwargs
+                )
+                self.assertEqual(res, ref_res)
+
+    def test_kv_cache_dtype(self):
+        config = AutoConfig.from_pretrained(
+            f"{curpath}/hf_configs/gptj", return_dict=False
+        )
+        m = transformers.models.gptj.modeling_gptj.GPTJForCausalLM(config).eval()
+        ipex_m = ipex.llm.optimize(
+            m,
+            dtype=torch.float,
+            kv_cache_dtype=torch.int8,
+            deployment_mode=False,
+            inplace=True,
+        )
+        # the config stays serializable, e.g., for save_pretrained
+        self.assertEqual(ipex_m.config.kv_cache_dtype, "int8")
+        self.assertIn('"kv_cache_dtype": "int8"', ipex_m.config.to_json_string())
+        input_ids = torch.randint(0, 100, (1, 8)).to(torch.long)
+        with torch.inference_mode(), torch.no_grad():
+            res = ipex_m.generate(
+                input_ids, do_sample=False, max_new_tokens=4, min_new_tokens=4
+            )
+        self.assertEqual(res.shape, (1, 12))
+
+    def test_chunked_prefill(self):
+        config = AutoConfig.from_pretrained(
+            f"{curpath}/hf_configs/gptj", return_dict=False
+        )
+        m = transformers.models.gptj.modeling_gptj.GPTJForCausalLM(config).eval()
+        # the prompt is longer than the chunks, which are smaller than the traced dummy prompt
+        input_ids = torch.randint(0, 100, (1, 20)).to(torch.long)
+        generate_kwargs = dict(do_sample=False, max_new_tokens=4, min_new_tokens=4)
+        for deployment_mode in [True, False]:
+            ref_m = copy.deepcopy(m)
+            chunked_m = copy.deepcopy(m)
+            chunked_m.config.prefill_chunk_size = 8
+            ref_m = ipex.llm.optimize(
+                ref_m, dtype=torch.float, deployment_mode=deployment_mode
+            )
+            chunked_m = ipex.llm.optimize(
+                chunked_m, dtype=torch.float, deployment_mode=deployment_mode
+            )
+            with torch.inference_mode(), torch.no_grad():
+                ref_res = ref_m.generate(input_ids, **generate_kwargs)
+                res = chunked_m.generate(input_ids, **generate_kwargs)
+            self.assertEqual(res, ref_res)
+
+    def test_mixtral_moe_weights(self):
+        config = AutoConfig.from_pretrained(
+            f"{curpath}/hf_configs/mixtral", return_dict=False
+        )
+        m = transformers.models.mixtral.modeling_mixtral.MixtralForCausalLM(
+            config
+        ).eval()
+        ipex_m = ipex.llm.optimize(
+            m, dtype=torch.bfloat16, deployment_mode=False, inplace=True
+        )
+        from intel_extension_for_pytorch.transformers.models.reference.modules.decoder import (
+            _get_mixtral_moe_weights,
+        )
+
+        # the expert weights are collected after the experts are prepacked
+        for layer in ipex_m.model.layers:
+            moe_weights = _get_mixtral_moe_weights(layer)
+            for weights, ref_weights in zip(layer._moe_weights[:3], moe_weights[:3]):
+                self.assertEqual(
+                    [w.data_ptr() for w in weights],
+                    [w.data_ptr() for w in ref_weights],
+                )
+            self.assertEqual(layer._moe_weights[6:], moe_weights[6:])
+
+    def test_meta_model_with_checkpoint(self):
+        config = AutoConfig.from_pretrained(
+            f"{curpath}/hf_configs/gptj", return_dict=False
+        )
+        m = transformers.models.gptj.modeling_gptj.GPTJForCausalLM(config).eval()
+        with ipex.OnDevice(dtype=torch.float, device="meta"):
+            meta_m = transformers.models.gptj.modeling_gptj.GPTJForCausalLM(config)
+        input_ids = torch.randint(0, 100, (1, 8)).to(torch.long)
+        generate_kwargs = dict(do_sample=False, max_new_tokens=4, min_new_tokens=4)
+        with tempfile.TemporaryDirectory() as work_dir:
+            checkpoint = os.path.join(work_dir, "pytorch_model.bin")
+            torch.save(m.state_dict(), checkpoint)
+            ipex_m = ipex.llm.optimize(m, dtype=torch.float, inplace=True)
+            ipex_meta_m = ipex.llm.optimize(
+                meta_m.eval(), dtype=torch.float, checkpoint=work_dir
+            )
+            self.assertTrue(
+                all(p.device.type != "meta" for p in ipex_meta_m.parameters())
+            )
+            with torch.inference_mode(), torch.no_grad():
+                ref_res = ipex_m.generate(input_ids, **generate_kwargs)
+                res = ipex_meta_m.generate(input_ids, **generate_kwargs)
+            self.assertEqual(res, ref_res)
+
+    def test_optimized_model_cache(self):
+        config = AutoConfig.from_pretrained(
+            f"{curpath}/hf_configs/gptj", return_dict=False
+        )
+        m = transformers.models.gptj.modeling_gptj.GPTJForCausalLM(config).eval()
+        warm_m = copy.deepcopy(m)
+        input_ids = torch.randint(0, 100, (1, 8)).to(torch.long)
+        generate_kwargs = dict(do_sample=False, max_new_tokens=4, min_new_tokens=4)
+        with tempfile.TemporaryDirectory() as cache_dir:
+            ipex_m = ipex.llm.optimize(
+                m, dtype=torch.float, inplace=True, cache_dir=cache_dir
+            )
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+            cached = os.path.join(cache_dir, os.listdir(cache_dir)[0])
+            self.assertIn("metadata.json", os.listdir(cached))
+            self.assertIn("trace_graph.pt", os.listdir(cached))
+            # a cache hit loads the traced graph instead of tracing the model
+            with unittest.mock.patch("torch.jit.trace") as trace:
+                warm_ipex_m = ipex.llm.optimize(
+                    warm_m, dtype=torch.float, inplace=True, cache_dir=cache_dir
+                )
+                trace.assert_not_called()
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+            with torch.inference_mode(), torch.no_grad():
+                ref_res = ipex_m.generate(input_ids, **generate_kwargs)
+                res = warm_ipex_m.generate(input_ids, **generate_kwargs)
+            self.assertEqual(res, ref_res)
+
+    def test_optimized_model_cache_with_numa_partition(self):
+        config = AutoConfig.from_pretrained(
+            f"{curpath}/hf_configs/gptj", return_dict=False
+        )
+        m = transformers.models.gptj.modeling_gptj.GPTJForCausalLM(config).eval()
+        with tempfile.TemporaryDirectory() as cache_dir:
+            # the cached graphs would skip the NUMA binding of the weights
+            ipex.llm.optimize(
+                m,
+                dtype=torch.float,
+                inplace=True,
+                cache_dir=cache_dir,
+                numa_partition=True,
+            )
+            self.assertEqual(os.listdir(cache_dir), [])
+
+    def test_static_quant_with_numa_partition(self):
+        config = AutoConfig.from_pretrained(
+            f"{curpath}/hf_configs/gptj", return_dict=False
+        )
+        m = transformers.models.gptj.modeling_gptj.GPTJForCausalLM(config).eval()
+        qconfig = ipex.quantization.get_smooth_quant_qconfig_mapping()
+        with unittest.mock.patch(
+            "intel_extension_for_pytorch.transformers.optimize.partition_weights_by_numa_node"
+        ) as partition, self.assertLogs("IPEX", level="WARNING") as logs:
+            ipex.llm.optimize(
+                m,
+                dtype=torch.float,
+                quantization_config=qconfig,
+                inplace=True,
+                numa_partition=True,
+            )
+        partition.assert_not_called()
+        self.assertTrue(any("numa_partition" in line for line in logs.output))
+
+    def test_checkpoint_fingerprint_from_hf_cache(self):
+        from intel_extension_for_pytorch.transformers.artifact_cache import (
+            _checkpoint_fingerprint,
+        )
+
+        config = AutoConfig.from_pretrained(
+            f"{curpath}/hf_configs/gptj", return_dict=False
+        )
+        m = transformers.models.gptj.modeling_gptj.GPTJForCausalLM(config).eval()
+        with tempfile.TemporaryDirectory() as hub_cache:
+            # the layout of a hub id in the HF cache
+            commit_hash = "0" * 40
+            repo_dir = os.path.join(hub_cache, "models--org--model")
+            snapshot_dir = os.path.join(repo_dir, "snapshots", commit_hash)
+            os.makedirs(snapshot_dir)
+            os.makedirs(os.path.join(repo_dir, "refs"))
+            with open(os.path.join(repo_dir, "refs", "main"), "w") as f:
+                f.write(commit_hash)
+            config.to_json_file(os.path.join(snapshot_dir, "config.json"))
+            torch.save(m.state_dict(), os.path.join(snapshot_dir, "pytorch_model.bin"))
+            m.config._name_or_path = "org/model"
+            with unittest.mock.patch(
+                "huggingface_hub.constants.HF_HUB_CACHE", hub_cache
+            ):
+                # the weights are not read if the snapshot has the checkpoint files
+                with unittest.mock.patch(
+                    "intel_extension_for_pytorch.transformers.artifact_cache._hash_tensors"
+                ) as hash_tensors:
+                    fingerprint = _checkpoint_fingerprint(m)
+                    hash_tensors.assert_not_called()
+                self.assertEqual(_checkpoint_fingerprint(m), fingerprint)
+                os.utime(os.path.join(snapshot_dir, "pytorch_model.bin"), (0, 0))
+                self.assertNotEqual(_checkpoint_fingerprint(m), fingerprint)
+
 
 if __name__ == "__main__":
     test = unittest.main()
@@ -1,4 +1,5 @@
 import unittest
+import unittest.mock
 import torch
 import intel_extension_for_pytorch as ipex
 import sys
@@ -10,7 +11,9 @@ from intel_extension_for_pytorch.transformers import (
     shard_mlp_weights,
     shard_lm_head_weights,
     update_heads_info,
+    TensorParallelColumnLinear,
     TensorParallelRowLinear,
+    TensorParallelChunkedRowLinear,
     TensorParallelLMhead,
     TensorParallelConv2d,
 )
@@ -203,6 +206,79 @@ class TensorParallelTester(TestCase):
         self.assertTrue(tp_model.lm_head, TensorParallelLMhead)
         self.tensor_parallel_with_optimize_transformers(model)
 
+    def test_tensor_parallel_argument(self):
+        config = AutoConfig.from_pretrained(
+            f"{curpath}/hf_configs/llama", return_dict=False
+        )
+        model = transformers.models.llama.modeling_llama.LlamaForCausalLM(config).eval()
+        world_size = ipex_comm.get_world_size()
+        with self.assertRaises(AssertionError):
+            ipex.llm.optimize(model, tensor_parallel=world_size + 1)
+        input_dict = {
+            "input_ids": torch.ones(1, 10).to(torch.long),
+            "attention_mask": torch.ones(1, 10),
+            "position_ids": torch.arange(10).unsqueeze(0),
+            "use_cache": True,
+        }
+        ipex_model = ipex.llm.optimize(model, tensor_parallel=world_size)
+        with torch.no_grad():
+            self.assertEqual(
+                model(**input_dict)[0], ipex_model(**input_dict)[0], prec=0.1
+            )
+
+    def test_tensor_parallel_local_shard(self):
+        linear = torch.nn.Linear(256, 256)
+        column_linear = TensorParallelColumnLinear(
+            linear, 4, 4, 64, 0, 2, shard_by_head=False
+        )
+        row_linear = TensorParallelRowLinear(linear, 4, 4, 64, 1, 2)
+        for weight, ref in [
+            (column_linear.linear.weight, linear.weight[:128]),
+            (row_linear.linear.weight, linear.weight[:, 128:]),
+        ]:
+            # the shards do not keep the weight of the whole model alive
+            self.assertTrue(weight.is_contiguous())
+            self.assertEqual(
+                weight.untyped_storage().nbytes(),
+                weight.numel() * weight.element_size(),
+            )
+            self.assertEqual(weight, ref)
+
+    def test_tensor_parallel_chunked_row_linear(self):
+        linear = torch.nn.Linear(256, 200)
+        x = torch.randn(4, 256)
+        for num_chunks in [1, 3, 4]:
+            chunked_linear = TensorParallelChunkedRowLinear(
+                linear.weight, linear.bias, None, num_chunks, lambda t: t
+            )
+            self.assertEqual(len(chunked_linear.linears), num_chunks)
+            with torch.no_grad():
+                traced_linear = torch.jit.trace(chunked_linear, x)
+                self.assertEqual(chunked_linear(x), linear(x))
+                self.assertEqual(traced_linear(x), linear(x))
+        # the bias of DeepSpeed LinearAllreduce is added after the allreduce
+        chunked_linear = TensorParallelChunkedRowLinear(
+            linear.weight, None, linear.bias, 2, lambda t: t * 2
+        )
+        with torch.no_grad():
+            self.assertEqual(
+                chunked_linear(x), 2 * (linear(x) - linear.bias) + linear.bias
+            )
+
+    def test_tensor_parallel_allreduce_chunks(self):
+        from intel_extension_for_pytorch.transformers.tensor_parallel import (
+            get_allreduce_chunks,
+        )
+
+        with unittest.mock.patch.dict(os.environ, {"TP_ALLREDUCE_CHUNKS": "4"}):
+            self.assertEqual(get_allreduce_chunks(), 4)
+        for num_chunks in ["0", "-2", "two"]:
+            with unittest.mock.patch.dict(
+                os.environ, {"TP_ALLREDUCE_CHUNKS": num_chunks}
+            ):
+                with self.assertRaises(AssertionError):
+                    get_allreduce_chunks()
+
 
 if __name__ == "__main__":
     test = unittest.main()
@@ -6,10 +6,20 @@ from intel_extension_for_pytorch.cpu.launch import (
     Launcher,
     DistributedTrainingLauncher,
 )
+from intel_extension_for_pytorch.cpu.launch.supervisor import (
+    InstanceSupervisor,
+    parse_metrics_line,
+)
 import os
 from os.path import expanduser
 import glob
 import subprocess
+import sys
+import json
+import tempfile
+import threading
+import time
+import signal
 
 
 class TestLauncher(TestCase):
@@ -208,6 +218,101 @@ class TestLauncher(TestCase):
             r = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
             self.assertEqual(r.returncode, 0)
 
+    def test_weight_sharing(self):
+        with tempfile.TemporaryDirectory() as work_dir:
+            script = os.path.join(work_dir, "script.py")
+            with open(script, "w") as f:
+                f.write(
+                    "import os\nprint(os.environ['IPEX_WEIGHT_SHARING_INSTANCES'])\n"
+                )
+            cmd = self.launch_scripts[0] + [
+                "--ninstances",
+                "2",
+                "--ncores-per-instance",
+                "1",
+                "--weight-sharing",
+                script,
+            ]
+            r = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+            self.assertEqual(r.returncode, 0)
+            # One process runs all the instances
+            instances = [
+                line for line in r.stdout.decode().splitlines() if line.startswith("0:")
+            ]
+            self.assertEqual(len(instances), 1)
+            self.assertEqual(len(instances[0].split(";")), 2)
+
+    def test_supervisor(self):
+        self.assertEqual(
+            parse_metrics_line("IPEX_METRICS throughput=120.5 latency=8 name=x\n"),
+            {"throughput": 120.5, "latency": 8.0},
+        )
+        self.assertEqual(parse_metrics_line("throughput=120.5"), None)
+        with tempfile.TemporaryDirectory() as work_dir:
+            # The instance 1 fails at the first run and is restarted
+            marker = os.path.join(work_dir, "failed")
+            script = (
+                "import os, sys\n"
+                f"if sys.argv[1] == '1' and not os.path.exists({repr(marker)}):\n"
+                f"    open({repr(marker)}, 'w').close()\n"
+                "    sys.exit(1)\n"
+                "print(f'IPEX_METRICS throughput={10 * (int(sys.argv[1]) + 1)} latency=2')\n"
+            )
+            instances = [
+                {
+                    "index": i,
+                    "cores": str(i),
+                    "argv": [sys.executable, "-c", script, str(i)],
+                    "environ": dict(os.environ),
+                    "log_name": os.path.join(work_dir, f"instance_{i}.log"),
+                }
+                for i in range(2)
+            ]
+            supervisor = InstanceSupervisor(
+                instances, lambda level, msg: None, max_restarts=1
+            )
+            summary = supervisor.run()
+            self.assertEqual([i["returncode"] for i in summary["instances"]], [0, 0])
+            self.assertEqual([i["restarts"] for i in summary["instances"]], [0, 1])
+            self.assertEqual(summary["aggregated"]["throughput"]["sum"], 30)
+            self.assertEqual(summary["aggregated"]["latency"]["mean"], 2)
+            with open(instances[1]["log_name"]) as f:
+                self.assertTrue("IPEX_METRICS throughput=20" in f.read())
+            summary_file = os.path.join(work_dir, "summary.json")
+            supervisor.report(summary, summary_file)
+            with open(summary_file) as f:
+                self.assertEqual(json.load(f), summary)
+
+    def test_supervisor_interrupt(self):
+        # The instances keep running until they are terminated
+        script = "import time\nprint('started', flush=True)\ntime.sleep(60)\n"
+        instances = [
+            {
+                "index": i,
+                "cores": str(i),
+                "argv": [sys.executable, "-c", script],
+                "environ": dict(os.environ),
+                "log_name": "",
+            }
+            for i in range(2)
+        ]
+        supervisor = InstanceSupervisor(
+            instances, lambda level, msg: None, max_restarts=3
+        )
+        # Ctrl-C in the main thread after the instances are started
+        timer = threading.Timer(2, os.kill, args=(os.getpid(), signal.SIGINT))
+        timer.start()
+        with self.assertRaises(KeyboardInterrupt):
+            supervisor.run()
+        timer.cancel()
+        processes = dict(supervisor.processes)
+        self.assertEqual(len(processes), 2)
+        # The terminated instances are waited for and not restarted
+        self.assertTrue(all(p.poll() is not None for p in processes.values()))
+        time.sleep(1)
+        self.assertEqual(supervisor.processes, processes)
+        self.assertEqual([i["restarts"] for i in instances], [0, 0])
+
     def verify_affinity(self, pools, ground_truth):
         self.assertEqual(len(pools), ground_truth["ninstances"])
         self.assertEqual(len(pools[0]), ground_truth["ncores_per_instance"])
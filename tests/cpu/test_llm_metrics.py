@@ -0,0 +1,55 @@
+import json
+import unittest
+
+import torch
+import intel_extension_for_pytorch as ipex
+from common_utils import TestCase
+
+
+class GenerationMetricsTester(TestCase):
+    def test_generation_metrics(self):
+        metrics = ipex.llm.metrics.GenerationMetrics(latency_buckets=[0.01, 0.1, 1.0])
+        self.assertIsNone(metrics._start_generation(torch.ones(2, 5)))
+        metrics.enable()
+        recorder = metrics._start_generation(torch.ones(2, 5))
+        unfinished_sequences = torch.ones(2, dtype=torch.long)
+        past_key_values = tuple(
+            (
+                torch.empty(1, 8, 8, 1, dtype=torch.long),
+                torch.zeros(16, 2, 4, 8),
+                torch.zeros(16, 2, 4, 8),
+                torch.zeros(16, 2, dtype=torch.long),
+            )
+            for _ in range(3)
+        )
+        for i, latency in enumerate([0.5, 0.05, 0.05, 0.005]):
+            # the second sequence generates its last token at the second step
+            if i == 1:
+                unfinished_sequences[1] = 0
+            recorder.step(latency, unfinished_sequences)
+        recorder.finish(past_key_values)
+
+        result = metrics.as_dict()
+        self.assertEqual(result["requests"], 2)
+        self.assertEqual(result["prompt_tokens"], 10)
+        self.assertEqual(result["generated_tokens"], 6)
+        self.assertEqual(result["prefill_seconds"], 0.5)
+        self.assertEqual(result["ttft_seconds"]["count"], 1)
+        self.assertEqual(
+            result["next_token_latency_seconds"]["buckets"],
+            {"0.01": 1, "0.1": 3, "1.0": 3, "+Inf": 3},
+        )
+        self.assertAlmostEqual(result["tokens_per_second"], 4 / 0.105)
+        self.assertEqual(result["kv_cache_bytes"], 3 * 2 * 16 * 2 * 4 * 8 * 4)
+        self.assertAlmostEqual(result["batch_occupancy"], 6 / 8)
+        self.assertEqual(json.loads(metrics.to_json()), result)
+        text = metrics.to_prometheus()
+        self.assertIn("ipex_llm_generated_tokens_total 6", text)
+        self.assertIn('ipex_llm_next_token_latency_seconds_bucket{le="0.1"} 3', text)
+
+        metrics.reset()
+        self.assertEqual(metrics.as_dict()["generated_tokens"], 0)
+
+
+if __name__ == "__main__":
+    test = unittest.main()
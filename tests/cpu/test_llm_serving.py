@@ -0,0 +1,291 @@
+import copy
+import unittest
+import torch
+import intel_extension_for_pytorch as ipex
+from common_utils import TestCase
+from intel_extension_for_pytorch.llm.serving import (
+    BlockSpaceManager,
+    LLMEngine,
+    SamplingParams,
+    Scheduler,
+    SchedulerConfig,
+    Sequence,
+    paged_attention,
+)
+
+
+class ToyAttentionModel(torch.nn.Module):
+    def __init__(self, vocab_size=64, num_heads=4, num_kv_heads=2, head_size=16):
+        super().__init__()
+        self.num_heads = num_heads
+        self.num_kv_heads = num_kv_heads
+        self.head_size = head_size
+        hidden_size = num_heads * head_size
+        self.embed = torch.nn.Embedding(vocab_size, hidden_size)
+        self.pos_embed = torch.nn.Embedding(512, hidden_size)
+        self.q_proj = torch.nn.Linear(hidden_size, num_heads * head_size)
+        self.k_proj = torch.nn.Linear(hidden_size, num_kv_heads * head_size)
+        self.v_proj = torch.nn.Linear(hidden_size, num_kv_heads * head_size)
+        self.lm_head = torch.nn.Linear(hidden_size, vocab_size)
+
+    def _qkv(self, input_ids, positions):
+        hidden_states = self.embed(input_ids) + self.pos_embed(positions)
+        query = self.q_proj(hidden_states).view(-1, self.num_heads, self.head_size)
+        key = self.k_proj(hidden_states).view(-1, self.num_kv_heads, self.head_size)
+        value = self.v_proj(hidden_states).view(-1, self.num_kv_heads, self.head_size)
+        return hidden_states, query, key, value
+
+    def forward(self, input_ids, positions, kv_caches, attn_metadata):
+        hidden_states, query, key, value = self._qkv(input_ids, positions)
+        key_cache, value_cache = kv_caches[0]
+        out = paged_attention(
+            query,
+            key,
+            value,
+            key_cache,
+            value_cache,
+            attn_metadata,
+            self.head_size**-0.5,
+        )
+        return self.lm_head(out.reshape(hidden_states.shape) + hidden_states)
+
+    def reference_generate(self, prompt, max_new_tokens):
+        token_ids = list(prompt)
+        group = self.num_heads // self.num_kv_heads
+        for _ in range(max_new_tokens):
+            input_ids = torch.tensor(token_ids)
+            positions = torch.arange(len(token_ids))
+            hidden_states, query, key, value = self._qkv(input_ids, positions)
+            out = torch.nn.functional.scaled_dot_product_attention(
+                query.transpose(0, 1),
+                key.transpose(0, 1).repeat_interleave(group, dim=0),
+                value.transpose(0, 1).repeat_interleave(group, dim=0),
+                is_causal=True,
+            ).transpose(0, 1)
+            logits = self.lm_head(out.reshape(hidden_states.shape) + hidden_states)
+            token_ids.append(int(torch.argmax(logits[-1])))
+        return token_ids[len(prompt) :]
+
+
+class LLMServingTester(TestCase):
+    def test_block_space_manager(self):
+        block_manager = BlockSpaceManager(num_blocks=4, block_size=4, watermark=0.0)
+        seq = Sequence(0, list(range(6)), SamplingParams())
+        self.assertTrue(block_manager.can_allocate(seq))
+        block_manager.allocate(seq)
+        self.assertEqual(len(block_manager.get_block_table(seq)), 2)
+        self.assertEqual(block_manager.get_num_free_blocks(), 2)
+        block_table = block_manager.get_block_table(seq)
+        self.assertEqual(block_manager.get_slot(seq, 5), block_table[1] * 4 + 1)
+        for token_id in range(3):
+            seq.append_token_id(token_id)
+            block_manager.append_slot(seq)
+        self.assertEqual(len(block_manager.get_block_table(seq)), 3)
+        block_manager.free(seq)
+        self.assertEqual(block_manager.get_num_free_blocks(), 4)
+
+    def test_scheduler_admission(self):
+        block_manager = BlockSpaceManager(num_blocks=3, block_size=2, watermark=0.0)
+        scheduler = Scheduler(SchedulerConfig(max_num_batched_tokens=16), block_manager)
+        seq0 = Sequence(0, [1, 2], SamplingParams())
+        seq1 = Sequence(1, [3, 4, 5, 6, 7], SamplingParams())
+        scheduler.add_sequence(seq0)
+        scheduler.add_sequence(seq1)
+        output = scheduler.schedule()
+        self.assertEqual(output.prefill_seqs, [seq0])
+        self.assertEqual(list(scheduler.waiting), [seq1])
+        seq0.append_token_id(7)
+        output = scheduler.schedule()
+        self.assertEqual(output.decode_seqs, [seq0])
+        self.assertEqual(block_manager.get_num_free_blocks(), 1)
+        # the prompt of seq1 needs 3 blocks, which are not available
+        self.assertEqual(output.prefill_seqs, [])
+
+    def test_prefix_caching_block_sharing(self):
+        block_manager = BlockSpaceManager(
+            num_blocks=8, block_size=4, watermark=0.0, enable_prefix_caching=True
+        )
+        seq0 = Sequence(0, list(range(10)), SamplingParams())
+        seq1 = Sequence(1, list(range(8)) + [20, 21, 22], SamplingParams())
+        block_manager.allocate(seq0)
+        block_manager.allocate(seq1)
+        self.assertEqual(block_manager.get_num_cached_tokens(seq0), 0)
+        self.assertEqual(block_manager.get_num_cached_tokens(seq1), 8)
+        self.assertEqual(
+            block_manager.get_block_table(seq0)[:2],
+            block_manager.get_block_table(seq1)[:2],
+        )
+        self.assertEqual(block_manager.get_num_free_blocks(), 4)
+        # the unreferenced cached blocks are kept and can be hit again
+        block_manager.free(seq0)
+        block_manager.free(seq1)
+        self.assertEqual(block_manager.get_num_free_blocks(), 8)
+        seq2 = Sequence(2, list(range(9)), SamplingParams())
+        block_manager.allocate(seq2)
+        self.assertEqual(block_manager.get_num_cached_tokens(seq2), 8)
+
+    def test_copy_on_write(self):
+        block_manager = BlockSpaceManager(num_blocks=4, block_size=4, watermark=0.0)
+        parent = Sequence(0, [1, 2, 3], SamplingParams())
+        child = Sequence(1, [1, 2, 3], SamplingParams())
+        block_manager.allocate(parent)
+        block_manager.fork(parent, child)
+        shared_block = block_manager.get_block_table(parent)[0]
+        self.assertEqual(block_manager.get_block_table(child), [shared_block])
+        parent.append_token_id(4)
+        child.append_token_id(5)
+        src, dst = block_manager.append_slot(child)
+        self.assertEqual(src, shared_block)
+        self.assertEqual(block_manager.get_block_table(child), [dst])
+        self.assertIsNone(block_manager.append_slot(parent))
+        self.assertEqual(block_manager.get_block_table(parent), [shared_block])
+
+    def test_engine_matches_reference(self):
+        torch.manual_seed(0)
+        model = ToyAttentionModel().eval()
+        prompts = [[1, 2, 3], [4, 5, 6, 7, 8, 9, 10, 11, 12], [13], [14, 15, 16, 17]]
+        max_new_tokens = [5, 3, 8, 6]
+        engine = LLMEngine(
+            model,
+            num_layers=1,
+            num_kv_heads=model.num_kv_heads,
+            head_size=model.head_size,
+            num_blocks=16,
+            block_size=4,
+            scheduler_config=SchedulerConfig(max_num_seqs=2),
+        )
+        request_ids = [
+            engine.add_request(prompt, SamplingParams(max_new_tokens=n))
+            for prompt, n in zip(prompts, max_new_tokens)
+        ]
+        results = {}
+        with torch.no_grad():
+            while engine.has_unfinished_requests():
+                for output in engine.step():
+                    if output.finished:
+                        results[output.request_id] = output.output_token_ids
+            for request_id, prompt, n in zip(request_ids, prompts, max_new_tokens):
+                self.assertEqual(
+                    results[request_id], model.reference_generate(prompt, n)
+                )
+        self.assertEqual(engine.block_manager.get_num_free_blocks(), 16)
+
+    def test_engine_prefix_caching_matches_reference(self):
+        torch.manual_seed(0)
+        model = ToyAttentionModel().eval()
+        system_prompt = list(range(20, 30))
+        prompts = [system_prompt + [1, 2], system_prompt + [3], system_prompt]
+        engine = LLMEngine(
+            model,
+            num_layers=1,
+            num_kv_heads=model.num_kv_heads,
+            head_size=model.head_size,
+            num_blocks=16,
+            block_size=4,
+            enable_prefix_caching=True,
+        )
+        with torch.no_grad():
+            # the first request populates the prefix cache
+            outputs = engine.generate(prompts[:1], SamplingParams(max_new_tokens=4))
+            outputs += engine.generate(prompts[1:], SamplingParams(max_new_tokens=4))
+            for prompt, output in zip(prompts, outputs):
+                self.assertEqual(output, model.reference_generate(prompt, 4))
+        self.assertGreater(engine.block_manager.prefix_cache.num_hits, 0)
+
+    def test_engine_lora_adapters_match_reference(self):
+        torch.manual_seed(0)
+        model = ToyAttentionModel().eval()
+        hidden_size = model.num_heads * model.head_size
+        adapters = {}
+        references = {None: copy.deepcopy(model)}
+        for adapter_id, rank in [("a", 4), ("b", 8)]:
+            state_dict = {}
+            references[adapter_id] = copy.deepcopy(model)
+            for name in ["q_proj", "v_proj"]:
+                lora_a = torch.randn(rank, hidden_size) * 0.1
+                lora_b = torch.randn(getattr(model, name).out_features, rank) * 0.1
+                state_dict[f"{name}.lora_A.weight"] = lora_a
+                state_dict[f"{name}.lora_B.weight"] = lora_b
+                with torch.no_grad():
+                    getattr(references[adapter_id], name).weight += (
+                        2.0 * lora_b @ lora_a
+                    )
+            adapters[adapter_id] = state_dict
+        adapter_cache = ipex.llm.modules.LoRAAdapterCache(2, 8)
+        adapter_cache.apply(model, ["q_proj", "v_proj"])
+        for adapter_id, state_dict in adapters.items():
+            adapter_cache.add_adapter(adapter_id, state_dict, scaling=2.0)
+        engine = LLMEngine(
+            model,
+            num_layers=1,
+            num_kv_heads=model.num_kv_heads,
+            head_size=model.head_size,
+            num_blocks=32,
+            block_size=4,
+            enable_prefix_caching=True,
+            adapter_cache=adapter_cache,
+        )
+        prompt = list(range(20, 30))
+        adapter_ids = ["a", None, "b", "a"]
+        request_ids = [
+            engine.add_request(prompt, SamplingParams(max_new_tokens=4), adapter_id)
+            for adapter_id in adapter_ids
+        ]
+        results = {}
+        with torch.no_grad():
+            while engine.has_unfinished_requests():
+                for output in engine.step():
+                    if output.finished:
+                        results[output.request_id] = output.output_token_ids
+            for request_id, adapter_id in zip(request_ids, adapter_ids):
+                self.assertEqual(
+                    results[request_id],
+                    references[adapter_id].reference_generate(prompt, 4),
+                )
+
+    def test_engine_lora_adapter_replacement(self):
+        torch.manual_seed(0)
+        model = ToyAttentionModel().eval()
+        hidden_size = model.num_heads * model.head_size
+        adapter_cache = ipex.llm.modules.LoRAAdapterCache(2, 8)
+        reference = copy.deepcopy(model)
+        adapter_cache.apply(model, ["q_proj", "v_proj"])
+        engine = LLMEngine(
+            model,
+            num_layers=1,
+            num_kv_heads=model.num_kv_heads,
+            head_size=model.head_size,
+            num_blocks=32,
+            block_size=4,
+            enable_prefix_caching=True,
+            adapter_cache=adapter_cache,
+        )
+        prompt = list(range(20, 30))
+        outputs = []
+        with torch.no_grad():
+            for _ in range(2):
+                # adds or replaces the adapter with new weights
+                state_dict = {}
+                adapted_reference = copy.deepcopy(reference)
+                for name in ["q_proj", "v_proj"]:
+                    lora_a = torch.randn(8, hidden_size)
+                    lora_b = torch.randn(getattr(reference, name).out_features, 8)
+                    state_dict[f"{name}.lora_A.weight"] = lora_a
+                    state_dict[f"{name}.lora_B.weight"] = lora_b
+                    getattr(adapted_reference, name).weight += lora_b @ lora_a
+                adapter_cache.add_adapter("a", state_dict)
+                engine.add_request(prompt, SamplingParams(max_new_tokens=4), "a")
+                while engine.has_unfinished_requests():
+                    for output in engine.step():
+                        if output.finished:
+                            outputs.append(output.output_token_ids)
+                # the KV cache of the old adapter weights is not reused
+                self.assertEqual(
+                    outputs[-1], adapted_reference.reference_generate(prompt, 4)
+                )
+        self.assertEqual(engine.block_manager.prefix_cache.num_hits, 0)
+        self.assertNotEqual(outputs[0], outputs[1])
+
+
+if __name__ == "__main__":
+    test = unittest.main()
@@ -0,0 +1,130 @@
+import copy
+import unittest
+
+import torch
+import intel_extension_for_pytorch as ipex
+from intel_extension_for_pytorch.llm.modules import LoRAAdapterCache, LoRALinear
+from common_utils import TestCase
+
+
+class MLP(torch.nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.up_proj = torch.nn.Linear(64, 128)
+        self.down_proj = torch.nn.Linear(128, 64)
+
+    def forward(self, x):
+        return self.down_proj(torch.nn.functional.relu(self.up_proj(x)))
+
+
+def _get_adapter(model, rank, prefix="base_model.model."):
+    state_dict = {}
+    for name in ["up_proj", "down_proj"]:
+        linear = getattr(model, name)
+        state_dict[f"{prefix}{name}.lora_A.weight"] = (
+            torch.randn(rank, linear.in_features) * 0.1
+        )
+        state_dict[f"{prefix}{name}.lora_B.weight"] = (
+            torch.randn(linear.out_features, rank) * 0.1
+        )
+    return state_dict
+
+
+def _merge_adapter(model, state_dict, scaling, prefix="base_model.model."):
+    model = copy.deepcopy(model)
+    with torch.no_grad():
+        for name in ["up_proj", "down_proj"]:
+            lora_a = state_dict[f"{prefix}{name}.lora_A.weight"]
+            lora_b = state_dict[f"{prefix}{name}.lora_B.weight"]
+            getattr(model, name).weight += scaling * lora_b @ lora_a
+    return model
+
+
+class LoRATester(TestCase):
+    def test_lora_linear_mixed_adapters(self):
+        torch.manual_seed(0)
+        model = MLP().eval()
+        adapters = {
+            "a": (_get_adapter(model, 4), 2.0),
+            "b": (_get_adapter(model, 8), 0.5),
+        }
+        references = {None: model}
+        for adapter_id, (state_dict, scaling) in adapters.items():
+            references[adapter_id] = _merge_adapter(model, state_dict, scaling)
+        with torch.no_grad():
+            # the base linears are prepacked by ipex.optimize
+            lora_model = ipex.optimize(copy.deepcopy(model))
+        adapter_cache = LoRAAdapterCache(2, 8)
+        adapter_cache.apply(lora_model, ["up_proj", "down_proj"])
+        self.assertTrue(isinstance(lora_model.up_proj, LoRALinear))
+        for adapter_id, (state_dict, scaling) in adapters.items():
+            adapter_cache.add_adapter(adapter_id, state_dict, scaling)
+        adapter_ids = ["a", None, "b", "a"]
+        x = torch.randn(4, 3, 64)
+        with torch.no_grad():
+            self.assertEqual(lora_model(x), model(x))
+            # one adapter per sequence
+            with adapter_cache.activate(adapter_ids):
+                y = lora_model(x)
+            for i, adapter_id in enumerate(adapter_ids):
+                self.assertEqual(y[i], references[adapter_id](x[i]))
+            # the tokens of the sequences are packed
+            num_tokens = [2, 5, 1, 3]
+            x = torch.randn(sum(num_tokens), 64)
+            with adapter_cache.activate(adapter_ids, num_tokens):
+                y = lora_model(x)
+            for x_i, y_i, adapter_id in zip(
+                x.split(num_tokens), y.split(num_tokens), adapter_ids
+            ):
+                self.assertEqual(y_i, references[adapter_id](x_i))
+
+    def test_lora_linear_woq(self):
+        torch.manual_seed(0)
+        model = MLP().eval()
+        state_dict = _get_adapter(model, 4)
+        qconfig = ipex.quantization.get_weight_only_quant_qconfig_mapping()
+        woq_model = ipex.quantization.prepare(
+            copy.deepcopy(model), qconfig, inplace=False
+        )
+        woq_model = ipex.quantization.convert(woq_model)
+        linear = woq_model.up_proj
+        adapter_cache = LoRAAdapterCache(1, 4)
+        lora_linear = LoRALinear(linear, adapter_cache, "up_proj")
+        adapter_cache.add_adapter("a", state_dict, scaling=2.0)
+        x = torch.randn(3, 64)
+        with torch.no_grad(), adapter_cache.activate(["a"]):
+            y = lora_linear(x)
+            delta = (
+                x
+                @ state_dict["base_model.model.up_proj.lora_A.weight"].t()
+                @ state_dict["base_model.model.up_proj.lora_B.weight"].t()
+            )
+            self.assertEqual(y, linear(x) + 2.0 * delta)
+
+    def test_lora_adapter_cache_eviction(self):
+        torch.manual_seed(0)
+        model = MLP().eval()
+        adapters = {i: _get_adapter(model, 4) for i in range(3)}
+        adapter_cache = LoRAAdapterCache(
+            2, 4, loader=lambda adapter_id: (adapters[adapter_id], 1.0)
+        )
+        lora_model = adapter_cache.apply(copy.deepcopy(model), ["up_proj", "down_proj"])
+        x = torch.randn(2, 64)
+        with torch.no_grad():
+            for adapter_ids in [[0, 1], [0, 2], [1, None], [0, 0]]:
+                with adapter_cache.activate(adapter_ids):
+                    y = lora_model(x)
+                for i, adapter_id in enumerate(adapter_ids):
+                    reference = model
+                    if adapter_id is not None:
+                        reference = _merge_adapter(model, adapters[adapter_id], 1.0)
+                    self.assertEqual(y[i], reference(x[i]))
+        # 1 evicts 0 at the 3rd batch, which is loaded again at the 4th batch
+        self.assertEqual(adapter_cache.num_loads, 5)
+        self.assertEqual(list(adapter_cache.slots), [1, 0])
+        with self.assertRaises(AssertionError):
+            adapter_cache.get_slots([0, 1, 2])
+
+
+if __name__ == "__main__":
+    test = unittest.main()
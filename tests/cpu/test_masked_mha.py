@@ -1,3 +1,4 @@
+import itertools
 import torch
 import torch.nn as nn
 from common_utils import TestCase
@@ -781,6 +782,254 @@ class MaskedMHATest(TestCase):
                             value_cache_iakv_half[offset, :, :, :],
                         )
 
+    def test_mha_cache_size_from_beam_idx(self):
+        torch.manual_seed(123)
+        mha = MaskedMHA(hidden_size=256, n_head=4, n_head_kv=4, head_dim=64)
+        batch_size = 2
+        first_seq_len = 8
+        attention_mask = torch.zeros(batch_size, 1, first_seq_len, first_seq_len)
+        input_t = torch.randn(batch_size, first_seq_len, 256)
+        key_cache = torch.randn(1, batch_size, 4, 64)
+        value_cache = torch.randn(1, batch_size, 4, 64)
+        offset = torch.tensor(0)
+        with torch.inference_mode():
+            # text_max_length is used unless it is negative, e.g., the legacy (2048, bs) beam_idx
+            for text_max_length, max_length, expected_cache_size in [
+                (-1, 20, 20),
+                (-1, 1, 9),
+                (64, 2048, 64),
+                (64, 1, 64),
+            ]:
+                beam_idx = torch.zeros(max_length, batch_size, dtype=torch.long)
+                _, _, key_cache_iakv, value_cache_iakv, beam_idx_iakv = mha(
+                    input_t,
+                    key_cache,
+                    value_cache,
+                    text_max_length,
+                    attention_mask,
+                    beam_idx,
+                    True,
+                    offset,
+                )
+                self.assertEqual(key_cache_iakv.size(0), expected_cache_size)
+                self.assertEqual(value_cache_iakv.size(0), expected_cache_size)
+                self.assertEqual(beam_idx_iakv.size(0), expected_cache_size)
+
+    def test_mha_chunked_prefill(self):
+        iakv_attention = ipex.llm.functional.indirect_access_kv_cache_attention
+        torch.manual_seed(123)
+        head_num, head_dim, seq_len = 4, 64, 37
+        for batch_size, num_beams in [(1, 1), (2, 1), (2, 2)]:
+            query = torch.randn(batch_size, seq_len, head_num, head_dim)
+            key = torch.randn(batch_size, seq_len, head_num, head_dim)
+            value = torch.randn(batch_size, seq_len, head_num, head_dim)
+            attention_mask = torch.zeros(batch_size, 1, seq_len, seq_len)
+            beam_idx = torch.zeros(64, batch_size * num_beams, dtype=torch.long)
+            layer_past = (
+                torch.zeros(1, 0, 0, 1, dtype=torch.long),
+                torch.zeros([1, 1, 1, 1]),
+                torch.zeros([1, 1, 1, 1]),
+                beam_idx,
+            )
+            next_query = torch.randn(batch_size * num_beams, 1, head_num, head_dim)
+            next_key = torch.randn(batch_size * num_beams, 1, head_num, head_dim)
+            next_value = torch.randn(batch_size * num_beams, 1, head_num, head_dim)
+            next_attention_mask = torch.zeros(batch_size * num_beams, 1, 1, seq_len + 1)
+            outputs = []
+            with torch.inference_mode():
+                for prefill_chunk_size in [0, 16]:
+                    first_out, _, present = iakv_attention(
+                        query,
+                        key,
+                        value,
+                        8,
+                        layer_past,
+                        None,
+                        attention_mask,
+                        text_max_length=64,
+                        prefill_chunk_size=prefill_chunk_size,
+                    )
+                    next_out, _, _ = iakv_attention(
+                        next_query,
+                        next_key,
+                        next_value,
+                        8,
+                        present,
+                        None,
+                        next_attention_mask,
+                        text_max_length=64,
+                    )
+                    self.assertEqual(present[0].size(-2), seq_len)
+                    outputs.append((first_out, next_out))
+            self.assertEqual(outputs[0][0], outputs[1][0], prec=1e-5)
+            self.assertEqual(outputs[0][1], outputs[1][1], prec=1e-5)
+
+    def test_mha_quantized_kv_cache(self):
+        iakv_attention = ipex.llm.functional.indirect_access_kv_cache_attention
+        torch.manual_seed(123)
+        head_num, kv_head_num, head_dim, seq_len = 4, 2, 64, 37
+        kv_cache_dtypes = [torch.int8]
+        if hasattr(torch, "float8_e4m3fn"):
+            kv_cache_dtypes += [torch.float8_e4m3fn, torch.float8_e5m2]
+        for (batch_size, num_beams), prefill_chunk_size in itertools.product(
+            [(1, 1), (2, 2)], [0, 16]
+        ):
+            query = torch.randn(batch_size, seq_len, head_num, head_dim)
+            key = torch.randn(batch_size, seq_len, kv_head_num, head_dim)
+            value = torch.randn(batch_size, seq_len, kv_head_num, head_dim)
+            attention_mask = torch.zeros(batch_size, 1, seq_len, seq_len)
+            beam_idx = torch.zeros(64, batch_size * num_beams, dtype=torch.long)
+            layer_past = (
+                torch.zeros(1, 0, 0, 1, dtype=torch.long),
+                torch.zeros([1, 1, 1, 1]),
+                torch.zeros([1, 1, 1, 1]),
+                beam_idx,
+            )
+            next_query = torch.randn(batch_size * num_beams, 1, head_num, head_dim)
+            next_key = torch.randn(batch_size * num_beams, 1, kv_head_num, head_dim)
+            next_value = torch.randn(batch_size * num_beams, 1, kv_head_num, head_dim)
+            next_attention_mask = torch.zeros(batch_size * num_beams, 1, 1, seq_len + 1)
+            outputs = []
+            with torch.inference_mode():
+                for kv_cache_dtype in [None] + kv_cache_dtypes:
+                    first_out, _, present = iakv_attention(
+                        query,
+                        key,
+                        value,
+                        8,
+                        layer_past,
+                        None,
+                        attention_mask,
+                        text_max_length=64,
+                        prefill_chunk_size=prefill_chunk_size,
+                        kv_cache_dtype=kv_cache_dtype,
+                    )
+                    next_out, _, _ = iakv_attention(
+                        next_query,
+                        next_key,
+                        next_value,
+                        8,
+                        present,
+                        None,
+                        next_attention_mask,
+                        text_max_length=64,
+                        kv_cache_dtype=kv_cache_dtype,
+                    )
+                    if kv_cache_dtype is not None:
+                        self.assertEqual(present[1].dtype, kv_cache_dtype)
+                        # the int8 scale of every head is packed after its values
+                        packed_head_dim = (
+                            head_dim + 4 if kv_cache_dtype is torch.int8 else head_dim
+                        )
+                        self.assertEqual(present[1].size(-1), packed_head_dim)
+                    outputs.append((first_out, next_out))
+            for (first_out, next_out), kv_cache_dtype in zip(
+                outputs[1:], kv_cache_dtypes
+            ):
+                prec = 2e-2 if kv_cache_dtype is torch.int8 else 1.5e-1
+                self.assertEqual(outputs[0][0], first_out, prec=prec)
+                self.assertEqual(outputs[0][1], next_out, prec=prec)
+
+    def _streaming_mha_ref(
+        self, query, sink_query, keys, values, offset, sink_size, window_size
+    ):
+        # query: [bs, cur, head_num, head_dim], keys/values: all the tokens so far
+        bs, cur, head_num, head_dim = query.shape
+        group = head_num // keys.size(2)
+        keys = keys.repeat_interleave(group, dim=2).transpose(1, 2)
+        values = values.repeat_interleave(group, dim=2).transpose(1, 2)
+        seq_len = keys.size(2)
+        q_pos = torch.arange(offset, offset + cur).unsqueeze(-1)
+        t = torch.arange(seq_len).unsqueeze(0)
+        is_sink = (t < sink_size) & (t <= q_pos)
+        in_window = (t > q_pos - window_size) & (t <= q_pos) & (t >= sink_size)
+        scores = torch.matmul(query.transpose(1, 2), keys.transpose(-1, -2))
+        sink_scores = torch.matmul(sink_query.transpose(1, 2), keys.transpose(-1, -2))
+        scores = torch.where(is_sink, sink_scores, scores) / 8
+        scores = scores.masked_fill(~(is_sink | in_window), float("-inf"))
+        return torch.matmul(torch.softmax(scores, dim=-1), values)
+
+    def test_mha_streaming_kv_cache(self):
+        iakv_attention = ipex.llm.functional.indirect_access_kv_cache_attention
+        torch.manual_seed(123)
+        batch_size, head_num, kv_head_num, head_dim = 2, 4, 2, 64
+        sink_size, window_size, prompt_len, decode_steps = 4, 8, 20, 6
+        total_len = prompt_len + decode_steps
+        for use_rope, prefill_chunk_size in itertools.product([False, True], [0, 6]):
+            rope = (
+                ipex.llm.modules.RotaryEmbedding(
+                    2048, head_dim, backbone="LlamaForCausalLM"
+                )
+                if use_rope
+                else None
+            )
+            query = torch.randn(batch_size, total_len, head_num, head_dim)
+            key = torch.randn(batch_size, total_len, kv_head_num, head_dim)
+            value = torch.randn(batch_size, total_len, kv_head_num, head_dim)
+            position_ids = torch.arange(total_len).unsqueeze(0).repeat(batch_size, 1)
+            if use_rope:
+                # the sinks are seen by the query right before the window
+                shift = torch.clamp(
+                    torch.arange(total_len) + 1 - sink_size - window_size, min=0
+                )
+                sink_query = rope(
+                    query,
+                    position_ids - shift,
+                    head_num,
+                    head_dim,
+                    head_dim // 2,
+                    head_dim,
+                )
+                query = rope(
+                    query, position_ids, head_num, head_dim, head_dim // 2, head_dim
+                )
+                key = rope(
+                    key, position_ids, kv_head_num, head_dim, head_dim // 2, head_dim
+                )
+            else:
+                sink_query = query
+            layer_past = (
+                torch.zeros(1, 0, 0, 1, dtype=torch.long),
+                torch.zeros([1, 1, 1, 1]),
+                torch.zeros([1, 1, 1, 1]),
+                torch.zeros(1, batch_size, dtype=torch.long),
+            )
+            steps = [(0, prompt_len)] + [
+                (t, t + 1) for t in range(prompt_len, total_len)
+            ]
+            with torch.inference_mode():
+                for start, end in steps:
+                    attention_mask = torch.zeros(batch_size, 1, end - start, end)
+                    attention_mask[..., start:] = torch.triu(
+                        torch.full((end - start, end - start), float("-inf")), 1
+                    )
+                    out, _, layer_past = iakv_attention(
+                        query[:, start:end],
+                        key[:, start:end],
+                        value[:, start:end],
+                        8,
+                        layer_past,
+                        None,
+                        attention_mask,
+                        prefill_chunk_size=prefill_chunk_size,
+                        attention_sink_size=sink_size,
+                        sliding_window_size=window_size,
+                        rotary_embedding=rope,
+                    )
+                    # the ring buffer is never grown
+                    self.assertEqual(layer_past[1].size(0), sink_size + window_size)
+                    self.assertEqual(layer_past[0].size(-2), end)
+                    ref = self._streaming_mha_ref(
+                        query[:, start:end],
+                        sink_query[:, start:end],
+                        key[:, :end],
+                        value[:, :end],
+                        start,
+                        sink_size,
+                        window_size,
+                    )
+                    self.assertEqual(out, ref, prec=1e-4)
+
     def test_mha(self):
         self._test_mha(torchcompile=False)
         self._test_mha_fp16(torchcompile=False)
@@ -0,0 +1,60 @@
+import os
+import unittest
+
+import torch
+import intel_extension_for_pytorch as ipex
+from intel_extension_for_pytorch.cpu._numa import (
+    _PAGE_SIZE,
+    _partition,
+    get_numa_nodes,
+    get_numa_nodes_of_tensor,
+    partition_weights_by_numa_node,
+)
+from intel_extension_for_pytorch.cpu.launch import CPUPoolList
+from common_utils import TestCase
+
+
+class NumaPartitionTester(TestCase):
+    def test_get_numa_nodes(self):
+        available_cores = os.sched_getaffinity(0)
+        nodes = get_numa_nodes()
+        self.assertEqual(
+            sorted(nodes),
+            sorted(
+                set(c.node for c in CPUPoolList().pool_all if c.cpu in available_cores)
+            ),
+        )
+
+    def test_partition(self):
+        weight = torch.empty(1000, 1000)
+        parts = _partition(weight, 3)
+        address = weight.untyped_storage().data_ptr()
+        self.assertLessEqual(parts[0][0], address)
+        self.assertGreaterEqual(
+            parts[-1][0] + parts[-1][1], address + weight.untyped_storage().nbytes()
+        )
+        for (begin, nbytes), (next_begin, _) in zip(parts, parts[1:]):
+            self.assertEqual(begin % _PAGE_SIZE, 0)
+            self.assertEqual(begin + nbytes, next_begin)
+
+    def test_partition_weights_by_numa_node(self):
+        model = torch.nn.Sequential(torch.nn.Linear(512, 1024), torch.nn.ReLU()).eval()
+        x = torch.randn(4, 512)
+        with torch.no_grad():
+            ref = ipex.optimize(model)(x)
+            ipex_model = ipex.optimize(model, numa_partition=True)
+            self.assertEqual(ipex_model(x), ref)
+        # bind the halves of the weight to the first node
+        node = get_numa_nodes()[0]
+        self.assertEqual(
+            partition_weights_by_numa_node(ipex_model, nodes=[node, node], min_bytes=0),
+            1,
+        )
+        for page_nodes in get_numa_nodes_of_tensor(ipex_model[0].weight, 2):
+            self.assertTrue(all(n == node for n in page_nodes))
+        with torch.no_grad():
+            self.assertEqual(ipex_model(x), ref)
+
+
+if __name__ == "__main__":
+    test = unittest.main()
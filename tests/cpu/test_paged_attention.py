@@ -300,6 +300,109 @@ class PagedAttentionTest(TestCase):
                 num_token, num_kv_head, head_size, block_size, num_blocks, dtype, seed
             )
 
+    def _test_paged_attention_quantized_kv_cache_func(
+        self,
+        num_head: Tuple[int, int],
+        head_size: int,
+        block_size: int,
+        cache_dtype: torch.dtype,
+        dtype: torch.dtype,
+    ) -> None:
+        random.seed(0)
+        torch.manual_seed(0)
+        num_seqs = 3
+        num_blocks = 64
+        scale = float(1.0 / (head_size**0.5))
+        num_query_heads, num_kv_head = num_head
+        num_queries_per_kv = num_query_heads // num_kv_head
+        head_mapping = torch.repeat_interleave(
+            torch.arange(num_kv_head, dtype=torch.int32), num_queries_per_kv
+        )
+        num_tokens = num_blocks * block_size
+        key = torch.randn(num_tokens, num_kv_head, head_size, dtype=dtype)
+        value = torch.randn(num_tokens, num_kv_head, head_size, dtype=dtype)
+        slot_mapping = torch.arange(num_tokens, dtype=torch.int)
+        cache_shape = (num_blocks, block_size, num_kv_head, head_size)
+        key_cache = torch.zeros(cache_shape, dtype=dtype)
+        value_cache = torch.zeros(cache_shape, dtype=dtype)
+        torch.ops.torch_ipex.reshape_and_cache(
+            key, value, key_cache, value_cache, slot_mapping
+        )
+        q_key_cache = torch.zeros(cache_shape, dtype=cache_dtype)
+        q_value_cache = torch.zeros(cache_shape, dtype=cache_dtype)
+        k_scale, v_scale = None, None
+        if cache_dtype is torch.int8:
+            k_scale = torch.zeros(num_blocks, block_size, num_kv_head)
+            v_scale = torch.zeros(num_blocks, block_size, num_kv_head)
+        torch.ops.torch_ipex.reshape_and_cache(
+            key, value, q_key_cache, q_value_cache, slot_mapping, k_scale, v_scale
+        )
+        if cache_dtype is torch.int8:
+            # per token per head symmetric quantization
+            self.assertEqual(
+                k_scale, key.float().abs().amax(-1).view(k_scale.shape) / 127
+            )
+
+        query = torch.randn(num_seqs, num_query_heads, head_size, dtype=dtype)
+        context_lens = [random.randint(1, num_tokens) for _ in range(num_seqs)]
+        max_context_len = max(context_lens)
+        max_num_blocks_per_seq = (max_context_len + block_size - 1) // block_size
+        block_tables = torch.tensor(
+            [
+                random.sample(range(num_blocks), max_num_blocks_per_seq)
+                for _ in range(num_seqs)
+            ],
+            dtype=torch.int,
+        )
+        context_lens = torch.tensor(context_lens, dtype=torch.int)
+        ref_output = torch.empty_like(query)
+        torch.ops.torch_ipex.single_query_cached_kv_attention(
+            ref_output,
+            query,
+            key_cache,
+            value_cache,
+            head_mapping,
+            scale,
+            block_tables,
+            context_lens,
+            block_size,
+            max_context_len,
+            None,
+        )
+        output = torch.empty_like(query)
+        torch.ops.torch_ipex.single_query_cached_kv_attention(
+            output,
+            query,
+            q_key_cache,
+            q_value_cache,
+            head_mapping,
+            scale,
+            block_tables,
+            context_lens,
+            block_size,
+            max_context_len,
+            None,
+            k_scale,
+            v_scale,
+        )
+        atol = 2e-2 if cache_dtype is torch.int8 else 6e-2
+        self.assertEqual(output, ref_output, atol=atol, rtol=0)
+
+    def test_paged_attention_quantized_kv_cache(self):
+        cache_dtypes = [torch.int8]
+        if hasattr(torch, "float8_e4m3fn"):
+            cache_dtypes += [torch.float8_e4m3fn, torch.float8_e5m2]
+        for num_head, head_size, block_size, cache_dtype, dtype in product(
+            [(16, 16), (16, 4)],
+            [64, 80],
+            [16],
+            cache_dtypes,
+            [torch.float, torch.bfloat16],
+        ):
+            self._test_paged_attention_quantized_kv_cache_func(
+                num_head, head_size, block_size, cache_dtype, dtype
+            )
+
 
 if __name__ == "__main__":
     test = unittest.main()
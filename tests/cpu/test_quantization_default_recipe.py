@@ -11,6 +11,7 @@ from torch.ao.quantization import (
 )
 import copy
 import unittest
+import unittest.mock
 import numpy
 from common_utils import TestCase
 
@@ -24,6 +25,7 @@ from intel_extension_for_pytorch.quantization import (
     dequantize_per_block,
     quantize_per_channel,
     quantize_per_block,
+    quantize_weights_batched,
     WoqWeightDtype,
     WoqLowpMode,
 )
@@ -1431,6 +1433,78 @@ class WeightOnlyQuantizationTester(TestCase):
         for shape, has_bias, act_quant_mode, group_size in cases:
             test(shape, has_bias, act_quant_mode, group_size)
 
+    def test_weight_only_quantization_batched(self):
+        class Mod(nn.Module):
+            def __init__(self):
+                super(Mod, self).__init__()
+                self.q = torch.nn.Linear(128, 64)
+                self.k = torch.nn.Linear(128, 32)
+                self.v = torch.nn.Linear(128, 32)
+                self.o = torch.nn.Linear(64, 128)
+
+            def forward(self, x):
+                return self.o(
+                    torch.cat([self.q(x)[..., :32], self.k(x) + self.v(x)], -1)
+                )
+
+        weights = [torch.randn(64, 128), torch.randn(31, 128), torch.randn(33, 128)]
+        for w_dtype, group_size in itertools.product(
+            [WoqWeightDtype.INT8, WoqWeightDtype.INT4, WoqWeightDtype.NF4],
+            [-1, 32, 48],
+        ):
+            results = quantize_weights_batched(weights, w_dtype, group_size)
+            for w, (qw, scales, zps) in zip(weights, results):
+                if group_size == -1:
+                    ref = quantize_per_channel(w, w_dtype)
+                else:
+                    ref = quantize_per_block(w, w_dtype, group_size)
+                self.assertEqual(qw, ref[0])
+                self.assertEqual(scales, ref[1])
+                if ref[2] is not None:
+                    self.assertEqual(zps, ref[2])
+
+            m = Mod().eval()
+            data = torch.rand(4, 128)
+            qconfig_mapping = ipex.quantization.get_weight_only_quant_qconfig_mapping(
+                weight_dtype=w_dtype, group_size=group_size
+            )
+            woq_model = convert(prepare(copy.deepcopy(m), qconfig_mapping))
+            for name in ["q", "k", "v", "o"]:
+                linear = copy.deepcopy(getattr(m, name))
+                linear.qconfig = qconfig_mapping.global_qconfig
+                ref_linear = ipex.nn.modules.WeightOnlyQuantizedLinear.from_float(
+                    linear
+                )
+                woq_linear = getattr(woq_model, name)
+                self.assertTrue(
+                    isinstance(woq_linear, ipex.nn.modules.WeightOnlyQuantizedLinear)
+                )
+                x = data[:, : linear.in_features]
+                with torch.no_grad():
+                    self.assertEqual(woq_linear(x), ref_linear(x))
+
+            # each linear is packed once, the converted model is not copied after packing
+            from_float_and_qweight = (
+                ipex.nn.modules.WeightOnlyQuantizedLinear._from_float_and_qweight
+            )
+            packed = []
+
+            def pack(*args, **kwargs):
+                packed.append(from_float_and_qweight(*args, **kwargs))
+                return packed[-1]
+
+            with unittest.mock.patch.object(
+                ipex.nn.modules.WeightOnlyQuantizedLinear,
+                "_from_float_and_qweight",
+                side_effect=pack,
+            ):
+                woq_model = convert(prepare(copy.deepcopy(m), qconfig_mapping))
+            # the modules are packed on a thread pool in any order
+            self.assertEqual(
+                sorted(id(woq_linear) for woq_linear in packed),
+                sorted(id(getattr(woq_model, name)) for name in ["q", "k", "v", "o"]),
+            )
+
     def test_compute_with_g_idx(self):
         class Mod(nn.Module):
             def __init__(self, ic, oc, has_bias):
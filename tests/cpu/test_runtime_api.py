@@ -5,7 +5,13 @@ from common_utils import TestCase
 
 from common_ipex_conf import runtime_thread_affinity_test_env
 import subprocess
+import tempfile
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 import os
+import logging
+import threading
+import time
 
 
 class SimpleNet(torch.nn.Module):
@@ -247,6 +253,30 @@ class TestRuntimeAPI(TestCase):
         self.assertEqual(y, y_runtime)
         self.assertEqual(y, y_runtime2)
 
+    @unittest.skipIf(
+        not ipex.cpu.runtime.is_runtime_ext_enabled(),
+        "Skip when IPEX Runtime extension is not enabled",
+    )
+    @runtime_thread_affinity_test_env
+    def test_task_asyncio_api_imperative_model(self):
+        model = SimpleNet()
+        model.eval()
+        x = torch.rand(64, 64, 3, 3)
+        # Calculate the reference result
+        y = model(x)
+
+        # Create task
+        cpu_pool = ipex.cpu.runtime.CPUPool(node_id=0)
+        task = ipex.cpu.runtime.Task(model, cpu_pool)
+
+        # Task submit and await in the event loop
+        async def run():
+            return await asyncio.gather(task.run_async(x), task.run_async(x[:8]))
+
+        y_runtime, y_runtime2 = asyncio.run(run())
+        self.assertEqual(y, y_runtime)
+        self.assertEqual(y[:8], y_runtime2)
+
 
 class TestMultiStreamModule(TestCase):
     @unittest.skipIf(
@@ -471,6 +501,73 @@ class TestMultiStreamModule(TestCase):
         self.assertEqual(y_runtime2[1].size(0), 1)
         self.assertEqual(y_runtime2[2].size(0), 1)
 
+    @unittest.skipIf(
+        not ipex.cpu.runtime.is_runtime_ext_enabled(),
+        "Skip when IPEX Runtime extension is not enabled",
+    )
+    @runtime_thread_affinity_test_env
+    def test_multi_stream_module_micro_batch(self):
+        model = SimpleNet()
+        model.eval()
+        batch_size = 11
+        x = torch.rand(batch_size, 64, 3, 3)
+        # Calculate the reference result
+        y = model(x)
+
+        # Create MultiStreamModule
+        # Batchsize 11, micro-batch size 3, stream Number is 2
+        cpu_pool = ipex.cpu.runtime.CPUPool(core_ids=[0, 1])
+        multi_stream_model = ipex.cpu.runtime.MultiStreamModule(
+            model, num_streams=2, cpu_pool=cpu_pool, micro_batch_size=3
+        )
+        multi_stream_model2 = ipex.cpu.runtime.MultiStreamModule(
+            model,
+            num_streams=2,
+            cpu_pool=cpu_pool,
+            concat_output=False,
+            micro_batch_size=3,
+        )
+
+        y_runtime = multi_stream_model(x)
+        y_runtime2 = multi_stream_model2(x)
+        self.assertEqual(y, y_runtime)
+        self.assertEqual(y, torch.cat(y_runtime2))
+        self.assertEqual([y_i.size(0) for y_i in y_runtime2], [3, 3, 3, 2])
+        # Fewer micro-batches than the streams
+        self.assertEqual(y[:2], multi_stream_model(x[:2]))
+
+    @unittest.skipIf(
+        not ipex.cpu.runtime.is_runtime_ext_enabled(),
+        "Skip when IPEX Runtime extension is not enabled",
+    )
+    @runtime_thread_affinity_test_env
+    def test_multi_stream_module_forward_async(self):
+        model = SimpleNet()
+        model.eval()
+        x = torch.rand(11, 64, 3, 3)
+        # Calculate the reference result
+        y = model(x)
+
+        cpu_pool = ipex.cpu.runtime.CPUPool(core_ids=[0, 1])
+        for num_streams, micro_batch_size in [(1, None), (2, None), (2, 3)]:
+            multi_stream_model = ipex.cpu.runtime.MultiStreamModule(
+                model,
+                num_streams=num_streams,
+                cpu_pool=cpu_pool,
+                micro_batch_size=micro_batch_size,
+            )
+
+            # Concurrent calls in the event loop
+            async def run():
+                return await asyncio.gather(
+                    multi_stream_model.forward_async(x),
+                    multi_stream_model.forward_async(x[:5]),
+                )
+
+            y_runtime, y_runtime2 = asyncio.run(run())
+            self.assertEqual(y, y_runtime)
+            self.assertEqual(y[:5], y_runtime2)
+
 
 class TestModuleMultiStreamModuleHint(TestCase):
     # For the inputs format which can't be jit.trace
@@ -653,6 +750,142 @@ def is_numactl_available():
     return numactl_available
 
 
+class TestDynamicBatcher(TestCase):
+    @unittest.skipIf(
+        not ipex.cpu.runtime.is_runtime_ext_enabled(),
+        "Skip when IPEX Runtime extension is not enabled",
+    )
+    @runtime_thread_affinity_test_env
+    def test_dynamic_batcher(self):
+        model = SimpleNet()
+        model.eval()
+        inputs = [torch.rand(i % 3 + 1, 64, 3, 3) for i in range(32)]
+        # Calculate the reference results
+        references = [model(x) for x in inputs]
+        batch_sizes = []
+
+        def record_batch_size(module, inputs):
+            batch_sizes.append(inputs[0].size(0))
+
+        model.register_forward_pre_hook(record_batch_size)
+        cpu_pool = ipex.cpu.runtime.CPUPool(node_id=0)
+        with ipex.cpu.runtime.DynamicBatcher(
+            model,
+            num_streams=2,
+            cpu_pool=cpu_pool,
+            max_batch_size=8,
+            max_latency_ms=20,
+        ) as batcher:
+            # the requests are submitted from several threads
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                futures = list(executor.map(batcher.submit, inputs))
+            outputs = [future.result() for future in futures]
+        for y, y_runtime in zip(references, outputs):
+            self.assertEqual(y, y_runtime)
+        self.assertTrue(max(batch_sizes) <= 8)
+        # some requests are batched together
+        self.assertTrue(len(batch_sizes) < len(inputs))
+        with self.assertRaises(RuntimeError):
+            batcher.submit(inputs[0])
+
+    @unittest.skipIf(
+        not ipex.cpu.runtime.is_runtime_ext_enabled(),
+        "Skip when IPEX Runtime extension is not enabled",
+    )
+    @runtime_thread_affinity_test_env
+    def test_dynamic_batcher_busy_workers(self):
+        model = SimpleNet()
+        model.eval()
+        inputs = [torch.rand(1, 64, 3, 3) for _ in range(16)]
+        references = [model(x) for x in inputs]
+        batch_sizes = []
+        started = threading.Semaphore(0)
+        release = threading.Event()
+
+        def block_workers(module, inputs):
+            batch_sizes.append(inputs[0].size(0))
+            started.release()
+            release.wait()
+
+        model.register_forward_pre_hook(block_workers)
+        cpu_pool = ipex.cpu.runtime.CPUPool(node_id=0)
+        with ipex.cpu.runtime.DynamicBatcher(
+            model,
+            num_streams=2,
+            cpu_pool=cpu_pool,
+            max_batch_size=8,
+            max_latency_ms=1,
+        ) as batcher:
+            # keep both workers busy
+            busy_futures = []
+            for x in inputs[:2]:
+                busy_futures.append(batcher.submit(x))
+                started.acquire()
+            # the queued requests wait longer than max_latency_ms for a free worker
+            futures = [batcher.submit(x) for x in inputs[2:]]
+            time.sleep(0.1)
+            release.set()
+            outputs = [future.result() for future in busy_futures + futures]
+        for y, y_runtime in zip(references, outputs):
+            self.assertEqual(y, y_runtime)
+        self.assertEqual(batch_sizes[:2], [1, 1])
+        self.assertTrue(max(batch_sizes) <= 8)
+        # the queued requests are still batched together after their deadlines
+        self.assertTrue(min(batch_sizes[2:]) > 1)
+
+
+class TestWeightSharingInstances(TestCase):
+    @unittest.skipIf(
+        not ipex.cpu.runtime.is_runtime_ext_enabled(),
+        "Skip when IPEX Runtime extension is not enabled",
+    )
+    @runtime_thread_affinity_test_env
+    def test_weight_sharing_instances(self):
+        model = SimpleNet()
+        model.eval()
+        inputs = [torch.rand(2, 64, 3, 3) for _ in range(4)]
+        # Calculate the reference results
+        references = [model(x) for x in inputs]
+
+        with tempfile.TemporaryDirectory() as log_dir:
+            # The environment set by ipexrun --weight-sharing
+            log_prefix = os.path.join(log_dir, "run")
+            os.environ["IPEX_WEIGHT_SHARING_INSTANCES"] = "0:0;2:1"
+            os.environ["IPEX_WEIGHT_SHARING_LOG_PREFIX"] = log_prefix
+            try:
+                instances = ipex.cpu.runtime.WeightSharingInstances(model)
+                # The second object shares the file handlers of the loggers
+                other_instances = ipex.cpu.runtime.WeightSharingInstances(model)
+            finally:
+                del os.environ["IPEX_WEIGHT_SHARING_INSTANCES"]
+                del os.environ["IPEX_WEIGHT_SHARING_LOG_PREFIX"]
+            self.assertEqual(len(instances), 2)
+            self.assertEqual(instances.cpu_pools[1].core_ids, [1])
+
+            def run_instance(instance_idx):
+                outputs = [
+                    instances.submit(instance_idx, x).get()
+                    for x in inputs[instance_idx::2]
+                ]
+                instances.loggers[instance_idx].info(f"{len(outputs)} batches")
+                return outputs
+
+            outputs = instances.run(run_instance)
+            self.assertEqual(outputs[0], references[0::2])
+            self.assertEqual(outputs[1], references[1::2])
+            with open(f"{log_prefix}_instance_2_cores_1.log") as f:
+                self.assertEqual(f.read().count("2 batches"), 1)
+            other_instances.close()
+            instances.close()
+            for instance_logger in instances.loggers:
+                self.assertFalse(
+                    any(
+                        isinstance(handler, logging.FileHandler)
+                        for handler in instance_logger.handlers
+                    )
+                )
+
+
 class TestRuntimeExtensionWithNumactl(TestCase):
     @unittest.skipIf(
         not (is_numactl_available() and ipex.cpu.runtime.is_runtime_ext_enabled()),